@@ -10,7 +10,7 @@ Market Data Service - 市场数据服务模块
 - Financial Modeling Prep
 """
 
-from .interfaces import IMarketDataProvider
+from .interfaces import IMarketDataProvider, KLineData, KLineBatch
 from .providers.yahoo_provider import YahooFinanceProvider
 from .providers.alphavantage_provider import AlphaVantageProvider
 from .providers.finnhub_provider import FinnhubProvider
@@ -19,9 +19,15 @@ from .providers.multi_provider import MultiProvider as MultiProviderStrategy
 from .providers.multi_account_provider import MultiAccountProvider
 from .providers.hybrid_provider import HybridProvider
 from .providers.scenario_router import ScenarioRouter
+from .providers.http_pool import HttpClientPool, HttpPoolConfig, ProviderRegistry
+from .symbol_registry import SymbolRegistry, SymbolStore, SQLiteSymbolStore, get_symbol_registry
+from .kline_cache import KLineCache
+from .quote_stream import QuoteStreamService, QuoteBook, Quote
 
 __all__ = [
     'IMarketDataProvider',
+    'KLineData',
+    'KLineBatch',
     'YahooFinanceProvider',
     'AlphaVantageProvider',
     'FinnhubProvider',
@@ -30,6 +36,17 @@ __all__ = [
     'MultiAccountProvider',
     'HybridProvider',
     'ScenarioRouter',
+    'HttpClientPool',
+    'HttpPoolConfig',
+    'ProviderRegistry',
+    'SymbolRegistry',
+    'SymbolStore',
+    'SQLiteSymbolStore',
+    'get_symbol_registry',
+    'KLineCache',
+    'QuoteStreamService',
+    'QuoteBook',
+    'Quote',
 ]
 
 __version__ = '1.0.0'
@@ -0,0 +1,13 @@
+"""
+本地模拟上游服务
+用于测试和压测，不访问真实数据源
+"""
+from .quote_server import FakeQuoteServer
+from .http_upstreams import FakeUpstreamServer, UpstreamBehavior, generate_bars
+
+__all__ = [
+    "FakeQuoteServer",
+    "FakeUpstreamServer",
+    "UpstreamBehavior",
+    "generate_bars",
+]
@@ -0,0 +1,253 @@
+"""
+模拟REST数据源
+按 Yahoo / Finnhub / Twelve Data / Alpha Vantage 的接口格式返回K线，支持配置延迟、错误率和限流
+"""
+import asyncio
+import random
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from aiohttp import web
+from loguru import logger
+
+
+@dataclass
+class UpstreamBehavior:
+    """模拟上游的行为配置"""
+    latency: float = 0.02  # 基础延迟（秒）
+    jitter: float = 0.01  # 随机抖动（秒）
+    error_rate: float = 0.0  # 返回500的概率
+    rate_limit: Optional[float] = None  # 每个API Key每秒允许的请求数，None表示不限流
+    burst: int = 5  # 令牌桶容量
+    bars: int = 250  # 每次返回的K线数量
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def generate_bars(symbol: str, count: int, end: Optional[datetime] = None) -> List[dict]:
+    """按股票代码生成确定性的日线（升序）"""
+    rng = random.Random(zlib.crc32(symbol.encode()))
+    end = (end or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    price = rng.uniform(20, 300)
+    bars = []
+    for i in range(count):
+        day = end - timedelta(days=count - 1 - i)
+        change = rng.uniform(-0.02, 0.02)
+        open_ = price
+        close = price * (1 + change)
+        bars.append({
+            "datetime": day,
+            "open": round(open_, 4),
+            "high": round(max(open_, close) * (1 + rng.uniform(0, 0.01)), 4),
+            "low": round(min(open_, close) * (1 - rng.uniform(0, 0.01)), 4),
+            "close": round(close, 4),
+            "volume": rng.randint(100_000, 5_000_000),
+        })
+        price = close
+    return bars
+
+
+class FakeUpstreamServer:
+    """
+    模拟REST数据源服务器
+
+    flavor 决定接口格式:
+    - yahoo:        GET /v8/finance/chart/{symbol}
+    - finnhub:      GET /api/v1/stock/candle, /api/v1/quote
+    - twelvedata:   GET /time_series, /quote
+    - alphavantage: GET /query?function=TIME_SERIES_DAILY（限流时按官方行为返回200+Note）
+
+    behavior 可在运行中修改（如把 error_rate 设为1.0模拟故障）
+    """
+
+    FLAVORS = ("yahoo", "finnhub", "twelvedata", "alphavantage")
+
+    def __init__(self, flavor: str, behavior: Optional[UpstreamBehavior] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        if flavor not in self.FLAVORS:
+            raise ValueError(f"未知的模拟数据源类型: {flavor}")
+        self.flavor = flavor
+        self.behavior = behavior or UpstreamBehavior()
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+        self._buckets: Dict[str, _TokenBucket] = {}
+
+        # 统计
+        self.requests = 0
+        self.served = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.requests_by_key: Dict[str, int] = {}
+
+    @property
+    def base_url(self) -> str:
+        """数据源 base_url（与各Provider的 base_url 属性对应）"""
+        root = f"http://{self.host}:{self.port}"
+        if self.flavor == "finnhub":
+            return f"{root}/api/v1"
+        if self.flavor == "alphavantage":
+            return f"{root}/query"
+        return root
+
+    async def start(self) -> str:
+        app = web.Application()
+        if self.flavor == "yahoo":
+            app.router.add_get("/v8/finance/chart/{symbol}", self._yahoo_chart)
+        elif self.flavor == "finnhub":
+            app.router.add_get("/api/v1/stock/candle", self._finnhub_candle)
+            app.router.add_get("/api/v1/quote", self._finnhub_quote)
+        elif self.flavor == "twelvedata":
+            app.router.add_get("/time_series", self._twelvedata_series)
+            app.router.add_get("/quote", self._twelvedata_quote)
+        else:
+            app.router.add_get("/query", self._alphavantage_query)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.debug(f"[FakeUpstream:{self.flavor}] 已启动: {self.base_url}")
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def reset_stats(self):
+        self.requests = self.served = self.errors = self.rate_limited = 0
+        self.requests_by_key.clear()
+
+    async def _admit(self, request: web.Request) -> Optional[web.Response]:
+        """模拟延迟/错误/限流，返回非None表示直接以该响应结束"""
+        self.requests += 1
+        key = request.query.get("token") or request.query.get("apikey") or "anonymous"
+        self.requests_by_key[key] = self.requests_by_key.get(key, 0) + 1
+
+        b = self.behavior
+        await asyncio.sleep(max(0.0, b.latency + random.uniform(-b.jitter, b.jitter)))
+
+        if b.rate_limit is not None:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.rate != b.rate_limit:
+                bucket = self._buckets[key] = _TokenBucket(b.rate_limit, b.burst)
+            if not bucket.take():
+                self.rate_limited += 1
+                if self.flavor == "alphavantage":
+                    return web.json_response({"Note": "API call frequency exceeded"})
+                return web.json_response({"error": "rate limited"}, status=429)
+
+        if b.error_rate > 0 and random.random() < b.error_rate:
+            self.errors += 1
+            return web.json_response({"error": "internal error"}, status=500)
+
+        self.served += 1
+        return None
+
+    async def _yahoo_chart(self, request: web.Request) -> web.Response:
+        rejected = await self._admit(request)
+        if rejected is not None:
+            return rejected
+        symbol = request.match_info["symbol"]
+        bars = generate_bars(symbol, self.behavior.bars)
+        return web.json_response({"chart": {"result": [{
+            "meta": {"symbol": symbol, "exchangeTimezoneName": "America/New_York"},
+            "timestamp": [int(bar["datetime"].timestamp()) for bar in bars],
+            "indicators": {"quote": [{
+                "open": [bar["open"] for bar in bars],
+                "high": [bar["high"] for bar in bars],
+                "low": [bar["low"] for bar in bars],
+                "close": [bar["close"] for bar in bars],
+                "volume": [bar["volume"] for bar in bars],
+            }]}
+        }], "error": None}})
+
+    async def _finnhub_candle(self, request: web.Request) -> web.Response:
+        rejected = await self._admit(request)
+        if rejected is not None:
+            return rejected
+        bars = generate_bars(request.query.get("symbol", ""), self.behavior.bars)
+        return web.json_response({
+            "s": "ok",
+            "t": [int(bar["datetime"].timestamp()) for bar in bars],
+            "o": [bar["open"] for bar in bars],
+            "h": [bar["high"] for bar in bars],
+            "l": [bar["low"] for bar in bars],
+            "c": [bar["close"] for bar in bars],
+            "v": [bar["volume"] for bar in bars],
+        })
+
+    async def _finnhub_quote(self, request: web.Request) -> web.Response:
+        rejected = await self._admit(request)
+        if rejected is not None:
+            return rejected
+        last = generate_bars(request.query.get("symbol", ""), 1)[-1]
+        return web.json_response({"c": last["close"], "o": last["open"], "h": last["high"], "l": last["low"]})
+
+    async def _twelvedata_series(self, request: web.Request) -> web.Response:
+        rejected = await self._admit(request)
+        if rejected is not None:
+            return rejected
+        bars = generate_bars(request.query.get("symbol", ""), self.behavior.bars)
+        return web.json_response({"status": "ok", "values": [
+            {
+                "datetime": bar["datetime"].strftime("%Y-%m-%d"),
+                "open": str(bar["open"]),
+                "high": str(bar["high"]),
+                "low": str(bar["low"]),
+                "close": str(bar["close"]),
+                "volume": str(bar["volume"]),
+            }
+            for bar in reversed(bars)  # Twelve Data 返回降序
+        ]})
+
+    async def _twelvedata_quote(self, request: web.Request) -> web.Response:
+        rejected = await self._admit(request)
+        if rejected is not None:
+            return rejected
+        symbol = request.query.get("symbol", "")
+        last = generate_bars(symbol, 1)[-1]
+        return web.json_response({"symbol": symbol, "name": symbol, "close": str(last["close"])})
+
+    async def _alphavantage_query(self, request: web.Request) -> web.Response:
+        rejected = await self._admit(request)
+        if rejected is not None:
+            return rejected
+        bars = generate_bars(request.query.get("symbol", ""), self.behavior.bars)
+        return web.json_response({"Time Series (Daily)": {
+            bar["datetime"].strftime("%Y-%m-%d"): {
+                "1. open": str(bar["open"]),
+                "2. high": str(bar["high"]),
+                "3. low": str(bar["low"]),
+                "4. close": str(bar["close"]),
+                "5. volume": str(bar["volume"]),
+            }
+            for bar in bars
+        }})
+
+    def get_statistics(self) -> dict:
+        return {
+            "requests": self.requests,
+            "served": self.served,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "keys": len(self.requests_by_key),
+        }
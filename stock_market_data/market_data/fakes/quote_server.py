@@ -0,0 +1,127 @@
+"""
+模拟行情推送服务器
+按 Finnhub WebSocket 协议收发消息，供 QuoteStreamService 测试使用
+"""
+import asyncio
+import json
+import random
+import time
+from typing import Dict, Optional, Set
+from aiohttp import web, WSMsgType
+from loguru import logger
+
+
+class FakeQuoteServer:
+    """
+    本地模拟行情推送服务器
+
+    使用示例:
+        server = FakeQuoteServer(tick_interval=0.1)
+        url = await server.start()
+        stream = QuoteStreamService(url)
+        ...
+        await server.stop()
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tick_interval: Optional[float] = None):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示随机端口
+            tick_interval: 自动推送随机成交的间隔（秒），None表示只手动推送
+        """
+        self.host = host
+        self.port = port
+        self.tick_interval = tick_interval
+        self.clients: Dict[web.WebSocketResponse, Set[str]] = {}
+        self.prices: Dict[str, float] = {}
+        self.subscribe_messages = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._ticker: Optional[asyncio.Task] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def start(self) -> str:
+        """启动服务器，返回WebSocket地址"""
+        app = web.Application()
+        app.router.add_get("/ws", self._handle_ws)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+        if self.tick_interval:
+            self._ticker = asyncio.create_task(self._tick_loop())
+        logger.debug(f"[FakeQuoteServer] 已启动: {self.url}")
+        return self.url
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+        await self.drop_connections()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def drop_connections(self):
+        """断开所有客户端（模拟上游断线）"""
+        for ws in list(self.clients):
+            await ws.close()
+        self.clients.clear()
+
+    @property
+    def subscribed_symbols(self) -> Set[str]:
+        symbols: Set[str] = set()
+        for subs in self.clients.values():
+            symbols |= subs
+        return symbols
+
+    async def _handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients[ws] = set()
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                message = json.loads(msg.data)
+                symbol = message.get("symbol")
+                if message.get("type") == "subscribe" and symbol:
+                    self.subscribe_messages += 1
+                    self.clients[ws].add(symbol)
+                elif message.get("type") == "unsubscribe" and symbol:
+                    self.clients[ws].discard(symbol)
+        finally:
+            self.clients.pop(ws, None)
+        return ws
+
+    async def _broadcast(self, symbol: str, message: dict):
+        payload = json.dumps(message)
+        for ws, subs in list(self.clients.items()):
+            if symbol in subs and not ws.closed:
+                await ws.send_str(payload)
+
+    async def push_trade(self, symbol: str, price: float, volume: float = 100):
+        """向订阅了该股票的客户端推送一笔成交"""
+        self.prices[symbol] = price
+        await self._broadcast(symbol, {
+            "type": "trade",
+            "data": [{"s": symbol, "p": price, "v": volume, "t": int(time.time() * 1000)}]
+        })
+
+    async def push_quote(self, symbol: str, bid: float, ask: float):
+        """向订阅了该股票的客户端推送买卖报价"""
+        await self._broadcast(symbol, {
+            "type": "quote",
+            "data": [{"s": symbol, "b": bid, "a": ask, "t": int(time.time() * 1000)}]
+        })
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            for symbol in self.subscribed_symbols:
+                price = self.prices.get(symbol, 100.0) * (1 + random.uniform(-0.001, 0.001))
+                await self.push_trade(symbol, round(price, 4), random.randint(1, 500))
@@ -3,10 +3,12 @@
 定义系统的抽象接口，提高扩展性和可测试性
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any
-from datetime import datetime
+from typing import List, Dict, Optional, Any, Iterator, Union
+from datetime import datetime, timezone, timedelta, tzinfo
 from dataclasses import dataclass
 
+import numpy as np
+
 
 @dataclass
 class KLineData:
@@ -20,6 +22,194 @@ class KLineData:
     symbol: str = ""
 
 
+class KLineBatch:
+    """
+    列式K线数据结构
+
+    以连续的NumPy数组保存同一只股票的K线：
+    - timestamps: int64 Unix秒
+    - open/high/low/close: float64
+    - volume: int64
+
+    tz 为 None 时表示原始时间为无时区的本地时间（按UTC存储，取回时仍为naive）；
+    否则为 tzinfo 对象（可传入时区名），固定偏移的时区（如 UTC-05:00）同样适用。
+    迭代时按需生成 KLineData，兼容原有 List[KLineData] 的调用方。
+    """
+
+    __slots__ = ('symbol', 'timestamps', 'open', 'high', 'low', 'close', 'volume', 'tz')
+
+    def __init__(
+        self,
+        symbol: str,
+        timestamps: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+        tz: Union[str, tzinfo, None] = None
+    ):
+        self.symbol = symbol
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        self.open = np.ascontiguousarray(open, dtype=np.float64)
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        self.volume = np.ascontiguousarray(volume, dtype=np.int64)
+        if isinstance(tz, str):
+            from zoneinfo import ZoneInfo
+            tz = ZoneInfo(tz)
+        self.tz = tz
+
+        n = len(self.timestamps)
+        for name in ('open', 'high', 'low', 'close', 'volume'):
+            if len(getattr(self, name)) != n:
+                raise ValueError(f"KLineBatch 列长度不一致: {name}")
+
+    @classmethod
+    def empty(cls, symbol: str = "") -> "KLineBatch":
+        """创建空批次"""
+        f = np.empty(0, dtype=np.float64)
+        return cls(symbol, np.empty(0, dtype=np.int64), f, f, f, f, np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def from_klines(cls, klines: List[KLineData], symbol: str = "") -> "KLineBatch":
+        """从 KLineData 列表构建"""
+        if not klines:
+            return cls.empty(symbol)
+
+        tz = klines[0].datetime.tzinfo
+
+        def to_epoch(dt: datetime) -> int:
+            return _epoch_seconds(dt, tz)
+
+        return cls(
+            symbol or klines[0].symbol,
+            np.fromiter((to_epoch(k.datetime) for k in klines), dtype=np.int64, count=len(klines)),
+            np.fromiter((k.open for k in klines), dtype=np.float64, count=len(klines)),
+            np.fromiter((k.high for k in klines), dtype=np.float64, count=len(klines)),
+            np.fromiter((k.low for k in klines), dtype=np.float64, count=len(klines)),
+            np.fromiter((k.close for k in klines), dtype=np.float64, count=len(klines)),
+            np.fromiter((k.volume for k in klines), dtype=np.int64, count=len(klines)),
+            tz=tz
+        )
+
+    @classmethod
+    def from_dataframe(cls, df, symbol: str = "") -> "KLineBatch":
+        """
+        从以时间为索引的DataFrame构建
+
+        支持 Open/High/Low/Close/Volume（yfinance风格）或小写列名
+        """
+        import pandas as pd
+
+        if df is None or df.empty:
+            return cls.empty(symbol)
+
+        columns = {c.lower(): c for c in df.columns}
+        df = df.dropna(subset=[columns['open'], columns['close']])
+        if df.empty:
+            return cls.empty(symbol)
+
+        index = pd.DatetimeIndex(df.index)
+        tz = index.tz
+        if tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+
+        return cls(
+            symbol,
+            index.as_unit('s').asi8,
+            df[columns['open']].to_numpy(dtype=np.float64),
+            df[columns['high']].to_numpy(dtype=np.float64),
+            df[columns['low']].to_numpy(dtype=np.float64),
+            df[columns['close']].to_numpy(dtype=np.float64),
+            df[columns['volume']].fillna(0).to_numpy(dtype=np.int64),
+            tz=tz
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _datetime_at(self, ts: int) -> datetime:
+        dt = datetime.fromtimestamp(int(ts), tz=timezone.utc)
+        if self.tz is None:
+            return dt.replace(tzinfo=None)
+        return dt.astimezone(self.tz)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[KLineData, "KLineBatch"]:
+        if isinstance(item, slice):
+            # 切片返回共享底层数组的视图
+            return KLineBatch(
+                self.symbol, self.timestamps[item], self.open[item], self.high[item],
+                self.low[item], self.close[item], self.volume[item], tz=self.tz
+            )
+        return KLineData(
+            datetime=self._datetime_at(self.timestamps[item]),
+            open=float(self.open[item]),
+            high=float(self.high[item]),
+            low=float(self.low[item]),
+            close=float(self.close[item]),
+            volume=int(self.volume[item]),
+            symbol=self.symbol
+        )
+
+    def __iter__(self) -> Iterator[KLineData]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def slice_from(self, start: datetime) -> "KLineBatch":
+        """
+        截取 start 之后（含）的数据，要求时间升序
+
+        二分查找定位起点，返回共享底层数组的视图。start 与 from_klines 中的K线时间按同一规则换算为Unix秒：
+        批次有时区时，naive 的 start 视为该时区的本地时间；批次无时区时按墙上时间比较
+        """
+        pos = int(np.searchsorted(self.timestamps, _epoch_seconds(start, self.tz), side='left'))
+        return self[pos:]
+
+    def to_klines(self) -> List[KLineData]:
+        """转换为 KLineData 列表"""
+        return list(self)
+
+    def to_dataframe(self):
+        """
+        转换为DataFrame（列直接引用底层数组，不复制）
+
+        Returns:
+            以时间为索引、列为 open/high/low/close/volume 的DataFrame
+        """
+        import pandas as pd
+
+        index = pd.to_datetime(self.timestamps, unit='s', utc=True)
+        index = index.tz_convert(self.tz) if self.tz else index.tz_localize(None)
+        return pd.DataFrame(
+            {
+                'open': self.open,
+                'high': self.high,
+                'low': self.low,
+                'close': self.close,
+                'volume': self.volume,
+            },
+            index=index,
+            copy=False
+        )
+
+
+def _epoch_seconds(dt: datetime, tz: Optional[tzinfo]) -> int:
+    """
+    按批次时区把时间换算为 KLineBatch 存储的Unix秒
+
+    tz 为 None（naive批次）时取墙上时间按UTC换算；否则 naive 时间视为 tz 的本地时间
+    """
+    if tz is None:
+        return int(dt.replace(tzinfo=timezone.utc).timestamp())
+    if dt.tzinfo is None:
+        # pytz 时区需 localize，直接 replace 会得到LMT偏移
+        localize = getattr(tz, 'localize', None)
+        dt = localize(dt) if localize else dt.replace(tzinfo=tz)
+    return int(dt.timestamp())
+
+
 @dataclass
 class AnalysisResult:
     """技术分析结果"""
@@ -49,9 +239,48 @@ class SelectionResult:
     risk_level: int = 3
 
 
+# 按天数从小到大排列的period，用于不支持区间请求的数据源选取最小的覆盖范围
+PERIOD_LADDER = [
+    (1, "1d"), (5, "5d"), (30, "1mo"), (90, "3mo"), (180, "6mo"),
+    (365, "1y"), (730, "2y"), (1825, "5y"), (3650, "10y"),
+]
+
+
+def period_covering(start: datetime) -> str:
+    """返回能覆盖从 start 到现在的最小period"""
+    now = datetime.now(start.tzinfo) if start.tzinfo else datetime.now()
+    days = (now - start).total_seconds() / 86400 + 1
+    for limit, period in PERIOD_LADDER:
+        if days <= limit:
+            return period
+    return "max"
+
+
+def _naive(dt: datetime) -> datetime:
+    """去掉时区信息（保留本地墙上时间，与数据库中的存储方式一致）"""
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def filter_klines_by_range(
+    klines: List[KLineData],
+    start: datetime,
+    end: Optional[datetime] = None
+) -> List[KLineData]:
+    """按 [start, end] 过滤K线（闭区间，忽略时区差异）"""
+    start = _naive(start)
+    end = _naive(end) if end else None
+    return [
+        k for k in klines
+        if _naive(k.datetime) >= start and (end is None or _naive(k.datetime) <= end)
+    ]
+
+
 class IMarketDataProvider(ABC):
     """市场数据提供者接口"""
     
+    # 是否原生支持按起止时间请求（get_stock_data_range）
+    supports_range: bool = False
+    
     @abstractmethod
     async def get_stock_data(self, symbol: str, period: str, interval: str) -> List[KLineData]:
         """获取股票K线数据"""
@@ -66,6 +295,53 @@ class IMarketDataProvider(ABC):
     async def validate_symbol(self, symbol: str) -> bool:
         """验证股票代码是否有效"""
         pass
+    
+    async def validate_symbols(self, symbols: List[str], concurrency: int = 5) -> Dict[str, Optional[bool]]:
+        """
+        批量验证股票代码，默认并发调用 validate_symbol，数据源可覆盖为批量请求
+
+        Returns:
+            {symbol: True/False}，出错无法判断时为 None
+        """
+        import asyncio
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check(symbol: str) -> Optional[bool]:
+            async with semaphore:
+                try:
+                    return await self.validate_symbol(symbol)
+                except Exception:
+                    return None
+
+        results = await asyncio.gather(*(check(s) for s in symbols))
+        return dict(zip(symbols, results))
+    
+    async def get_stock_data_batch(self, symbol: str, period: str, interval: str) -> KLineBatch:
+        """获取列式K线数据，默认由 get_stock_data 转换，数据源可覆盖以直接返回"""
+        klines = await self.get_stock_data(symbol, period, interval)
+        return KLineBatch.from_klines(klines, symbol)
+    
+    async def get_stock_data_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> List[KLineData]:
+        """
+        按起止时间获取K线数据（闭区间）
+
+        默认用能覆盖 start 的最小period拉取后过滤；支持区间请求的数据源应覆盖此方法
+
+        Args:
+            symbol: 股票代码
+            interval: 时间间隔
+            start: 起始时间
+            end: 结束时间，None表示到最新
+        """
+        klines = await self.get_stock_data(symbol, period_covering(start), interval)
+        return filter_klines_by_range(klines, start, end)
 
 
 class ITechnicalAnalyzer(ABC):
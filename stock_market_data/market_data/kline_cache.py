@@ -0,0 +1,233 @@
+"""
+进程内K线缓存
+按 (股票代码, 周期) 缓存列式数组，按内存预算LRU淘汰；写入的K线并入缓存，删除时失效
+
+trading_journal（写入方）与 stock_strategy_trading（读取方）共用此实现，
+各服务在 app/core/kline_cache.py 中按自己的配置创建全局实例
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+# {ts, open, high, low, close, volume}，各列按 ts 升序
+Columns = Dict[str, np.ndarray]
+
+
+@dataclass
+class _Entry:
+    columns: Columns
+    # 最多保留的K线条数，None表示不限
+    capacity: Optional[int]
+    # 缓存从该时间起（含）是完整的，None表示已包含全部历史
+    covered_from: Optional[int]
+    # 最近一次向数据库核对尾部的时间
+    checked_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+    @property
+    def size(self) -> int:
+        return len(self.columns["ts"])
+
+
+def _slice(columns: Columns, start: Optional[int] = None, stop: Optional[int] = None) -> Columns:
+    return {name: values[start:stop] for name, values in columns.items()}
+
+
+def _freeze(columns: Columns) -> Columns:
+    # 返回给调用方的是缓存数组的切片，禁止原地修改
+    for values in columns.values():
+        values.flags.writeable = False
+    return columns
+
+
+class KLineCache:
+    """
+    K线列式缓存
+
+    读取:
+        get(symbol, period, limit=N)   缓存中有不少于N条（或已是全部历史）时返回最近N条
+        get(symbol, period, since=ts)  缓存覆盖到 since 时返回 ts >= since 的部分
+    写入:
+        put       放入从数据库读取的窗口
+        merge     并入新K线（通常追加到尾部），同一时间的K线以新数据为准
+        on_write  K线写入数据库后调用
+        invalidate  删除或无法逐行并入的写入后使缓存失效
+
+    返回的数组与缓存共享内存且只读。
+    """
+
+    def __init__(self, max_bytes: int, refresh_interval: float = 60.0):
+        """
+        Args:
+            max_bytes: 内存预算（字节），超出时按LRU淘汰
+            refresh_interval: 命中后多久需要重新向数据库核对尾部（秒）
+        """
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.merges = 0
+        self.invalidations = 0
+
+    def get(self, symbol: str, period: str, limit: Optional[int] = None,
+            since: Optional[int] = None) -> Optional[Columns]:
+        """读取缓存（计入命中率），未命中返回None"""
+        with self._lock:
+            columns = self._lookup(symbol, period, limit, since)
+            if columns is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((symbol, period))
+            self.hits += 1
+            return columns
+
+    def peek(self, symbol: str, period: str, limit: Optional[int] = None,
+             since: Optional[int] = None) -> Optional[Columns]:
+        """读取缓存，不计入命中率也不调整LRU顺序"""
+        with self._lock:
+            return self._lookup(symbol, period, limit, since)
+
+    def _lookup(self, symbol: str, period: str, limit: Optional[int],
+                since: Optional[int]) -> Optional[Columns]:
+        entry = self._entries.get((symbol, period))
+        if entry is None:
+            return None
+        columns = entry.columns
+        if since is not None:
+            if entry.covered_from is not None and entry.covered_from > since:
+                return None
+            columns = _slice(columns, int(np.searchsorted(columns["ts"], since, side="left")))
+        elif limit is not None and entry.size < limit and entry.covered_from is not None:
+            return None
+        elif limit is None and entry.covered_from is not None:
+            return None
+        return _slice(columns, -limit) if limit else columns
+
+    def needs_refresh(self, symbol: str, period: str) -> bool:
+        """命中的缓存是否到了向数据库核对新K线的时间"""
+        entry = self._entries.get((symbol, period))
+        return entry is not None and time.monotonic() - entry.checked_at >= self.refresh_interval
+
+    def last_ts(self, symbol: str, period: str) -> Optional[int]:
+        """缓存中最后一条K线的时间"""
+        entry = self._entries.get((symbol, period))
+        if entry is None or entry.size == 0:
+            return None
+        return int(entry.columns["ts"][-1])
+
+    def mark_checked(self, symbol: str, period: str):
+        entry = self._entries.get((symbol, period))
+        if entry is not None:
+            entry.checked_at = time.monotonic()
+
+    def put(self, symbol: str, period: str, columns: Columns,
+            capacity: Optional[int] = None, covered_from: Optional[int] = None):
+        """
+        放入从数据库读取的窗口
+
+        Args:
+            columns: 列数组（按 ts 升序）
+            capacity: 最多保留的条数（追加后超出则丢弃最早的），None表示不限
+            covered_from: 窗口从该时间起是完整的，None表示已包含全部历史
+        """
+        with self._lock:
+            self._remove((symbol, period))
+            entry = _Entry(columns=_freeze(columns), capacity=capacity, covered_from=covered_from)
+            self._entries[(symbol, period)] = entry
+            self._bytes += entry.nbytes
+            self._evict()
+
+    def merge(self, symbol: str, period: str, columns: Columns) -> bool:
+        """
+        并入新写入的K线，返回缓存是否存在
+
+        通常是追加到尾部；与缓存重叠的时间以新数据为准，早于缓存窗口的K线忽略
+        """
+        with self._lock:
+            key = (symbol, period)
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry.covered_from is not None:
+                columns = _slice(columns, int(np.searchsorted(columns["ts"], entry.covered_from, side="left")))
+            if len(columns["ts"]) == 0:
+                return True
+
+            merged = {
+                name: np.concatenate((values, np.asarray(columns[name], dtype=values.dtype)))
+                for name, values in entry.columns.items()
+            }
+            if entry.size and int(columns["ts"][0]) <= int(entry.columns["ts"][-1]):
+                # 稳定排序后同一时间取最后出现的（即新数据）
+                order = np.argsort(merged["ts"], kind="stable")
+                ts = merged["ts"][order]
+                order = order[np.append(ts[1:] != ts[:-1], True)]
+                merged = {name: values[order] for name, values in merged.items()}
+            if entry.capacity is not None and len(merged["ts"]) > entry.capacity:
+                merged = _slice(merged, -entry.capacity)
+                entry.covered_from = int(merged["ts"][0])
+
+            self._bytes -= entry.nbytes
+            entry.columns = _freeze(merged)
+            self._bytes += entry.nbytes
+            self.merges += 1
+            self._evict()
+            return True
+
+    def on_write(self, symbol: str, period: str, columns: Columns):
+        """K线写入数据库后调用（未缓存的股票忽略）"""
+        self.merge(symbol, period, columns)
+
+    def invalidate(self, symbol: Optional[str] = None, period: Optional[str] = None):
+        """使缓存失效，参数为None表示不限"""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (symbol is None or key[0] == symbol) and (period is None or key[1] == period)
+            ]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _evict(self):
+        # 至少保留最近使用的一项，避免单个窗口超出预算时反复加载
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes
+            self.evictions += 1
+
+    def get_statistics(self) -> Dict[str, float]:
+        """命中率与内存占用"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "usage_percent": round(self._bytes / self.max_bytes * 100, 1) if self.max_bytes else 0.0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            "evictions": self.evictions,
+            "merges": self.merges,
+            "invalidations": self.invalidations,
+        }
+
@@ -11,6 +11,7 @@ from .multi_provider import MultiProvider
 MultiProviderStrategy = MultiProvider  # 别名，保持兼容性
 from .multi_account_provider import MultiAccountProvider
 from .scenario_router import ScenarioRouter
+from .http_pool import HttpClientPool, HttpPoolConfig, ProviderRegistry, get_shared_pool, close_shared_pool
 
 __all__ = [
     "YahooFinanceProvider",
@@ -22,5 +23,10 @@ __all__ = [
     "MultiProviderStrategy",
     "MultiAccountProvider",
     "ScenarioRouter",
-    "MarketDataProviderFactory"
+    "MarketDataProviderFactory",
+    "HttpClientPool",
+    "HttpPoolConfig",
+    "ProviderRegistry",
+    "get_shared_pool",
+    "close_shared_pool"
 ]
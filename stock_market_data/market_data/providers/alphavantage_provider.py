@@ -5,29 +5,39 @@ Alpha Vantage 数据提供者
 """
 import aiohttp
 import asyncio
+import bisect
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any, Dict
+import pandas as pd
 from loguru import logger
 import os
 
-from ..interfaces import IMarketDataProvider, KLineData
+from ..interfaces import IMarketDataProvider, KLineData, KLineBatch
+from .http_pool import HttpClientPool, get_shared_pool
 
 
 class AlphaVantageProvider(IMarketDataProvider):
     """Alpha Vantage 数据提供者实现"""
     
-    def __init__(self, api_key: Optional[str] = None, rate_limit_delay: float = 12.0):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        rate_limit_delay: float = 12.0,
+        http_pool: Optional[HttpClientPool] = None
+    ):
         """
         初始化 Alpha Vantage Provider
         
         Args:
             api_key: Alpha Vantage API 密钥
             rate_limit_delay: API 调用间隔（免费版限制：5次/分钟，即12秒/次）
+            http_pool: 共享HTTP连接池，默认使用进程内共享连接池
         """
         self.api_key = api_key or os.getenv("ALPHA_VANTAGE_API_KEY", "demo")
         self.base_url = "https://www.alphavantage.co/query"
         self.rate_limit_delay = rate_limit_delay
         self.last_request_time = 0
+        self.http_pool = http_pool or get_shared_pool()
     
     async def _rate_limit(self):
         """实施速率限制"""
@@ -46,24 +56,24 @@ class AlphaVantageProvider(IMarketDataProvider):
             
             params["apikey"] = self.api_key
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.base_url, params=params, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        # 检查 API 错误
-                        if "Error Message" in data:
-                            logger.error(f"Alpha Vantage API错误: {data['Error Message']}")
-                            return None
-                        
-                        if "Note" in data:
-                            logger.warning(f"Alpha Vantage API限流: {data['Note']}")
-                            return None
-                        
-                        return data
-                    else:
-                        logger.error(f"Alpha Vantage API请求失败: {response.status}")
+            session = await self.http_pool.get_session()
+            async with session.get(self.base_url, params=params, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    
+                    # 检查 API 错误
+                    if "Error Message" in data:
+                        logger.error(f"Alpha Vantage API错误: {data['Error Message']}")
+                        return None
+                    
+                    if "Note" in data:
+                        logger.warning(f"Alpha Vantage API限流: {data['Note']}")
                         return None
+                    
+                    return data
+                else:
+                    logger.error(f"Alpha Vantage API请求失败: {response.status}")
+                    return None
         
         except asyncio.TimeoutError:
             logger.error("Alpha Vantage API请求超时")
@@ -96,6 +106,35 @@ class AlphaVantageProvider(IMarketDataProvider):
             # 默认返回日线
             return "TIME_SERIES_DAILY", None
     
+    async def _fetch_time_series(self, symbol: str, period: str, interval: str) -> KLineBatch:
+        """请求时间序列接口，解析并按period截取为KLineBatch"""
+        function, av_interval = self._parse_interval(interval)
+        
+        # 构建请求参数
+        params = {
+            "function": function,
+            "symbol": symbol,
+            "outputsize": "full"  # 获取完整历史数据
+        }
+        
+        # 对于日内数据，添加 interval 参数
+        if av_interval:
+            params["interval"] = av_interval
+        
+        # 发起请求
+        data = await self._make_request(params)
+        
+        if not data:
+            logger.warning(f"未获取到股票 {symbol} 的数据")
+            return KLineBatch.empty(symbol)
+        
+        # 解析数据
+        batch = self._parse_time_series_batch(data, symbol, function)
+        
+        # 根据 period 过滤数据
+        cutoff = self._period_cutoff(period)
+        return batch.slice_from(cutoff) if cutoff else batch
+    
     async def get_stock_data(self, symbol: str, period: str, interval: str) -> List[KLineData]:
         """
         获取股票K线数据
@@ -111,31 +150,7 @@ class AlphaVantageProvider(IMarketDataProvider):
         try:
             logger.debug(f"[AlphaVantage] 获取股票数据: {symbol}, period: {period}, interval: {interval}")
             
-            function, av_interval = self._parse_interval(interval)
-            
-            # 构建请求参数
-            params = {
-                "function": function,
-                "symbol": symbol,
-                "outputsize": "full"  # 获取完整历史数据
-            }
-            
-            # 对于日内数据，添加 interval 参数
-            if av_interval:
-                params["interval"] = av_interval
-            
-            # 发起请求
-            data = await self._make_request(params)
-            
-            if not data:
-                logger.warning(f"未获取到股票 {symbol} 的数据")
-                return []
-            
-            # 解析数据
-            kline_data = self._parse_time_series(data, symbol, function)
-            
-            # 根据 period 过滤数据
-            kline_data = self._filter_by_period(kline_data, period)
+            kline_data = (await self._fetch_time_series(symbol, period, interval)).to_klines()
             
             logger.debug(f"[AlphaVantage] 成功获取股票 {symbol} 的 {len(kline_data)} 条K线数据")
             return kline_data
@@ -144,10 +159,16 @@ class AlphaVantageProvider(IMarketDataProvider):
             logger.error(f"[AlphaVantage] 获取股票 {symbol} 数据失败: {e}")
             return []
     
-    def _parse_time_series(self, data: Dict, symbol: str, function: str) -> List[KLineData]:
-        """解析 Alpha Vantage 时间序列数据"""
-        kline_data = []
-        
+    async def get_stock_data_batch(self, symbol: str, period: str, interval: str) -> KLineBatch:
+        """获取列式K线数据（不创建逐条KLineData对象）"""
+        try:
+            return await self._fetch_time_series(symbol, period, interval)
+        except Exception as e:
+            logger.error(f"[AlphaVantage] 获取股票 {symbol} 列式数据失败: {e}")
+            return KLineBatch.empty(symbol)
+    
+    def _parse_time_series_batch(self, data: Dict, symbol: str, function: str) -> KLineBatch:
+        """向量化解析 Alpha Vantage 时间序列数据（按时间升序）"""
         try:
             # 根据 function 确定时间序列的 key
             time_series_key = None
@@ -162,75 +183,63 @@ class AlphaVantageProvider(IMarketDataProvider):
             
             if not time_series_key or time_series_key not in data:
                 logger.error(f"未找到时间序列数据，可用keys: {list(data.keys())}")
-                return []
+                return KLineBatch.empty(symbol)
             
             time_series = data[time_series_key]
+            if not time_series:
+                return KLineBatch.empty(symbol)
             
-            # 解析每个时间点的数据
-            for timestamp, values in time_series.items():
-                try:
-                    # 解析时间戳
-                    dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S") if " " in timestamp else datetime.strptime(timestamp, "%Y-%m-%d")
-                    
-                    # 解析 OHLCV 数据
-                    kline = KLineData(
-                        datetime=dt,
-                        open=float(values.get("1. open", 0)),
-                        high=float(values.get("2. high", 0)),
-                        low=float(values.get("3. low", 0)),
-                        close=float(values.get("4. close", 0)),
-                        volume=int(values.get("5. volume", 0)),
-                        symbol=symbol
-                    )
-                    kline_data.append(kline)
-                
-                except (ValueError, KeyError) as e:
-                    logger.warning(f"解析数据点失败: {timestamp}, {e}")
-                    continue
+            # 整个字典一次性转为DataFrame，列名 "1. open" -> "open"
+            df = pd.DataFrame.from_dict(time_series, orient='index')
+            df.columns = [column.split('. ', 1)[-1] for column in df.columns]
+            df = df.apply(pd.to_numeric, errors='coerce')
+            df.index = pd.to_datetime(df.index, format='ISO8601', errors='coerce')
             
-            # 按时间排序（从旧到新）
-            kline_data.sort(key=lambda x: x.datetime)
+            invalid = df.index.isna() | df[['open', 'close']].isna().any(axis=1).to_numpy()
+            if invalid.any():
+                logger.warning(f"解析数据点失败 {int(invalid.sum())} 条，已跳过")
+                df = df[~invalid]
             
-            return kline_data
+            return KLineBatch.from_dataframe(df.sort_index(), symbol)
         
         except Exception as e:
             logger.error(f"解析时间序列数据失败: {e}")
-            return []
+            return KLineBatch.empty(symbol)
+    
+    def _parse_time_series(self, data: Dict, symbol: str, function: str) -> List[KLineData]:
+        """解析 Alpha Vantage 时间序列数据"""
+        return self._parse_time_series_batch(data, symbol, function).to_klines()
+    
+    @staticmethod
+    def _period_cutoff(period: str) -> Optional[datetime]:
+        """period 对应的起始时间，max 返回 None"""
+        days = {
+            "1d": 1,
+            "5d": 5,
+            "1mo": 30,
+            "3mo": 90,
+            "6mo": 180,
+            "1y": 365,
+            "2y": 730,
+            "5y": 1825,
+        }
+        if period == "max":
+            return None
+        # 默认返回最近一年
+        return datetime.now() - timedelta(days=days.get(period, 365))
     
     def _filter_by_period(self, kline_data: List[KLineData], period: str) -> List[KLineData]:
-        """根据时间范围过滤数据"""
+        """根据时间范围过滤数据（要求按时间升序，二分查找起点）"""
         if not kline_data:
             return []
         
         try:
-            # 解析 period
-            now = datetime.now()
-            
-            if period == "1d":
-                cutoff = now - timedelta(days=1)
-            elif period == "5d":
-                cutoff = now - timedelta(days=5)
-            elif period == "1mo":
-                cutoff = now - timedelta(days=30)
-            elif period == "3mo":
-                cutoff = now - timedelta(days=90)
-            elif period == "6mo":
-                cutoff = now - timedelta(days=180)
-            elif period == "1y":
-                cutoff = now - timedelta(days=365)
-            elif period == "2y":
-                cutoff = now - timedelta(days=730)
-            elif period == "5y":
-                cutoff = now - timedelta(days=1825)
-            elif period == "max":
+            cutoff = self._period_cutoff(period)
+            if cutoff is None:
                 return kline_data  # 返回所有数据
-            else:
-                # 默认返回最近一年
-                cutoff = now - timedelta(days=365)
             
-            # 过滤数据
-            filtered = [k for k in kline_data if k.datetime >= cutoff]
-            return filtered
+            start = bisect.bisect_left(kline_data, cutoff, key=lambda k: k.datetime)
+            return kline_data[start:]
         
         except Exception as e:
             logger.error(f"过滤数据失败: {e}")
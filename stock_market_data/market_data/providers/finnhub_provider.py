@@ -7,33 +7,36 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 import aiohttp
+import numpy as np
 from loguru import logger
 
-from ..interfaces import IMarketDataProvider, KLineData
+from ..interfaces import IMarketDataProvider, KLineData, KLineBatch, filter_klines_by_range
+from .http_pool import HttpClientPool, get_shared_pool
 # StockInfo removed
 
 
 class FinnhubProvider(IMarketDataProvider):
     """Finnhub 数据提供者"""
     
-    def __init__(self, api_key: str, rate_limit_delay: float = 1.0):
+    supports_range = True
+    
+    def __init__(self, api_key: str, rate_limit_delay: float = 1.0, http_pool: Optional[HttpClientPool] = None):
         """
         初始化 Finnhub Provider
         
         Args:
             api_key: Finnhub API Key
             rate_limit_delay: 请求间隔(秒)，默认1秒 (60次/分钟)
+            http_pool: 共享HTTP连接池，默认使用进程内共享连接池
         """
         self.api_key = api_key
         self.rate_limit_delay = rate_limit_delay
         self.base_url = "https://finnhub.io/api/v1"
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.http_pool = http_pool or get_shared_pool()
     
     async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建session"""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
-        return self._session
+        """从共享连接池获取session"""
+        return await self.http_pool.get_session()
     
     async def _request(self, endpoint: str, params: dict = None) -> dict:
         """
@@ -130,6 +133,77 @@ class FinnhubProvider(IMarketDataProvider):
         
         return int(start_date.timestamp()), int(end_date.timestamp())
     
+    @staticmethod
+    def _parse_candles(data: dict, symbol: str) -> KLineBatch:
+        """
+        将candle接口返回的列式数组直接转换为KLineBatch
+
+        Finnhub 时间戳为UTC秒，批次时区标记为UTC
+        """
+        timestamps = np.asarray(data.get('t', []), dtype=np.int64)
+        if len(timestamps) == 0:
+            return KLineBatch.empty(symbol)
+        
+        batch = KLineBatch(
+            symbol,
+            timestamps,
+            np.asarray(data.get('o', []), dtype=np.float64),
+            np.asarray(data.get('h', []), dtype=np.float64),
+            np.asarray(data.get('l', []), dtype=np.float64),
+            np.asarray(data.get('c', []), dtype=np.float64),
+            np.asarray(data.get('v', []), dtype=np.float64).astype(np.int64),
+            tz='UTC'
+        )
+        
+        # Finnhub按时间升序返回，防御性地保证有序
+        if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+            order = np.argsort(timestamps, kind='stable')
+            batch = KLineBatch(
+                symbol, batch.timestamps[order], batch.open[order], batch.high[order],
+                batch.low[order], batch.close[order], batch.volume[order], tz='UTC'
+            )
+        return batch
+    
+    async def _fetch_candles(self, symbol: str, period: str, interval: str) -> KLineBatch:
+        """请求candle接口并解析为KLineBatch"""
+        start_ts, end_ts = self._period_to_dates(period)
+        return await self._fetch_candles_range(symbol, interval, start_ts, end_ts)
+    
+    async def _fetch_candles_range(self, symbol: str, interval: str, start_ts: int, end_ts: int) -> KLineBatch:
+        """按起止时间戳请求candle接口并解析为KLineBatch"""
+        # 转换参数
+        resolution = self._interval_to_resolution(interval)
+        
+        # 请求数据
+        data = await self._request('stock/candle', {
+            'symbol': symbol,
+            'resolution': resolution,
+            'from': start_ts,
+            'to': end_ts
+        })
+        
+        # 检查状态
+        if data.get('s') == 'no_data':
+            logger.warning(f"[Finnhub] 未获取到股票 {symbol} 的数据")
+            return KLineBatch.empty(symbol)
+        
+        if data.get('s') != 'ok':
+            logger.warning(f"[Finnhub] 数据状态异常: {data.get('s')}")
+            return KLineBatch.empty(symbol)
+        
+        return self._parse_candles(data, symbol)
+    
+    @staticmethod
+    def _batch_to_klines(batch: KLineBatch) -> List[KLineData]:
+        """转换为KLineData列表（保持原有语义：本地时区的naive时间）"""
+        return [
+            KLineData(datetime=datetime.fromtimestamp(t), open=o, high=h, low=l, close=c, volume=v)
+            for t, o, h, l, c, v in zip(
+                batch.timestamps.tolist(), batch.open.tolist(), batch.high.tolist(),
+                batch.low.tolist(), batch.close.tolist(), batch.volume.tolist()
+            )
+        ]
+    
     async def get_stock_data(
         self,
         symbol: str,
@@ -150,46 +224,8 @@ class FinnhubProvider(IMarketDataProvider):
         logger.debug(f"[Finnhub] 获取股票数据: {symbol}, period: {period}, interval: {interval}")
         
         try:
-            # 转换参数
-            resolution = self._interval_to_resolution(interval)
-            start_ts, end_ts = self._period_to_dates(period)
-            
-            # 请求数据
-            data = await self._request('stock/candle', {
-                'symbol': symbol,
-                'resolution': resolution,
-                'from': start_ts,
-                'to': end_ts
-            })
-            
-            # 检查状态
-            if data.get('s') == 'no_data':
-                logger.warning(f"[Finnhub] 未获取到股票 {symbol} 的数据")
-                return []
-            
-            if data.get('s') != 'ok':
-                logger.warning(f"[Finnhub] 数据状态异常: {data.get('s')}")
-                return []
-            
-            # 解析数据
-            klines = []
-            timestamps = data.get('t', [])
-            opens = data.get('o', [])
-            highs = data.get('h', [])
-            lows = data.get('l', [])
-            closes = data.get('c', [])
-            volumes = data.get('v', [])
-            
-            for i in range(len(timestamps)):
-                kline = KLineData(
-                    datetime=datetime.fromtimestamp(timestamps[i]),
-                    open=float(opens[i]),
-                    high=float(highs[i]),
-                    low=float(lows[i]),
-                    close=float(closes[i]),
-                    volume=int(volumes[i])
-                )
-                klines.append(kline)
+            batch = await self._fetch_candles(symbol, period, interval)
+            klines = self._batch_to_klines(batch)
             
             logger.debug(f"[Finnhub] 成功获取股票 {symbol} 的 {len(klines)} 条K线数据")
             return klines
@@ -198,6 +234,35 @@ class FinnhubProvider(IMarketDataProvider):
             logger.error(f"[Finnhub] 获取股票数据失败: {e}")
             return []
     
+    async def get_stock_data_batch(
+        self,
+        symbol: str,
+        period: str = "1mo",
+        interval: str = "1d"
+    ) -> KLineBatch:
+        """获取列式K线数据（不创建逐条KLineData对象）"""
+        try:
+            return await self._fetch_candles(symbol, period, interval)
+        except Exception as e:
+            logger.error(f"[Finnhub] 获取股票列式数据失败: {e}")
+            return KLineBatch.empty(symbol)
+    
+    async def get_stock_data_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> List[KLineData]:
+        """按起止时间获取K线数据（candle接口的 from/to 参数）"""
+        try:
+            end_ts = int((end or datetime.now()).timestamp())
+            batch = await self._fetch_candles_range(symbol, interval, int(start.timestamp()), end_ts)
+            return filter_klines_by_range(self._batch_to_klines(batch), start, end)
+        except Exception as e:
+            logger.error(f"[Finnhub] 获取股票区间数据失败: {e}")
+            return []
+    
     async def get_stock_info(self, symbol: str) -> Optional[Dict]:
         """
         获取股票基本信息
@@ -286,15 +351,5 @@ class FinnhubProvider(IMarketDataProvider):
         return result
     
     async def close(self):
-        """关闭session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
-    
-    def __del__(self):
-        """析构时关闭session"""
-        if self._session and not self._session.closed:
-            try:
-                asyncio.create_task(self._session.close())
-            except:
-                pass
-
+        """连接由共享连接池管理，这里不关闭session（见 HttpClientPool.close）"""
+        pass
@@ -0,0 +1,218 @@
+"""
+共享HTTP连接池
+所有异步数据源共用一个 aiohttp 连接池，复用 keep-alive 连接，减少TLS握手和socket开销
+"""
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Optional, Any
+import aiohttp
+from loguru import logger
+
+
+@dataclass
+class HttpPoolConfig:
+    """连接池配置"""
+    limit: int = 100  # 总连接数上限
+    limit_per_host: int = 10  # 单个host连接数上限
+    keepalive_timeout: float = 30.0  # keep-alive 空闲连接保留时间(秒)
+    ttl_dns_cache: int = 300  # DNS缓存时间(秒)
+    total_timeout: float = 30.0  # 单次请求总超时(秒)
+    connect_timeout: float = 10.0  # 建立连接超时(秒)
+
+
+class HostMetrics:
+    """单个host的连接统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    @property
+    def reuse_rate(self) -> float:
+        """连接复用率"""
+        total = self.new_connections + self.reused_connections
+        if total == 0:
+            return 0.0
+        return self.reused_connections / total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'reuse_rate': f"{self.reuse_rate*100:.1f}%"
+        }
+
+
+class HttpClientPool:
+    """
+    共享的 aiohttp 连接池
+
+    - 按host限制连接数，开启keep-alive和DNS缓存
+    - 统一的请求超时
+    - 通过 TraceConfig 统计每个host的新建/复用连接数
+    - 显式的异步生命周期: start() / close()，也可作为异步上下文管理器使用
+    """
+
+    def __init__(self, config: Optional[HttpPoolConfig] = None):
+        self.config = config or HttpPoolConfig()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.metrics: Dict[str, HostMetrics] = defaultdict(HostMetrics)
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host
+            self.metrics[ctx.host].requests += 1
+
+        async def on_request_exception(session, ctx, params):
+            self.metrics[params.url.host].errors += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.metrics[getattr(ctx, 'host', None) or 'unknown'].new_connections += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.metrics[getattr(ctx, 'host', None) or 'unknown'].reused_connections += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            keepalive_timeout=self.config.keepalive_timeout,
+            ttl_dns_cache=self.config.ttl_dns_cache,
+            use_dns_cache=True
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.config.total_timeout,
+            connect=self.config.connect_timeout
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[self._build_trace_config()]
+        )
+
+    async def start(self):
+        """创建连接池（重复调用无副作用）"""
+        await self.get_session()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """获取共享session，不存在、已关闭或事件循环变化时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 事件循环变化（如多次 asyncio.run）时旧session不可再用
+            self._session = None
+            self._loop = loop
+
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            logger.debug(
+                f"[HttpPool] 创建连接池: limit={self.config.limit}, "
+                f"limit_per_host={self.config.limit_per_host}"
+            )
+        return self._session
+
+    @property
+    def is_open(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.debug("[HttpPool] 连接池已关闭")
+        self._session = None
+
+    async def __aenter__(self) -> "HttpClientPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """按host返回连接与复用统计"""
+        return {host: stat.to_dict() for host, stat in self.metrics.items()}
+
+
+class ProviderRegistry:
+    """
+    数据源注册表
+
+    持有共享连接池和已注册的数据源，统一管理异步生命周期
+    """
+
+    def __init__(self, pool: Optional[HttpClientPool] = None):
+        self.pool = pool or HttpClientPool()
+        self.providers: Dict[str, Any] = {}
+
+    def _bind_pool(self, provider: Any):
+        """数据源若支持 http_pool 属性则改用本注册表的连接池（包括多账号/多数据源的子数据源）"""
+        if hasattr(provider, 'http_pool'):
+            provider.http_pool = self.pool
+        for child in getattr(provider, 'providers', None) or []:
+            self._bind_pool(child)
+
+    def register(self, name: str, provider: Any) -> Any:
+        """注册数据源"""
+        self._bind_pool(provider)
+        self.providers[name] = provider
+        return provider
+
+    def get(self, name: str) -> Optional[Any]:
+        return self.providers.get(name)
+
+    async def start(self):
+        await self.pool.start()
+        logger.info(f"[ProviderRegistry] 已启动，共 {len(self.providers)} 个数据源")
+
+    async def close(self):
+        """关闭所有数据源和共享连接池"""
+        for name, provider in self.providers.items():
+            close = getattr(provider, 'close', None)
+            if close is None:
+                continue
+            try:
+                await close()
+            except Exception as e:
+                logger.warning(f"[ProviderRegistry] 关闭数据源 {name} 失败: {e}")
+        await self.pool.close()
+
+    async def __aenter__(self) -> "ProviderRegistry":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        return self.pool.get_metrics()
+
+
+_shared_pool: Optional[HttpClientPool] = None
+
+
+def get_shared_pool() -> HttpClientPool:
+    """获取进程内默认的共享连接池"""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = HttpClientPool()
+    return _shared_pool
+
+
+async def close_shared_pool():
+    """关闭进程内默认的共享连接池"""
+    if _shared_pool is not None:
+        await _shared_pool.close()
@@ -52,6 +52,11 @@ class HybridProvider(IMarketDataProvider):
             "alphavantage": {"success": 0, "failure": 0}
         }
     
+    @property
+    def supports_range(self) -> bool:
+        """任一子数据源支持区间请求即视为支持"""
+        return any(getattr(p, 'supports_range', False) for p in self.providers)
+    
     def _record_success(self, provider_name: str):
         """记录成功"""
         if provider_name in self.stats:
@@ -110,6 +115,27 @@ class HybridProvider(IMarketDataProvider):
         logger.error(f"[HybridProvider] ❌ 所有数据源均无法获取 {symbol} 的数据")
         return []
     
+    async def get_stock_data_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> List[KLineData]:
+        """按起止时间获取K线数据（带故障转移）"""
+        for provider, provider_name in zip(self.providers, self.provider_names):
+            try:
+                data = await provider.get_stock_data_range(symbol, interval, start, end)
+                if data:
+                    self._record_success(provider_name)
+                    return data
+                logger.warning(f"[HybridProvider] {provider_name} 区间数据为空")
+                self._record_failure(provider_name)
+            except Exception as e:
+                logger.error(f"[HybridProvider] {provider_name} 获取区间数据失败: {e}")
+                self._record_failure(provider_name)
+        return []
+    
     async def get_stock_info(self, symbol: str) -> Optional[Dict[str, Any]]:
         """
         获取股票基本信息（带故障转移）
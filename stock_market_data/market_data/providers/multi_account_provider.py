@@ -3,6 +3,7 @@
 支持使用多个API Key轮询访问，成倍扩展API额度
 """
 import time
+from datetime import datetime
 from typing import List, Optional, Type, Dict
 from loguru import logger
 
@@ -135,6 +136,11 @@ class MultiAccountProvider(IMarketDataProvider):
             f"共 {len(self.providers)} 个账号"
         )
     
+    @property
+    def supports_range(self) -> bool:
+        """任一子数据源支持区间请求即视为支持"""
+        return any(getattr(p, 'supports_range', False) for p in self.providers)
+    
     def _get_next_provider(self) -> Optional[tuple]:
         """
         获取下一个可用的Provider
@@ -249,6 +255,20 @@ class MultiAccountProvider(IMarketDataProvider):
         )
         return result if result is not None else []
     
+    async def get_stock_data_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> List[KLineData]:
+        """按起止时间获取K线数据（多账号轮询）"""
+        result = await self._execute_with_retry(
+            'get_stock_data_range',
+            symbol, interval, start, end
+        )
+        return result if result is not None else []
+    
     async def get_stock_info(self, symbol: str) -> Optional[Dict]:
         """获取股票信息（多账号轮询）"""
         return await self._execute_with_retry('get_stock_info', symbol)
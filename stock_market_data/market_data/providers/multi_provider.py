@@ -2,68 +2,229 @@
 多数据源智能路由Provider
 支持多个数据源的负载均衡、故障转移和优先级路由
 """
+import math
 import random
 import time
-from typing import List, Optional, Dict
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Dict, Tuple
 from loguru import logger
 
-from ..interfaces import IMarketDataProvider, KLineData
+from ..interfaces import IMarketDataProvider, KLineData, KLineBatch
 # StockInfo removed
 
 
 class ProviderStats:
-    """数据源统计信息"""
-    
-    def __init__(self, name: str, priority: int = 1, weight: int = 10):
+    """
+    数据源统计信息
+
+    - 延迟: 按时间衰减的EWMA + 最近样本的p50/p95
+    - 成功率: 滑动时间窗口内的成功率（旧数据自动过期）
+    - 熔断: closed -> open -> half_open 三态，半开状态仅放行一个探测请求
+    """
+
+    # 熔断器状态
+    STATE_CLOSED = "closed"
+    STATE_OPEN = "open"
+    STATE_HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        priority: int = 1,
+        weight: int = 10,
+        window_seconds: float = 300.0,
+        latency_half_life: float = 60.0,
+        latency_samples: int = 200,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        max_recovery_timeout: float = 300.0
+    ):
         self.name = name
         self.priority = priority  # 优先级，数字越小优先级越高
         self.weight = weight  # 权重，用于负载均衡
+
+        # 累计计数（仅用于展示）
         self.total_requests = 0
         self.successful_requests = 0
         self.failed_requests = 0
-        self.total_response_time = 0.0
         self.last_error_time = 0.0
         self.consecutive_failures = 0
-    
+
+        # 滑动窗口成功率: (时间戳, 是否成功)
+        self.window_seconds = window_seconds
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._window_success = 0
+
+        # 时间衰减EWMA延迟与分位数样本
+        self.latency_half_life = latency_half_life
+        self._ewma_latency = 0.0
+        self._last_latency_time = 0.0
+        self._latency_samples: Deque[float] = deque(maxlen=latency_samples)
+
+        # 双源验证不一致记录: (时间戳, 是否一致)
+        self._verifications: Deque[Tuple[float, bool]] = deque()
+        
+        # 半开熔断器
+        self.failure_threshold = failure_threshold
+        self.base_recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.recovery_timeout = recovery_timeout
+        self.state = self.STATE_CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _prune_window(self, now: Optional[float] = None):
+        """移除滑动窗口之外的请求记录"""
+        cutoff = (now or time.time()) - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            _, ok = self._outcomes.popleft()
+            if ok:
+                self._window_success -= 1
+
+    def _record_outcome(self, ok: bool, now: float):
+        self._outcomes.append((now, ok))
+        if ok:
+            self._window_success += 1
+        self._prune_window(now)
+
+    @property
+    def window_requests(self) -> int:
+        """滑动窗口内的请求数"""
+        self._prune_window()
+        return len(self._outcomes)
+
     @property
     def success_rate(self) -> float:
-        """成功率"""
-        if self.total_requests == 0:
+        """滑动窗口内的成功率（窗口内无请求时视为1.0）"""
+        self._prune_window()
+        if not self._outcomes:
             return 1.0
-        return self.successful_requests / self.total_requests
+        return self._window_success / len(self._outcomes)
+
+    def record_verification(self, agreed: bool):
+        """记录一次双源验证结果"""
+        now = time.time()
+        self._verifications.append((now, agreed))
+        cutoff = now - self.window_seconds
+        while self._verifications and self._verifications[0][0] < cutoff:
+            self._verifications.popleft()
     
     @property
-    def avg_response_time(self) -> float:
-        """平均响应时间"""
-        if self.successful_requests == 0:
+    def disagreement_rate(self) -> float:
+        """滑动窗口内双源验证的不一致率"""
+        cutoff = time.time() - self.window_seconds
+        while self._verifications and self._verifications[0][0] < cutoff:
+            self._verifications.popleft()
+        if not self._verifications:
             return 0.0
-        return self.total_response_time / self.successful_requests
+        return sum(1 for _, ok in self._verifications if not ok) / len(self._verifications)
     
+    @property
+    def avg_response_time(self) -> float:
+        """按时间衰减的EWMA响应时间"""
+        return self._ewma_latency
+
+    def _percentile(self, q: float) -> float:
+        if not self._latency_samples:
+            return 0.0
+        ordered = sorted(self._latency_samples)
+        index = min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[index]
+
+    @property
+    def p50_response_time(self) -> float:
+        """最近样本的p50响应时间"""
+        return self._percentile(0.50)
+
+    @property
+    def p95_response_time(self) -> float:
+        """最近样本的p95响应时间"""
+        return self._percentile(0.95)
+
     @property
     def is_available(self) -> bool:
-        """是否可用（连续失败少于5次且距离上次错误超过60秒）"""
-        if self.consecutive_failures >= 5:
-            # 如果连续失败5次，需要等待一段时间后再尝试
-            if time.time() - self.last_error_time < 60:
-                return False
-            # 60秒后重置连续失败计数
-            self.consecutive_failures = 0
+        """
+        是否可接收请求（只读，不改变熔断器状态）
+
+        open状态冷却结束后可放行一个探测请求，half_open状态下只允许一个探测请求在途
+        """
+        if self.state == self.STATE_OPEN:
+            return self._cooldown_elapsed()
+        if self.state == self.STATE_HALF_OPEN:
+            return not self._probe_in_flight
         return True
-    
+
+    def _cooldown_elapsed(self) -> bool:
+        return time.time() - self.opened_at >= self.recovery_timeout
+
+    def begin_request(self):
+        """
+        请求开始前调用（call_provider 中）
+
+        open状态冷却结束时在此转为half_open，半开状态下占用唯一的探测名额
+        """
+        if self.state == self.STATE_OPEN and self._cooldown_elapsed():
+            self.state = self.STATE_HALF_OPEN
+            logger.info(f"[MultiProvider] {self.name} 熔断冷却结束，进入半开探测")
+        if self.state == self.STATE_HALF_OPEN:
+            self._probe_in_flight = True
+
+    def cancel_request(self):
+        """请求未完成就被取消（任务取消、wait_for 超时等）时调用：不计入成败，释放半开探测名额"""
+        self._probe_in_flight = False
+
+    def _update_latency(self, response_time: float, now: float):
+        if self._last_latency_time == 0.0:
+            self._ewma_latency = response_time
+        else:
+            # 半衰期衰减: 距上次样本越久，新样本权重越大
+            elapsed = max(now - self._last_latency_time, 0.0)
+            alpha = 1.0 - math.exp(-math.log(2) * elapsed / self.latency_half_life)
+            alpha = max(alpha, 0.1)
+            self._ewma_latency += alpha * (response_time - self._ewma_latency)
+        self._last_latency_time = now
+        self._latency_samples.append(response_time)
+
     def record_success(self, response_time: float):
         """记录成功请求"""
+        now = time.time()
         self.total_requests += 1
         self.successful_requests += 1
-        self.total_response_time += response_time
         self.consecutive_failures = 0
-    
+        self._record_outcome(True, now)
+        self._update_latency(response_time, now)
+
+        if self.state != self.STATE_CLOSED:
+            logger.info(f"[MultiProvider] {self.name} 探测成功，熔断器关闭")
+        self.state = self.STATE_CLOSED
+        self.recovery_timeout = self.base_recovery_timeout
+        self._probe_in_flight = False
+
     def record_failure(self):
         """记录失败请求"""
+        now = time.time()
         self.total_requests += 1
         self.failed_requests += 1
         self.consecutive_failures += 1
-        self.last_error_time = time.time()
-    
+        self.last_error_time = now
+        self._record_outcome(False, now)
+
+        if self.state == self.STATE_HALF_OPEN:
+            # 探测失败，退避后重新打开
+            self.recovery_timeout = min(self.recovery_timeout * 2, self.max_recovery_timeout)
+            self._trip(now)
+        elif self.state == self.STATE_CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._trip(now)
+
+    def _trip(self, now: float):
+        self.state = self.STATE_OPEN
+        self.opened_at = now
+        self._probe_in_flight = False
+        logger.warning(
+            f"[MultiProvider] {self.name} 熔断打开，{self.recovery_timeout:.0f}秒后半开探测"
+        )
+
     def get_score(self) -> float:
         """
         计算数据源得分（用于选择最优数据源）
@@ -76,24 +237,29 @@ class ProviderStats:
         # 优先级权重 (40%)
         priority_score = (5 - self.priority) / 5 * 0.4
         
-        # 成功率权重 (30%)
-        success_score = self.success_rate * 0.3
+        # 成功率权重 (30%) - 滑动窗口成功率，双源验证不一致时折减
+        success_score = self.success_rate * (1 - 0.5 * self.disagreement_rate) * 0.3
         
         # 配置权重 (20%)
         weight_score = self.weight / 100 * 0.2
         
-        # 响应速度权重 (10%) - 响应时间越短越好
-        if self.avg_response_time > 0:
-            speed_score = min(1.0 / self.avg_response_time, 1.0) * 0.1
+        # 响应速度权重 (10%) - EWMA与p95混合，兼顾近期水平和长尾
+        latency = 0.7 * self.avg_response_time + 0.3 * self.p95_response_time
+        if latency > 0:
+            speed_score = min(1.0 / latency, 1.0) * 0.1
         else:
             speed_score = 0.1
         
         total_score = priority_score + success_score + weight_score + speed_score
+
+        # 半开探测期间（含冷却结束、尚未发出探测的open状态）降权，避免探测请求挤占正常流量
+        if self.state != self.STATE_CLOSED:
+            total_score *= 0.5
         
         logger.debug(
             f"[MultiProvider] {self.name} 得分: {total_score:.3f} "
             f"(优先级:{priority_score:.3f}, 成功率:{success_score:.3f}, "
-            f"权重:{weight_score:.3f}, 速度:{speed_score:.3f})"
+            f"权重:{weight_score:.3f}, 速度:{speed_score:.3f}, 状态:{self.state})"
         )
         
         return total_score
@@ -137,10 +303,20 @@ class MultiProvider(IMarketDataProvider):
         
         logger.info(f"[MultiProvider] 初始化完成，共 {len(self.providers)} 个数据源")
     
-    def _select_provider(self) -> Optional[tuple]:
+    @property
+    def supports_range(self) -> bool:
+        """任一子数据源支持区间请求即视为支持"""
+        return any(getattr(p, 'supports_range', False) for p in self.providers)
+    
+    def _select_provider(self, exclude: Optional[List[str]] = None) -> Optional[tuple]:
         """
         智能选择数据源
         
+        得分基于滑动窗口成功率、EWMA/p95延迟和熔断状态，数据源劣化后几分钟内即会降权
+        
+        Args:
+            exclude: 本轮已尝试过的数据源名称
+        
         Returns:
             (provider, stats) 或 None
         """
@@ -148,6 +324,8 @@ class MultiProvider(IMarketDataProvider):
         candidates = []
         
         for provider, (name, stats) in zip(self.providers, self.stats.items()):
+            if exclude and name in exclude:
+                continue
             if stats.is_available:
                 score = stats.get_score()
                 candidates.append((provider, stats, score))
@@ -184,17 +362,69 @@ class MultiProvider(IMarketDataProvider):
         
         return provider, stats
     
-    async def _try_with_fallback(self, func_name: str, *args, **kwargs):
+    async def call_provider(self, provider: IMarketDataProvider, stats: ProviderStats,
+                            func_name: str, *args, **kwargs):
         """
-        尝试调用方法，支持故障转移
+        调用指定数据源并记录统计，失败时抛出异常
         
         Args:
+            provider: 数据源实例
+            stats: 对应的统计信息
             func_name: 方法名
             *args, **kwargs: 方法参数
+        """
+        stats.begin_request()
+        
+        try:
+            # 记录开始时间
+            start_time = time.time()
+            
+            # 调用方法
+            func = getattr(provider, func_name)
+            result = await func(*args, **kwargs)
+            
+            # 记录响应时间
+            response_time = time.time() - start_time
+            stats.record_success(response_time)
+            
+            logger.info(
+                f"[MultiProvider] {stats.name} 成功 - "
+                f"耗时: {response_time:.2f}s, "
+                f"窗口成功率: {stats.success_rate*100:.1f}%"
+            )
+            
+            return result
+        
+        except Exception as e:
+            # 记录失败
+            stats.record_failure()
+            
+            logger.warning(
+                f"[MultiProvider] {stats.name} 失败: {e} - "
+                f"连续失败: {stats.consecutive_failures}次"
+            )
+            raise
+        
+        except BaseException:
+            # CancelledError 等不是 Exception 的子类；不释放探测名额的话半开状态不再放行任何请求
+            stats.cancel_request()
+            raise
+    
+    async def call_with_fallback(self, func_name: str, args: tuple = (), kwargs: Optional[dict] = None,
+                                 first: Optional[tuple] = None) -> Tuple[object, Optional[str]]:
+        """
+        尝试调用方法，支持故障转移，同时返回实际提供数据的数据源名称
+        
+        Args:
+            func_name: 方法名
+            args, kwargs: 方法参数
+            first: 预先选定的 (provider, stats)，优先尝试
             
         Returns:
-            方法返回值
+            (方法返回值, 数据源名称)，全部失败时为 (None, None)
         """
+        kwargs = kwargs or {}
+        
         # 记录所有尝试
         attempts = []
         
@@ -203,7 +433,10 @@ class MultiProvider(IMarketDataProvider):
         
         for attempt in range(max_attempts):
             # 选择数据源
-            selected = self._select_provider()
+            if attempt == 0 and first is not None:
+                selected = first
+            else:
+                selected = self._select_provider(exclude=attempts)
             
             if not selected:
                 break
@@ -217,40 +450,28 @@ class MultiProvider(IMarketDataProvider):
             attempts.append(stats.name)
             
             try:
-                # 记录开始时间
-                start_time = time.time()
-                
-                # 调用方法
-                func = getattr(provider, func_name)
-                result = await func(*args, **kwargs)
-                
-                # 记录响应时间
-                response_time = time.time() - start_time
-                stats.record_success(response_time)
-                
-                logger.info(
-                    f"[MultiProvider] {stats.name} 成功 - "
-                    f"耗时: {response_time:.2f}s, "
-                    f"成功率: {stats.success_rate*100:.1f}%"
-                )
-                
-                return result
-            
-            except Exception as e:
-                # 记录失败
-                stats.record_failure()
-                
-                logger.warning(
-                    f"[MultiProvider] {stats.name} 失败: {e} - "
-                    f"连续失败: {stats.consecutive_failures}次, "
-                    f"尝试下一个数据源..."
-                )
-                
+                result = await self.call_provider(provider, stats, func_name, *args, **kwargs)
+                return result, stats.name
+            except Exception:
                 continue
         
         # 所有数据源都失败
         logger.error(f"[MultiProvider] 所有数据源都失败，尝试过: {', '.join(attempts)}")
-        return None
+        return None, None
+    
+    async def _try_with_fallback(self, func_name: str, *args, **kwargs):
+        """
+        尝试调用方法，支持故障转移
+        
+        Args:
+            func_name: 方法名
+            *args, **kwargs: 方法参数
+            
+        Returns:
+            方法返回值
+        """
+        result, _ = await self.call_with_fallback(func_name, args, kwargs)
+        return result
     
     async def get_stock_data(
         self,
@@ -265,6 +486,33 @@ class MultiProvider(IMarketDataProvider):
         )
         return result if result is not None else []
     
+    async def get_stock_data_batch(
+        self,
+        symbol: str,
+        period: str = "1mo",
+        interval: str = "1d"
+    ) -> KLineBatch:
+        """获取列式K线数据（带故障转移）"""
+        result = await self._try_with_fallback(
+            'get_stock_data_batch',
+            symbol, period, interval
+        )
+        return result if result is not None else KLineBatch.empty(symbol)
+    
+    async def get_stock_data_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> List[KLineData]:
+        """按起止时间获取K线数据（带故障转移）"""
+        result = await self._try_with_fallback(
+            'get_stock_data_range',
+            symbol, interval, start, end
+        )
+        return result if result is not None else []
+    
     async def get_stock_info(self, symbol: str) -> Optional[Dict]:
         """获取股票信息（带故障转移）"""
         return await self._try_with_fallback('get_stock_info', symbol)
@@ -274,6 +522,11 @@ class MultiProvider(IMarketDataProvider):
         result = await self._try_with_fallback('validate_symbol', symbol)
         return result if result is not None else False
     
+    async def validate_symbols(self, symbols: List[str], concurrency: int = 5) -> Dict[str, Optional[bool]]:
+        """批量验证股票代码（带故障转移）"""
+        result = await self._try_with_fallback('validate_symbols', symbols, concurrency)
+        return result if result is not None else {symbol: None for symbol in symbols}
+    
     async def get_multiple_stocks_data(
         self,
         symbols: List[str],
@@ -304,8 +557,13 @@ class MultiProvider(IMarketDataProvider):
                 'successful_requests': stat.successful_requests,
                 'failed_requests': stat.failed_requests,
                 'success_rate': f"{stat.success_rate*100:.2f}%",
+                'window_requests': stat.window_requests,
                 'avg_response_time': f"{stat.avg_response_time:.2f}s",
+                'p50_response_time': f"{stat.p50_response_time:.2f}s",
+                'p95_response_time': f"{stat.p95_response_time:.2f}s",
                 'consecutive_failures': stat.consecutive_failures,
+                'breaker_state': stat.state,
+                'disagreement_rate': f"{stat.disagreement_rate*100:.2f}%",
                 'is_available': stat.is_available,
                 'score': f"{stat.get_score():.3f}"
             }
@@ -326,8 +584,10 @@ class MultiProvider(IMarketDataProvider):
             print(f"   成功: {stat.successful_requests}")
             print(f"   失败: {stat.failed_requests}")
             print(f"   成功率: {stat.success_rate*100:.2f}%")
-            print(f"   平均响应: {stat.avg_response_time:.2f}s")
+            print(f"   平均响应(EWMA): {stat.avg_response_time:.2f}s")
+            print(f"   响应p50/p95: {stat.p50_response_time:.2f}s / {stat.p95_response_time:.2f}s")
             print(f"   连续失败: {stat.consecutive_failures}")
+            print(f"   熔断状态: {stat.state}")
             print(f"   当前状态: {'✅ 可用' if stat.is_available else '❌ 不可用'}")
             print(f"   综合得分: {stat.get_score():.3f}")
         
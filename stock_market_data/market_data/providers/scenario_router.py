@@ -2,10 +2,15 @@
 场景化数据源路由器
 根据不同使用场景（实时、历史、最近）智能选择最优数据源
 """
-from typing import List, Optional, Dict
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Dict, Tuple
+import numpy as np
 from loguru import logger
 
-from ..interfaces import IMarketDataProvider, KLineData
+from ..interfaces import IMarketDataProvider, KLineData, KLineBatch
 # StockInfo removed
 from .multi_provider import MultiProvider
 
@@ -51,6 +56,9 @@ SCENARIO_CONFIGS = {
         ],
         "exclude": [],
         "verify_with_second": True,  # 关键数据双源验证
+        "verify_tolerance": 0.005,  # 双源价格相对误差容忍度(0.5%)
+        "verify_max_mismatch_ratio": 0.05,  # 不一致K线占比超过5%视为验证失败
+        "exchange_timezone": "America/New_York",  # 日线按交易所本地日期对齐
         "cache_ttl": 60,  # 缓存1分钟
         "use_case": ["策略执行", "订单决策", "风控检查"],
     },
@@ -71,6 +79,93 @@ SCENARIO_CONFIGS = {
 }
 
 
+@dataclass
+class VerificationResult:
+    """双源验证结果"""
+    symbol: str
+    interval: str
+    primary: str
+    secondary: str
+    overlap: int = 0  # 重叠的K线数量
+    mismatches: int = 0  # 超出容忍度的K线数量
+    max_rel_diff: float = 0.0  # 最大相对误差
+    verified: Optional[bool] = None  # None 表示无法验证（副数据源无数据或无重叠）
+    arbiter: Optional[str] = None  # 不一致时用于仲裁的第三个数据源
+    outlier: Optional[str] = None  # 仲裁后与多数不一致的数据源，None 表示未能判定
+    checked_at: float = field(default_factory=time.time)
+
+
+DEFAULT_EXCHANGE_TIMEZONE = "America/New_York"
+
+
+def _exchange_epochs(batch: KLineBatch, exchange_tz: str) -> np.ndarray:
+    """
+    K线的绝对时间（UTC epoch秒）
+
+    naive时间视为交易所本地时间换算到UTC；夏令时切换时重复的本地时间按标准时间处理
+    """
+    if batch.tz is None:
+        import pandas as pd
+        local = pd.to_datetime(batch.timestamps, unit='s').tz_localize(
+            exchange_tz, ambiguous=np.zeros(len(batch), dtype=bool), nonexistent='shift_forward'
+        )
+        return local.as_unit('s').asi8
+    return batch.timestamps
+
+
+def _trading_days(batch: KLineBatch, exchange_tz: str) -> np.ndarray:
+    """
+    K线所属的交易所本地交易日（自1970-01-01起的天数）
+
+    带时区的时间先换算到交易所时区；naive时间视为交易所本地时间（与数据库存储约定一致）
+    """
+    if batch.tz is None:
+        return batch.timestamps // 86400
+    import pandas as pd
+    local = pd.to_datetime(batch.timestamps, unit='s', utc=True).tz_convert(exchange_tz).tz_localize(None)
+    return local.as_unit('s').asi8 // 86400
+
+
+def compare_klines(
+    primary: List[KLineData],
+    secondary: List[KLineData],
+    interval: str,
+    tolerance: float,
+    exchange_tz: str = DEFAULT_EXCHANGE_TIMEZONE
+) -> Tuple[int, int, float]:
+    """
+    向量化比较两组K线的重叠部分
+
+    日线及以上按交易所本地交易日对齐（各数据源的时区约定不同，UTC零点附近按UTC日期会错开一天），
+    日内按绝对时间对齐（naive时间视为交易所本地时间）
+
+    Returns:
+        (重叠数量, 不一致数量, 最大相对误差)
+    """
+    a = KLineBatch.from_klines(primary)
+    b = KLineBatch.from_klines(secondary)
+    if len(a) == 0 or len(b) == 0:
+        return 0, 0, 0.0
+
+    if interval in ('1d', '1wk', '1mo'):
+        key_a, key_b = _trading_days(a, exchange_tz), _trading_days(b, exchange_tz)
+    else:
+        key_a, key_b = _exchange_epochs(a, exchange_tz), _exchange_epochs(b, exchange_tz)
+
+    _, idx_a, idx_b = np.intersect1d(key_a, key_b, assume_unique=False, return_indices=True)
+    if len(idx_a) == 0:
+        return 0, 0, 0.0
+
+    prices_a = np.stack([a.open[idx_a], a.high[idx_a], a.low[idx_a], a.close[idx_a]])
+    prices_b = np.stack([b.open[idx_b], b.high[idx_b], b.low[idx_b], b.close[idx_b]])
+    denom = np.maximum(np.abs(prices_a), 1e-9)
+    rel_diff = np.abs(prices_a - prices_b) / denom
+    bar_diff = rel_diff.max(axis=0)
+
+    mismatches = int(np.count_nonzero(bar_diff > tolerance))
+    return len(idx_a), mismatches, float(bar_diff.max())
+
+
 class ScenarioRouter(IMarketDataProvider):
     """
     场景化数据源路由器
@@ -79,8 +174,9 @@ class ScenarioRouter(IMarketDataProvider):
     
     使用示例:
         # 实时数据
-        realtime = ScenarioRouter(scenario="realtime", providers_pool=all_providers)
-        price = await realtime.get_latest_price("AAPL")
+        realtime = ScenarioRouter(scenario="realtime", providers_pool=all_providers,
+                                  quote_stream=stream)
+        prices = await realtime.get_latest_price(["AAPL", "MSFT"])
         
         # 历史数据
         historical = ScenarioRouter(scenario="historical", providers_pool=all_providers)
@@ -90,7 +186,8 @@ class ScenarioRouter(IMarketDataProvider):
     def __init__(
         self,
         scenario: str = "default",
-        providers_pool: Dict[str, IMarketDataProvider] = None
+        providers_pool: Dict[str, IMarketDataProvider] = None,
+        quote_stream=None
     ):
         """
         初始化场景路由器
@@ -98,19 +195,31 @@ class ScenarioRouter(IMarketDataProvider):
         Args:
             scenario: 场景名称 (realtime, historical, recent, default)
             providers_pool: 可用的数据源池 {name: provider}
+            quote_stream: 实时行情推送服务 (QuoteStreamService)，realtime场景下用于最新价查询
         """
         self.scenario = scenario
+        self.quote_stream = quote_stream
         self.config = SCENARIO_CONFIGS.get(scenario, SCENARIO_CONFIGS["default"])
         self.providers_pool = providers_pool or {}
         
         # 创建场景专用的MultiProvider
         self.multi_provider = self._create_multi_provider()
         
+        # 双源验证: 最新结果与进行中的验证任务
+        self.verifications: Dict[Tuple[str, str], VerificationResult] = {}
+        self._verify_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        # 无法仲裁的不一致按数据源对记录，不计入单个数据源的得分
+        self.pair_disagreements: Dict[Tuple[str, str], int] = {}
+        
         logger.info(
             f"[ScenarioRouter] 初始化场景: {scenario} - "
             f"{self.config['description']}"
         )
     
+    @property
+    def supports_range(self) -> bool:
+        return self.multi_provider.supports_range
+    
     def _create_multi_provider(self) -> MultiProvider:
         """根据场景配置创建MultiProvider"""
         # 过滤并排序数据源
@@ -170,6 +279,10 @@ class ScenarioRouter(IMarketDataProvider):
             f"({period}, {interval})"
         )
         
+        if self.config.get("verify_with_second"):
+            # 双源验证：主/副数据源并发请求，主数据源返回后立即返回，验证结果异步写入
+            return await self._get_with_verification(symbol, period, interval)
+        
         # 使用场景专用的MultiProvider
         data = await self.multi_provider.get_stock_data(symbol, period, interval)
         
@@ -183,14 +296,233 @@ class ScenarioRouter(IMarketDataProvider):
                     f"{len(data)} < {min_points}"
                 )
         
-        elif self.scenario == "recent":
-            # 最近数据场景：可选的双源验证
-            if self.config.get("verify_with_second") and len(data) > 0:
-                # TODO: 实现双源验证逻辑
-                pass
+        return data
+    
+    async def _get_with_verification(
+        self,
+        symbol: str,
+        period: str,
+        interval: str
+    ) -> List[KLineData]:
+        """并发请求主/副数据源，主数据源结果直接返回，副数据源结果用于异步验证"""
+        mp = self.multi_provider
+        primary = mp._select_provider()
+        if primary is None:
+            return []
+        secondary = mp._select_provider(exclude=[primary[1].name])
         
+        secondary_task = None
+        if secondary is not None:
+            provider, stats = secondary
+            secondary_task = asyncio.create_task(
+                mp.call_provider(provider, stats, 'get_stock_data', symbol, period, interval)
+            )
+        
+        data, source = await mp.call_with_fallback(
+            'get_stock_data', (symbol, period, interval), first=primary
+        )
+        data = data or []
+        
+        if secondary_task is None:
+            return data
+        
+        secondary_name = secondary[1].name
+        if not data:
+            # 主链路全部失败时使用副数据源结果
+            try:
+                fallback = await secondary_task
+            except Exception:
+                return []
+            logger.warning(
+                f"[ScenarioRouter:{self.scenario}] {symbol} 主数据源无数据，使用验证数据源 {secondary_name}"
+            )
+            return fallback or []
+        
+        if source == secondary_name:
+            # 故障转移后主副数据源相同，无需验证
+            secondary_task.cancel()
+            return data
+        
+        key = (symbol, interval)
+        self._verify_tasks[key] = asyncio.create_task(
+            self._verify(symbol, period, interval, source, data, secondary_name, secondary_task)
+        )
         return data
     
+    def _agrees(self, a: List[KLineData], b: List[KLineData], interval: str) -> Optional[bool]:
+        """两组K线是否一致，无重叠时返回 None"""
+        overlap, mismatches, _ = compare_klines(
+            a, b, interval,
+            self.config.get("verify_tolerance", 0.005),
+            self.config.get("exchange_timezone", DEFAULT_EXCHANGE_TIMEZONE)
+        )
+        if overlap == 0:
+            return None
+        return mismatches / overlap <= self.config.get("verify_max_mismatch_ratio", 0.05)
+    
+    def _record_verification(self, name: str, agreed: bool):
+        stats = self.multi_provider.stats.get(name)
+        if stats:
+            stats.record_verification(agreed)
+    
+    async def _arbitrate(
+        self,
+        symbol: str,
+        period: str,
+        interval: str,
+        primary_name: str,
+        primary_data: List[KLineData],
+        secondary_name: str,
+        secondary_data: List[KLineData]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        主副数据源不一致时请求第三个数据源仲裁
+        
+        Returns:
+            (仲裁数据源, 与多数不一致的数据源)，无第三个数据源或仲裁结果不明确时后者为 None
+        """
+        mp = self.multi_provider
+        if not set(mp.stats) - {primary_name, secondary_name}:
+            return None, None
+        selected = mp._select_provider(exclude=[primary_name, secondary_name])
+        if selected is None:
+            return None, None
+        provider, stats = selected
+        try:
+            arbiter_data = await mp.call_provider(provider, stats, 'get_stock_data', symbol, period, interval)
+        except Exception:
+            return stats.name, None
+        
+        primary_ok = self._agrees(primary_data, arbiter_data or [], interval)
+        secondary_ok = self._agrees(secondary_data, arbiter_data or [], interval)
+        if primary_ok and secondary_ok is False:
+            return stats.name, secondary_name
+        if secondary_ok and primary_ok is False:
+            return stats.name, primary_name
+        return stats.name, None
+    
+    async def _verify(
+        self,
+        symbol: str,
+        period: str,
+        interval: str,
+        primary_name: str,
+        primary_data: List[KLineData],
+        secondary_name: str,
+        secondary_task: asyncio.Task
+    ) -> VerificationResult:
+        """
+        等待副数据源返回并比较重叠K线
+        
+        一致时计入两个数据源的得分；不一致时由第三个数据源仲裁，只扣减与多数不一致的一方，
+        无法仲裁时只记录在数据源对上（pair_disagreements），不扣减任何一方
+        """
+        result = VerificationResult(symbol, interval, primary_name, secondary_name)
+        try:
+            try:
+                secondary_data = await secondary_task
+            except Exception:
+                secondary_data = []
+            
+            overlap, mismatches, max_rel_diff = compare_klines(
+                primary_data, secondary_data or [], interval,
+                self.config.get("verify_tolerance", 0.005),
+                self.config.get("exchange_timezone", DEFAULT_EXCHANGE_TIMEZONE)
+            )
+            result.overlap = overlap
+            result.mismatches = mismatches
+            result.max_rel_diff = max_rel_diff
+            
+            if overlap > 0:
+                max_ratio = self.config.get("verify_max_mismatch_ratio", 0.05)
+                result.verified = mismatches / overlap <= max_ratio
+                
+                if result.verified:
+                    for name in (primary_name, secondary_name):
+                        self._record_verification(name, True)
+                else:
+                    logger.warning(
+                        f"[ScenarioRouter:{self.scenario}] {symbol} 双源验证不一致: "
+                        f"{primary_name} vs {secondary_name}, "
+                        f"{mismatches}/{overlap} 根K线超出容忍度, 最大误差 {max_rel_diff*100:.2f}%"
+                    )
+                    result.arbiter, result.outlier = await self._arbitrate(
+                        symbol, period, interval, primary_name, primary_data,
+                        secondary_name, secondary_data or []
+                    )
+                    if result.outlier:
+                        majority = secondary_name if result.outlier == primary_name else primary_name
+                        self._record_verification(result.outlier, False)
+                        self._record_verification(majority, True)
+                        logger.warning(
+                            f"[ScenarioRouter:{self.scenario}] {symbol} 仲裁数据源 {result.arbiter} "
+                            f"判定 {result.outlier} 数据有误"
+                        )
+                    else:
+                        pair = tuple(sorted((primary_name, secondary_name)))
+                        self.pair_disagreements[pair] = self.pair_disagreements.get(pair, 0) + 1
+            
+            result.checked_at = time.time()
+            self.verifications[(symbol, interval)] = result
+            return result
+        
+        except Exception as e:
+            logger.error(f"[ScenarioRouter:{self.scenario}] {symbol} 双源验证失败: {e}")
+            return result
+        finally:
+            if self._verify_tasks.get((symbol, interval)) is asyncio.current_task():
+                del self._verify_tasks[(symbol, interval)]
+    
+    async def get_verification(
+        self,
+        symbol: str,
+        interval: str = "1d",
+        wait: bool = False
+    ) -> Optional[VerificationResult]:
+        """
+        获取最近一次双源验证结果
+        
+        Args:
+            symbol: 股票代码
+            interval: 时间间隔
+            wait: 验证进行中时是否等待其完成
+        """
+        key = (symbol, interval)
+        task = self._verify_tasks.get(key)
+        if wait and task is not None:
+            return await asyncio.shield(task)
+        return self.verifications.get(key)
+    
+    async def get_latest_price(self, symbols) -> Dict[str, Optional[float]]:
+        """
+        获取最新价格
+        
+        配置了行情推送服务时从内存行情簿读取（过期时由推送服务回退REST），
+        否则取分钟K线最后一根的收盘价
+        """
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        
+        if self.quote_stream is not None:
+            return await self.quote_stream.get_latest_price(symbols)
+        
+        async def fetch(symbol: str) -> Optional[float]:
+            data = await self.multi_provider.get_stock_data(symbol, "1d", "1m")
+            return float(data[-1].close) if data else None
+        
+        prices = await asyncio.gather(*(fetch(s) for s in symbols))
+        return dict(zip(symbols, prices))
+    
+    async def get_stock_data_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> List[KLineData]:
+        """按起止时间获取K线数据"""
+        return await self.multi_provider.get_stock_data_range(symbol, interval, start, end)
+    
     async def get_stock_info(self, symbol: str) -> Optional[Dict]:
         """获取股票信息"""
         return await self.multi_provider.get_stock_info(symbol)
@@ -224,6 +556,9 @@ class ScenarioRouter(IMarketDataProvider):
     def get_statistics(self) -> dict:
         """获取数据源统计信息"""
         stats = self.multi_provider.get_statistics()
+        stats["pair_disagreements"] = {
+            f"{a} vs {b}": count for (a, b), count in self.pair_disagreements.items()
+        }
         stats["scenario"] = self.scenario
         stats["scenario_config"] = self.get_scenario_info()
         return stats
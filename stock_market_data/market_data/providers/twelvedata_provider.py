@@ -7,33 +7,36 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 import aiohttp
+import pandas as pd
 from loguru import logger
 
-from ..interfaces import IMarketDataProvider, KLineData
+from ..interfaces import IMarketDataProvider, KLineData, KLineBatch, filter_klines_by_range
+from .http_pool import HttpClientPool, get_shared_pool
 # StockInfo removed
 
 
 class TwelveDataProvider(IMarketDataProvider):
     """Twelve Data 数据提供者"""
     
-    def __init__(self, api_key: str, rate_limit_delay: float = 7.5):
+    supports_range = True
+    
+    def __init__(self, api_key: str, rate_limit_delay: float = 7.5, http_pool: Optional[HttpClientPool] = None):
         """
         初始化 Twelve Data Provider
         
         Args:
             api_key: Twelve Data API Key
             rate_limit_delay: 请求间隔(秒)，默认7.5秒 (8次/分钟)
+            http_pool: 共享HTTP连接池，默认使用进程内共享连接池
         """
         self.api_key = api_key
         self.rate_limit_delay = rate_limit_delay
         self.base_url = "https://api.twelvedata.com"
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.http_pool = http_pool or get_shared_pool()
     
     async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建session"""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
-        return self._session
+        """从共享连接池获取session"""
+        return await self.http_pool.get_session()
     
     async def _request(self, endpoint: str, params: dict = None) -> dict:
         """
@@ -141,6 +144,60 @@ class TwelveDataProvider(IMarketDataProvider):
             # 日线或更长
             return min(days, 5000)
     
+    @staticmethod
+    def _parse_values(values: List[Dict], symbol: str) -> KLineBatch:
+        """
+        将time_series返回的values向量化解析为KLineBatch
+
+        Twelve Data 返回降序数据，时间为交易所本地时间（naive）
+        """
+        if not values:
+            return KLineBatch.empty(symbol)
+        
+        df = pd.DataFrame.from_records(values)
+        if 'volume' not in df.columns:
+            df['volume'] = 0
+        
+        df.index = pd.to_datetime(df['datetime'], format='ISO8601', errors='coerce')
+        df = df[df.index.notna()]
+        for column in ('open', 'high', 'low', 'close', 'volume'):
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        
+        invalid = df[['open', 'high', 'low', 'close']].isna().any(axis=1)
+        if invalid.any():
+            logger.warning(f"[TwelveData] {symbol} 有 {int(invalid.sum())} 条数据解析失败，已跳过")
+            df = df[~invalid]
+        
+        return KLineBatch.from_dataframe(df.iloc[::-1], symbol)
+    
+    async def _fetch_time_series(self, symbol: str, period: str, interval: str) -> KLineBatch:
+        """请求time_series接口并解析为KLineBatch"""
+        return await self._request_time_series(symbol, interval, {
+            'outputsize': self._period_to_outputsize(period, interval)
+        })
+    
+    async def _request_time_series(self, symbol: str, interval: str, extra_params: dict) -> KLineBatch:
+        """请求time_series接口（extra_params 指定 outputsize 或 start_date/end_date）"""
+        # 请求数据
+        data = await self._request('time_series', {
+            'symbol': symbol,
+            'interval': self._interval_to_twelvedata(interval),
+            'format': 'JSON',
+            **extra_params
+        })
+        
+        # 检查数据
+        if 'values' not in data:
+            logger.warning(f"[TwelveData] 未获取到股票 {symbol} 的数据")
+            return KLineBatch.empty(symbol)
+        
+        values = data['values']
+        if not values:
+            logger.warning(f"[TwelveData] 股票 {symbol} 数据为空")
+            return KLineBatch.empty(symbol)
+        
+        return self._parse_values(values, symbol)
+    
     async def get_stock_data(
         self,
         symbol: str,
@@ -161,46 +218,8 @@ class TwelveDataProvider(IMarketDataProvider):
         logger.debug(f"[TwelveData] 获取股票数据: {symbol}, period: {period}, interval: {interval}")
         
         try:
-            # 转换参数
-            td_interval = self._interval_to_twelvedata(interval)
-            outputsize = self._period_to_outputsize(period, interval)
-            
-            # 请求数据
-            data = await self._request('time_series', {
-                'symbol': symbol,
-                'interval': td_interval,
-                'outputsize': outputsize,
-                'format': 'JSON'
-            })
-            
-            # 检查数据
-            if 'values' not in data:
-                logger.warning(f"[TwelveData] 未获取到股票 {symbol} 的数据")
-                return []
-            
-            values = data['values']
-            if not values:
-                logger.warning(f"[TwelveData] 股票 {symbol} 数据为空")
-                return []
-            
-            # 解析数据
-            klines = []
-            for item in reversed(values):  # Twelve Data返回的数据是降序的
-                try:
-                    kline = KLineData(
-                        datetime=datetime.strptime(item['datetime'], '%Y-%m-%d %H:%M:%S') 
-                                if ' ' in item['datetime'] 
-                                else datetime.strptime(item['datetime'], '%Y-%m-%d'),
-                        open=float(item['open']),
-                        high=float(item['high']),
-                        low=float(item['low']),
-                        close=float(item['close']),
-                        volume=int(float(item.get('volume', 0)))
-                    )
-                    klines.append(kline)
-                except (KeyError, ValueError) as e:
-                    logger.warning(f"[TwelveData] 解析数据失败: {e}, item: {item}")
-                    continue
+            batch = await self._fetch_time_series(symbol, period, interval)
+            klines = batch.to_klines()
             
             logger.debug(f"[TwelveData] 成功获取股票 {symbol} 的 {len(klines)} 条K线数据")
             return klines
@@ -209,6 +228,40 @@ class TwelveDataProvider(IMarketDataProvider):
             logger.error(f"[TwelveData] 获取股票数据失败: {e}")
             return []
     
+    async def get_stock_data_batch(
+        self,
+        symbol: str,
+        period: str = "1mo",
+        interval: str = "1d"
+    ) -> KLineBatch:
+        """获取列式K线数据（不创建逐条KLineData对象）"""
+        try:
+            return await self._fetch_time_series(symbol, period, interval)
+        except Exception as e:
+            logger.error(f"[TwelveData] 获取股票列式数据失败: {e}")
+            return KLineBatch.empty(symbol)
+    
+    async def get_stock_data_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> List[KLineData]:
+        """按起止时间获取K线数据（time_series 的 start_date/end_date 参数）"""
+        try:
+            params = {
+                'start_date': start.strftime('%Y-%m-%d %H:%M:%S'),
+                'outputsize': 5000,  # Twelve Data 单次上限
+            }
+            if end is not None:
+                params['end_date'] = end.strftime('%Y-%m-%d %H:%M:%S')
+            batch = await self._request_time_series(symbol, interval, params)
+            return filter_klines_by_range(batch.to_klines(), start, end)
+        except Exception as e:
+            logger.error(f"[TwelveData] 获取股票区间数据失败: {e}")
+            return []
+    
     async def get_stock_info(self, symbol: str) -> Optional[Dict]:
         """
         获取股票基本信息
@@ -293,15 +346,5 @@ class TwelveDataProvider(IMarketDataProvider):
         return result
     
     async def close(self):
-        """关闭session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
-    
-    def __del__(self):
-        """析构时关闭session"""
-        if self._session and not self._session.closed:
-            try:
-                asyncio.create_task(self._session.close())
-            except:
-                pass
-
+        """连接由共享连接池管理，这里不关闭session（见 HttpClientPool.close）"""
+        pass
@@ -4,20 +4,54 @@ Yahoo Finance数据提供者
 """
 import yfinance as yf
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any, Dict
 from loguru import logger
 import asyncio
 import time
 
-from ..interfaces import IMarketDataProvider, KLineData
+from ..interfaces import IMarketDataProvider, KLineData, KLineBatch, filter_klines_by_range
 
 
 class YahooFinanceProvider(IMarketDataProvider):
     """Yahoo Finance数据提供者实现"""
     
-    def __init__(self, rate_limit_delay: float = 1.0):
+    supports_range = True
+    
+    # 批量验证时随批次一起请求的参照代码：参照代码有数据说明请求本身成功，其余无数据的代码确为无效
+    VALIDATION_PROBE_SYMBOL = "SPY"
+    
+    def __init__(self, rate_limit_delay: float = 1.0, bulk_batch_size: int = 100):
         self.rate_limit_delay = rate_limit_delay
+        # 批量模式下单次请求的股票数量（一次HTTP往返获取多只股票）
+        self.bulk_batch_size = bulk_batch_size
+    
+    @staticmethod
+    def _frame_to_klines(symbol: str, data: pd.DataFrame) -> List[KLineData]:
+        """将单只股票的DataFrame向量化转换为KLineData列表"""
+        if data is None or data.empty:
+            return []
+        
+        data = data.dropna(subset=['Open', 'Close'])
+        if data.empty:
+            return []
+        
+        times = pd.DatetimeIndex(data.index).to_pydatetime()
+        opens = data['Open'].to_numpy(dtype='float64')
+        highs = data['High'].to_numpy(dtype='float64')
+        lows = data['Low'].to_numpy(dtype='float64')
+        closes = data['Close'].to_numpy(dtype='float64')
+        volumes = data['Volume'].fillna(0).to_numpy(dtype='int64')
+        
+        return [
+            KLineData(
+                datetime=dt, open=o, high=h, low=l, close=c, volume=v, symbol=symbol
+            )
+            for dt, o, h, l, c, v in zip(
+                times, opens.tolist(), highs.tolist(), lows.tolist(),
+                closes.tolist(), volumes.tolist()
+            )
+        ]
     
     async def get_stock_data(self, symbol: str, period: str, interval: str) -> List[KLineData]:
         """获取股票K线数据"""
@@ -37,21 +71,7 @@ class YahooFinanceProvider(IMarketDataProvider):
                 return []
             
             # 转换为KLineData格式
-            kline_data = []
-            for index, row in data.iterrows():
-                if pd.isna(row['Open']) or pd.isna(row['Close']):
-                    continue
-                
-                kline = KLineData(
-                    datetime=index.to_pydatetime(),
-                    open=float(row['Open']),
-                    high=float(row['High']),
-                    low=float(row['Low']),
-                    close=float(row['Close']),
-                    volume=int(row['Volume']) if not pd.isna(row['Volume']) else 0,
-                    symbol=symbol
-                )
-                kline_data.append(kline)
+            kline_data = self._frame_to_klines(symbol, data)
             
             logger.debug(f"成功获取股票 {symbol} 的 {len(kline_data)} 条K线数据")
             return kline_data
@@ -60,6 +80,66 @@ class YahooFinanceProvider(IMarketDataProvider):
             logger.error(f"获取股票 {symbol} 数据失败: {e}")
             return []
     
+    async def get_stock_data_batch(self, symbol: str, period: str, interval: str) -> KLineBatch:
+        """获取列式K线数据（DataFrame直接转换为数组，不经过KLineData对象）"""
+        try:
+            loop = asyncio.get_event_loop()
+            data = await loop.run_in_executor(
+                None,
+                self._fetch_yahoo_data,
+                symbol, period, interval
+            )
+            return KLineBatch.from_dataframe(data, symbol)
+            
+        except Exception as e:
+            logger.error(f"获取股票 {symbol} 列式数据失败: {e}")
+            return KLineBatch.empty(symbol)
+    
+    async def get_stock_data_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> List[KLineData]:
+        """按起止时间获取K线数据（history 的 start/end 参数）"""
+        try:
+            loop = asyncio.get_event_loop()
+            data = await loop.run_in_executor(
+                None,
+                self._fetch_yahoo_range,
+                symbol, interval, start, end
+            )
+            if data is None or data.empty:
+                return []
+            return filter_klines_by_range(self._frame_to_klines(symbol, data), start, end)
+            
+        except Exception as e:
+            logger.error(f"获取股票 {symbol} 区间数据失败: {e}")
+            return []
+    
+    def _fetch_yahoo_range(
+        self,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime]
+    ) -> Optional[pd.DataFrame]:
+        """同步按区间获取Yahoo Finance数据"""
+        try:
+            time.sleep(self.rate_limit_delay)
+            
+            # Yahoo 的 end 为开区间，多取一天后再过滤
+            end = (end or datetime.now()) + timedelta(days=1)
+            ticker = yf.Ticker(symbol)
+            data = ticker.history(start=start, end=end, interval=interval)
+            
+            return data if not data.empty else None
+            
+        except Exception as e:
+            logger.error(f"Yahoo Finance API调用失败: {e}")
+            return None
+    
     def _fetch_yahoo_data(self, symbol: str, period: str, interval: str) -> Optional[pd.DataFrame]:
         """同步获取Yahoo Finance数据"""
         try:
@@ -126,36 +206,112 @@ class YahooFinanceProvider(IMarketDataProvider):
             logger.error(f"验证股票代码 {symbol} 失败: {e}")
             return False
     
+    def _download_bulk(self, symbols: List[str], period: str, interval: str) -> Dict[str, pd.DataFrame]:
+        """同步批量下载多只股票数据（单次请求），按股票拆分为独立的DataFrame，出错时抛出异常"""
+        time.sleep(self.rate_limit_delay)
+        
+        data = yf.download(
+            tickers=symbols,
+            period=period,
+            interval=interval,
+            group_by='ticker',
+            auto_adjust=True,
+            threads=True,
+            progress=False
+        )
+        
+        if data is None or data.empty:
+            return {}
+        
+        frames: Dict[str, pd.DataFrame] = {}
+        if isinstance(data.columns, pd.MultiIndex):
+            available = set(data.columns.get_level_values(0))
+            for symbol in symbols:
+                if symbol in available:
+                    frames[symbol] = data[symbol]
+        elif len(symbols) == 1:
+            frames[symbols[0]] = data
+        
+        return frames
+    
+    def _fetch_yahoo_bulk(self, symbols: List[str], period: str, interval: str) -> Dict[str, pd.DataFrame]:
+        """同步批量获取多只股票数据，失败返回空字典"""
+        try:
+            return self._download_bulk(symbols, period, interval)
+        except Exception as e:
+            logger.error(f"Yahoo Finance批量API调用失败: {e}")
+            return {}
+    
+    async def validate_symbols(self, symbols: List[str], concurrency: int = 5) -> Dict[str, Optional[bool]]:
+        """
+        批量验证股票代码：每批一次 yf.download 请求最近5天日线，有数据即有效
+        
+        yf.download 出错时只返回空结果，无法区分网络故障和无效代码：每批附带参照代码
+        （VALIDATION_PROBE_SYMBOL）一起请求，参照代码或批内任一代码有数据说明请求成功，
+        其余无数据的代码记为无效；否则整批记为 None（未知），避免调用方把临时故障当作无效代码缓存
+        """
+        results: Dict[str, Optional[bool]] = {}
+        loop = asyncio.get_event_loop()
+        probe = self.VALIDATION_PROBE_SYMBOL
+        
+        for i in range(0, len(symbols), self.bulk_batch_size):
+            batch = symbols[i:i + self.bulk_batch_size]
+            request = batch if probe in batch else batch + [probe]
+            try:
+                frames = await loop.run_in_executor(None, self._download_bulk, request, "5d", "1d")
+            except Exception as e:
+                logger.error(f"批量验证股票代码失败: {e}")
+                results.update({symbol: None for symbol in batch})
+                continue
+            
+            has_data = {
+                symbol: symbol in frames and not frames[symbol].dropna(subset=['Close']).empty
+                for symbol in request
+            }
+            if not any(has_data.values()):
+                results.update({symbol: None for symbol in batch})
+            else:
+                results.update({symbol: has_data[symbol] for symbol in batch})
+        
+        return results
+    
     async def get_multiple_stocks_data(self, symbols: List[str], 
                                      period: str = "1y", 
                                      interval: str = "1d") -> Dict[str, List[KLineData]]:
-        """批量获取多只股票数据"""
+        """
+        批量获取多只股票数据
+        
+        每批 bulk_batch_size 只股票通过一次 yf.download 请求获取，
+        宽表按股票拆分后向量化转换
+        """
         results = {}
         
-        # 分批处理，避免API限制
-        batch_size = 5
-        for i in range(0, len(symbols), batch_size):
-            batch = symbols[i:i + batch_size]
-            
-            # 并发获取当前批次的数据
-            tasks = [
-                self.get_stock_data(symbol, period, interval) 
-                for symbol in batch
-            ]
-            
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # 处理结果
-            for symbol, data in zip(batch, batch_results):
-                if isinstance(data, Exception):
-                    logger.error(f"获取股票 {symbol} 数据时发生异常: {data}")
+        for i in range(0, len(symbols), self.bulk_batch_size):
+            batch = symbols[i:i + self.bulk_batch_size]
+            
+            loop = asyncio.get_event_loop()
+            frames = await loop.run_in_executor(
+                None,
+                self._fetch_yahoo_bulk,
+                batch, period, interval
+            )
+            
+            if not frames:
+                # 批量请求整体失败时退回逐只获取
+                logger.warning(f"批量请求未返回数据，退回逐只获取 {len(batch)} 只股票")
+                for symbol in batch:
+                    results[symbol] = await self.get_stock_data(symbol, period, interval)
+                continue
+            
+            for symbol in batch:
+                try:
+                    results[symbol] = self._frame_to_klines(symbol, frames.get(symbol))
+                except Exception as e:
+                    logger.error(f"转换股票 {symbol} 数据时发生异常: {e}")
                     results[symbol] = []
-                else:
-                    results[symbol] = data
             
-            # 批次间暂停，避免API限制
-            if i + batch_size < len(symbols):
-                await asyncio.sleep(1)
+            fetched = sum(1 for symbol in batch if results[symbol])
+            logger.debug(f"批量获取完成: {fetched}/{len(batch)} 只股票有数据")
         
         return results
 
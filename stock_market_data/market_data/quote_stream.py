@@ -0,0 +1,321 @@
+"""
+实时行情推送服务
+通过数据源WebSocket接收逐笔成交/报价，维护内存行情簿；推送中断或数据过期时回退到REST
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+import aiohttp
+from loguru import logger
+
+from .interfaces import IMarketDataProvider
+from .providers.http_pool import HttpClientPool, get_shared_pool
+
+
+@dataclass
+class Quote:
+    """单只股票的最新行情"""
+    symbol: str
+    price: Optional[float] = None  # 最新成交价
+    bid: Optional[float] = None
+    ask: Optional[float] = None
+    volume: float = 0.0  # 最新一笔成交量
+    timestamp: float = 0.0  # 行情时间（Unix秒）
+    received_at: float = field(default_factory=time.monotonic)  # 本地接收时间
+    source: str = "stream"  # stream / rest
+
+
+class QuoteBook:
+    """内存行情簿：symbol -> 最新Quote"""
+
+    def __init__(self):
+        self._quotes: Dict[str, Quote] = {}
+
+    def update_trade(self, symbol: str, price: float, volume: float = 0.0,
+                     timestamp: Optional[float] = None, source: str = "stream"):
+        quote = self._quotes.get(symbol)
+        if quote is None:
+            quote = self._quotes[symbol] = Quote(symbol)
+        quote.price = price
+        quote.volume = volume
+        quote.timestamp = timestamp or time.time()
+        quote.received_at = time.monotonic()
+        quote.source = source
+
+    def update_bid_ask(self, symbol: str, bid: Optional[float], ask: Optional[float],
+                       timestamp: Optional[float] = None):
+        quote = self._quotes.get(symbol)
+        if quote is None:
+            quote = self._quotes[symbol] = Quote(symbol)
+        if bid is not None:
+            quote.bid = bid
+        if ask is not None:
+            quote.ask = ask
+        quote.timestamp = timestamp or time.time()
+        quote.received_at = time.monotonic()
+
+    def get(self, symbol: str) -> Optional[Quote]:
+        return self._quotes.get(symbol)
+
+    def remove(self, symbol: str):
+        self._quotes.pop(symbol, None)
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+
+class QuoteStreamService:
+    """
+    实时行情推送服务
+
+    协议兼容 Finnhub WebSocket：
+    - 订阅: {"type": "subscribe", "symbol": "AAPL"}
+    - 退订: {"type": "unsubscribe", "symbol": "AAPL"}
+    - 成交: {"type": "trade", "data": [{"s": "AAPL", "p": 190.1, "v": 100, "t": 毫秒时间戳}]}
+    - 报价: {"type": "quote", "data": [{"s": "AAPL", "b": 190.0, "a": 190.2, "t": 毫秒时间戳}]}（可选）
+
+    订阅按引用计数管理，多个页面订阅同一股票只会向上游订阅一次；
+    行情超过 stale_after 秒未更新时，get_latest_price 通过 rest_provider 补取，
+    补取并发数不超过 rest_concurrency（断线时所有订阅同时过期，避免瞬间打满数据源）
+    """
+
+    def __init__(
+        self,
+        url: str,
+        rest_provider: Optional[IMarketDataProvider] = None,
+        stale_after: float = 10.0,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+        http_pool: Optional[HttpClientPool] = None,
+        rest_concurrency: int = 5
+    ):
+        """
+        Args:
+            url: WebSocket地址（如 wss://ws.finnhub.io?token=xxx）
+            rest_provider: 推送过期时用于补取的REST数据源
+            stale_after: 行情过期时间（秒）
+            reconnect_delay: 断线重连初始间隔（秒），按指数退避
+            max_reconnect_delay: 断线重连最大间隔（秒）
+            http_pool: 共享HTTP连接池
+            rest_concurrency: REST补取的最大并发数（所有 get_latest_price 调用共用）
+        """
+        self.url = url
+        self.rest_provider = rest_provider
+        self.stale_after = stale_after
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.http_pool = http_pool or get_shared_pool()
+        self._rest_semaphore = asyncio.Semaphore(rest_concurrency)
+
+        self.book = QuoteBook()
+        self._refcounts: Dict[str, int] = {}
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+        self._closing = False
+
+        # 统计
+        self.messages_received = 0
+        self.reconnects = 0
+        self.rest_fallbacks = 0
+
+    @property
+    def is_connected(self) -> bool:
+        return self._ws is not None and not self._ws.closed
+
+    @property
+    def subscriptions(self) -> List[str]:
+        return list(self._refcounts.keys())
+
+    async def start(self):
+        """启动后台连接任务"""
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._connected = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """等待连接建立"""
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self):
+        """关闭连接并停止后台任务"""
+        self._closing = True
+        if self._ws is not None and not self._ws.closed:
+            await self._ws.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+
+    async def _send(self, message: dict):
+        if self.is_connected:
+            try:
+                await self._ws.send_str(json.dumps(message))
+            except Exception as e:
+                logger.warning(f"[QuoteStream] 发送消息失败: {e}")
+
+    async def subscribe(self, symbols: Iterable[str]):
+        """订阅（引用计数+1，首次订阅时通知上游）"""
+        for symbol in symbols:
+            count = self._refcounts.get(symbol, 0)
+            self._refcounts[symbol] = count + 1
+            if count == 0:
+                await self._send({"type": "subscribe", "symbol": symbol})
+
+    async def unsubscribe(self, symbols: Iterable[str]):
+        """退订（引用计数-1，归零时通知上游并移出行情簿）"""
+        for symbol in symbols:
+            count = self._refcounts.get(symbol, 0)
+            if count <= 1:
+                self._refcounts.pop(symbol, None)
+                self.book.remove(symbol)
+                if count == 1:
+                    await self._send({"type": "unsubscribe", "symbol": symbol})
+            else:
+                self._refcounts[symbol] = count - 1
+
+    async def _run(self):
+        """连接、接收消息，断线后指数退避重连并恢复订阅"""
+        delay = self.reconnect_delay
+        while not self._closing:
+            try:
+                session = await self.http_pool.get_session()
+                async with session.ws_connect(self.url, heartbeat=30) as ws:
+                    self._ws = ws
+                    self._connected.set()
+                    delay = self.reconnect_delay
+                    logger.info(f"[QuoteStream] 已连接，恢复 {len(self._refcounts)} 个订阅")
+
+                    for symbol in list(self._refcounts):
+                        await ws.send_str(json.dumps({"type": "subscribe", "symbol": symbol}))
+
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._handle_message(msg.data)
+                        elif msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[QuoteStream] 连接异常: {e}")
+            finally:
+                self._ws = None
+                self._connected.clear()
+
+            if self._closing:
+                break
+            self.reconnects += 1
+            logger.info(f"[QuoteStream] {delay:.1f}秒后重连")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _handle_message(self, raw: str):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+
+        msg_type = message.get("type")
+        if msg_type not in ("trade", "quote"):
+            return
+
+        self.messages_received += 1
+        for item in message.get("data") or []:
+            symbol = item.get("s")
+            if symbol not in self._refcounts:
+                continue
+            ts = item.get("t")
+            timestamp = ts / 1000.0 if ts else None
+            if msg_type == "trade" and item.get("p") is not None:
+                self.book.update_trade(symbol, float(item["p"]), float(item.get("v") or 0), timestamp)
+            elif msg_type == "quote":
+                self.book.update_bid_ask(symbol, item.get("b"), item.get("a"), timestamp)
+
+    def is_stale(self, quote: Optional[Quote]) -> bool:
+        return (
+            quote is None
+            or quote.price is None
+            or time.monotonic() - quote.received_at > self.stale_after
+        )
+
+    def peek(self, symbols: Iterable[str]) -> Dict[str, Optional[Quote]]:
+        """直接读取行情簿（不回退REST），过期数据也返回"""
+        return {symbol: self.book.get(symbol) for symbol in symbols}
+
+    async def get_latest_price(self, symbols: Iterable[str]) -> Dict[str, Optional[float]]:
+        """
+        获取最新价格
+
+        行情簿中未过期的直接返回；缺失或过期的通过 rest_provider 限并发补取，
+        已订阅的股票写回行情簿（未订阅的只返回，不进入行情簿）
+        """
+        symbols = list(symbols)
+        result: Dict[str, Optional[float]] = {}
+        stale: List[str] = []
+
+        for symbol in symbols:
+            quote = self.book.get(symbol)
+            if self.is_stale(quote):
+                stale.append(symbol)
+            else:
+                result[symbol] = quote.price
+
+        if stale:
+            fetched = await self._fetch_rest_prices(stale)
+            for symbol in stale:
+                price = fetched.get(symbol)
+                if price is None:
+                    # REST也失败时退回过期的推送价格
+                    quote = self.book.get(symbol)
+                    price = quote.price if quote else None
+                result[symbol] = price
+
+        return result
+
+    async def _fetch_rest_prices(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        if self.rest_provider is None:
+            return {}
+
+        self.rest_fallbacks += len(symbols)
+        logger.debug(f"[QuoteStream] {len(symbols)} 只股票行情过期，使用REST补取")
+
+        async def fetch(symbol: str) -> Optional[float]:
+            try:
+                async with self._rest_semaphore:
+                    data = await self.rest_provider.get_stock_data(symbol, "1d", "1m")
+                if not data:
+                    return None
+                last = data[-1]
+                # 等待期间可能已退订，只写回仍在订阅中的股票
+                if symbol in self._refcounts:
+                    self.book.update_trade(
+                        symbol, float(last.close), float(last.volume),
+                        last.datetime.timestamp(), source="rest"
+                    )
+                return float(last.close)
+            except Exception as e:
+                logger.warning(f"[QuoteStream] REST补取 {symbol} 失败: {e}")
+                return None
+
+        prices = await asyncio.gather(*(fetch(s) for s in symbols))
+        return dict(zip(symbols, prices))
+
+    def get_statistics(self) -> dict:
+        return {
+            "connected": self.is_connected,
+            "subscriptions": len(self._refcounts),
+            "book_size": len(self.book),
+            "messages_received": self.messages_received,
+            "reconnects": self.reconnects,
+            "rest_fallbacks": self.rest_fallbacks,
+        }
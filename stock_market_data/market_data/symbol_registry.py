@@ -0,0 +1,260 @@
+"""
+股票代码注册表缓存
+持久化保存代码有效性（含负缓存）和基本信息，所有数据源共用，避免重复的验证/信息请求
+
+存储后端可替换（SymbolStore）：默认 SQLiteSymbolStore 为单机文件，
+多进程/多实例部署时应传入共享数据库的实现
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple
+from loguru import logger
+
+from .interfaces import IMarketDataProvider
+
+
+class SymbolStore(ABC):
+    """代码注册表存储后端（代码已规范化为大写，时间为Unix秒）"""
+
+    @abstractmethod
+    def load_validity(self, symbols: List[str]) -> Dict[str, Tuple[bool, float]]:
+        """读取有效性 {symbol: (是否有效, 验证时间)}，无记录的代码不返回"""
+
+    @abstractmethod
+    def save_validity(self, validity: Dict[str, bool], validated_at: float):
+        """批量写入有效性"""
+
+    @abstractmethod
+    def load_info(self, symbol: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """读取基本信息 (信息, 获取时间)，无记录返回 None"""
+
+    @abstractmethod
+    def save_info(self, symbol: str, info: Dict[str, Any], fetched_at: float):
+        """写入基本信息（同时标记为有效）"""
+
+    @abstractmethod
+    def delete(self, symbol: str):
+        """删除某个代码的记录"""
+
+    def close(self):
+        pass
+
+
+class SQLiteSymbolStore(SymbolStore):
+    """单机SQLite文件存储（独立使用 market_data 时的默认后端）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv(
+            "SYMBOL_REGISTRY_PATH",
+            str(Path.home() / ".cache" / "market_data" / "symbol_registry.db")
+        )
+        self._lock = threading.Lock()
+
+        if self.db_path != ":memory:":
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS symbols (
+                symbol TEXT PRIMARY KEY,
+                is_valid INTEGER,
+                validated_at REAL,
+                info TEXT,
+                info_at REAL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def load_validity(self, symbols: List[str]) -> Dict[str, Tuple[bool, float]]:
+        rows = []
+        with self._lock:
+            # SQLite 参数数量有限制，分块查询
+            for i in range(0, len(symbols), 500):
+                chunk = symbols[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT symbol, is_valid, validated_at FROM symbols "
+                    f"WHERE symbol IN ({placeholders}) AND is_valid IS NOT NULL",
+                    chunk
+                ).fetchall())
+        return {symbol: (bool(is_valid), validated_at) for symbol, is_valid, validated_at in rows}
+
+    def save_validity(self, validity: Dict[str, bool], validated_at: float):
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO symbols (symbol, is_valid, validated_at) VALUES (?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    is_valid = excluded.is_valid,
+                    validated_at = excluded.validated_at
+                """,
+                [(s, int(v), validated_at) for s, v in validity.items()]
+            )
+            self._conn.commit()
+
+    def load_info(self, symbol: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info, info_at FROM symbols WHERE symbol = ? AND info IS NOT NULL",
+                (symbol,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def save_info(self, symbol: str, info: Dict[str, Any], fetched_at: float):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO symbols (symbol, is_valid, validated_at, info, info_at)
+                VALUES (?, 1, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    is_valid = 1,
+                    validated_at = excluded.validated_at,
+                    info = excluded.info,
+                    info_at = excluded.info_at
+                """,
+                (symbol, fetched_at, json.dumps(info, ensure_ascii=False, default=str), fetched_at)
+            )
+            self._conn.commit()
+
+    def delete(self, symbol: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM symbols WHERE symbol = ?", (symbol,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SymbolRegistry:
+    """
+    股票代码注册表
+
+    - 有效代码: valid_ttl 内直接返回 True
+    - 无效代码: invalid_ttl（负缓存，较短）内直接返回 False
+    - 基本信息: info_ttl（较长）内直接返回缓存
+    """
+
+    def __init__(
+        self,
+        store: Optional[SymbolStore] = None,
+        valid_ttl: float = 7 * 86400,
+        invalid_ttl: float = 86400,
+        info_ttl: float = 30 * 86400
+    ):
+        """
+        Args:
+            store: 存储后端，默认 SQLiteSymbolStore（单机文件）
+        """
+        self.store = store or SQLiteSymbolStore()
+        self.valid_ttl = valid_ttl
+        self.invalid_ttl = invalid_ttl
+        self.info_ttl = info_ttl
+
+    @staticmethod
+    def _normalize(symbol: str) -> str:
+        return symbol.strip().upper()
+
+    def get_validity(self, symbols: List[str]) -> Dict[str, Optional[bool]]:
+        """
+        从缓存查询代码有效性
+
+        Returns:
+            {symbol: True/False}，未命中或已过期为 None
+        """
+        result: Dict[str, Optional[bool]] = {s: None for s in symbols}
+        if not symbols:
+            return result
+
+        now = time.time()
+        normalized = {self._normalize(s): s for s in symbols}
+        rows = self.store.load_validity(list(normalized.keys()))
+
+        for symbol, (is_valid, validated_at) in rows.items():
+            ttl = self.valid_ttl if is_valid else self.invalid_ttl
+            if now - validated_at < ttl:
+                result[normalized[symbol]] = is_valid
+        return result
+
+    def set_validity(self, validity: Dict[str, bool]):
+        """批量写入代码有效性"""
+        if not validity:
+            return
+        self.store.save_validity({self._normalize(s): bool(v) for s, v in validity.items()}, time.time())
+
+    def get_info(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """从缓存获取基本信息，未命中或已过期返回 None"""
+        row = self.store.load_info(self._normalize(symbol))
+        if not row or time.time() - row[1] >= self.info_ttl:
+            return None
+        return row[0]
+
+    def set_info(self, symbol: str, info: Dict[str, Any]):
+        """写入基本信息（能取到信息的代码同时标记为有效）"""
+        self.store.save_info(self._normalize(symbol), info, time.time())
+
+    def invalidate(self, symbol: str):
+        """删除某个代码的缓存"""
+        self.store.delete(self._normalize(symbol))
+
+    async def validate_symbols(
+        self,
+        provider: IMarketDataProvider,
+        symbols: List[str]
+    ) -> Dict[str, Optional[bool]]:
+        """
+        批量验证股票代码：先查缓存，未命中的交给数据源批量验证后写回
+
+        存储读写在线程中执行，不阻塞事件循环
+
+        Returns:
+            {symbol: True/False}，数据源出错无法判断时为 None（不写入缓存）
+        """
+        result = await asyncio.to_thread(self.get_validity, symbols)
+        misses = [s for s, v in result.items() if v is None]
+
+        if misses:
+            logger.debug(f"[SymbolRegistry] 缓存命中 {len(symbols) - len(misses)}/{len(symbols)}，"
+                         f"批量验证 {len(misses)} 个代码")
+            fetched = await provider.validate_symbols(misses)
+            known = {s: v for s, v in fetched.items() if v is not None}
+            await asyncio.to_thread(self.set_validity, known)
+            result.update(fetched)
+
+        return result
+
+    async def validate_symbol(self, provider: IMarketDataProvider, symbol: str) -> Optional[bool]:
+        """验证单个股票代码（走缓存）"""
+        return (await self.validate_symbols(provider, [symbol])).get(symbol)
+
+    async def get_stock_info(self, provider: IMarketDataProvider, symbol: str) -> Optional[Dict[str, Any]]:
+        """获取股票基本信息（走缓存）"""
+        info = await asyncio.to_thread(self.get_info, symbol)
+        if info is not None:
+            return info
+
+        info = await provider.get_stock_info(symbol)
+        if info:
+            await asyncio.to_thread(self.set_info, symbol, info)
+        return info
+
+    def close(self):
+        self.store.close()
+
+
+_shared_registry: Optional[SymbolRegistry] = None
+
+
+def get_symbol_registry() -> SymbolRegistry:
+    """获取进程内共享的代码注册表"""
+    global _shared_registry
+    if _shared_registry is None:
+        _shared_registry = SymbolRegistry()
+    return _shared_registry
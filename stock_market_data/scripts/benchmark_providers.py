@@ -0,0 +1,340 @@
+"""
+数据源路由压测
+
+启动本地模拟的 Yahoo / Finnhub / Twelve Data / Alpha Vantage 服务，
+在不同并发下压测 MultiProvider、MultiAccountProvider、HybridProvider 和 ScenarioRouter，
+输出吞吐量、p50/p95/p99延迟、配额利用率和故障转移时间。不消耗真实API Key。
+
+用法:
+    python scripts/benchmark_providers.py
+    python scripts/benchmark_providers.py --concurrency 1,8,32 --requests 300 --rate-limit 20
+    python scripts/benchmark_providers.py --targets multi,scenario:recent --error-rate 0.05
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from loguru import logger
+
+from market_data.interfaces import IMarketDataProvider, KLineBatch, KLineData
+from market_data.providers.finnhub_provider import FinnhubProvider
+from market_data.providers.twelvedata_provider import TwelveDataProvider
+from market_data.providers.alphavantage_provider import AlphaVantageProvider
+from market_data.providers.multi_provider import MultiProvider
+from market_data.providers.multi_account_provider import MultiAccountProvider
+from market_data.providers.hybrid_provider import HybridProvider
+from market_data.providers.scenario_router import ScenarioRouter
+from market_data.providers.http_pool import HttpClientPool, HttpPoolConfig
+from market_data.fakes import FakeUpstreamServer, UpstreamBehavior
+
+
+SYMBOLS = ["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA", "AMD", "NFLX", "INTC"]
+
+# 各压测对象的主数据源（故障转移测试时让它全部返回500）
+# multi_account 的所有账号共用同一个上游，不参与故障转移测试
+PRIMARY_UPSTREAM = {
+    "multi": "finnhub",
+    "hybrid": "yahoo",
+    "scenario:realtime": "finnhub",
+    "scenario:recent": "twelvedata",
+}
+
+
+class ChartApiYahooProvider(IMarketDataProvider):
+    """
+    基于 Yahoo v8 chart 接口的压测用数据源
+
+    yfinance 的请求地址固定且需要 cookie/crumb 握手，无法指向本地模拟服务，
+    压测中用这个按同一接口格式直接请求的实现代替 YahooFinanceProvider
+    """
+
+    def __init__(self, base_url: str, http_pool: HttpClientPool):
+        self.base_url = base_url
+        self.http_pool = http_pool
+
+    async def get_stock_data(self, symbol: str, period: str = "1mo", interval: str = "1d") -> List[KLineData]:
+        session = await self.http_pool.get_session()
+        async with session.get(f"{self.base_url}/v8/finance/chart/{symbol}",
+                               params={"range": period, "interval": interval}) as response:
+            if response.status != 200:
+                raise Exception(f"Yahoo chart API错误: {response.status}")
+            data = await response.json()
+
+        result = data["chart"]["result"][0]
+        quote = result["indicators"]["quote"][0]
+        batch = KLineBatch(
+            symbol,
+            np.asarray(result["timestamp"], dtype=np.int64),
+            np.asarray(quote["open"], dtype=np.float64),
+            np.asarray(quote["high"], dtype=np.float64),
+            np.asarray(quote["low"], dtype=np.float64),
+            np.asarray(quote["close"], dtype=np.float64),
+            np.asarray(quote["volume"], dtype=np.int64),
+        )
+        return batch.to_klines()
+
+    async def get_stock_info(self, symbol: str) -> Optional[Dict]:
+        return {"symbol": symbol, "name": symbol}
+
+    async def validate_symbol(self, symbol: str) -> bool:
+        return len(await self.get_stock_data(symbol, "5d", "1d")) > 0
+
+
+class BenchmarkEnv:
+    """模拟上游 + 指向它们的数据源实例"""
+
+    def __init__(self, behavior: UpstreamBehavior, finnhub_keys: int):
+        self.behavior = behavior
+        self.finnhub_keys = finnhub_keys
+        self.servers: Dict[str, FakeUpstreamServer] = {}
+        self.pool = HttpClientPool(HttpPoolConfig(limit=200, limit_per_host=50))
+
+    async def start(self):
+        for flavor in FakeUpstreamServer.FLAVORS:
+            behavior = UpstreamBehavior(**vars(self.behavior))
+            server = FakeUpstreamServer(flavor, behavior)
+            await server.start()
+            self.servers[flavor] = server
+
+    async def stop(self):
+        for server in self.servers.values():
+            await server.stop()
+        await self.pool.close()
+
+    def reset(self):
+        for server in self.servers.values():
+            server.reset_stats()
+            server.behavior.error_rate = self.behavior.error_rate
+
+    def _finnhub(self, key: str = "bench-finnhub") -> FinnhubProvider:
+        provider = FinnhubProvider(api_key=key, rate_limit_delay=0, http_pool=self.pool)
+        provider.base_url = self.servers["finnhub"].base_url
+        return provider
+
+    def _twelvedata(self) -> TwelveDataProvider:
+        provider = TwelveDataProvider(api_key="bench-twelvedata", rate_limit_delay=0, http_pool=self.pool)
+        provider.base_url = self.servers["twelvedata"].base_url
+        return provider
+
+    def _alphavantage(self) -> AlphaVantageProvider:
+        provider = AlphaVantageProvider(api_key="bench-alphavantage", rate_limit_delay=0, http_pool=self.pool)
+        provider.base_url = self.servers["alphavantage"].base_url
+        return provider
+
+    def _yahoo(self) -> ChartApiYahooProvider:
+        return ChartApiYahooProvider(self.servers["yahoo"].base_url, self.pool)
+
+    def providers_pool(self) -> Dict[str, IMarketDataProvider]:
+        return {
+            "finnhub": self._finnhub(),
+            "twelvedata": self._twelvedata(),
+            "alphavantage": self._alphavantage(),
+            "yahoo": self._yahoo(),
+        }
+
+    def build(self, target: str) -> IMarketDataProvider:
+        """为每轮压测创建全新的路由对象，避免上一轮的统计影响结果"""
+        if target == "multi":
+            pool = self.providers_pool()
+            return MultiProvider([
+                (pool["finnhub"], "finnhub", 1, 40),
+                (pool["twelvedata"], "twelvedata", 1, 30),
+                (pool["alphavantage"], "alphavantage", 2, 15),
+                (pool["yahoo"], "yahoo", 3, 15),
+            ])
+        if target == "multi_account":
+            keys = [f"bench-finnhub-{i+1}" for i in range(self.finnhub_keys)]
+            provider = MultiAccountProvider(
+                keys, FinnhubProvider, "finnhub", rate_limit_delay=0, http_pool=self.pool
+            )
+            for child in provider.providers:
+                child.base_url = self.servers["finnhub"].base_url
+            return provider
+        if target == "hybrid":
+            return HybridProvider(self._yahoo(), self._alphavantage(), primary_provider="yahoo")
+        if target.startswith("scenario:"):
+            return ScenarioRouter(target.split(":", 1)[1], self.providers_pool())
+        raise ValueError(f"未知的压测对象: {target}")
+
+    def quota_utilization(self, duration: float, keys_per_upstream: Dict[str, int]) -> Dict[str, str]:
+        """配额利用率 = 成功服务的请求数 / ((限流速率 × 时长 + 令牌桶容量) × Key数量)"""
+        result = {}
+        rate = self.behavior.rate_limit
+        for flavor, server in self.servers.items():
+            if server.requests == 0:
+                continue
+            if rate is None:
+                result[flavor] = f"{server.served} req (不限流)"
+                continue
+            capacity = (rate * duration + self.behavior.burst) * keys_per_upstream.get(flavor, 1)
+            result[flavor] = (
+                f"{server.served / capacity * 100:.0f}% "
+                f"({server.served}/{capacity:.0f}, 429={server.rate_limited})"
+            )
+        return result
+
+
+async def run_load(provider: IMarketDataProvider, concurrency: int, total: int) -> dict:
+    """并发发起 total 个 get_stock_data 请求"""
+    latencies: List[float] = []
+    ok = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal ok
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                data = await provider.get_stock_data(SYMBOLS[i % len(SYMBOLS)], "1y", "1d")
+            except Exception:
+                data = None
+            latencies.append(time.perf_counter() - start)
+            if data:
+                ok += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    duration = time.perf_counter() - start
+
+    arr = np.asarray(latencies) * 1000
+    return {
+        "duration": duration,
+        "throughput": total / duration if duration > 0 else 0.0,
+        "ok_rate": ok / total if total else 0.0,
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+    }
+
+
+async def measure_failover(env: BenchmarkEnv, target: str, concurrency: int,
+                           warmup: float = 1.0, window: int = 10, timeout: float = 10.0) -> Optional[float]:
+    """
+    主数据源整体故障后，多久恢复到连续 window 个请求成功
+
+    Returns:
+        故障转移耗时（秒），超时返回 None
+    """
+    env.reset()
+    provider = env.build(target)
+    primary = env.servers[PRIMARY_UPSTREAM[target]]
+
+    outage_at: Optional[float] = None
+    recovered_at: Optional[float] = None
+    streak = 0
+    stop = asyncio.Event()
+
+    async def worker(worker_id: int):
+        nonlocal streak, recovered_at
+        i = worker_id
+        while not stop.is_set():
+            try:
+                data = await provider.get_stock_data(SYMBOLS[i % len(SYMBOLS)], "1y", "1d")
+            except Exception:
+                data = None
+            i += concurrency
+            if outage_at is None:
+                continue
+            streak = streak + 1 if data else 0
+            if streak >= window and recovered_at is None:
+                recovered_at = time.perf_counter()
+                stop.set()
+
+    workers = [asyncio.create_task(worker(i)) for i in range(concurrency)]
+    await asyncio.sleep(warmup)
+    primary.behavior.error_rate = 1.0
+    outage_at = time.perf_counter()
+    try:
+        await asyncio.wait_for(stop.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    stop.set()
+    await asyncio.gather(*workers, return_exceptions=True)
+    primary.behavior.error_rate = env.behavior.error_rate
+
+    return recovered_at - outage_at if recovered_at else None
+
+
+async def main(args):
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG" if args.verbose else "CRITICAL")
+
+    behavior = UpstreamBehavior(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        bars=args.bars,
+    )
+    env = BenchmarkEnv(behavior, finnhub_keys=args.keys)
+    await env.start()
+
+    targets = args.targets.split(",")
+    concurrencies = [int(c) for c in args.concurrency.split(",")]
+
+    try:
+        print("\n" + "=" * 100)
+        print(f"  数据源路由压测  延迟={args.latency}ms±{args.jitter}ms  错误率={args.error_rate:.0%}  "
+              f"限流={args.rate_limit or '无'}/s/key  请求数={args.requests}")
+        print("=" * 100)
+        print(f"{'对象':<20}{'并发':>6}{'吞吐(req/s)':>14}{'成功率':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}  配额利用率")
+
+        for target in targets:
+            for concurrency in concurrencies:
+                env.reset()
+                provider = env.build(target)
+                result = await run_load(provider, concurrency, args.requests)
+                keys = {"finnhub": args.keys if target == "multi_account" else 1}
+                quota = env.quota_utilization(result["duration"], keys)
+                quota_text = ", ".join(f"{k}: {v}" for k, v in quota.items())
+                print(
+                    f"{target:<20}{concurrency:>6}{result['throughput']:>14.1f}{result['ok_rate']:>9.1%}"
+                    f"{result['p50']:>10.1f}{result['p95']:>10.1f}{result['p99']:>10.1f}  {quota_text}"
+                )
+
+        if not args.skip_failover:
+            print("\n" + "-" * 100)
+            print(f"  故障转移: 主数据源全部返回500后恢复到连续10次成功的耗时 (并发={concurrencies[-1]})")
+            print("-" * 100)
+            for target in targets:
+                if target not in PRIMARY_UPSTREAM:
+                    print(f"{target:<20} 单一上游，不适用")
+                    continue
+                elapsed = await measure_failover(env, target, concurrencies[-1])
+                primary = PRIMARY_UPSTREAM[target]
+                text = f"{elapsed * 1000:.0f} ms" if elapsed is not None else "未恢复（超时）"
+                print(f"{target:<20} 主数据源={primary:<14} {text}")
+
+        print("=" * 100 + "\n")
+    finally:
+        await env.stop()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="数据源路由压测（本地模拟上游）")
+    parser.add_argument("--targets", default="multi,multi_account,hybrid,scenario:realtime,scenario:recent",
+                        help="压测对象，逗号分隔")
+    parser.add_argument("--concurrency", default="1,8,32", help="并发数列表，逗号分隔")
+    parser.add_argument("--requests", type=int, default=200, help="每轮请求数")
+    parser.add_argument("--latency", type=float, default=20.0, help="上游基础延迟(ms)")
+    parser.add_argument("--jitter", type=float, default=10.0, help="上游延迟抖动(ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="上游错误率(0-1)")
+    parser.add_argument("--rate-limit", type=float, default=None, help="每个Key每秒请求上限")
+    parser.add_argument("--keys", type=int, default=3, help="multi_account 的 Finnhub Key 数量")
+    parser.add_argument("--bars", type=int, default=250, help="每次返回的K线数量")
+    parser.add_argument("--skip-failover", action="store_true", help="跳过故障转移测试")
+    parser.add_argument("--verbose", action="store_true", help="输出数据源日志")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
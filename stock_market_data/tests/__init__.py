@@ -0,0 +1,3 @@
+"""
+测试模块
+"""
@@ -0,0 +1,123 @@
+"""
+测试列式K线数据结构 KLineBatch
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data.interfaces import KLineBatch, KLineData
+from market_data.fakes import generate_bars
+
+
+def _klines(tzinfo=None, count: int = 30):
+    """模拟上游生成的确定性日线，按需附加时区"""
+    return [
+        KLineData(
+            datetime=bar["datetime"].replace(hour=9, minute=30, tzinfo=tzinfo),
+            open=bar["open"], high=bar["high"], low=bar["low"], close=bar["close"],
+            volume=bar["volume"], symbol="AAPL"
+        )
+        for bar in generate_bars("AAPL", count, end=datetime(2024, 3, 1))
+    ]
+
+
+class TestKLineBatchRoundTrip:
+    """测试 KLineData / DataFrame 与 KLineBatch 之间的往返转换"""
+
+    def test_naive_round_trip(self):
+        """naive时间往返后保持墙上时间且仍为naive"""
+        klines = _klines()
+        batch = KLineBatch.from_klines(klines)
+
+        assert batch.tz is None
+        assert batch.symbol == "AAPL"
+        assert batch.to_klines() == klines
+
+    def test_zoneinfo_round_trip(self):
+        """IANA时区往返"""
+        klines = _klines(ZoneInfo("America/New_York"))
+        batch = KLineBatch.from_klines(klines)
+
+        assert batch.to_klines() == klines
+        assert batch[0].datetime.utcoffset() == timedelta(hours=-5)
+
+    def test_fixed_offset_round_trip(self):
+        """固定偏移时区（无IANA名称）往返"""
+        tz = timezone(timedelta(hours=-5))
+        klines = _klines(tz)
+        batch = KLineBatch.from_klines(klines)
+
+        assert batch.to_klines() == klines
+        assert batch.to_dataframe().index[0] == klines[0].datetime
+
+    def test_timezone_name(self):
+        """可直接传入时区名"""
+        klines = _klines(timezone.utc)
+        source = KLineBatch.from_klines(klines)
+        batch = KLineBatch(
+            "AAPL", source.timestamps, source.open, source.high, source.low,
+            source.close, source.volume, tz="UTC"
+        )
+        assert batch.to_klines() == klines
+
+    def test_dataframe_round_trip(self):
+        """DataFrame往返（带时区与naive）"""
+        for tzinfo in (None, ZoneInfo("America/New_York"), timezone(timedelta(hours=8))):
+            klines = _klines(tzinfo)
+            batch = KLineBatch.from_dataframe(KLineBatch.from_klines(klines).to_dataframe(), "AAPL")
+            assert batch.to_klines() == klines
+
+    def test_dataframe_shares_memory(self):
+        """to_dataframe 不复制底层数组"""
+        batch = KLineBatch.from_klines(_klines())
+        df = batch.to_dataframe()
+        assert np.shares_memory(df["close"].to_numpy(), batch.close)
+
+    def test_column_length_mismatch(self):
+        """列长度不一致时报错"""
+        with pytest.raises(ValueError):
+            KLineBatch("AAPL", np.arange(3), np.ones(3), np.ones(3), np.ones(3), np.ones(2), np.ones(3))
+
+    def test_empty(self):
+        """空列表得到空批次"""
+        batch = KLineBatch.from_klines([], "AAPL")
+        assert len(batch) == 0
+        assert batch.to_klines() == []
+
+
+class TestKLineBatchSlice:
+    """测试 slice_from"""
+
+    def test_naive_batch(self):
+        """naive批次按墙上时间截取，带时区的 start 同样按墙上时间"""
+        klines = _klines()
+        batch = KLineBatch.from_klines(klines)
+        start = klines[10].datetime
+
+        assert batch.slice_from(start).to_klines() == klines[10:]
+        assert batch.slice_from(start + timedelta(minutes=1)).to_klines() == klines[11:]
+        assert len(batch.slice_from(start.replace(tzinfo=ZoneInfo("Asia/Shanghai")))) == len(klines) - 10
+
+    def test_aware_batch(self):
+        """带时区批次：naive start 视为批次时区的本地时间，带时区的 start 按绝对时间"""
+        tz = ZoneInfo("America/New_York")
+        klines = _klines(tz)
+        batch = KLineBatch.from_klines(klines)
+        start = klines[10].datetime
+
+        assert batch.slice_from(start.replace(tzinfo=None)).to_klines() == klines[10:]
+        assert batch.slice_from(start.astimezone(timezone.utc)).to_klines() == klines[10:]
+        assert len(batch.slice_from(start.astimezone(timezone.utc) + timedelta(seconds=1))) == len(klines) - 11
+
+    def test_slice_is_view(self):
+        """截取结果与原批次共享内存"""
+        batch = KLineBatch.from_klines(_klines())
+        tail = batch.slice_from(batch[5].datetime)
+        assert np.shares_memory(tail.close, batch.close)
@@ -0,0 +1,195 @@
+"""
+测试进程内K线缓存 KLineCache
+"""
+import pytest
+import sys
+import os
+from datetime import datetime
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data.kline_cache import KLineCache
+from market_data.fakes import generate_bars
+
+DAY = 86400
+
+
+def _columns(symbol: str = "AAPL", count: int = 50, end: datetime = datetime(2024, 3, 1)):
+    """模拟上游生成的日线转换为缓存的列数组"""
+    bars = generate_bars(symbol, count, end=end)
+    return {
+        "ts": np.array([int((bar["datetime"] - datetime(1970, 1, 1)).total_seconds()) for bar in bars], dtype=np.int64),
+        "open": np.array([bar["open"] for bar in bars], dtype=np.float64),
+        "high": np.array([bar["high"] for bar in bars], dtype=np.float64),
+        "low": np.array([bar["low"] for bar in bars], dtype=np.float64),
+        "close": np.array([bar["close"] for bar in bars], dtype=np.float64),
+        "volume": np.array([bar["volume"] for bar in bars], dtype=np.int64),
+    }
+
+
+def _tail(columns, start: int, count: int, close: float):
+    """从 start 起每天一根、收盘价固定的K线"""
+    ts = start + np.arange(count, dtype=np.int64) * DAY
+    return {
+        name: (ts if name == "ts" else np.full(count, close, dtype=values.dtype))
+        for name, values in columns.items()
+    }
+
+
+class TestKLineCacheRead:
+    """测试读取"""
+
+    def setup_method(self):
+        self.cache = KLineCache(max_bytes=1 << 20)
+
+    def test_limit_window(self):
+        """按条数缓存的窗口：不足 limit 条时未命中"""
+        columns = _columns()
+        self.cache.put("AAPL", "1d", columns, capacity=50, covered_from=int(columns["ts"][0]))
+
+        recent = self.cache.get("AAPL", "1d", limit=20)
+        assert np.array_equal(recent["ts"], columns["ts"][-20:])
+        assert self.cache.get("AAPL", "1d", limit=60) is None
+        assert self.cache.hits == 1 and self.cache.misses == 1
+
+    def test_since_window(self):
+        """按起始时间缓存的窗口：早于 covered_from 时未命中"""
+        columns = _columns()
+        covered_from = int(columns["ts"][10])
+        self.cache.put("AAPL", "1d", columns, covered_from=covered_from)
+
+        assert len(self.cache.get("AAPL", "1d", since=int(columns["ts"][20]))["ts"]) == 30
+        assert self.cache.get("AAPL", "1d", since=int(columns["ts"][5])) is None
+
+    def test_full_history(self):
+        """covered_from 为 None 时任何 limit 都命中"""
+        self.cache.put("AAPL", "1d", _columns())
+        assert len(self.cache.get("AAPL", "1d", limit=500)["ts"]) == 50
+
+    def test_returns_read_only_views(self):
+        """返回的数组只读"""
+        self.cache.put("AAPL", "1d", _columns())
+        columns = self.cache.get("AAPL", "1d", limit=10)
+        with pytest.raises(ValueError):
+            columns["close"][0] = 0.0
+
+
+class TestKLineCacheMerge:
+    """测试并入新K线"""
+
+    def setup_method(self):
+        self.cache = KLineCache(max_bytes=1 << 20)
+
+    def test_append(self):
+        """新K线追加到尾部"""
+        columns = _columns()
+        self.cache.put("AAPL", "1d", columns)
+        last = int(columns["ts"][-1])
+
+        assert self.cache.merge("AAPL", "1d", _tail(columns, last + DAY, 3, 1.0))
+        assert self.cache.last_ts("AAPL", "1d") == last + 3 * DAY
+        assert len(self.cache.peek("AAPL", "1d", limit=100)["ts"]) == 53
+
+    def test_overlap_prefers_new_data(self):
+        """与缓存重叠的时间以新数据为准，结果仍按时间升序且不重复"""
+        columns = _columns()
+        self.cache.put("AAPL", "1d", columns)
+        start = int(columns["ts"][-2])
+
+        self.cache.merge("AAPL", "1d", _tail(columns, start, 4, 1.0))
+        merged = self.cache.peek("AAPL", "1d")
+        assert len(merged["ts"]) == 52
+        assert np.all(np.diff(merged["ts"]) > 0)
+        assert np.all(merged["close"][-4:] == 1.0)
+        assert merged["close"][-5] == columns["close"][-3]
+
+    def test_capacity_trims_head(self):
+        """超出容量时丢弃最早的K线，covered_from 随之前移"""
+        columns = _columns()
+        self.cache.put("AAPL", "1d", columns, capacity=50, covered_from=int(columns["ts"][0]))
+        self.cache.merge("AAPL", "1d", _tail(columns, int(columns["ts"][-1]) + DAY, 5, 1.0))
+
+        window = self.cache.peek("AAPL", "1d", limit=50)
+        assert len(window["ts"]) == 50
+        assert window["ts"][0] == columns["ts"][5]
+        assert self.cache.get("AAPL", "1d", since=int(columns["ts"][0])) is None
+
+    def test_ignores_bars_before_window(self):
+        """早于缓存窗口的K线不并入"""
+        columns = _columns()
+        self.cache.put("AAPL", "1d", columns, covered_from=int(columns["ts"][10]))
+        self.cache.merge("AAPL", "1d", _tail(columns, int(columns["ts"][0]) - 5 * DAY, 3, 1.0))
+        assert len(self.cache.peek("AAPL", "1d", since=int(columns["ts"][10]))["ts"]) == 40
+
+    def test_uncached_symbol(self):
+        """未缓存的股票不建立缓存"""
+        assert not self.cache.merge("MSFT", "1d", _columns("MSFT"))
+        assert self.cache.peek("MSFT", "1d") is None
+
+    def test_invalidate(self):
+        """按股票、周期或全部失效"""
+        for symbol in ("AAPL", "MSFT"):
+            for period in ("1d", "1h"):
+                self.cache.put(symbol, period, _columns(symbol))
+
+        self.cache.invalidate("AAPL", "1d")
+        assert self.cache.peek("AAPL", "1d") is None
+        assert self.cache.peek("AAPL", "1h") is not None
+
+        self.cache.invalidate(period="1h")
+        assert self.cache.peek("AAPL", "1h") is None and self.cache.peek("MSFT", "1h") is None
+
+        self.cache.invalidate()
+        assert self.cache.get_statistics()["entries"] == 0
+        assert self.cache.get_statistics()["bytes"] == 0
+
+
+class TestKLineCacheEviction:
+    """测试按内存预算LRU淘汰"""
+
+    def test_evicts_least_recently_used(self):
+        """超出预算时淘汰最久未使用的项"""
+        entry_bytes = sum(values.nbytes for values in _columns().values())
+        cache = KLineCache(max_bytes=entry_bytes * 2)
+        cache.put("AAPL", "1d", _columns("AAPL"))
+        cache.put("MSFT", "1d", _columns("MSFT"))
+        cache.get("AAPL", "1d", limit=10)
+
+        cache.put("NVDA", "1d", _columns("NVDA"))
+        assert cache.peek("MSFT", "1d") is None
+        assert cache.peek("AAPL", "1d") is not None
+        assert cache.peek("NVDA", "1d") is not None
+        assert cache.evictions == 1
+        assert cache.get_statistics()["bytes"] <= cache.max_bytes
+
+    def test_merge_growth_triggers_eviction(self):
+        """并入新K线使占用超出预算时同样淘汰"""
+        columns = _columns()
+        entry_bytes = sum(values.nbytes for values in columns.values())
+        cache = KLineCache(max_bytes=entry_bytes * 2)
+        cache.put("MSFT", "1d", _columns("MSFT"))
+        cache.put("AAPL", "1d", columns)
+
+        cache.merge("AAPL", "1d", _tail(columns, int(columns["ts"][-1]) + DAY, 5, 1.0))
+        assert cache.peek("MSFT", "1d") is None
+        assert cache.peek("AAPL", "1d") is not None
+
+    def test_keeps_single_oversized_entry(self):
+        """单个窗口超出预算时仍保留最近使用的一项"""
+        cache = KLineCache(max_bytes=64)
+        cache.put("AAPL", "1d", _columns())
+        assert cache.peek("AAPL", "1d") is not None
+
+    def test_needs_refresh(self):
+        """超过核对间隔后需要向数据库核对"""
+        cache = KLineCache(max_bytes=1 << 20, refresh_interval=0)
+        assert not cache.needs_refresh("AAPL", "1d")
+        cache.put("AAPL", "1d", _columns())
+        assert cache.needs_refresh("AAPL", "1d")
+
+        cache.refresh_interval = 3600
+        cache.mark_checked("AAPL", "1d")
+        assert not cache.needs_refresh("AAPL", "1d")
@@ -0,0 +1,211 @@
+"""
+测试多数据源路由的半开熔断器
+"""
+import pytest
+import asyncio
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data.interfaces import KLineData
+from market_data.providers.multi_provider import MultiProvider, ProviderStats
+from market_data.providers.http_pool import HttpClientPool
+from market_data.fakes import FakeUpstreamServer, UpstreamBehavior
+
+
+def _expire_cooldown(stats: ProviderStats):
+    """让熔断冷却时间立即结束"""
+    stats.opened_at -= stats.recovery_timeout
+
+
+class TestProviderBreaker:
+    """测试 ProviderStats 熔断器状态机"""
+
+    def setup_method(self):
+        self.stats = ProviderStats("fake", failure_threshold=3, recovery_timeout=10, max_recovery_timeout=25)
+
+    def test_opens_after_consecutive_failures(self):
+        """连续失败达到阈值后打开"""
+        for _ in range(2):
+            self.stats.record_failure()
+        assert self.stats.state == ProviderStats.STATE_CLOSED
+        assert self.stats.is_available
+
+        self.stats.record_failure()
+        assert self.stats.state == ProviderStats.STATE_OPEN
+        assert not self.stats.is_available
+        assert self.stats.get_score() == 0.0
+
+    def test_success_resets_consecutive_failures(self):
+        """中间的成功请求清零连续失败次数"""
+        self.stats.record_failure()
+        self.stats.record_failure()
+        self.stats.record_success(0.1)
+        self.stats.record_failure()
+        self.stats.record_failure()
+        assert self.stats.state == ProviderStats.STATE_CLOSED
+
+    def test_is_available_has_no_side_effects(self):
+        """查询可用性不改变熔断器状态"""
+        for _ in range(3):
+            self.stats.record_failure()
+        assert not self.stats.is_available
+        _expire_cooldown(self.stats)
+
+        for _ in range(3):
+            assert self.stats.is_available
+        assert self.stats.state == ProviderStats.STATE_OPEN
+        assert self.stats.get_score() > 0
+
+    def test_half_open_admits_single_probe(self):
+        """冷却结束后发起请求时进入半开，只放行一个探测请求"""
+        for _ in range(3):
+            self.stats.record_failure()
+        _expire_cooldown(self.stats)
+
+        assert self.stats.is_available
+        self.stats.begin_request()
+        assert self.stats.state == ProviderStats.STATE_HALF_OPEN
+        assert not self.stats.is_available
+
+    def test_begin_request_during_cooldown_stays_open(self):
+        """冷却期内直接发起的请求不进入半开"""
+        for _ in range(3):
+            self.stats.record_failure()
+        self.stats.begin_request()
+        assert self.stats.state == ProviderStats.STATE_OPEN
+        assert not self.stats.is_available
+
+    def test_probe_success_closes(self):
+        """探测成功后关闭并恢复初始冷却时间"""
+        for _ in range(3):
+            self.stats.record_failure()
+        _expire_cooldown(self.stats)
+        assert self.stats.is_available
+        self.stats.begin_request()
+        self.stats.record_success(0.1)
+
+        assert self.stats.state == ProviderStats.STATE_CLOSED
+        assert self.stats.recovery_timeout == 10
+        assert self.stats.is_available
+
+    def test_probe_failure_reopens_with_backoff(self):
+        """探测失败后重新打开，冷却时间翻倍且不超过上限"""
+        for _ in range(3):
+            self.stats.record_failure()
+
+        for expected in (20, 25):
+            _expire_cooldown(self.stats)
+            assert self.stats.is_available
+            self.stats.begin_request()
+            self.stats.record_failure()
+            assert self.stats.state == ProviderStats.STATE_OPEN
+            assert self.stats.recovery_timeout == expected
+
+    def test_cancelled_probe_releases_slot(self):
+        """探测请求被取消时释放探测名额"""
+        for _ in range(3):
+            self.stats.record_failure()
+        _expire_cooldown(self.stats)
+        assert self.stats.is_available
+        self.stats.begin_request()
+        self.stats.cancel_request()
+
+        assert self.stats.state == ProviderStats.STATE_HALF_OPEN
+        assert self.stats.is_available
+
+
+class _ChartProvider:
+    """
+    按 Yahoo chart 接口请求模拟上游的数据源
+
+    各正式数据源的 get_stock_data 出错时返回空列表，这里直接抛出异常，便于观察熔断
+    """
+
+    def __init__(self, base_url: str, http_pool: HttpClientPool):
+        self.base_url = base_url
+        self.http_pool = http_pool
+
+    async def get_stock_data(self, symbol: str, period: str, interval: str):
+        session = await self.http_pool.get_session()
+        async with session.get(f"{self.base_url}/v8/finance/chart/{symbol}") as response:
+            if response.status != 200:
+                raise Exception(f"chart API错误: {response.status}")
+            data = await response.json()
+        result = data["chart"]["result"][0]
+        quote = result["indicators"]["quote"][0]
+        return [
+            KLineData(datetime=ts, open=o, high=h, low=l, close=c, volume=v, symbol=symbol)
+            for ts, o, h, l, c, v in zip(
+                result["timestamp"], quote["open"], quote["high"], quote["low"], quote["close"], quote["volume"]
+            )
+        ]
+
+
+class _SlowProvider:
+    """永不返回的数据源，用于模拟超时取消"""
+
+    async def get_stock_data(self, symbol: str, period: str, interval: str):
+        await asyncio.sleep(3600)
+
+
+class TestMultiProviderBreaker:
+    """测试 MultiProvider 调用链上的熔断行为（本地模拟上游）"""
+
+    @pytest.mark.asyncio
+    async def test_failover_trips_failing_upstream(self):
+        """主数据源全部返回500时故障转移到备用数据源，主数据源熔断"""
+        failing = FakeUpstreamServer("yahoo", UpstreamBehavior(latency=0, jitter=0, error_rate=1.0, bars=30))
+        healthy = FakeUpstreamServer("yahoo", UpstreamBehavior(latency=0, jitter=0, bars=30))
+        await failing.start()
+        await healthy.start()
+        pool = HttpClientPool()
+        try:
+            primary = _ChartProvider(failing.base_url, pool)
+            provider = MultiProvider([
+                (primary, "primary", 1, 60),
+                (_ChartProvider(healthy.base_url, pool), "backup", 2, 40),
+            ])
+            stats = provider.stats["primary"]
+
+            # 选择带随机性，首个请求指定先走主数据源
+            data, source = await provider.call_with_fallback(
+                "get_stock_data", ("AAPL", "1mo", "1d"), first=(primary, stats)
+            )
+            assert len(data) == 30 and source == "backup"
+            assert failing.requests == 1
+
+            while stats.state == ProviderStats.STATE_CLOSED:
+                with pytest.raises(Exception):
+                    await provider.call_provider(primary, stats, "get_stock_data", "AAPL", "1mo", "1d")
+            assert stats.state == ProviderStats.STATE_OPEN
+            assert failing.requests == stats.failure_threshold
+
+            # 熔断期间不再请求故障数据源
+            for _ in range(3):
+                assert len(await provider.get_stock_data("AAPL", "1mo", "1d")) == 30
+            assert failing.requests == stats.failure_threshold
+        finally:
+            await pool.close()
+            await failing.stop()
+            await healthy.stop()
+
+    @pytest.mark.asyncio
+    async def test_timeout_releases_probe(self):
+        """半开探测请求被 wait_for 超时取消后，下一个请求仍可探测"""
+        provider = MultiProvider([(_SlowProvider(), "slow", 1, 10)])
+        stats = provider.stats["slow"]
+        for _ in range(stats.failure_threshold):
+            stats.record_failure()
+        _expire_cooldown(stats)
+        assert stats.is_available
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                provider.call_provider(_SlowProvider(), stats, "get_stock_data", "AAPL", "1mo", "1d"),
+                timeout=0.05
+            )
+        assert stats.state == ProviderStats.STATE_HALF_OPEN
+        assert stats.is_available
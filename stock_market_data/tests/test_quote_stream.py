@@ -0,0 +1,191 @@
+"""
+测试实时行情推送服务 QuoteStreamService（本地模拟推送服务器）
+"""
+import pytest
+import asyncio
+import sys
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data.interfaces import KLineData
+from market_data.quote_stream import QuoteStreamService
+from market_data.providers.http_pool import HttpClientPool
+from market_data.fakes import FakeQuoteServer
+
+
+async def _until(condition, timeout: float = 2.0):
+    """等待条件成立"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.01)
+
+
+class _RestProvider:
+    """记录并发数的REST数据源，返回固定收盘价的分钟线"""
+
+    def __init__(self, price: float = 50.0, delay: float = 0.02):
+        self.price = price
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_stock_data(self, symbol: str, period: str, interval: str):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return [KLineData(
+            datetime=datetime(2024, 3, 4, 15, 59), open=self.price, high=self.price,
+            low=self.price, close=self.price, volume=100, symbol=symbol
+        )]
+
+
+@asynccontextmanager
+async def _running(**kwargs):
+    """启动模拟推送服务器与推送服务（未启动连接），结束时全部关闭"""
+    server = FakeQuoteServer()
+    await server.start()
+    pool = HttpClientPool()
+    kwargs.setdefault("reconnect_delay", 0.05)
+    stream = QuoteStreamService(server.url, http_pool=pool, **kwargs)
+    try:
+        yield server, stream
+    finally:
+        await stream.close()
+        await pool.close()
+        await server.stop()
+
+
+class TestSubscriptions:
+    """测试引用计数订阅"""
+
+    @pytest.mark.asyncio
+    async def test_refcounted_subscribe(self):
+        """同一股票多次订阅只向上游订阅一次，全部退订后才向上游退订并移出行情簿"""
+        async with _running() as (server, stream):
+            await stream.start()
+            assert await stream.wait_connected(2)
+
+            await stream.subscribe(["AAPL"])
+            await stream.subscribe(["AAPL", "MSFT"])
+            await _until(lambda: server.subscribed_symbols == {"AAPL", "MSFT"})
+            assert server.subscribe_messages == 2
+
+            await server.push_trade("AAPL", 190.5)
+            await _until(lambda: stream.book.get("AAPL") is not None)
+            assert stream.book.get("AAPL").price == 190.5
+
+            await stream.unsubscribe(["AAPL"])
+            await asyncio.sleep(0.05)
+            assert "AAPL" in server.subscribed_symbols
+            assert stream.book.get("AAPL") is not None
+
+            await stream.unsubscribe(["AAPL"])
+            await _until(lambda: server.subscribed_symbols == {"MSFT"})
+            assert stream.book.get("AAPL") is None
+            assert stream.subscriptions == ["MSFT"]
+
+    @pytest.mark.asyncio
+    async def test_ignores_unsubscribed_symbols(self):
+        """未订阅股票的推送不进入行情簿"""
+        async with _running() as (server, stream):
+            await stream.subscribe(["AAPL"])
+            await stream.start()
+            await _until(lambda: server.subscribed_symbols == {"AAPL"})
+
+            stream._handle_message('{"type": "trade", "data": [{"s": "TSLA", "p": 1.0, "t": 0}]}')
+            assert stream.book.get("TSLA") is None
+
+    @pytest.mark.asyncio
+    async def test_resubscribe_after_reconnect(self):
+        """上游断线后重连并恢复全部订阅，推送继续进入行情簿"""
+        async with _running() as (server, stream):
+            await stream.subscribe(["AAPL", "MSFT"])
+            await stream.start()
+            await _until(lambda: server.subscribed_symbols == {"AAPL", "MSFT"})
+
+            await server.drop_connections()
+            await _until(lambda: stream.reconnects == 1 and server.subscribed_symbols == {"AAPL", "MSFT"})
+            assert server.subscribe_messages == 4
+
+            await server.push_trade("MSFT", 410.0)
+            await _until(lambda: stream.book.get("MSFT") is not None)
+            assert stream.book.get("MSFT").source == "stream"
+
+
+class TestRestFallback:
+    """测试行情过期时回退REST"""
+
+    @pytest.mark.asyncio
+    async def test_fresh_quote_skips_rest(self):
+        """未过期的推送行情直接返回，不请求REST"""
+        rest = _RestProvider()
+        async with _running(rest_provider=rest, stale_after=60) as (server, stream):
+            await stream.subscribe(["AAPL"])
+            await stream.start()
+            await _until(lambda: server.subscribed_symbols == {"AAPL"})
+            await server.push_trade("AAPL", 190.5)
+            await _until(lambda: stream.book.get("AAPL") is not None)
+
+            assert await stream.get_latest_price(["AAPL"]) == {"AAPL": 190.5}
+            assert rest.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_stale_quotes_fall_back_to_rest(self):
+        """推送中断后过期的行情走REST补取，并发受限，已订阅的写回行情簿"""
+        rest = _RestProvider(price=50.0)
+        symbols = [f"S{i:02d}" for i in range(12)]
+        async with _running(rest_provider=rest, stale_after=0.05, rest_concurrency=3) as (server, stream):
+            await stream.subscribe(symbols)
+            await stream.start()
+            await _until(lambda: server.subscribed_symbols == set(symbols))
+            for symbol in symbols:
+                await server.push_trade(symbol, 100.0)
+            await _until(lambda: len(stream.book) == len(symbols))
+
+            await server.drop_connections()
+            await asyncio.sleep(0.1)
+
+            prices = await stream.get_latest_price(symbols)
+            assert prices == {symbol: 50.0 for symbol in symbols}
+            assert rest.calls == len(symbols)
+            assert rest.max_in_flight == 3
+            assert all(stream.book.get(s).source == "rest" for s in symbols)
+
+    @pytest.mark.asyncio
+    async def test_rest_result_for_unsubscribed_symbol_not_cached(self):
+        """未订阅股票的REST结果只返回，不写入行情簿"""
+        rest = _RestProvider(price=50.0)
+        async with _running(rest_provider=rest) as (server, stream):
+            assert await stream.get_latest_price(["NVDA"]) == {"NVDA": 50.0}
+            assert stream.book.get("NVDA") is None
+            assert len(stream.book) == 0
+
+    @pytest.mark.asyncio
+    async def test_rest_failure_returns_stale_price(self):
+        """REST也失败时返回过期的推送价格"""
+
+        class _Failing:
+            async def get_stock_data(self, symbol, period, interval):
+                raise Exception("boom")
+
+        async with _running(rest_provider=_Failing(), stale_after=0.05) as (server, stream):
+            await stream.subscribe(["AAPL"])
+            await stream.start()
+            await _until(lambda: server.subscribed_symbols == {"AAPL"})
+            await server.push_trade("AAPL", 190.5)
+            await _until(lambda: stream.book.get("AAPL") is not None)
+            await asyncio.sleep(0.1)
+
+            assert await stream.get_latest_price(["AAPL"]) == {"AAPL": 190.5}
@@ -0,0 +1,92 @@
+"""
+测试"最近数据"场景的双源K线比较
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data.interfaces import KLineData
+from market_data.providers.scenario_router import compare_klines
+from market_data.fakes import generate_bars
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def _hourly(tzinfo=None, count: int = 7, day: datetime = datetime(2024, 3, 4)):
+    """模拟上游生成的日内小时线（交易所本地时间 9:30 起），按需附加时区"""
+    return [
+        KLineData(
+            datetime=(day + timedelta(hours=9.5 + i)).replace(tzinfo=tzinfo),
+            open=bar["open"], high=bar["high"], low=bar["low"], close=bar["close"],
+            volume=bar["volume"], symbol="AAPL"
+        )
+        for i, bar in enumerate(generate_bars("AAPL", count, end=day))
+    ]
+
+
+def _daily(tzinfo=None, count: int = 20, hour: int = 0):
+    """模拟上游生成的日线，按需附加时区与时刻"""
+    return [
+        KLineData(
+            datetime=bar["datetime"].replace(hour=hour, tzinfo=tzinfo),
+            open=bar["open"], high=bar["high"], low=bar["low"], close=bar["close"],
+            volume=bar["volume"], symbol="AAPL"
+        )
+        for bar in generate_bars("AAPL", count, end=datetime(2024, 3, 1))
+    ]
+
+
+class TestCompareKlines:
+    """测试 compare_klines 的对齐方式"""
+
+    def test_identical(self):
+        klines = _hourly(NEW_YORK)
+        assert compare_klines(klines, klines, "1h", 0.005) == (7, 0, 0.0)
+
+    def test_intraday_naive_vs_aware(self):
+        """日内：naive（交易所本地时间）与带时区的同一组K线按绝对时间对齐，全部一致"""
+        overlap, mismatches, max_rel_diff = compare_klines(_hourly(), _hourly(NEW_YORK), "1h", 0.005)
+        assert (overlap, mismatches, max_rel_diff) == (7, 0, 0.0)
+
+    def test_intraday_naive_vs_utc(self):
+        """日内：带UTC时区的K线同样换算到绝对时间后对齐"""
+        utc = [
+            KLineData(
+                datetime=k.datetime.astimezone(ZoneInfo("UTC")), open=k.open, high=k.high,
+                low=k.low, close=k.close, volume=k.volume, symbol=k.symbol
+            )
+            for k in _hourly(NEW_YORK)
+        ]
+        assert compare_klines(_hourly(), utc, "1h", 0.005) == (7, 0, 0.0)
+
+    def test_intraday_detects_mismatch(self):
+        """价格超出容忍度的K线计为不一致"""
+        primary = _hourly()
+        secondary = _hourly(NEW_YORK)
+        secondary[3] = KLineData(
+            datetime=secondary[3].datetime, open=secondary[3].open, high=secondary[3].high * 1.1,
+            low=secondary[3].low, close=secondary[3].close, volume=secondary[3].volume, symbol="AAPL"
+        )
+        overlap, mismatches, max_rel_diff = compare_klines(primary, secondary, "1h", 0.005)
+        assert (overlap, mismatches) == (7, 1)
+        assert abs(max_rel_diff - 0.1) < 1e-9
+
+    def test_daily_on_exchange_date(self):
+        """日线：UTC零点前后的时间戳按交易所本地日期对齐，不会错开一天"""
+        naive = _daily()
+        # 交易所本地零点对应 UTC 05:00，UTC日期与本地日期相同；本地 20:00 对应次日 UTC 01:00
+        evening = [
+            KLineData(
+                datetime=(k.datetime.replace(hour=20, tzinfo=NEW_YORK)).astimezone(ZoneInfo("UTC")),
+                open=k.open, high=k.high, low=k.low, close=k.close, volume=k.volume, symbol=k.symbol
+            )
+            for k in naive
+        ]
+        assert compare_klines(naive, evening, "1d", 0.005) == (20, 0, 0.0)
+
+    def test_empty(self):
+        assert compare_klines([], _hourly(), "1h", 0.005) == (0, 0, 0.0)
@@ -6,6 +6,7 @@ from typing import List, Dict, Any
 from loguru import logger
 
 from ....core.container import container
+from ....core.kline_cache import kline_cache
 from ....services.strategy_service import StrategyService
 
 router = APIRouter()
@@ -227,3 +228,17 @@ async def trigger_data_update() -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"触发数据更新失败: {e}")
         raise HTTPException(status_code=500, detail="触发数据更新失败")
+
+
+@router.get("/kline-cache/stats")
+async def get_kline_cache_stats() -> Dict[str, Any]:
+    """K线缓存命中率与内存占用"""
+    try:
+        return {
+            "success": True,
+            "data": kline_cache.get_statistics()
+        }
+        
+    except Exception as e:
+        logger.error(f"获取K线缓存统计失败: {e}")
+        raise HTTPException(status_code=500, detail="获取K线缓存统计失败")
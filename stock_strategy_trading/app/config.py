@@ -30,6 +30,10 @@ class Settings(BaseSettings):
     strategy_execution_timeout: int = 300  # 秒
     max_concurrent_strategies: int = 5
     
+    # K线缓存配置
+    kline_cache_max_mb: int = 256  # 进程内K线缓存内存预算（MB），超出按LRU淘汰
+    kline_cache_refresh_interval: int = 60  # 命中的缓存多久向数据库核对一次新K线（秒）
+    
     # 回测配置
     backtest_initial_capital: float = 100000.0
     backtest_commission: float = 0.001  # 0.1%
@@ -0,0 +1,13 @@
+"""
+进程内K线缓存
+KLineCache 的实现位于 market_data.kline_cache（两个服务共用），此处按本服务配置创建全局实例
+"""
+from ..config import settings
+from ..utils.market_data_helper import KLineCache
+
+
+# 全局K线缓存实例
+kline_cache = KLineCache(
+    max_bytes=settings.kline_cache_max_mb * 1024 * 1024,
+    refresh_interval=settings.kline_cache_refresh_interval
+)
@@ -49,6 +49,12 @@ class StrategyEngine(IStrategyEngine):
             
             logger.info(f"开始执行策略 {strategy.name}，共 {total_stocks} 只股票")
             
+            # 一次查询整个股票池中数据充足的股票，分页时只做集合过滤
+            sufficient_universe = await self.kline_repository.get_sufficient_symbols(
+                min_daily_records=100, min_hourly_records=100
+            )
+            logger.info(f"数据充足的股票: {len(sufficient_universe)} 只")
+            
             # 分页处理，每页50只股票
             page_size = 50
             total_pages = (total_stocks + page_size - 1) // page_size
@@ -65,26 +71,26 @@ class StrategyEngine(IStrategyEngine):
                     # 获取股票代码列表
                     symbols = [stock.code if hasattr(stock, 'code') else stock.symbol for stock in stocks]
                     
-                    # 批量检查数据充足性，只处理有足够数据的股票
-                    sufficient_symbols = await self.kline_repository.get_stocks_with_sufficient_data(
-                        symbols, min_daily_records=100, min_hourly_records=100
-                    )
+                    # 只处理有足够数据的股票
+                    sufficient_symbols = [s for s in symbols if s in sufficient_universe]
                     
                     if not sufficient_symbols:
                         logger.debug(f"第 {page}/{total_pages} 页没有股票有足够数据，跳过")
                         continue
                     
-                    # 优先从本地数据库获取K线数据
+                    # 优先从本地数据库获取K线数据（整页一次批量读取）
+                    daily_batch = await self.kline_repository.get_kline_data_batch(
+                        sufficient_symbols, "K_DAY", limit=500  # 获取最近500个交易日
+                    )
+                    hourly_batch = await self.kline_repository.get_kline_data_batch(
+                        sufficient_symbols, "K_60M", limit=1000  # 获取最近1000小时
+                    )
+                    
                     stock_data = {}
                     for symbol in sufficient_symbols:
                         try:
-                            # 从数据库获取日线和小时线数据
-                            daily_data = await self.kline_repository.get_kline_data_from_db(
-                                symbol, "K_DAY", limit=500  # 获取最近500个交易日
-                            )
-                            hourly_data = await self.kline_repository.get_kline_data_from_db(
-                                symbol, "K_60M", limit=1000  # 获取最近1000小时
-                            )
+                            daily_data = daily_batch.get(symbol, [])
+                            hourly_data = hourly_batch.get(symbol, [])
                             
                             if len(daily_data) >= 100 and len(hourly_data) >= 100:
                                 stock_data[symbol] = {
@@ -156,6 +162,11 @@ class StrategyEngine(IStrategyEngine):
         logger.info(f"开始执行策略 {strategy.name}，共 {total_stocks} 只股票")
         await progress_cb(0, total_stocks, None, 'start')
         
+        # 一次查询整个股票池中数据充足的股票，分页时只做集合过滤
+        sufficient_universe = await self.kline_repository.get_sufficient_symbols(
+            min_daily_records=100, min_hourly_records=100
+        )
+        
         # 分页处理
         page_size = 50
         total_pages = (total_stocks + page_size - 1) // page_size
@@ -174,28 +185,28 @@ class StrategyEngine(IStrategyEngine):
                 # 获取股票代码列表
                 symbols = [stock.code if hasattr(stock, 'code') else stock.symbol for stock in stocks]
                 
-                # 批量检查数据充足性
-                sufficient_symbols = await self.kline_repository.get_stocks_with_sufficient_data(
-                    symbols, min_daily_records=100, min_hourly_records=100
-                )
+                # 只处理有足够数据的股票
+                sufficient_symbols = [s for s in symbols if s in sufficient_universe]
                 
                 if not sufficient_symbols:
                     processed_count += len(stocks)
                     continue
                 
-                # 获取数据并执行策略
+                # 获取数据并执行策略（整页一次批量读取）
+                daily_batch = await self.kline_repository.get_kline_data_batch(
+                    sufficient_symbols, "K_DAY", limit=500
+                )
+                hourly_batch = await self.kline_repository.get_kline_data_batch(
+                    sufficient_symbols, "K_60M", limit=1000
+                )
+                
                 stock_data = {}
                 for idx, symbol in enumerate(sufficient_symbols):
                     await progress_cb(processed_count + idx, total_stocks, symbol, 'fetch_data')
                     
                     try:
-                        # 从数据库获取K线数据
-                        daily_data = await self.kline_repository.get_kline_data_from_db(
-                            symbol, "K_DAY", limit=500
-                        )
-                        hourly_data = await self.kline_repository.get_kline_data_from_db(
-                            symbol, "K_60M", limit=1000
-                        )
+                        daily_data = daily_batch.get(symbol, [])
+                        hourly_data = hourly_batch.get(symbol, [])
                         
                         if len(daily_data) >= 100 and len(hourly_data) >= 100:
                             stock_data[symbol] = {
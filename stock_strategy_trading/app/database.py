@@ -3,7 +3,7 @@
 """
 import os
 from typing import List, Optional
-from sqlalchemy import create_engine, and_
+from sqlalchemy import create_engine, and_, inspect
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
 from loguru import logger
@@ -14,7 +14,8 @@ from .models import (
     ExpertDB, ExpertOpinionDB,
     TradingPlaybookDB, SelectionStrategyDB, StockInfo,
     TradingPlanDB, TradeRecordDB, PositionDB, EmotionRecordDB, 
-    TradingDisciplineDB, TradingReviewDB, DataSyncTaskDB, StockSyncStatusDB
+    TradingDisciplineDB, TradingReviewDB, DataSyncTaskDB, StockSyncStatusDB,
+    KLineTableManager
 )
 
 
@@ -70,6 +71,8 @@ class DatabaseService:
             # 创建所有表
             Base.metadata.create_all(bind=self.engine)
             
+            self.check_kline_epoch()
+            
             logger.info(f"Database initialized: {settings.database_url}")
             
         except Exception as e:
@@ -80,6 +83,27 @@ class DatabaseService:
         """获取数据库会话"""
         return self.SessionLocal()
 
+    def check_kline_epoch(self):
+        """
+        检查K线表 ts 列已回填且非空
+
+        ts 列由 trading_journal 启动时迁移；未完成时按 ts 排序、读取会遗漏或错排K线，拒绝启动
+        """
+        inspector = inspect(self.engine)
+        existing = set(inspector.get_table_names())
+        pending = []
+        for model in KLineTableManager.ALL_MODELS:
+            if model.__tablename__ not in existing:
+                continue
+            ts = next((col for col in inspector.get_columns(model.__tablename__) if col['name'] == 'ts'), None)
+            if ts is None or ts['nullable']:
+                pending.append(model.__tablename__)
+        if pending:
+            raise RuntimeError(
+                f"K线表 ts 列迁移未完成: {', '.join(pending)}。"
+                f"请先启动 trading_journal 或运行 trading_journal/scripts/migrate_kline_epoch.py"
+            )
+
     def create_tables(self):
         """创建所有数据库表"""
         try:
@@ -1,10 +1,10 @@
 """
 数据模型定义
 """
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Date, Index, create_engine, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, Text, Date, Index, create_engine, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -71,6 +71,7 @@ class KLine1MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -83,6 +84,7 @@ class KLine1MinDB(Base):
     
     __table_args__ = (
         Index('idx_1min_code_time', 'code', 'trade_time'),
+        Index('idx_1min_code_ts', 'code', 'ts'),
         Index('idx_1min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -95,6 +97,7 @@ class KLine3MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -107,6 +110,7 @@ class KLine3MinDB(Base):
     
     __table_args__ = (
         Index('idx_3min_code_time', 'code', 'trade_time'),
+        Index('idx_3min_code_ts', 'code', 'ts'),
         Index('idx_3min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -119,6 +123,7 @@ class KLine5MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -131,6 +136,7 @@ class KLine5MinDB(Base):
     
     __table_args__ = (
         Index('idx_5min_code_time', 'code', 'trade_time'),
+        Index('idx_5min_code_ts', 'code', 'ts'),
         Index('idx_5min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -143,6 +149,7 @@ class KLine15MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -155,6 +162,7 @@ class KLine15MinDB(Base):
     
     __table_args__ = (
         Index('idx_15min_code_time', 'code', 'trade_time'),
+        Index('idx_15min_code_ts', 'code', 'ts'),
         Index('idx_15min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -167,6 +175,7 @@ class KLine30MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -179,6 +188,7 @@ class KLine30MinDB(Base):
     
     __table_args__ = (
         Index('idx_30min_code_time', 'code', 'trade_time'),
+        Index('idx_30min_code_ts', 'code', 'ts'),
         Index('idx_30min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -191,6 +201,7 @@ class KLine1HourDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -203,6 +214,7 @@ class KLine1HourDB(Base):
     
     __table_args__ = (
         Index('idx_1hour_code_time', 'code', 'trade_time'),
+        Index('idx_1hour_code_ts', 'code', 'ts'),
         Index('idx_1hour_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -215,6 +227,7 @@ class KLine4HourDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -227,6 +240,7 @@ class KLine4HourDB(Base):
     
     __table_args__ = (
         Index('idx_4hour_code_time', 'code', 'trade_time'),
+        Index('idx_4hour_code_ts', 'code', 'ts'),
         Index('idx_4hour_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -239,6 +253,7 @@ class KLineDailyDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -251,6 +266,7 @@ class KLineDailyDB(Base):
     
     __table_args__ = (
         Index('idx_daily_code_time', 'code', 'trade_time'),
+        Index('idx_daily_code_ts', 'code', 'ts'),
         Index('idx_daily_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -263,6 +279,7 @@ class KLineWeeklyDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -275,6 +292,7 @@ class KLineWeeklyDB(Base):
     
     __table_args__ = (
         Index('idx_weekly_code_time', 'code', 'trade_time'),
+        Index('idx_weekly_code_ts', 'code', 'ts'),
         Index('idx_weekly_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -287,6 +305,7 @@ class KLineMonthlyDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -299,12 +318,16 @@ class KLineMonthlyDB(Base):
     
     __table_args__ = (
         Index('idx_monthly_code_time', 'code', 'trade_time'),
+        Index('idx_monthly_code_ts', 'code', 'ts'),
         Index('idx_monthly_code_key', 'code', 'time_key', unique=True),
     )
 
 
 # ==================== K线表映射管理器 ====================
 
+# ts 列的零点（trade_time 为交易所本地时间，不带时区）
+EPOCH = datetime(1970, 1, 1)
+
 class KLineTableManager:
     """K线表映射管理器"""
     
@@ -383,8 +406,8 @@ class KLineTableManager:
         Raises:
             ValueError: 如果时间周期不支持
         """
-        period = period.lower()
-        model = cls.PERIOD_TO_MODEL.get(period)
+        # "1M"（月线）与 "1m"（1分钟线）只有大小写不同，先按原样匹配再忽略大小写
+        model = cls.PERIOD_TO_MODEL.get(period) or cls.PERIOD_TO_MODEL.get(period.lower())
         
         if model is None:
             raise ValueError(
@@ -394,6 +417,16 @@ class KLineTableManager:
         
         return model
     
+    @staticmethod
+    def to_epoch(trade_time: datetime) -> int:
+        """交易时间 -> ts 列的值（按UTC解释本地墙上时间，与迁移脚本的SQL换算一致）"""
+        return int((trade_time.replace(tzinfo=None) - EPOCH).total_seconds())
+    
+    @staticmethod
+    def from_epoch(ts: int) -> datetime:
+        """ts 列的值 -> 交易时间"""
+        return EPOCH + timedelta(seconds=int(ts))
+    
     @classmethod
     def get_period_by_model(cls, model):
         """根据表模型获取时间周期"""
@@ -2,19 +2,33 @@
 K线数据仓库
 负责K线数据的持久化操作
 """
-from typing import List, Optional, Dict, Any, TYPE_CHECKING
+from typing import List, Optional, Dict, Any, Set, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from ..core.interfaces import KLineData
 from datetime import datetime
+import numpy as np
+import pandas as pd
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import func
 from loguru import logger
 
 from ..core.interfaces import IKLineRepository
-from ..models import KLineDB
+from ..core.kline_cache import kline_cache
+from ..models import KLineDB, KLineTableManager
 from ..database import db_service
 
+# 旧版周期代码 -> 周期表
+LEGACY_PERIODS = {
+    "K_1M": "1m",
+    "K_5M": "5m",
+    "K_15M": "15m",
+    "K_60M": "1h",
+    "K_DAY": "1d",
+    "K_WEEK": "1w",
+    "K_MON": "1month",
+}
+
 
 class KLineRepository(IKLineRepository):
     """K线数据仓库实现"""
@@ -208,30 +222,60 @@ class KLineRepository(IKLineRepository):
         Returns:
             bool: 是否有足够数据
         """
+        sufficient = await self.get_sufficient_symbols([symbol], min_daily_records, min_hourly_records)
+        return symbol in sufficient
+
+    async def get_sufficient_symbols(
+        self,
+        symbols: Optional[List[str]] = None,
+        min_daily_records: int = 100,
+        min_hourly_records: int = 100
+    ) -> Set[str]:
+        """
+        批量获取有足够K线数据的股票集合
+        
+        每个周期一条 GROUP BY code HAVING COUNT(*) >= N 查询（走 (code, trade_time) 索引），
+        小时线只在日线满足的股票中查询
+        
+        Args:
+            symbols: 股票代码列表，None表示全部股票
+            min_daily_records: 最少日线记录数
+            min_hourly_records: 最少小时线记录数
+            
+        Returns:
+            Set[str]: 日线和小时线都满足条件的股票代码
+        """
         try:
             with db_service.get_session() as session:
-                # 检查日线数据
-                daily_count = session.query(func.count(KLineDB.id)).filter(
-                    KLineDB.code == symbol,
-                    KLineDB.period == "K_DAY"
-                ).scalar() or 0
-                
-                # 检查小时线数据
-                hourly_count = session.query(func.count(KLineDB.id)).filter(
-                    KLineDB.code == symbol,
-                    KLineDB.period == "K_60M"
-                ).scalar() or 0
-                
-                has_enough = daily_count >= min_daily_records and hourly_count >= min_hourly_records
-                
-                if not has_enough:
-                    logger.debug(f"股票 {symbol} 数据不足: 日线 {daily_count}/{min_daily_records}, 小时线 {hourly_count}/{min_hourly_records}")
-                
-                return has_enough
+                daily = self._codes_with_min_records(session, "1d", min_daily_records, symbols)
+                if not daily:
+                    return set()
+                hourly = self._codes_with_min_records(session, "1h", min_hourly_records, list(daily))
+                return daily & hourly
                 
         except Exception as e:
-            logger.error(f"检查股票 {symbol} 数据充足性失败: {e}")
-            return False
+            logger.error(f"批量检查股票数据充足性失败: {e}")
+            return set()
+
+    @staticmethod
+    def _codes_with_min_records(session, period: str, min_records: int, symbols: Optional[List[str]]) -> Set[str]:
+        """返回指定周期表中记录数不少于 min_records 的股票代码"""
+        model = KLineTableManager.get_model_by_period(period)
+        
+        def query(codes: Optional[List[str]]) -> Set[str]:
+            q = session.query(model.code)
+            if codes is not None:
+                q = q.filter(model.code.in_(codes))
+            rows = q.group_by(model.code).having(func.count(model.id) >= min_records).all()
+            return {row[0] for row in rows}
+        
+        if symbols is None:
+            return query(None)
+        
+        result: Set[str] = set()
+        for i in range(0, len(symbols), 1000):
+            result |= query(symbols[i:i + 1000])
+        return result
 
     async def get_stocks_with_sufficient_data(self, symbols: List[str], min_daily_records: int = 100, min_hourly_records: int = 100) -> List[str]:
         """
@@ -243,35 +287,204 @@ class KLineRepository(IKLineRepository):
             min_hourly_records: 最少小时线记录数
             
         Returns:
-            List[str]: 有足够数据的股票代码列表
+            List[str]: 有足够数据的股票代码列表（保持输入顺序）
         """
-        try:
-            sufficient_symbols = []
-            with db_service.get_session() as session:
-                for symbol in symbols:
-                    # 检查日线数据
-                    daily_count = session.query(func.count(KLineDB.id)).filter(
-                        KLineDB.code == symbol,
-                        KLineDB.period == "K_DAY"
-                    ).scalar() or 0
-                    
-                    # 检查小时线数据
-                    hourly_count = session.query(func.count(KLineDB.id)).filter(
-                        KLineDB.code == symbol,
-                        KLineDB.period == "K_60M"
-                    ).scalar() or 0
-                    
-                    if daily_count >= min_daily_records and hourly_count >= min_hourly_records:
-                        sufficient_symbols.append(symbol)
-                    else:
-                        logger.debug(f"跳过数据不足的股票 {symbol}: 日线 {daily_count}/{min_daily_records}, 小时线 {hourly_count}/{min_hourly_records}")
+        sufficient = await self.get_sufficient_symbols(symbols, min_daily_records, min_hourly_records)
+        sufficient_symbols = [symbol for symbol in symbols if symbol in sufficient]
+        logger.info(f"在 {len(symbols)} 只股票中，{len(sufficient_symbols)} 只有足够数据用于策略分析")
+        return sufficient_symbols
+
+    async def get_kline_columns_batch(
+        self,
+        symbols: List[str],
+        period: str,
+        limit: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        批量读取K线为列式数组（原始游标 + (code, ts) 索引，不构造ORM对象）
+        
+        只按 limit 读取最近K线时走进程内缓存（kline_cache），缓存命中的股票按
+        kline_cache_refresh_interval 用一条查询补读新K线追加到尾部
+        
+        Args:
+            symbols: 股票代码列表
+            period: 周期，如 "1d"/"1h"，也支持 "K_DAY"/"K_60M"
+            limit: 每只股票最多取最近的多少条
+            start: 开始时间（含）
+            end: 结束时间（含）
             
-            logger.info(f"在 {len(symbols)} 只股票中，{len(sufficient_symbols)} 只有足够数据用于策略分析")
-            return sufficient_symbols
+        Returns:
+            Dict[symbol, {ts, open, high, low, close, volume}]，各列为按时间正序的 NumPy 数组，
+            ts 为 int64 秒（KLineTableManager.from_epoch 可还原为交易时间）；
+            来自缓存的数组为只读
+        """
+        if not symbols:
+            return {}
+        try:
+            period = KLineTableManager.normalize_period(LEGACY_PERIODS.get(period, period))
+            if limit is None or start is not None or end is not None:
+                return self._load_columns(period, symbols, limit, start, end)
+            return self._load_columns_cached(period, symbols, limit)
             
         except Exception as e:
-            logger.error(f"批量检查股票数据充足性失败: {e}")
-            return []
+            logger.error(f"批量读取K线列数据失败 {period}: {e}")
+            return {}
+
+    def _load_columns_cached(self, period: str, symbols: List[str], limit: int) -> Dict[str, Dict[str, np.ndarray]]:
+        """按 limit 读取最近K线，先查缓存，未命中的一次批量加载后放入缓存"""
+        result: Dict[str, Dict[str, np.ndarray]] = {}
+        misses: List[str] = []
+        stale: Dict[str, int] = {}
+        for symbol in symbols:
+            columns = kline_cache.get(symbol, period, limit=limit)
+            if columns is None:
+                misses.append(symbol)
+                continue
+            result[symbol] = columns
+            last_ts = kline_cache.last_ts(symbol, period)
+            if last_ts is not None and kline_cache.needs_refresh(symbol, period):
+                stale[symbol] = last_ts
+        
+        if stale:
+            # 从最早的缓存尾部起一条查询补读，各股票只追加自己最后一条（含）之后的K线
+            tails = self._load_columns(
+                period, list(stale), None, KLineTableManager.from_epoch(min(stale.values())), None
+            )
+            for symbol, last_ts in stale.items():
+                tail = tails.get(symbol)
+                if tail is not None:
+                    tail = {name: values[np.searchsorted(tail["ts"], last_ts):] for name, values in tail.items()}
+                    kline_cache.merge(symbol, period, tail)
+                kline_cache.mark_checked(symbol, period)
+                refreshed = kline_cache.peek(symbol, period, limit=limit)
+                if refreshed is not None:
+                    result[symbol] = refreshed
+        
+        if misses:
+            loaded = self._load_columns(period, misses, limit, None, None)
+            for symbol, columns in loaded.items():
+                # 不足 limit 条说明已是全部历史
+                covered_from = int(columns["ts"][0]) if len(columns["ts"]) >= limit else None
+                kline_cache.put(symbol, period, columns, capacity=limit, covered_from=covered_from)
+            result.update(loaded)
+        return result
+
+    def _load_columns(
+        self,
+        period: str,
+        symbols: List[str],
+        limit: Optional[int],
+        start: Optional[datetime],
+        end: Optional[datetime]
+    ) -> Dict[str, Dict[str, np.ndarray]]:
+        """从周期表批量读取列数据（每1000只股票一条SQL）"""
+        model = KLineTableManager.get_model_by_period(period)
+        result: Dict[str, Dict[str, np.ndarray]] = {}
+        raw = db_service.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for i in range(0, len(symbols), 1000):
+                codes = symbols[i:i + 1000]
+                sql, params = self._columns_sql(model.__tablename__, codes, limit, start, end)
+                cursor.execute(sql, params)
+                result.update(self._split_columns(cursor.fetchall()))
+            cursor.close()
+        finally:
+            raw.close()
+        return result
+
+    @staticmethod
+    def _columns_sql(table: str, codes: List[str], limit: Optional[int],
+                     start: Optional[datetime], end: Optional[datetime]):
+        """构造列式读取SQL（pymysql 参数风格）"""
+        conditions = [f"code IN ({', '.join(['%s'] * len(codes))})"]
+        params: List[Any] = list(codes)
+        if start is not None:
+            conditions.append("ts >= %s")
+            params.append(KLineTableManager.to_epoch(start))
+        if end is not None:
+            conditions.append("ts <= %s")
+            params.append(KLineTableManager.to_epoch(end))
+        where = " AND ".join(conditions)
+        columns = "code, ts, open_price, high_price, low_price, close_price, COALESCE(volume, 0)"
+        
+        if limit is None:
+            return f"SELECT {columns} FROM {table} WHERE {where} ORDER BY code, ts", params
+        
+        params.append(int(limit))
+        return (
+            f"SELECT {columns} FROM ("
+            f" SELECT code, ts, open_price, high_price, low_price, close_price, volume,"
+            f" ROW_NUMBER() OVER (PARTITION BY code ORDER BY ts DESC) AS rn"
+            f" FROM {table} WHERE {where}"
+            f") AS recent WHERE rn <= %s ORDER BY code, ts",
+            params
+        )
+
+    @staticmethod
+    def _split_columns(rows) -> Dict[str, Dict[str, np.ndarray]]:
+        """把按 (code, ts) 排序的行拆成每只股票的列数组"""
+        if not rows:
+            return {}
+        n = len(rows)
+        codes, ts, opens, highs, lows, closes, volumes = zip(*rows)
+        columns = {
+            "ts": np.fromiter(ts, dtype=np.int64, count=n),
+            "open": np.fromiter(opens, dtype=np.float64, count=n),
+            "high": np.fromiter(highs, dtype=np.float64, count=n),
+            "low": np.fromiter(lows, dtype=np.float64, count=n),
+            "close": np.fromiter(closes, dtype=np.float64, count=n),
+            "volume": np.fromiter(volumes, dtype=np.int64, count=n),
+        }
+        
+        code_array = np.array(codes, dtype=object)
+        bounds = [0, *(np.flatnonzero(code_array[1:] != code_array[:-1]) + 1).tolist(), n]
+        return {
+            codes[lo]: {name: values[lo:hi] for name, values in columns.items()}
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        }
+
+    async def get_kline_frame(
+        self,
+        symbol: str,
+        period: str,
+        limit: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """读取单只股票K线为 DataFrame（以交易时间为索引，列: open/high/low/close/volume）"""
+        columns = (await self.get_kline_columns_batch([symbol], period, limit, start, end)).get(symbol)
+        if columns is None:
+            return pd.DataFrame(columns=["open", "high", "low", "close", "volume"])
+        index = pd.to_datetime(columns["ts"], unit="s")
+        return pd.DataFrame({name: values for name, values in columns.items() if name != "ts"}, index=index)
+
+    async def get_kline_data_batch(
+        self,
+        symbols: List[str],
+        period: str,
+        limit: int = 1000
+    ) -> Dict[str, List['KLineData']]:
+        """批量获取多只股票最近 limit 条K线（策略所需的 KLineData 格式，按时间正序）"""
+        from ..core.interfaces import KLineData
+        
+        result: Dict[str, List[KLineData]] = {}
+        batch = await self.get_kline_columns_batch(symbols, period, limit=limit)
+        for symbol, columns in batch.items():
+            result[symbol] = [
+                KLineData(
+                    datetime=KLineTableManager.from_epoch(ts),
+                    open=open_, high=high, low=low, close=close,
+                    volume=volume, symbol=symbol
+                )
+                for ts, open_, high, low, close, volume in zip(
+                    columns["ts"].tolist(), columns["open"].tolist(), columns["high"].tolist(),
+                    columns["low"].tolist(), columns["close"].tolist(), columns["volume"].tolist()
+                )
+            ]
+        return result
 
     async def get_kline_data_from_db(self, symbol: str, period: str, limit: int = 1000) -> List['KLineData']:
         """
@@ -279,37 +492,10 @@ class KLineRepository(IKLineRepository):
         
         Args:
             symbol: 股票代码
-            period: 周期 ("K_DAY" 或 "K_60M")
+            period: 周期 ("K_DAY" 或 "K_60M"，也支持 "1d"/"1h")
             limit: 获取记录数限制
             
         Returns:
             List[KLineData]: K线数据列表，按时间正序
         """
-        try:
-            from ..core.interfaces import KLineData
-            
-            with db_service.get_session() as session:
-                klines = session.query(KLineDB).filter(
-                    KLineDB.code == symbol,
-                    KLineDB.period == period
-                ).order_by(KLineDB.time_key.desc()).limit(limit).all()
-                
-                # 转换为策略所需的KLineData格式
-                result = []
-                for kline in reversed(klines):  # 转为正序（时间从早到晚）
-                    kline_data = KLineData(
-                        datetime=datetime.strptime(kline.time_key, "%Y-%m-%d %H:%M:%S"),
-                        open=kline.open_price,
-                        high=kline.high_price,
-                        low=kline.low_price,
-                        close=kline.close_price,
-                        volume=kline.volume or 0,
-                        symbol=symbol
-                    )
-                    result.append(kline_data)
-                
-                return result
-                
-        except Exception as e:
-            logger.error(f"从数据库获取K线数据失败 {symbol} {period}: {e}")
-            return []
+        return (await self.get_kline_data_batch([symbol], period, limit)).get(symbol, [])
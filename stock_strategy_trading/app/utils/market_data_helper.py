@@ -22,6 +22,7 @@ from market_data import (
     MultiAccountProvider,
     HybridProvider,
     ScenarioRouter,
+    KLineCache,
 )
 
 __all__ = [
@@ -34,4 +35,5 @@ __all__ = [
     'MultiAccountProvider',
     'HybridProvider',
     'ScenarioRouter',
+    'KLineCache',
 ]
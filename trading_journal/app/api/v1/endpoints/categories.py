@@ -14,9 +14,13 @@ from ....models import (
     CategoryStockRelationCreate, CategoryHeatmapData
 )
 from ....repositories.kline_repository import KLineRepository
+from ....repositories.category_heatmap_repository import CategoryHeatmapRepository
+from ....repositories.category_repository import CategoryRepository
 from ....core.container import container
 
 router = APIRouter()
+category_repository = CategoryRepository()
+heatmap_repository = CategoryHeatmapRepository()
 
 
 def get_kline_repository() -> KLineRepository:
@@ -48,45 +52,6 @@ def update_category_path_and_level(session, category: CategoryDB):
             category.level = 0
 
 
-def update_stock_counts(session, category_id: str):
-    """更新分类及其祖先的股票数量"""
-    def count_stocks_recursive(cat_id: str) -> int:
-        """递归计算分类及其所有子分类的股票总数"""
-        # 直接关联的股票数
-        direct_count = session.query(CategoryStockRelationDB).filter(
-            CategoryStockRelationDB.category_id == cat_id
-        ).count()
-        
-        # 子分类的股票数
-        children = session.query(CategoryDB).filter(CategoryDB.parent_id == cat_id).all()
-        child_count = sum(count_stocks_recursive(child.category_id) for child in children)
-        
-        # 更新当前分类
-        category = session.query(CategoryDB).filter(CategoryDB.category_id == cat_id).first()
-        if category:
-            category.stock_count = direct_count
-            category.total_stock_count = direct_count + child_count
-        
-        return direct_count + child_count
-    
-    # 从当前分类开始向上更新
-    category = session.query(CategoryDB).filter(CategoryDB.category_id == category_id).first()
-    if category:
-        count_stocks_recursive(category_id)
-        
-        # 更新祖先分类
-        current = category
-        while current.parent_id:
-            parent = session.query(CategoryDB).filter(CategoryDB.category_id == current.parent_id).first()
-            if parent:
-                count_stocks_recursive(parent.category_id)
-                current = parent
-            else:
-                break
-    
-    session.commit()
-
-
 @router.post("/")
 async def create_category(category_data: CategoryCreate) -> Dict[str, Any]:
     """创建新分类"""
@@ -124,9 +89,12 @@ async def create_category(category_data: CategoryCreate) -> Dict[str, Any]:
             
             # 更新路径和层级
             update_category_path_and_level(session, new_category)
+            category_repository.bump_version(session)
             session.commit()
             session.refresh(new_category)
             
+            await category_repository.rebuild_closure()
+            
             return {
                 "success": True,
                 "data": {
@@ -154,78 +122,22 @@ async def get_categories(
 ) -> Dict[str, Any]:
     """获取分类列表或树形结构"""
     try:
-        with db_service.get_session() as session:
-            if flat:
-                # 返回扁平列表
-                categories = session.query(CategoryDB).filter(
-                    CategoryDB.is_active == True
-                ).order_by(CategoryDB.level, CategoryDB.sort_order).all()
-                
-                result = []
-                for cat in categories:
-                    result.append({
-                        "id": cat.id,
-                        "category_id": cat.category_id,
-                        "name": cat.name,
-                        "parent_id": cat.parent_id,
-                        "path": cat.path,
-                        "level": cat.level,
-                        "sort_order": cat.sort_order,
-                        "icon": cat.icon,
-                        "color": cat.color,
-                        "description": cat.description,
-                        "stock_count": cat.stock_count,
-                        "total_stock_count": cat.total_stock_count,
-                        "is_active": cat.is_active,
-                        "is_custom": cat.is_custom
-                    })
-                
-                return {
-                    "success": True,
-                    "data": result,
-                    "message": "获取分类列表成功"
-                }
-            else:
-                # 返回树形结构
-                def build_tree(parent_id: Optional[str]) -> List[Dict]:
-                    query = session.query(CategoryDB).filter(CategoryDB.is_active == True)
-                    if parent_id is None:
-                        query = query.filter(CategoryDB.parent_id.is_(None))
-                    else:
-                        query = query.filter(CategoryDB.parent_id == parent_id)
-                    
-                    categories = query.order_by(CategoryDB.sort_order).all()
-                    
-                    result = []
-                    for cat in categories:
-                        node = {
-                            "id": cat.id,
-                            "category_id": cat.category_id,
-                            "name": cat.name,
-                            "parent_id": cat.parent_id,
-                            "path": cat.path,
-                            "level": cat.level,
-                            "sort_order": cat.sort_order,
-                            "icon": cat.icon,
-                            "color": cat.color,
-                            "description": cat.description,
-                            "stock_count": cat.stock_count,
-                            "total_stock_count": cat.total_stock_count,
-                            "is_active": cat.is_active,
-                            "is_custom": cat.is_custom,
-                            "children": build_tree(cat.category_id)
-                        }
-                        result.append(node)
-                    
-                    return result
-                
-                tree = build_tree(parent_id)
-                
-                return {
-                    "success": True,
-                    "data": tree,
-                    "message": "获取分类树成功"
-                }
+        snapshot = await category_repository.get_snapshot()
+        
+        if flat:
+            # 返回扁平列表
+            return {
+                "success": True,
+                "data": snapshot.nodes,
+                "message": "获取分类列表成功"
+            }
+        
+        # 返回树形结构（内存中组装）
+        return {
+            "success": True,
+            "data": snapshot.build_tree(parent_id),
+            "message": "获取分类树成功"
+        }
                 
     except Exception as e:
         logger.error(f"获取分类失败: {e}")
@@ -289,6 +201,7 @@ async def update_category(category_id: str, category_data: CategoryUpdate) -> Di
             # 更新字段
             if category_data.name is not None:
                 category.name = category_data.name
+            old_parent_id = category.parent_id
             if category_data.parent_id is not None:
                 # 检查是否会形成循环
                 if category_data.parent_id == category_id:
@@ -331,9 +244,17 @@ async def update_category(category_id: str, category_data: CategoryUpdate) -> Di
                 
                 update_children(category)
             
+            category_repository.bump_version(session)
             session.commit()
             session.refresh(category)
             
+            if category_data.parent_id is not None:
+                await category_repository.rebuild_closure()
+                await category_repository.refresh_stock_counts(category_id)
+                if old_parent_id and old_parent_id != category.parent_id:
+                    await category_repository.refresh_stock_counts(old_parent_id)
+            await heatmap_repository.rebuild_snapshot()
+            
             return {
                 "success": True,
                 "data": {
@@ -380,34 +301,29 @@ async def delete_category(
                     detail="该分类下有子分类，请先删除子分类或使用force=true强制删除"
                 )
             
+            # 待删除的分类：自身，force时包含全部子孙分类
             if force:
-                # 递归删除所有子分类
-                def delete_children(parent_id: str):
-                    children = session.query(CategoryDB).filter(
-                        CategoryDB.parent_id == parent_id
-                    ).all()
-                    for child in children:
-                        delete_children(child.category_id)
-                        # 删除关联的股票
-                        session.query(CategoryStockRelationDB).filter(
-                            CategoryStockRelationDB.category_id == child.category_id
-                        ).delete()
-                        session.delete(child)
-                
-                delete_children(category_id)
+                doomed_ids = await category_repository.get_descendant_ids(category_id)
+            else:
+                doomed_ids = {category_id}
+            parent_id = category.parent_id
             
-            # 删除该分类的股票关联
+            # 删除股票关联和分类
             session.query(CategoryStockRelationDB).filter(
-                CategoryStockRelationDB.category_id == category_id
-            ).delete()
-            
-            # 删除分类
-            session.delete(category)
+                CategoryStockRelationDB.category_id.in_(doomed_ids)
+            ).delete(synchronize_session=False)
+            session.query(CategoryDB).filter(
+                CategoryDB.category_id.in_(doomed_ids)
+            ).delete(synchronize_session=False)
+            category_repository.bump_version(session)
             session.commit()
             
+            await category_repository.rebuild_closure()
+            
             # 更新父分类的股票数量
-            if category.parent_id:
-                update_stock_counts(session, category.parent_id)
+            if parent_id:
+                await category_repository.refresh_stock_counts(parent_id)
+            await heatmap_repository.rebuild_snapshot()
             
             return {
                 "success": True,
@@ -462,10 +378,12 @@ async def add_stock_to_category(
             )
             
             session.add(new_relation)
+            category_repository.bump_version(session)
             session.commit()
             
             # 更新分类的股票数量
-            update_stock_counts(session, category_id)
+            await category_repository.refresh_stock_counts(category_id)
+            await heatmap_repository.rebuild_snapshot()
             
             return {
                 "success": True,
@@ -493,10 +411,12 @@ async def remove_stock_from_category(category_id: str, stock_code: str) -> Dict[
                 raise HTTPException(status_code=404, detail="股票不在该分类中")
             
             session.delete(relation)
+            category_repository.bump_version(session)
             session.commit()
             
             # 更新分类的股票数量
-            update_stock_counts(session, category_id)
+            await category_repository.refresh_stock_counts(category_id)
+            await heatmap_repository.rebuild_snapshot()
             
             return {
                 "success": True,
@@ -526,28 +446,8 @@ async def get_category_stocks(
             if not category:
                 raise HTTPException(status_code=404, detail="分类不存在")
             
-            stock_codes = set()
-            
-            # 获取直接关联的股票
-            relations = session.query(CategoryStockRelationDB).filter(
-                CategoryStockRelationDB.category_id == category_id
-            ).all()
-            stock_codes.update(rel.stock_code for rel in relations)
-            
-            # 如果包含子分类
-            if include_children:
-                def get_children_stocks(parent_id: str):
-                    children = session.query(CategoryDB).filter(
-                        CategoryDB.parent_id == parent_id
-                    ).all()
-                    for child in children:
-                        child_relations = session.query(CategoryStockRelationDB).filter(
-                            CategoryStockRelationDB.category_id == child.category_id
-                        ).all()
-                        stock_codes.update(rel.stock_code for rel in child_relations)
-                        get_children_stocks(child.category_id)
-                
-                get_children_stocks(category_id)
+            # 直接关联的股票（include_children时通过闭包表包含整个子树）
+            stock_codes = await category_repository.get_stock_codes(category_id, include_children)
             
             # 获取股票详情
             stocks = []
@@ -602,110 +502,59 @@ async def get_category_stocks(
         raise HTTPException(status_code=500, detail=f"获取分类股票列表失败: {str(e)}")
 
 
+def heatmap_style(weighted_change: float) -> Dict[str, Any]:
+    """根据加权涨跌幅计算热度等级 (1-10) 和颜色"""
+    heat_level = min(10, max(1, int((abs(weighted_change) / 5) * 10) + 1))
+    
+    if weighted_change > 0:
+        # 红色系（上涨）
+        intensity = min(255, int((weighted_change / 10) * 255))
+        color = f"rgb({intensity}, 0, 0)"
+    elif weighted_change < 0:
+        # 绿色系（下跌）
+        intensity = min(255, int((abs(weighted_change) / 10) * 255))
+        color = f"rgb(0, {intensity}, 0)"
+    else:
+        color = "rgb(128, 128, 128)"
+    
+    return {"heat_level": heat_level, "color": color}
+
+
 @router.get("/heatmap/data")
-async def get_heatmap_data(
-    kline_repository: KLineRepository = Depends(get_kline_repository)
-) -> Dict[str, Any]:
-    """获取分类热力图数据"""
+async def get_heatmap_data() -> Dict[str, Any]:
+    """获取分类热力图数据（读取行情写入后物化的快照，父分类包含子分类的股票）"""
     try:
-        with db_service.get_session() as session:
-            # 获取所有活跃分类
-            categories = session.query(CategoryDB).filter(
-                CategoryDB.is_active == True
-            ).all()
-            
-            heatmap_data = []
-            
-            for category in categories:
-                # 获取该分类下的所有股票
-                relations = session.query(CategoryStockRelationDB).filter(
-                    CategoryStockRelationDB.category_id == category.category_id
-                ).all()
-                
-                if not relations:
-                    continue
-                
-                stock_codes = [rel.stock_code for rel in relations]
-                weights = {rel.stock_code: rel.weight for rel in relations}
-                
-                # 获取股票的最新价格数据
-                price_data = await kline_repository.get_latest_price_data(stock_codes)
-                
-                # 计算统计数据
-                total_weight = 0
-                weighted_change = 0
-                rising = 0
-                falling = 0
-                unchanged = 0
-                changes = []
-                
-                for stock_code in stock_codes:
-                    if stock_code in price_data:
-                        data = price_data[stock_code]
-                        change_percent = data.get('change_percent', 0)
-                        if change_percent is not None:
-                            changes.append(change_percent)
-                            weight = weights.get(stock_code, 1.0)
-                            total_weight += weight
-                            weighted_change += change_percent * weight
-                            
-                            if change_percent > 0:
-                                rising += 1
-                            elif change_percent < 0:
-                                falling += 1
-                            else:
-                                unchanged += 1
-                
-                if not changes:
-                    continue
-                
-                avg_change = sum(changes) / len(changes)
-                weighted_avg_change = weighted_change / total_weight if total_weight > 0 else 0
-                max_change = max(changes)
-                min_change = min(changes)
-                
-                # 计算热度等级 (1-10)
-                heat_level = min(10, max(1, int((abs(weighted_avg_change) / 5) * 10) + 1))
-                
-                # 确定颜色
-                if weighted_avg_change > 0:
-                    # 红色系（上涨）
-                    intensity = min(255, int((weighted_avg_change / 10) * 255))
-                    color = f"rgb({intensity}, 0, 0)"
-                elif weighted_avg_change < 0:
-                    # 绿色系（下跌）
-                    intensity = min(255, int((abs(weighted_avg_change) / 10) * 255))
-                    color = f"rgb(0, {intensity}, 0)"
-                else:
-                    color = "rgb(128, 128, 128)"
-                
-                heatmap_data.append({
-                    "category_id": category.category_id,
-                    "name": category.name,
-                    "path": category.path,
-                    "level": category.level,
-                    "parent_id": category.parent_id,
-                    "stock_count": len(stock_codes),
-                    "avg_change_percent": round(avg_change, 2),
-                    "weighted_change_percent": round(weighted_avg_change, 2),
-                    "total_market_value": 0,  # TODO: 计算市值
-                    "rising_count": rising,
-                    "falling_count": falling,
-                    "unchanged_count": unchanged,
-                    "max_change_percent": round(max_change, 2),
-                    "min_change_percent": round(min_change, 2),
-                    "heat_level": heat_level,
-                    "color": color
-                })
-            
-            # 按加权涨跌幅排序
-            heatmap_data.sort(key=lambda x: x["weighted_change_percent"], reverse=True)
-            
-            return {
-                "success": True,
-                "data": heatmap_data,
-                "message": "获取热力图数据成功"
-            }
+        rows = await heatmap_repository.get_snapshot()
+        
+        heatmap_data = []
+        for row in rows:
+            weighted_change = round(row.weighted_change_percent or 0, 2)
+            heatmap_data.append({
+                "category_id": row.category_id,
+                "name": row.name,
+                "path": row.path,
+                "level": row.level,
+                "parent_id": row.parent_id,
+                "stock_count": row.stock_count,
+                "avg_change_percent": round(row.avg_change_percent or 0, 2),
+                "weighted_change_percent": weighted_change,
+                "total_market_value": 0,  # TODO: 计算市值
+                "rising_count": row.rising_count,
+                "falling_count": row.falling_count,
+                "unchanged_count": row.unchanged_count,
+                "max_change_percent": round(row.max_change_percent or 0, 2),
+                "min_change_percent": round(row.min_change_percent or 0, 2),
+                **heatmap_style(weighted_change)
+            })
+        
+        snapshot_time = max((row.updated_at for row in rows if row.updated_at), default=None)
+        
+        return {
+            "success": True,
+            "data": heatmap_data,
+            "snapshot_time": snapshot_time.isoformat() if snapshot_time else None,
+            "message": "获取热力图数据成功"
+        }
             
     except Exception as e:
         logger.error(f"获取热力图数据失败: {e}")
@@ -757,6 +606,7 @@ async def batch_import_categories(data: Dict[str, Any]) -> Dict[str, Any]:
                     session.refresh(new_category)
                     
                     update_category_path_and_level(session, new_category)
+                    category_repository.bump_version(session)
                     session.commit()
                     
                     created_count += 1
@@ -768,6 +618,9 @@ async def batch_import_categories(data: Dict[str, Any]) -> Dict[str, Any]:
             for cat in categories:
                 create_category_recursive(cat)
             
+            if created_count:
+                await category_repository.rebuild_closure()
+            
             return {
                 "success": True,
                 "data": {
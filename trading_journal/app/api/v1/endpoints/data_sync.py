@@ -240,7 +240,7 @@ async def get_running_tasks() -> Dict[str, Any]:
         
         tasks_data = []
         for task in running_tasks:
-            tasks_data.append({
+            task_data = {
                 "task_id": task.task_id,
                 "status": task.status,
                 "progress": task.progress,
@@ -251,7 +251,11 @@ async def get_running_tasks() -> Dict[str, Any]:
                 "task_type": task.task_type,
                 "start_time": task.start_time.isoformat() if task.start_time else None,
                 "created_at": task.created_at.isoformat() if task.created_at else None
-            })
+            }
+            live = data_sync_service.task_repository.get_live_progress(task.task_id)
+            if live:
+                task_data.update({key: value for key, value in live.items() if key in task_data})
+            tasks_data.append(task_data)
         
         return {
             "success": True,
@@ -311,6 +315,10 @@ async def get_recent_tasks(limit: int = Query(10, ge=1, le=50)) -> Dict[str, Any
 async def cancel_task(task_id: str) -> Dict[str, Any]:
     """取消指定的数据同步任务"""
     try:
+        # 通知运行中的同步流水线停止，再更新任务记录
+        data_sync_service.cancel_sync(task_id)
+        # 队列任务：尚未认领的单元不再执行
+        await smart_sync_service.sync_queue.cancel_task(task_id)
         success = await data_sync_service.task_repository.cancel_task(task_id)
         
         if not success:
@@ -636,6 +644,43 @@ async def get_smart_sync_overview() -> Dict[str, Any]:
         )
 
 
+@router.get("/sync/smart/gaps")
+async def get_sync_gaps(
+    stock_codes: List[str] = Query(None, description="指定股票代码列表，为空则统计所有")
+) -> Dict[str, Any]:
+    """
+    获取每只股票的数据缺口统计
+    
+    按交易日历比对目标范围内已有K线的交易日，返回缺失交易日数、连续缺失区间数和合并后的请求数。
+    
+    Returns:
+        {股票代码: {时间周期: {missing_sessions, gap_ranges, requests}}}
+    """
+    try:
+        gaps = await smart_sync_service.get_gap_summary(stock_codes)
+        stocks_with_gaps = sum(
+            1 for timeframe_gaps in gaps.values()
+            if any(stats["missing_sessions"] for stats in timeframe_gaps.values())
+        )
+        
+        return {
+            "success": True,
+            "summary": {
+                "total_stocks": len(gaps),
+                "stocks_with_gaps": stocks_with_gaps
+            },
+            "gaps": gaps,
+            "current_time": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"获取数据缺口统计失败: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取数据缺口统计失败: {str(e)}"
+        )
+
+
 @router.post("/sync/smart/initialize")
 async def initialize_sync_status() -> Dict[str, Any]:
     """
@@ -685,3 +730,102 @@ async def initialize_sync_status() -> Dict[str, Any]:
             status_code=500,
             detail=f"初始化同步状态失败: {str(e)}"
         )
+
+
+# ==================== 同步队列API ====================
+
+@router.post("/sync/queue/enqueue")
+async def enqueue_sync(
+    stock_codes: List[str] = Query(None, description="指定要同步的股票代码列表，为空则同步所有")
+) -> Dict[str, Any]:
+    """
+    分析同步需求并放入同步队列
+    
+    每个 (股票, 周期, 日期范围) 作为一个工作单元，由独立的同步worker进程认领执行
+    （python scripts/run_sync_worker.py，可多机多进程运行）。
+    
+    Returns:
+        任务ID与入队单元数
+    """
+    try:
+        result = await smart_sync_service.enqueue_sync(stock_codes)
+        
+        return {
+            "success": True,
+            "message": (
+                "所有数据已是最新" if result["task_id"] is None
+                else "同步范围已在队列中" if not result["enqueued_units"]
+                else "同步单元已入队"
+            ),
+            **result,
+            "enqueue_time": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"同步队列入队失败: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"同步队列入队失败: {str(e)}"
+        )
+
+
+@router.get("/sync/queue/tasks/{task_id}")
+async def get_queue_task_progress(task_id: str) -> Dict[str, Any]:
+    """
+    获取队列任务的执行进度
+    
+    Returns:
+        任务状态与各状态的单元数（按周期细分）
+    """
+    try:
+        task_status = await data_sync_service.task_repository.get_status(task_id)
+        if task_status is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"任务不存在: {task_id}"
+            )
+        
+        progress = await smart_sync_service.sync_queue.get_task_progress(task_id)
+        finished = progress.get("done", 0) + progress.get("failed", 0)
+        
+        return {
+            "success": True,
+            "task_id": task_id,
+            "status": task_status,
+            "progress": round(finished / progress["total"] * 100, 1) if progress.get("total") else 0.0,
+            "units": progress
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取队列任务进度失败: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取队列任务进度失败: {str(e)}"
+        )
+
+
+@router.get("/sync/queue/stats")
+async def get_queue_stats() -> Dict[str, Any]:
+    """
+    获取同步队列状态
+    
+    Returns:
+        各状态单元数、可立即认领的单元数、持有租约的worker及数量
+    """
+    try:
+        stats = await smart_sync_service.sync_queue.get_queue_stats()
+        
+        return {
+            "success": True,
+            "queue": stats,
+            "current_time": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"获取同步队列状态失败: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取同步队列状态失败: {str(e)}"
+        )
@@ -2,14 +2,18 @@
 股票API端点
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
 from loguru import logger
+from sqlalchemy import and_, or_
+import base64
+import json
 
 from ....core.container import container
 from ....repositories.stock_repository import StockRepository
 from ....repositories.kline_repository import KLineRepository
 from ....database import db_service
-from ....models import StockDB
+from ....models import StockDB, LatestQuoteDB, CategoryStockRelationDB
 
 router = APIRouter()
 
@@ -76,12 +80,29 @@ async def get_all_stocks(
         raise HTTPException(status_code=500, detail="获取股票列表失败")
 
 
+def _encode_cursor(value: Any, stock_id: int) -> str:
+    """把最后一行的排序值和ID编码为翻页游标"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, stock_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str, sort_field: str) -> Tuple[Any, int]:
+    """解析翻页游标，返回 (排序值, 股票ID)"""
+    value, stock_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if value is not None and sort_field == 'updated_at':
+        value = datetime.fromisoformat(value)
+    return value, int(stock_id)
+
+
 @router.get("/overview")
 async def get_stocks_overview(
     stock_repository: StockRepository = Depends(get_stock_repository),
     kline_repository: KLineRepository = Depends(get_kline_repository),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="翻页游标（上一页返回的nextCursor），传入时忽略page"),
     category_id: Optional[str] = Query(None, description="按分类过滤"),
     sort_field: Optional[str] = Query("updated_at", description="排序字段: name, price, change_percent, market, updated_at"),
     sort_order: Optional[str] = Query("desc", description="排序顺序: asc, desc"),
@@ -90,28 +111,40 @@ async def get_stocks_overview(
     change_percent_min: Optional[float] = Query(None, description="涨跌幅最小值(%)"),
     change_percent_max: Optional[float] = Query(None, description="涨跌幅最大值(%)")
 ) -> Dict[str, Any]:
-    """获取股票概览分页列表（从本地K线数据获取价格）
+    """获取股票概览分页列表（从本地最新行情表获取价格）
 
     - 返回字段包含：symbol、name、market、group_name、updated_at
-    - 价格数据从本地K线数据表获取最新价格和涨跌幅，不依赖外部API
-    - 分类筛选功能使用category_id参数
+    - 价格和涨跌幅来自 latest_quotes，筛选、排序、分页都在数据库完成
+    - 分类筛选功能使用category_id参数（关联查询）
+    - 传入cursor时按游标翻页（keyset），翻页耗时不随页码增长
     """
     from math import ceil
 
     try:
         with db_service.get_session() as session:
-            query = session.query(StockDB).filter(StockDB.is_active == True)
+            query = session.query(StockDB, LatestQuoteDB).outerjoin(
+                LatestQuoteDB, LatestQuoteDB.code == StockDB.code
+            ).filter(StockDB.is_active == True)
 
             # 分类筛选（使用categories系统）
             if category_id:
-                from ..models import CategoryStockRelationDB
-                rel_symbols = [rel.stock_code for rel in session.query(CategoryStockRelationDB).filter(
-                    CategoryStockRelationDB.category_id == category_id
-                ).all()]
-                if rel_symbols:
-                    query = query.filter(StockDB.code.in_(rel_symbols))
-                else:
-                    return {"success": True, "data": {"stocks": [], "total": 0, "page": page, "pageSize": page_size, "totalPages": 0}}
+                query = query.join(
+                    CategoryStockRelationDB,
+                    and_(
+                        CategoryStockRelationDB.stock_code == StockDB.code,
+                        CategoryStockRelationDB.category_id == category_id
+                    )
+                )
+
+            # 价格/涨跌幅筛选（没有行情的股票自然被排除）
+            if price_min is not None:
+                query = query.filter(LatestQuoteDB.last_close >= price_min)
+            if price_max is not None:
+                query = query.filter(LatestQuoteDB.last_close <= price_max)
+            if change_percent_min is not None:
+                query = query.filter(LatestQuoteDB.change_percent >= change_percent_min)
+            if change_percent_max is not None:
+                query = query.filter(LatestQuoteDB.change_percent <= change_percent_max)
 
             total = query.count()
             
@@ -119,127 +152,53 @@ async def get_stocks_overview(
             sort_field_map = {
                 'name': StockDB.name,
                 'market': StockDB.market,
-                'updated_at': StockDB.updated_at
+                'updated_at': StockDB.updated_at,
+                'price': LatestQuoteDB.last_close,
+                'change_percent': LatestQuoteDB.change_percent
             }
+            if sort_field not in sort_field_map:
+                sort_field = 'updated_at'
+            order_column = sort_field_map[sort_field]
+            descending = (sort_order or 'desc').lower() != 'asc'
             
-            # 默认排序字段
-            order_column = sort_field_map.get(sort_field, StockDB.updated_at)
+            # 游标翻页: 取排在 (value, id) 之后的行，空值始终排在最后
+            if cursor:
+                last_value, last_id = _decode_cursor(cursor, sort_field)
+                id_after = StockDB.id < last_id if descending else StockDB.id > last_id
+                if last_value is None:
+                    query = query.filter(order_column.is_(None), id_after)
+                else:
+                    value_after = order_column < last_value if descending else order_column > last_value
+                    query = query.filter(or_(
+                        value_after,
+                        and_(order_column == last_value, id_after),
+                        order_column.is_(None)
+                    ))
             
-            # 应用排序
-            if sort_order.lower() == 'asc':
-                query = query.order_by(order_column.asc())
-            else:
-                query = query.order_by(order_column.desc())
+            # 应用排序（空值在后，ID作为稳定的次序）
+            query = query.order_by(
+                order_column.is_(None),
+                order_column.desc() if descending else order_column.asc(),
+                StockDB.id.desc() if descending else StockDB.id.asc()
+            )
             
-            items = (query
-                     .offset((page - 1) * page_size)
-                     .limit(page_size)
-                     .all())
+            if not cursor:
+                query = query.offset((page - 1) * page_size)
+            rows = query.limit(page_size).all()
 
-            # 对于价格和涨跌幅排序或筛选，需要特殊处理
-            has_price_filter = (price_min is not None or price_max is not None or 
-                               change_percent_min is not None or change_percent_max is not None)
-            
-            if sort_field in ['price', 'change_percent'] or has_price_filter:
-                # 获取所有股票的最新K线价格数据，然后在Python中处理
-                all_stock_codes = [s.code for s in session.query(StockDB).filter(StockDB.is_active == True).all()]
-                
-                # 从K线数据获取最新价格信息
-                kline_prices = await kline_repository.get_latest_price_data(all_stock_codes)
-                
-                # 重新获取所有符合条件的股票
-                query_for_sorting = session.query(StockDB).filter(StockDB.is_active == True)
-                
-                # 应用分类筛选
-                if category_id:
-                    from ..models import CategoryStockRelationDB
-                    rel_symbols = [rel.stock_code for rel in session.query(CategoryStockRelationDB).filter(
-                        CategoryStockRelationDB.category_id == category_id
-                    ).all()]
-                    if rel_symbols:
-                        query_for_sorting = query_for_sorting.filter(StockDB.code.in_(rel_symbols))
-                    else:
-                        return {"success": True, "data": {"stocks": [], "total": 0, "page": page, "pageSize": page_size, "totalPages": 0}}
-                
-                all_stocks = query_for_sorting.all()
-                
-                # 在Python中进行价格筛选
-                def passes_price_filter(stock):
-                    kline_data = kline_prices.get(stock.code)
-                    if not kline_data:
-                        # 如果没有K线数据，价格筛选时排除
-                        if has_price_filter:
-                            return False
-                        return True
-                    
-                    # 价格筛选
-                    if price_min is not None or price_max is not None:
-                        price = kline_data.get('price')
-                        if price is None:
-                            return False
-                        if price_min is not None and price < price_min:
-                            return False
-                        if price_max is not None and price > price_max:
-                            return False
-                    
-                    # 涨跌幅筛选
-                    if change_percent_min is not None or change_percent_max is not None:
-                        change_percent = kline_data.get('change_percent')
-                        if change_percent is None:
-                            return False
-                        if change_percent_min is not None and change_percent < change_percent_min:
-                            return False
-                        if change_percent_max is not None and change_percent > change_percent_max:
-                            return False
-                    
-                    return True
-                
-                # 应用价格筛选
-                filtered_stocks = [stock for stock in all_stocks if passes_price_filter(stock)]
-                
-                # 在Python中进行排序
-                def get_sort_key(stock):
-                    kline_data = kline_prices.get(stock.code)
-                    if not kline_data:
-                        return float('-inf') if sort_order.lower() == 'desc' else float('inf')
-                    
-                    if sort_field == 'price':
-                        price = kline_data.get('price')
-                        return price if price is not None else (float('-inf') if sort_order.lower() == 'desc' else float('inf'))
-                    elif sort_field == 'change_percent':
-                        change_percent = kline_data.get('change_percent')
-                        return change_percent if change_percent is not None else (float('-inf') if sort_order.lower() == 'desc' else float('inf'))
-                    
-                    return 0
-                
-                sorted_stocks = sorted(filtered_stocks, key=get_sort_key, reverse=(sort_order.lower() == 'desc'))
-                
-                # 应用分页
-                start_idx = (page - 1) * page_size
-                end_idx = start_idx + page_size
-                items = sorted_stocks[start_idx:end_idx]
-                total = len(sorted_stocks)
-                
-                latest_kline_prices = kline_prices
-            else:
-                # 批量获取股票的最新K线价格数据
-                stock_codes = [s.code for s in items]
-                latest_kline_prices = {}
-                
-                if stock_codes:
-                    # 从K线数据获取最新价格信息
-                    latest_kline_prices = await kline_repository.get_latest_price_data(stock_codes)
+            # latest_quotes 中还没有的股票（如历史数据未补建）按页补取
+            missing = [stock.code for stock, quote in rows if quote is None]
+            fallback_prices = await kline_repository.get_latest_price_data(missing) if missing else {}
 
             # 组装返回数据
             stocks = []
-            for stock in items:
-                # 获取价格和涨跌幅数据
-                kline_data = latest_kline_prices.get(stock.code)
-                price = None
-                change_percent = None
-                last_update = None
-                
-                if kline_data:
+            for stock, quote in rows:
+                if quote is not None:
+                    price = quote.last_close
+                    change_percent = quote.change_percent
+                    last_update = quote.time_key
+                else:
+                    kline_data = fallback_prices.get(stock.code) or {}
                     price = kline_data.get('price')
                     change_percent = kline_data.get('change_percent')
                     last_update = kline_data.get('last_update')
@@ -255,6 +214,17 @@ async def get_stocks_overview(
                     "last_price_update": last_update
                 })
 
+            next_cursor = None
+            if len(rows) == page_size:
+                last_stock, last_quote = rows[-1]
+                if sort_field == 'price':
+                    last_value = last_quote.last_close if last_quote else None
+                elif sort_field == 'change_percent':
+                    last_value = last_quote.change_percent if last_quote else None
+                else:
+                    last_value = getattr(last_stock, sort_field)
+                next_cursor = _encode_cursor(last_value, last_stock.id)
+
         return {
             "success": True,
             "data": {
@@ -262,7 +232,8 @@ async def get_stocks_overview(
                 "total": total,
                 "page": page,
                 "pageSize": page_size,
-                "totalPages": ceil(total / page_size) if page_size else 0
+                "totalPages": ceil(total / page_size) if page_size else 0,
+                "nextCursor": next_cursor
             },
             "message": "获取股票概览成功"
         }
@@ -330,30 +301,48 @@ async def import_stocks(payload: Dict[str, Any]) -> Dict[str, Any]:
         added = 0
         updated = 0
 
+        items: Dict[str, Dict[str, Any]] = {}
+        for item in stocks:
+            code = (item.get("code") or item.get("symbol") or "").strip().upper()
+            name = item.get("name") or ""
+            if not code or not name:
+                continue
+            items[code] = {"name": name, "market": item.get("market") or "US"}
+
+        # 传入 validate=true 时批量验证代码（命中缓存的不再请求数据源），无法判断的代码照常导入
+        invalid_codes: List[str] = []
+        if payload.get("validate", False) and items:
+            market_data_service = container.get_market_data_service()
+            validity = await market_data_service.validate_stock_symbols(list(items.keys()))
+            invalid_codes = [code for code, valid in validity.items() if valid is False]
+            for code in invalid_codes:
+                items.pop(code, None)
+
         with db_service.get_session() as session:
-            for item in stocks:
-                code = (item.get("code") or item.get("symbol") or "").strip().upper()
-                name = item.get("name") or ""
-                market = item.get("market") or "US"
-                if not code or not name:
-                    continue
-
-                existing = session.query(StockDB).filter(StockDB.code == code).first()
+            existing_stocks = {
+                stock.code: stock
+                for stock in session.query(StockDB).filter(StockDB.code.in_(list(items.keys()))).all()
+            } if items else {}
+
+            for code, item in items.items():
+                existing = existing_stocks.get(code)
                 if existing:
-                    existing.name = name
-                    existing.market = market
+                    existing.name = item["name"]
+                    existing.market = item["market"]
                     existing.is_active = True
                     updated += 1
                 else:
-                    session.add(StockDB(code=code, name=name, market=market, is_active=True))
+                    session.add(StockDB(code=code, name=item["name"], market=item["market"], is_active=True))
                     added += 1
-                session.commit()
+            session.commit()
 
         return {
             "success": True,
             "data": {
                 "added_count": added,
-                "updated_count": updated
+                "updated_count": updated,
+                "invalid_count": len(invalid_codes),
+                "invalid_symbols": invalid_codes
             },
             "message": "批量导入完成"
         }
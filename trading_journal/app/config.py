@@ -40,6 +40,28 @@ class Settings(BaseSettings):
     max_requests_per_minute: int = 100
     max_quote_batch_size: int = 200
     max_kline_days: int = 730  # 增加到2年，支持更多历史数据用于技术分析
+    kline_upsert_chunk_size: int = 1000  # K线批量写入时每条SQL的行数
+    kline_stats_cache_ttl: int = 300  # K线数据统计缓存时间（秒），同步完成时主动失效
+    kline_rollup_enabled: bool = True  # 写入1分钟/小时/日线后自动汇总出更粗周期的K线
+    market_session_open: str = "09:30"  # 交易时段开盘时间（交易所本地时间），日内汇总按此对齐
+    kline_cache_max_mb: int = 128  # 进程内K线缓存内存预算（MB），超出按LRU淘汰
+    kline_cache_refresh_interval: int = 60  # 命中的缓存多久向数据库核对一次新K线（秒）
+    
+    # 数据同步流水线
+    sync_fetch_workers: int = 0  # 拉取并发数，0表示使用 sync_max_fetch_workers
+    sync_max_fetch_workers: int = 8  # 默认拉取并发数
+    sync_fetch_requests_per_second: float = 0.0  # 拉取的总请求速率（次/秒），0表示按数据源限速推算
+    sync_write_queue_size: int = 32  # 拉取与写库之间的缓冲队列长度
+    sync_progress_flush_every: int = 20  # 任务进度每处理多少只股票写一次数据库
+    sync_progress_flush_interval: float = 2.0  # 任务进度最长多久写一次数据库（秒）
+    smart_sync_gap_merge_sessions: int = 5  # 智能同步时相隔不超过N个交易日的缺口合并为一次请求
+    sync_queue_max_attempts: int = 3  # 同步队列单元最多认领次数（含租约过期），超出置为失败
+    sync_queue_retry_delay: float = 60.0  # 同步队列单元失败后延后多久重新认领（秒，按次数递增）
+    sync_worker_concurrency: int = 4  # 每个同步worker进程并发执行的单元数
+    sync_worker_batch_size: int = 4  # 同步worker每次认领的单元数
+    sync_worker_lease_seconds: int = 300  # 同步单元租约时长（秒），过期未完成的单元由其他worker重新认领
+    sync_worker_requests_per_second: float = 2.0  # 每个同步worker的数据源请求配额（次/秒），0表示不限
+    sync_worker_poll_interval: float = 2.0  # 队列为空时同步worker的轮询间隔（秒）
     
     # 市场数据源配置
     market_data_provider: str = "multi"  # 可选: yahoo, alphavantage, finnhub, twelvedata, hybrid, multi
@@ -70,6 +92,11 @@ class Settings(BaseSettings):
         "finnhub:1:40,twelvedata:1:30,alphavantage:2:15,yahoo:3:15"
     )
     
+    # 股票代码注册表缓存（有效性/基本信息持久化缓存，symbol_registry 表）
+    symbol_valid_ttl: int = 7 * 86400  # 有效代码缓存时间（秒）
+    symbol_invalid_ttl: int = 86400  # 无效代码负缓存时间（秒）
+    symbol_info_ttl: int = 30 * 86400  # 基本信息缓存时间（秒）
+    
     # 数据源优先级（hybrid模式下）
     primary_data_source: str = "finnhub"  # 主要数据源
     
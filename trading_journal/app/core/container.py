@@ -9,9 +9,11 @@ from .interfaces import (
     IMarketDataProvider, IStockRepository, IKLineRepository,
     IStrategyRepository, ISelectionResultRepository
 )
-from ..utils.market_data_helper import YahooFinanceProvider
+from ..config import settings
+from ..utils.market_data_helper import YahooFinanceProvider, SymbolRegistry
 from ..repositories.stock_repository import StockRepository
 from ..repositories.kline_repository import KLineRepository
+from ..repositories.symbol_registry_repository import SymbolRegistryRepository
 from ..services.market_data_service import MarketDataService
 
 
@@ -33,6 +35,14 @@ class Container:
             # 创建数据提供者
             self._services['market_data_provider'] = YahooFinanceProvider(rate_limit_delay=0.2)
             
+            # 股票代码注册表缓存（所有数据源共用，存储在MySQL中供各进程共享）
+            self._services['symbol_registry'] = SymbolRegistry(
+                SymbolRegistryRepository(),
+                valid_ttl=settings.symbol_valid_ttl,
+                invalid_ttl=settings.symbol_invalid_ttl,
+                info_ttl=settings.symbol_info_ttl
+            )
+            
             # 创建仓库
             self._services['stock_repository'] = StockRepository()
             self._services['kline_repository'] = KLineRepository()
@@ -41,7 +51,8 @@ class Container:
             self._services['market_data_service'] = MarketDataService(
                 self._services['market_data_provider'],
                 self._services['stock_repository'],
-                self._services['kline_repository']
+                self._services['kline_repository'],
+                symbol_registry=self._services['symbol_registry']
             )
             
             # 注意: strategy_service 已迁移到 quant_trading 模块
@@ -166,6 +166,24 @@ class IKLineRepository(ABC):
         """保存K线数据"""
         pass
     
+    @abstractmethod
+    async def save_kline_batch(self, symbol: str, timeframe: str, klines: List[KLineData]) -> Dict[str, Any]:
+        """批量保存K线数据，返回写入统计"""
+        pass
+    
+    @abstractmethod
+    async def get_last_datetimes(self, symbols: List[str], timeframe: str) -> Dict[str, datetime]:
+        """批量获取最新一条K线的时间"""
+        pass
+    
+    def invalidate_statistics_cache(self) -> None:
+        """数据变化后清除统计缓存，默认无缓存"""
+        pass
+    
+    async def backfill_latest_quotes(self) -> int:
+        """补建缺少的最新行情（启动时调用），默认无需补建"""
+        return 0
+    
     @abstractmethod
     async def cleanup_old_data(self, cutoff_date: datetime) -> int:
         """清理过期数据"""
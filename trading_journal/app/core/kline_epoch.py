@@ -0,0 +1,109 @@
+"""
+K线表整数时间列 ts 的结构检查与迁移
+
+ts 列为非空列：新建的表由 create_all 直接建成非空列；已有的表在启动时
+添加列和 (code, ts) 索引、分批回填，全部回填后改为 NOT NULL。
+多个进程同时启动时用 MySQL 命名锁串行执行。
+"""
+from typing import List
+
+from sqlalchemy import text, inspect
+from loguru import logger
+
+from ..models import KLineTableManager
+
+# 每批回填的行数（避免长事务锁表）
+BACKFILL_BATCH_SIZE = 50000
+
+# 迁移使用的 MySQL 命名锁
+MIGRATION_LOCK = "zhixing_kline_epoch_migration"
+MIGRATION_LOCK_TIMEOUT = 3600
+
+
+def pending_kline_tables(engine) -> List:
+    """ts 列缺失或仍可为空（未完成回填）的K线表模型"""
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    pending = []
+    for model in KLineTableManager.ALL_MODELS:
+        if model.__tablename__ not in existing:
+            continue
+        columns = {col['name']: col for col in inspector.get_columns(model.__tablename__)}
+        ts = columns.get('ts')
+        if ts is None or ts['nullable']:
+            pending.append(model)
+    return pending
+
+
+def _ts_index_name(model) -> str:
+    return next(
+        index.name for index in model.__table__.indexes
+        if [col.name for col in index.columns] == ['code', 'ts']
+    )
+
+
+def migrate_kline_table(conn, model) -> int:
+    """为单个K线表添加、回填 ts 列并改为非空，返回回填行数"""
+    table_name = model.__tablename__
+    index_name = _ts_index_name(model)
+    inspector = inspect(conn)
+    columns = {col['name'] for col in inspector.get_columns(table_name)}
+    indexes = {index['name'] for index in inspector.get_indexes(table_name)}
+
+    if 'ts' not in columns:
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN ts BIGINT NULL AFTER trade_time"))
+        conn.commit()
+        logger.info(f"✅ {table_name}: 已添加 ts 列")
+
+    if index_name not in indexes:
+        conn.execute(text(f"CREATE INDEX {index_name} ON {table_name} (code, ts)"))
+        conn.commit()
+        logger.info(f"✅ {table_name}: 已添加索引 {index_name}")
+
+    # 与 KLineTableManager.to_epoch 一致：不做时区换算
+    backfilled = 0
+    while True:
+        result = conn.execute(text(f"""
+            UPDATE {table_name}
+            SET ts = TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', trade_time)
+            WHERE ts IS NULL
+            LIMIT {BACKFILL_BATCH_SIZE}
+        """))
+        conn.commit()
+        backfilled += result.rowcount or 0
+        if (result.rowcount or 0) < BACKFILL_BATCH_SIZE:
+            break
+
+    comment = model.__table__.c.ts.comment
+    conn.execute(text(f"ALTER TABLE {table_name} MODIFY COLUMN ts BIGINT NOT NULL COMMENT '{comment}'"))
+    conn.commit()
+    logger.info(f"✅ {table_name}: 回填 {backfilled} 行，ts 已改为非空")
+    return backfilled
+
+
+def ensure_kline_epoch(engine):
+    """
+    确保所有K线表的 ts 列已回填且非空（启动时调用，已完成时只做结构检查）
+
+    Raises:
+        RuntimeError: 等待其他进程的迁移超时
+    """
+    if not pending_kline_tables(engine):
+        return
+
+    with engine.connect() as conn:
+        acquired = conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": MIGRATION_LOCK, "timeout": MIGRATION_LOCK_TIMEOUT}
+        ).scalar()
+        if acquired != 1:
+            raise RuntimeError("等待K线表 ts 列迁移锁超时")
+        try:
+            # 拿到锁后重新检查：其他进程可能已完成迁移
+            pending = pending_kline_tables(engine)
+            if pending:
+                logger.info(f"开始K线表 ts 列迁移: {', '.join(m.__tablename__ for m in pending)}")
+            for model in pending:
+                migrate_kline_table(conn, model)
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK})
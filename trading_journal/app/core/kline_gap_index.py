@@ -0,0 +1,124 @@
+"""
+K线交易日缺口索引
+每只股票每个周期一个交易日位图（按交易日序号），据此求最小缺失区间并合并为尽量少的数据源请求
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Tuple
+
+import numpy as np
+
+from .trading_calendar import TradingCalendar
+
+
+@dataclass
+class SessionBitmap:
+    """
+    交易日位图
+
+    第i位对应交易日序号 start + i；位图范围之外的交易日视为缺失。
+    小时线等日内周期按交易日粒度记录（当天有任一K线即视为已有）。
+    """
+    start: int
+    bits: np.ndarray  # bool
+
+    @classmethod
+    def empty(cls) -> "SessionBitmap":
+        return cls(start=0, bits=np.zeros(0, dtype=bool))
+
+    @classmethod
+    def from_bytes(cls, start: int, count: int, data: bytes) -> "SessionBitmap":
+        if not count or not data:
+            return cls(start=start, bits=np.zeros(0, dtype=bool))
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count).astype(bool)
+        return cls(start=start, bits=bits)
+
+    @classmethod
+    def from_ordinals(cls, ordinals) -> "SessionBitmap":
+        bitmap = cls.empty()
+        bitmap.mark(ordinals)
+        return bitmap
+
+    def to_bytes(self) -> bytes:
+        return np.packbits(self.bits).tobytes()
+
+    @property
+    def end(self) -> int:
+        """位图覆盖的最后一个序号 + 1"""
+        return self.start + len(self.bits)
+
+    @property
+    def present_count(self) -> int:
+        return int(self.bits.sum())
+
+    def mark(self, ordinals) -> int:
+        """
+        标记交易日已有数据（需要时扩展位图）
+
+        Returns:
+            新标记的交易日数
+        """
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        ordinals = ordinals[ordinals >= 0]
+        if not len(ordinals):
+            return 0
+
+        if not len(self.bits):
+            self.start = int(ordinals.min())
+        low = min(self.start, int(ordinals.min()))
+        high = max(self.end, int(ordinals.max()) + 1)
+        if low != self.start or high != self.end:
+            bits = np.zeros(high - low, dtype=bool)
+            bits[self.start - low:self.end - low] = self.bits
+            self.start, self.bits = low, bits
+
+        before = self.present_count
+        self.bits[ordinals - self.start] = True
+        return self.present_count - before
+
+    def missing_runs(self, first: int, last: int) -> List[Tuple[int, int]]:
+        """[first, last] 内连续缺失的交易日序号区间（闭区间），即最小缺失范围"""
+        if last < first:
+            return []
+        present = np.zeros(last - first + 1, dtype=bool)
+        lo, hi = max(first, self.start), min(last + 1, self.end)
+        if lo < hi:
+            present[lo - first:hi - first] = self.bits[lo - self.start:hi - self.start]
+
+        # 缺失标记两端补0后，差分为1处是缺失区间开始，为-1处是结束的下一位
+        edges = np.diff(np.concatenate(([0], (~present).astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1) - 1
+        return [(first + int(s), first + int(e)) for s, e in zip(starts, ends)]
+
+
+def coalesce_runs(runs: List[Tuple[int, int]], max_gap: int) -> List[Tuple[int, int]]:
+    """相隔不超过 max_gap 个已有交易日的缺失区间合并（少量重复拉取换更少的请求次数）"""
+    merged: List[Tuple[int, int]] = []
+    for first, last in runs:
+        if merged and first - merged[-1][1] - 1 <= max_gap:
+            merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def missing_date_ranges(
+    bitmap: SessionBitmap,
+    calendar: TradingCalendar,
+    start: date,
+    end: date,
+    max_gap: int = 0
+) -> List[Tuple[date, date, int]]:
+    """
+    [start, end] 内的缺失交易日区间
+
+    Returns:
+        [(首个缺失交易日, 最后缺失交易日, 区间内缺失交易日数)]，按 max_gap 合并后的结果
+    """
+    runs = bitmap.missing_runs(calendar.ordinal(start), calendar.ordinal_before(end))
+    result = []
+    for first, last in coalesce_runs(runs, max_gap):
+        missing = sum(e - s + 1 for s, e in runs if s >= first and e <= last)
+        result.append((calendar.session(first), calendar.session(last), missing))
+    return result
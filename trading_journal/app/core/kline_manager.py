@@ -2,12 +2,17 @@
 K线数据管理器
 提供统一的K线数据访问接口，自动路由到对应的时间周期表
 """
+import time
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import and_, bindparam, desc, func, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 
-from app.models import KLineTableManager
+import numpy as np
+
+from app.models import KLineTableManager, KLineDailyDB, LatestQuoteDB
+from .kline_cache import kline_cache
 from loguru import logger
 
 
@@ -148,12 +153,14 @@ class KLineManager:
         """
         try:
             model = self._get_model(period)
+            trade_time = kline_data.get("trade_time", datetime.utcnow())
             
             # 创建新记录
             kline = model(
                 code=code,
                 time_key=kline_data.get("time_key"),
-                trade_time=kline_data.get("trade_time", datetime.utcnow()),
+                trade_time=trade_time,
+                ts=KLineTableManager.to_epoch(trade_time),
                 open_price=kline_data["open_price"],
                 close_price=kline_data["close_price"],
                 high_price=kline_data["high_price"],
@@ -166,6 +173,7 @@ class KLineManager:
             
             self.session.add(kline)
             self.session.commit()
+            kline_cache.invalidate(code, self.normalize_period(period))
             
             return True
         
@@ -211,6 +219,7 @@ class KLineManager:
                 if existing:
                     # 更新现有记录
                     existing.trade_time = kline_data.get("trade_time", existing.trade_time)
+                    existing.ts = KLineTableManager.to_epoch(existing.trade_time)
                     existing.open_price = kline_data.get("open_price", existing.open_price)
                     existing.close_price = kline_data.get("close_price", existing.close_price)
                     existing.high_price = kline_data.get("high_price", existing.high_price)
@@ -223,10 +232,12 @@ class KLineManager:
                 
                 else:
                     # 插入新记录
+                    trade_time = kline_data.get("trade_time", datetime.utcnow())
                     kline = model(
                         code=code,
                         time_key=time_key,
-                        trade_time=kline_data.get("trade_time", datetime.utcnow()),
+                        trade_time=trade_time,
+                        ts=KLineTableManager.to_epoch(trade_time),
                         open_price=kline_data["open_price"],
                         close_price=kline_data["close_price"],
                         high_price=kline_data["high_price"],
@@ -240,6 +251,7 @@ class KLineManager:
                     inserted_count += 1
             
             self.session.commit()
+            kline_cache.invalidate(code, self.normalize_period(period))
             logger.info(f"批量插入K线数据成功: {code} {period} {inserted_count}条")
             
             return inserted_count
@@ -282,6 +294,7 @@ class KLineManager:
             
             count = query.delete()
             self.session.commit()
+            kline_cache.invalidate(code, self.normalize_period(period))
             
             logger.info(f"删除K线数据: {code} {period} {count}条")
             return count
@@ -291,6 +304,34 @@ class KLineManager:
             self.session.rollback()
             return 0
     
+    def delete_klines_before(self, cutoff_time: datetime) -> int:
+        """
+        删除所有周期表中早于 cutoff_time 的K线
+        
+        Args:
+            cutoff_time: 截止时间（不含）
+            
+        Returns:
+            删除的总数量
+        """
+        try:
+            total = 0
+            for model in KLineTableManager.ALL_MODELS:
+                count = self.session.query(model).filter(
+                    model.trade_time < cutoff_time
+                ).delete(synchronize_session=False)
+                if count:
+                    logger.info(f"清理K线数据: {model.__tablename__} {count}条")
+                total += count
+            self.session.commit()
+            kline_cache.invalidate()
+            return total
+        
+        except Exception as e:
+            logger.error(f"清理K线数据失败: {e}")
+            self.session.rollback()
+            raise
+    
     def count_klines(
         self,
         code: str,
@@ -385,3 +426,273 @@ class KLineManager:
         """规范化时间周期名称"""
         return KLineTableManager.normalize_period(period)
 
+
+    def upsert_klines(
+        self,
+        code: str,
+        period: str,
+        klines_data: List[dict],
+        chunk_size: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        批量写入K线数据（多行 INSERT ... ON DUPLICATE KEY UPDATE）
+
+        按 (code, time_key) 唯一索引去重，每 chunk_size 行一条SQL，整批一次提交。
+        已存在且值未变化的行不会被改写。
+
+        Args:
+            code: 股票代码
+            period: 时间周期
+            klines_data: K线数据列表（字段同 insert_kline，time_key 必填）
+            chunk_size: 每条SQL包含的行数
+
+        Returns:
+            {"rows_total", "rows_inserted", "rows_updated", "rows_written",
+             "rows_unchanged", "chunks", "elapsed_ms"}
+        """
+        stats = {
+            "rows_total": 0,
+            "rows_inserted": 0,
+            "rows_updated": 0,
+            "rows_written": 0,
+            "rows_unchanged": 0,
+            "chunks": 0,
+            "elapsed_ms": 0.0,
+        }
+        if not klines_data:
+            return stats
+
+        start = time.perf_counter()
+        model = self._get_model(period)
+        table = model.__table__
+
+        # 同一批次内按 time_key 去重（后出现的覆盖先出现的）
+        rows_by_key: Dict[str, dict] = {}
+        for kline_data in klines_data:
+            time_key = kline_data["time_key"]
+            trade_time = kline_data.get("trade_time") or datetime.strptime(time_key, "%Y-%m-%d %H:%M:%S")
+            rows_by_key[time_key] = {
+                "code": code,
+                "time_key": time_key,
+                "trade_time": trade_time,
+                "ts": KLineTableManager.to_epoch(trade_time),
+                "open_price": kline_data["open_price"],
+                "close_price": kline_data["close_price"],
+                "high_price": kline_data["high_price"],
+                "low_price": kline_data["low_price"],
+                "volume": kline_data.get("volume"),
+                "turnover": kline_data.get("turnover"),
+                "change_rate": kline_data.get("change_rate"),
+                "amplitude": kline_data.get("amplitude"),
+                "created_at": datetime.utcnow(),
+            }
+        rows = list(rows_by_key.values())
+        stats["rows_total"] = len(rows)
+
+        try:
+            for i in range(0, len(rows), chunk_size):
+                chunk = rows[i:i + chunk_size]
+
+                # 走 (code, time_key) 唯一索引统计已存在的行，用于区分新增和未变化
+                existing = self.session.query(func.count(model.id)).filter(
+                    model.code == code,
+                    model.time_key.in_([row["time_key"] for row in chunk])
+                ).scalar() or 0
+
+                stmt = mysql_insert(table).values(chunk)
+                inserted = stmt.inserted
+                stmt = stmt.on_duplicate_key_update(
+                    trade_time=inserted.trade_time,
+                    ts=inserted.ts,
+                    open_price=inserted.open_price,
+                    close_price=inserted.close_price,
+                    high_price=inserted.high_price,
+                    low_price=inserted.low_price,
+                    volume=inserted.volume,
+                    # 数据源不提供时保留已有值
+                    turnover=func.coalesce(inserted.turnover, table.c.turnover),
+                    change_rate=func.coalesce(inserted.change_rate, table.c.change_rate),
+                    amplitude=func.coalesce(inserted.amplitude, table.c.amplitude),
+                )
+                result = self.session.execute(stmt)
+
+                # SQLAlchemy 的MySQL驱动总是开启 CLIENT_FOUND_ROWS：
+                # 新增行计1，更新行计2，值未变化的已有行计1
+                updated = max(0, (result.rowcount or 0) - len(chunk))
+                stats["rows_inserted"] += len(chunk) - existing
+                stats["rows_updated"] += updated
+                stats["rows_unchanged"] += max(0, existing - updated)
+                stats["chunks"] += 1
+
+            # 日线写入后同步维护最新行情表（同一事务）
+            if model is KLineDailyDB:
+                self.refresh_latest_quote(code)
+
+            self.session.commit()
+
+        except Exception as e:
+            logger.error(f"批量写入K线数据失败: {code} {period}: {e}")
+            self.session.rollback()
+            raise
+
+        # 写入的K线并入进程内缓存（已缓存的股票）
+        rows.sort(key=lambda row: row["ts"])
+        kline_cache.on_write(code, self.normalize_period(period), {
+            "ts": np.array([row["ts"] for row in rows], dtype=np.int64),
+            "open": np.array([row["open_price"] for row in rows], dtype=np.float64),
+            "high": np.array([row["high_price"] for row in rows], dtype=np.float64),
+            "low": np.array([row["low_price"] for row in rows], dtype=np.float64),
+            "close": np.array([row["close_price"] for row in rows], dtype=np.float64),
+            "volume": np.array([row["volume"] or 0 for row in rows], dtype=np.int64),
+        })
+
+        stats["rows_written"] = stats["rows_inserted"] + stats["rows_updated"]
+        stats["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        logger.debug(
+            f"批量写入K线数据: {code} {period} 共{stats['rows_total']}条, "
+            f"新增{stats['rows_inserted']} 更新{stats['rows_updated']} 未变{stats['rows_unchanged']}, "
+            f"{stats['chunks']}批 耗时{stats['elapsed_ms']}ms"
+        )
+        return stats
+
+    def refresh_latest_quote(self, code: str) -> None:
+        """
+        按日线表最近两根K线更新 latest_quotes（不提交，由调用方控制事务）
+
+        Args:
+            code: 股票代码
+        """
+        rows = self.session.query(
+            KLineDailyDB.trade_time, KLineDailyDB.time_key, KLineDailyDB.close_price
+        ).filter(
+            KLineDailyDB.code == code
+        ).order_by(
+            desc(KLineDailyDB.trade_time)
+        ).limit(2).all()
+
+        if not rows:
+            return
+
+        last = rows[0]
+        prev_close = rows[1].close_price if len(rows) > 1 else None
+        change_percent = None
+        if prev_close:
+            change_percent = (last.close_price - prev_close) / prev_close * 100
+
+        stmt = mysql_insert(LatestQuoteDB.__table__).values(
+            code=code,
+            last_close=last.close_price,
+            prev_close=prev_close,
+            change_percent=change_percent,
+            trade_time=last.trade_time,
+            time_key=last.time_key,
+            updated_at=datetime.utcnow(),
+        )
+        inserted = stmt.inserted
+        self.session.execute(stmt.on_duplicate_key_update(
+            last_close=inserted.last_close,
+            prev_close=inserted.prev_close,
+            change_percent=inserted.change_percent,
+            trade_time=inserted.trade_time,
+            time_key=inserted.time_key,
+            updated_at=inserted.updated_at,
+        ))
+
+    @staticmethod
+    def _latest_quotes_select(codes: Optional[List[str]]) -> str:
+        """每只股票最近两根日线推导的最新行情（codes为None表示全部）"""
+        code_filter = "WHERE code IN :codes" if codes is not None else ""
+        return f"""
+            WITH ranked AS (
+                SELECT code, close_price, trade_time, time_key,
+                       ROW_NUMBER() OVER (PARTITION BY code ORDER BY trade_time DESC) AS rn
+                FROM klines_daily
+                {code_filter}
+            )
+            SELECT cur.code,
+                   cur.close_price AS last_close,
+                   prev.close_price AS prev_close,
+                   CASE WHEN prev.close_price > 0
+                        THEN (cur.close_price - prev.close_price) / prev.close_price * 100
+                   END AS change_percent,
+                   cur.trade_time,
+                   cur.time_key,
+                   UTC_TIMESTAMP() AS updated_at
+            FROM ranked cur
+            LEFT JOIN ranked prev ON prev.code = cur.code AND prev.rn = 2
+            WHERE cur.rn = 1
+        """
+
+    def rebuild_latest_quotes(self, codes: Optional[List[str]] = None) -> int:
+        """
+        从日线表批量重建 latest_quotes（一条 INSERT ... SELECT，用于迁移和补数）
+
+        Args:
+            codes: 股票代码列表，None表示全部
+
+        Returns:
+            影响的行数
+        """
+        params: Dict[str, Any] = {}
+        if codes is not None:
+            if not codes:
+                return 0
+            params["codes"] = list(codes)
+
+        sql = text(f"""
+            INSERT INTO latest_quotes
+                (code, last_close, prev_close, change_percent, trade_time, time_key, updated_at)
+            SELECT * FROM ({self._latest_quotes_select(codes)}) AS src
+            ON DUPLICATE KEY UPDATE
+                last_close = src.last_close,
+                prev_close = src.prev_close,
+                change_percent = src.change_percent,
+                trade_time = src.trade_time,
+                time_key = src.time_key,
+                updated_at = src.updated_at
+        """)
+        if codes is not None:
+            sql = sql.bindparams(bindparam("codes", expanding=True))
+
+        try:
+            result = self.session.execute(sql, params)
+            self.session.commit()
+            logger.info(f"重建最新行情表: {result.rowcount} 行")
+            return result.rowcount or 0
+        except Exception as e:
+            logger.error(f"重建最新行情表失败: {e}")
+            self.session.rollback()
+            return 0
+
+    def compute_latest_quotes(self, codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        从日线表计算最新行情（只读，不写入 latest_quotes）
+
+        Returns:
+            Dict[code, {last_close, change_percent, time_key}]
+        """
+        if not codes:
+            return {}
+        sql = text(self._latest_quotes_select(codes)).bindparams(bindparam("codes", expanding=True))
+        return {
+            row.code: {"last_close": row.last_close, "change_percent": row.change_percent, "time_key": row.time_key}
+            for row in self.session.execute(sql, {"codes": list(codes)})
+        }
+
+    def backfill_latest_quotes(self) -> int:
+        """
+        补建日线表中有数据而 latest_quotes 中没有的股票（表建立前已入库的股票，启动时调用）
+
+        Returns:
+            影响的行数
+        """
+        codes = [row[0] for row in self.session.execute(text("""
+            SELECT DISTINCT d.code FROM klines_daily d
+            WHERE NOT EXISTS (SELECT 1 FROM latest_quotes q WHERE q.code = d.code)
+        """))]
+        if not codes:
+            return 0
+        logger.info(f"补建最新行情: {len(codes)} 只股票")
+        return sum(
+            self.rebuild_latest_quotes(codes[i:i + 1000]) for i in range(0, len(codes), 1000)
+        )
@@ -0,0 +1,166 @@
+"""
+K线周期汇总引擎
+由已写入的细粒度K线派生粗粒度K线（1分钟 -> 5/15/30分钟，小时线 -> 4小时，日线 -> 周线/月线），只重算新数据涉及的区间
+"""
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.models import KLineTableManager
+from .kline_manager import KLineManager
+
+
+class KLineRollupEngine:
+    """
+    K线周期汇总引擎
+
+    日内周期按交易时段开盘时间对齐（如 30m: 09:30-10:00、10:00-10:30 ...，4h: 09:30-13:30、13:30-16:00），
+    周线从周一开始、月线从每月1日开始。时间均为数据库中的交易所本地时间。
+
+    使用示例:
+        engine = KLineRollupEngine(session)
+        stats = engine.rollup("AAPL", "1d", start, end)
+    """
+
+    # 源周期 -> 可由其汇总的目标周期
+    # 日线、小时线由数据源直接提供（同步拉取的周期），不作为汇总目标，避免1分钟线写入时覆盖数据源的K线；
+    # 4小时线只由小时线汇总。月线目标写作 "1month"，不依赖 "1M"/"1m" 的大小写区分
+    ROLLUP_PLAN: Dict[str, Tuple[str, ...]] = {
+        "1m": ("5m", "15m", "30m"),
+        "1h": ("4h",),
+        "1d": ("1w", "1month"),
+    }
+
+    # 日内周期的分钟数
+    INTRADAY_MINUTES: Dict[str, int] = {
+        "5m": 5,
+        "15m": 15,
+        "30m": 30,
+        "4h": 240,
+    }
+
+    def __init__(self, session: Session, session_open: time = time(9, 30), chunk_size: int = 1000):
+        """
+        Args:
+            session: 数据库会话
+            session_open: 交易时段开盘时间（交易所本地时间）
+            chunk_size: 写入时每条SQL的行数
+        """
+        self.session = session
+        self.session_open = session_open
+        self.chunk_size = chunk_size
+        self.manager = KLineManager(session)
+
+    def bucket_start(self, period: str, moment: datetime) -> datetime:
+        """K线所属目标周期区间的开始时间"""
+        if period == "1w":
+            day = moment.date() - timedelta(days=moment.weekday())
+            return datetime.combine(day, time.min)
+        if period == "1month":
+            return datetime.combine(moment.date().replace(day=1), time.min)
+
+        minutes = self.INTRADAY_MINUTES[period]
+        anchor = datetime.combine(moment.date(), self.session_open)
+        offset = int((moment - anchor).total_seconds() // 60)
+        return anchor + timedelta(minutes=(offset // minutes) * minutes)
+
+    def bucket_end(self, period: str, start: datetime) -> datetime:
+        """区间结束时间（不含）"""
+        if period == "1w":
+            return start + timedelta(days=7)
+        if period == "1month":
+            return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return start + timedelta(minutes=self.INTRADAY_MINUTES[period])
+
+    def rollup(
+        self,
+        code: str,
+        source_period: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        用源周期K线重算 [start, end] 涉及的目标周期区间
+
+        Args:
+            code: 股票代码
+            source_period: 源周期（ROLLUP_PLAN 中的键）
+            start: 新数据中最早的K线时间
+            end: 新数据中最新的K线时间，None表示与start相同
+
+        Returns:
+            {目标周期: upsert_klines 的写入统计}
+        """
+        source_period = KLineTableManager.normalize_period(source_period)
+        targets = self.ROLLUP_PLAN.get(source_period)
+        if not targets:
+            return {}
+        end = end or start
+
+        # 每个目标周期只重算与 [start, end] 相交的区间，源数据一次读出
+        windows = {
+            period: (self.bucket_start(period, start), self.bucket_start(period, end))
+            for period in targets
+        }
+        read_from = min(first for first, _ in windows.values())
+        read_to = max(self.bucket_end(period, last) for period, (_, last) in windows.items())
+
+        model = KLineTableManager.get_model_by_period(source_period)
+        bars = self.session.query(model).filter(
+            model.code == code,
+            model.trade_time >= read_from,
+            model.trade_time < read_to
+        ).order_by(model.trade_time).all()
+        if not bars:
+            return {}
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for period in targets:
+            first, last = windows[period]
+            rows = self._aggregate(period, bars, first, last)
+            if rows:
+                results[period] = self.manager.upsert_klines(code, period, rows, chunk_size=self.chunk_size)
+
+        logger.debug(
+            f"K线汇总: {code} {source_period} -> "
+            + ", ".join(f"{p}:{s['rows_total']}" for p, s in results.items())
+        )
+        return results
+
+    def _aggregate(self, period: str, bars: List, first: datetime, last: datetime) -> List[dict]:
+        """把按时间升序的源K线聚合为 [first, last] 范围内各区间的K线"""
+        rows: List[dict] = []
+        current: Optional[dict] = None
+
+        for bar in bars:
+            bucket = self.bucket_start(period, bar.trade_time)
+            if bucket < first or bucket > last:
+                continue
+
+            if current is None or current["trade_time"] != bucket:
+                current = {
+                    "time_key": bucket.strftime("%Y-%m-%d %H:%M:%S"),
+                    "trade_time": bucket,
+                    "open_price": bar.open_price,
+                    "high_price": bar.high_price,
+                    "low_price": bar.low_price,
+                    "close_price": bar.close_price,
+                    "volume": bar.volume,
+                    "turnover": bar.turnover,
+                }
+                rows.append(current)
+                continue
+
+            current["high_price"] = max(current["high_price"], bar.high_price)
+            current["low_price"] = min(current["low_price"], bar.low_price)
+            current["close_price"] = bar.close_price
+            if bar.volume is not None:
+                current["volume"] = (current["volume"] or 0) + bar.volume
+            # 成交额只有全部源K线都有时才可加总
+            if current["turnover"] is not None and bar.turnover is not None:
+                current["turnover"] += bar.turnover
+            else:
+                current["turnover"] = None
+
+        return rows
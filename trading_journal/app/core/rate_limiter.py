@@ -0,0 +1,46 @@
+"""
+请求速率限制
+异步令牌桶，供同步流水线等并发拉取场景共享，限制对数据源的总请求速率
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+class RequestQuota:
+    """
+    数据源请求配额（令牌桶）
+
+    所有并发协程共用一个实例：并发数只决定能同时等待多少个响应，总请求速率由配额决定
+
+    使用示例:
+        quota = RequestQuota(requests_per_second=2.0)
+        await quota.acquire()
+        data = await provider.get_stock_data(...)
+    """
+
+    def __init__(self, requests_per_second: float, burst: Optional[float] = None):
+        """
+        Args:
+            requests_per_second: 每秒请求数，<=0 表示不限
+            burst: 允许的突发请求数，默认等于每秒请求数（至少1）
+        """
+        self.rate = requests_per_second
+        self.capacity = burst or max(1.0, requests_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """取得一次请求配额，配额不足时等待"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,138 @@
+"""
+交易日历
+按规则计算美股（NYSE）常规休市日，提供交易日序号与区间查询，供K线缺口索引使用
+"""
+from datetime import date, timedelta
+from typing import List, Set
+
+import numpy as np
+
+
+# 规则之外的临时休市日
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11), date(2001, 9, 12), date(2001, 9, 13), date(2001, 9, 14),  # 9·11
+    date(2004, 6, 11),  # 里根国葬
+    date(2007, 1, 2),  # 福特国葬
+    date(2012, 10, 29), date(2012, 10, 30),  # 飓风桑迪
+    date(2018, 12, 5),  # 老布什国葬
+    date(2025, 1, 9),  # 卡特国葬
+}
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """某月第n个星期weekday（n<0表示倒数）"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + (n - 1) * 7)
+    last = (date(year, month, 28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7 + (-n - 1) * 7)
+
+
+def _observed(day: date) -> date:
+    """周六的假日提前到周五，周日的顺延到周一"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _easter(year: int) -> date:
+    """复活节（格里高利历）"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def us_market_holidays(year: int) -> Set[date]:
+    """NYSE 某年的休市日"""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),  # 马丁·路德·金纪念日
+        _nth_weekday(year, 2, 0, 3),  # 总统日
+        _easter(year) - timedelta(days=2),  # 耶稣受难日
+        _nth_weekday(year, 5, 0, -1),  # 阵亡将士纪念日
+        _observed(date(year, 7, 4)),  # 独立日
+        _nth_weekday(year, 9, 0, 1),  # 劳动节
+        _nth_weekday(year, 11, 3, 4),  # 感恩节
+        _observed(date(year, 12, 25)),  # 圣诞节
+    }
+    # 元旦落在周六时不提前到上一年12月31日
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # 六月节
+    return holidays
+
+
+class TradingCalendar:
+    """
+    交易日历
+
+    交易日按日期升序编号（序号从 first_year 的第一个交易日起为0），
+    缺口索引用序号定位位图中的位置
+
+    使用示例:
+        calendar = TradingCalendar()
+        sessions = calendar.sessions(date(2024, 1, 1), date(2024, 12, 31))
+        index = calendar.ordinal(date(2024, 7, 5))
+    """
+
+    def __init__(self, first_year: int = 2000, last_year: int = None):
+        last_year = last_year or date.today().year + 1
+        closed = set(SPECIAL_CLOSURES)
+        for year in range(first_year, last_year + 1):
+            closed |= us_market_holidays(year)
+
+        days = np.arange(
+            np.datetime64(date(first_year, 1, 1)),
+            np.datetime64(date(last_year + 1, 1, 1)),
+            dtype="datetime64[D]"
+        )
+        days = days[np.is_busday(days)]
+        self._sessions = days[~np.isin(days, np.array(sorted(closed), dtype="datetime64[D]"))]
+
+    @property
+    def first_session(self) -> date:
+        return self._sessions[0].astype(date)
+
+    def is_session(self, day: date) -> bool:
+        """是否交易日"""
+        i = self.ordinal(day)
+        return i < len(self._sessions) and self._sessions[i] == np.datetime64(day)
+
+    def ordinal(self, day: date) -> int:
+        """不早于 day 的第一个交易日的序号"""
+        return int(np.searchsorted(self._sessions, np.datetime64(day), side="left"))
+
+    def ordinal_before(self, day: date) -> int:
+        """不晚于 day 的最后一个交易日的序号"""
+        return int(np.searchsorted(self._sessions, np.datetime64(day), side="right")) - 1
+
+    def session(self, ordinal: int) -> date:
+        """序号对应的交易日"""
+        return self._sessions[ordinal].astype(date)
+
+    def ordinals(self, days) -> np.ndarray:
+        """一组日期（需为交易日）的序号，非交易日返回-1"""
+        values = np.asarray(days, dtype="datetime64[D]")
+        index = np.searchsorted(self._sessions, values, side="left")
+        valid = index < len(self._sessions)
+        valid[valid] &= self._sessions[index[valid]] == values[valid]
+        return np.where(valid, index, -1)
+
+    def sessions(self, start: date, end: date) -> List[date]:
+        """[start, end] 内的交易日"""
+        return [d.astype(date) for d in self._sessions[self.ordinal(start):self.ordinal_before(end) + 1]]
+
+
+# 全局交易日历实例
+trading_calendar = TradingCalendar()
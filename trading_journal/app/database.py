@@ -9,6 +9,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from loguru import logger
 
 from .config import settings
+from .core.kline_epoch import ensure_kline_epoch
 from .models import (
     Base, StockDB, StrategyDB, SelectionResultDB,
     ExpertDB, ExpertOpinionDB,
@@ -70,6 +71,9 @@ class DatabaseService:
             # 创建所有表
             Base.metadata.create_all(bind=self.engine)
             
+            # create_all 不修改已有表：K线表的 ts 列在此补齐并回填
+            ensure_kline_epoch(self.engine)
+            
             logger.info(f"Database initialized: {settings.database_url}")
             
         except Exception as e:
@@ -45,6 +45,8 @@ async def lifespan(app: FastAPI):
         os.makedirs("logs", exist_ok=True)
 
         container.initialize()
+        # latest_quotes 表建立前已入库的股票在启动时补建，查询接口只读
+        await container.get_kline_repository().backfill_latest_quotes()
 
         task = asyncio.create_task(background_tasks())
 
@@ -1,10 +1,10 @@
 """
 数据模型定义
 """
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Date, Index, create_engine, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, Text, Date, Index, LargeBinary, create_engine, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -71,6 +71,7 @@ class KLine1MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -83,6 +84,7 @@ class KLine1MinDB(Base):
     
     __table_args__ = (
         Index('idx_1min_code_time', 'code', 'trade_time'),
+        Index('idx_1min_code_ts', 'code', 'ts'),
         Index('idx_1min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -95,6 +97,7 @@ class KLine3MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -107,6 +110,7 @@ class KLine3MinDB(Base):
     
     __table_args__ = (
         Index('idx_3min_code_time', 'code', 'trade_time'),
+        Index('idx_3min_code_ts', 'code', 'ts'),
         Index('idx_3min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -119,6 +123,7 @@ class KLine5MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -131,6 +136,7 @@ class KLine5MinDB(Base):
     
     __table_args__ = (
         Index('idx_5min_code_time', 'code', 'trade_time'),
+        Index('idx_5min_code_ts', 'code', 'ts'),
         Index('idx_5min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -143,6 +149,7 @@ class KLine15MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -155,6 +162,7 @@ class KLine15MinDB(Base):
     
     __table_args__ = (
         Index('idx_15min_code_time', 'code', 'trade_time'),
+        Index('idx_15min_code_ts', 'code', 'ts'),
         Index('idx_15min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -167,6 +175,7 @@ class KLine30MinDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -179,6 +188,7 @@ class KLine30MinDB(Base):
     
     __table_args__ = (
         Index('idx_30min_code_time', 'code', 'trade_time'),
+        Index('idx_30min_code_ts', 'code', 'ts'),
         Index('idx_30min_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -191,6 +201,7 @@ class KLine1HourDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -203,6 +214,7 @@ class KLine1HourDB(Base):
     
     __table_args__ = (
         Index('idx_1hour_code_time', 'code', 'trade_time'),
+        Index('idx_1hour_code_ts', 'code', 'ts'),
         Index('idx_1hour_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -215,6 +227,7 @@ class KLine4HourDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -227,6 +240,7 @@ class KLine4HourDB(Base):
     
     __table_args__ = (
         Index('idx_4hour_code_time', 'code', 'trade_time'),
+        Index('idx_4hour_code_ts', 'code', 'ts'),
         Index('idx_4hour_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -239,6 +253,7 @@ class KLineDailyDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -251,6 +266,7 @@ class KLineDailyDB(Base):
     
     __table_args__ = (
         Index('idx_daily_code_time', 'code', 'trade_time'),
+        Index('idx_daily_code_ts', 'code', 'ts'),
         Index('idx_daily_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -263,6 +279,7 @@ class KLineWeeklyDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -275,6 +292,7 @@ class KLineWeeklyDB(Base):
     
     __table_args__ = (
         Index('idx_weekly_code_time', 'code', 'trade_time'),
+        Index('idx_weekly_code_ts', 'code', 'ts'),
         Index('idx_weekly_code_key', 'code', 'time_key', unique=True),
     )
 
@@ -287,6 +305,7 @@ class KLineMonthlyDB(Base):
     code = Column(String(20), ForeignKey('stocks.code', ondelete='CASCADE'), index=True, nullable=False, comment="股票代码")
     time_key = Column(String(20), nullable=False, comment="时间键")
     trade_time = Column(DateTime, nullable=False, index=True, comment="交易时间")
+    ts = Column(BigInteger, nullable=False, comment="交易时间的Unix秒（trade_time按UTC解释）")
     open_price = Column(Float, nullable=False, comment="开盘价")
     close_price = Column(Float, nullable=False, comment="收盘价")
     high_price = Column(Float, nullable=False, comment="最高价")
@@ -299,12 +318,16 @@ class KLineMonthlyDB(Base):
     
     __table_args__ = (
         Index('idx_monthly_code_time', 'code', 'trade_time'),
+        Index('idx_monthly_code_ts', 'code', 'ts'),
         Index('idx_monthly_code_key', 'code', 'time_key', unique=True),
     )
 
 
 # ==================== K线表映射管理器 ====================
 
+# ts 列的零点（trade_time 为交易所本地时间，不带时区）
+EPOCH = datetime(1970, 1, 1)
+
 class KLineTableManager:
     """K线表映射管理器"""
     
@@ -383,8 +406,8 @@ class KLineTableManager:
         Raises:
             ValueError: 如果时间周期不支持
         """
-        period = period.lower()
-        model = cls.PERIOD_TO_MODEL.get(period)
+        # "1M"（月线）与 "1m"（1分钟线）只有大小写不同，先按原样匹配再忽略大小写
+        model = cls.PERIOD_TO_MODEL.get(period) or cls.PERIOD_TO_MODEL.get(period.lower())
         
         if model is None:
             raise ValueError(
@@ -394,6 +417,16 @@ class KLineTableManager:
         
         return model
     
+    @staticmethod
+    def to_epoch(trade_time: datetime) -> int:
+        """交易时间 -> ts 列的值（按UTC解释本地墙上时间，与迁移脚本的SQL换算一致）"""
+        return int((trade_time.replace(tzinfo=None) - EPOCH).total_seconds())
+    
+    @staticmethod
+    def from_epoch(ts: int) -> datetime:
+        """ts 列的值 -> 交易时间"""
+        return EPOCH + timedelta(seconds=int(ts))
+    
     @classmethod
     def get_period_by_model(cls, model):
         """根据表模型获取时间周期"""
@@ -425,6 +458,35 @@ class KLineTableManager:
         return cls.MODEL_TO_PERIOD[model]
 
 
+class LatestQuoteDB(Base):
+    """最新行情表 - 每只股票最近两根日线的收盘价，由K线写入时维护"""
+    __tablename__ = "latest_quotes"
+
+    code = Column(String(20), primary_key=True, comment="股票代码")
+    last_close = Column(Float, nullable=False, comment="最新收盘价")
+    prev_close = Column(Float, comment="前一交易日收盘价")
+    change_percent = Column(Float, comment="涨跌幅(%)")
+    trade_time = Column(DateTime, nullable=False, comment="最新K线交易时间")
+    time_key = Column(String(20), nullable=False, comment="最新K线时间键")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    __table_args__ = (
+        Index('idx_latest_quote_price', 'last_close'),
+        Index('idx_latest_quote_change', 'change_percent'),
+    )
+
+
+class SymbolRegistryDB(Base):
+    """股票代码注册表 - 代码有效性（含负缓存）与基本信息缓存，所有API进程/worker共享"""
+    __tablename__ = "symbol_registry"
+
+    symbol = Column(String(20), primary_key=True, comment="股票代码（大写）")
+    is_valid = Column(Boolean, comment="是否有效")
+    validated_at = Column(Float, comment="验证时间（Unix秒）")
+    info = Column(Text, comment="基本信息（JSON）")
+    info_at = Column(Float, comment="基本信息获取时间（Unix秒）")
+
+
 class StrategyDB(Base):
     """选股策略表"""
     __tablename__ = "strategies"
@@ -515,6 +577,55 @@ class CategoryStockRelationDB(Base):
     )
 
 
+class CategoryClosureDB(Base):
+    """分类闭包表 - 每对 (祖先, 子孙) 一行（含自身，depth=0），分类树结构变化时重建"""
+    __tablename__ = "category_closure"
+
+    ancestor_id = Column(String(50), primary_key=True, comment="祖先分类ID")
+    descendant_id = Column(String(50), primary_key=True, comment="子孙分类ID")
+    depth = Column(Integer, nullable=False, default=0, comment="层级差")
+
+    __table_args__ = (
+        Index('idx_closure_descendant', 'descendant_id', 'ancestor_id'),
+    )
+
+
+class CategoryTreeVersionDB(Base):
+    """分类树版本表 - 单行，分类或分类-股票关联写入时在同一事务内递增，各进程据此判断缓存的分类树是否失效"""
+    __tablename__ = "category_tree_version"
+
+    id = Column(Integer, primary_key=True, default=1, comment="固定为1")
+    version = Column(BigInteger, nullable=False, default=0, comment="分类树版本号")
+
+
+class CategoryHeatmapDB(Base):
+    """分类热力图快照表 - 每次行情写入后按分类（含子分类股票）整体重算"""
+    __tablename__ = "category_heatmap"
+
+    category_id = Column(String(50), primary_key=True, comment="分类ID")
+    name = Column(String(100), nullable=False, comment="分类名称")
+    path = Column(String(500), comment="分类路径")
+    level = Column(Integer, default=0, comment="层级")
+    parent_id = Column(String(50), comment="父分类ID")
+
+    stock_count = Column(Integer, default=0, comment="股票数量（含子分类）")
+    priced_count = Column(Integer, default=0, comment="有行情的股票数量")
+    avg_change_percent = Column(Float, default=0, comment="平均涨跌幅(%)")
+    weighted_change_percent = Column(Float, default=0, comment="加权涨跌幅(%)")
+    rising_count = Column(Integer, default=0, comment="上涨数量")
+    falling_count = Column(Integer, default=0, comment="下跌数量")
+    unchanged_count = Column(Integer, default=0, comment="平盘数量")
+    max_change_percent = Column(Float, comment="最大涨幅(%)")
+    min_change_percent = Column(Float, comment="最大跌幅(%)")
+
+    quote_time = Column(DateTime, comment="最新行情时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, comment="快照生成时间")
+
+    __table_args__ = (
+        Index('idx_heatmap_weighted_change', 'weighted_change_percent'),
+    )
+
+
 class ExpertDB(Base):
     """专家表"""
     __tablename__ = "experts"
@@ -921,6 +1032,69 @@ class StockSyncStatusDB(Base):
     )
 
 
+class KLineSessionIndexDB(Base):
+    """K线交易日位图索引 - 每只股票每个周期一行，第i位表示 start_date 起第i个交易日已有K线（或已确认数据源无数据）"""
+    __tablename__ = "kline_session_index"
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(20), nullable=False, comment="股票代码")
+    timeframe = Column(String(10), nullable=False, comment="时间周期: 1d, 1h")
+    start_date = Column(Date, nullable=False, comment="位图第0位对应的交易日")
+    session_count = Column(Integer, default=0, comment="位图覆盖的交易日数")
+    present_count = Column(Integer, default=0, comment="已有数据的交易日数")
+    bitmap = Column(LargeBinary, comment="按位打包的交易日位图")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_session_index_code_timeframe', 'code', 'timeframe', unique=True),
+    )
+
+
+class SyncWorkUnitDB(Base):
+    """同步工作单元表 - 同步队列中的 (股票, 周期, 日期范围)，由独立worker按租约认领执行"""
+    __tablename__ = "sync_work_units"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(String(50), comment="所属数据同步任务ID")
+    stock_code = Column(String(20), nullable=False, comment="股票代码")
+    timeframe = Column(String(10), nullable=False, comment="时间周期: 1d, 1h")
+    start_date = Column(Date, nullable=False, comment="开始日期（含）")
+    end_date = Column(Date, nullable=False, comment="结束日期（含）")
+    reason = Column(String(100), comment="同步原因: historical_gap, latest_gap, interior_gap, failed_retry")
+
+    status = Column(String(20), default='pending', comment="pending, leased, done, failed")
+    available_at = Column(DateTime, default=datetime.utcnow, comment="最早可被认领的时间（失败重试时延后）")
+    lease_owner = Column(String(100), comment="持有租约的worker")
+    lease_expires_at = Column(DateTime, comment="租约到期时间，过期未完成的单元重新入队")
+    attempts = Column(Integer, default=0, comment="已认领次数")
+    max_attempts = Column(Integer, default=3, comment="最多认领次数")
+
+    rows_written = Column(Integer, default=0, comment="写入K线条数")
+    last_error = Column(Text, comment="最后一次错误信息")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_work_unit_claim', 'status', 'available_at'),
+        Index('idx_work_unit_lease', 'status', 'lease_expires_at'),
+        Index('idx_work_unit_task', 'task_id', 'status'),
+        Index('idx_work_unit_stock', 'stock_code', 'timeframe', 'status'),
+    )
+
+
+class SyncTaskUnitLinkDB(Base):
+    """同步任务与其他任务工作单元的关联 - 入队时计划范围已被其他任务的未结束单元覆盖，本任务等待这些单元完成"""
+    __tablename__ = "sync_task_unit_links"
+
+    task_id = Column(String(50), primary_key=True, comment="等待该单元的数据同步任务ID")
+    unit_id = Column(Integer, ForeignKey('sync_work_units.id', ondelete='CASCADE'), primary_key=True, comment="工作单元ID")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_task_unit_link_unit', 'unit_id'),
+    )
+
+
 # ==================== Pydantic 响应模型 ====================
 
 class StockInfo(BaseModel):
@@ -0,0 +1,102 @@
+"""
+分类热力图仓库
+负责热力图快照的物化与读取
+"""
+from typing import List
+from sqlalchemy import text
+from loguru import logger
+
+from ..models import CategoryHeatmapDB
+from ..database import db_service
+from .category_repository import CategoryRepository
+
+
+# 每个分类的成员 = 闭包表中自身及所有子孙分类下的股票，同一股票只计一次；
+# 与 latest_quotes 关联后按分类聚合，整张快照在一个事务内替换
+_REBUILD_SQL = text("""
+    INSERT INTO category_heatmap
+        (category_id, name, path, level, parent_id,
+         stock_count, priced_count, avg_change_percent, weighted_change_percent,
+         rising_count, falling_count, unchanged_count,
+         max_change_percent, min_change_percent, quote_time, updated_at)
+    SELECT c.category_id, c.name, c.path, c.level, c.parent_id,
+           agg.stock_count, agg.priced_count, agg.avg_change,
+           COALESCE(agg.weighted_change, 0),
+           agg.rising_count, agg.falling_count, agg.unchanged_count,
+           agg.max_change, agg.min_change, agg.quote_time, UTC_TIMESTAMP()
+    FROM (
+        SELECT m.category_id,
+               COUNT(*) AS stock_count,
+               COUNT(q.change_percent) AS priced_count,
+               AVG(q.change_percent) AS avg_change,
+               SUM(q.change_percent * m.weight)
+                   / NULLIF(SUM(CASE WHEN q.change_percent IS NOT NULL THEN m.weight END), 0)
+                   AS weighted_change,
+               SUM(q.change_percent > 0) AS rising_count,
+               SUM(q.change_percent < 0) AS falling_count,
+               SUM(q.change_percent = 0) AS unchanged_count,
+               MAX(q.change_percent) AS max_change,
+               MIN(q.change_percent) AS min_change,
+               MAX(q.trade_time) AS quote_time
+        FROM (
+            SELECT anc.category_id, rel.stock_code,
+                   MAX(COALESCE(rel.weight, 1.0)) AS weight
+            FROM category_closure cc
+            JOIN categories anc ON anc.category_id = cc.ancestor_id
+            JOIN categories d ON d.category_id = cc.descendant_id
+            JOIN category_stock_relations rel ON rel.category_id = d.category_id
+            WHERE anc.is_active = 1 AND d.is_active = 1
+            GROUP BY anc.category_id, rel.stock_code
+        ) AS m
+        LEFT JOIN latest_quotes q ON q.code = m.stock_code
+        GROUP BY m.category_id
+        HAVING COUNT(q.change_percent) > 0
+    ) AS agg
+    JOIN categories c ON c.category_id = agg.category_id
+""")
+
+
+class CategoryHeatmapRepository:
+    """分类热力图仓库实现"""
+
+    # 本进程是否已确认快照存在（首次读取为空时补建一次）
+    _snapshot_checked: bool = False
+
+    def __init__(self):
+        self.db_service = db_service
+
+    async def rebuild_snapshot(self) -> int:
+        """
+        重算全部分类的热力图快照（行情写入后调用）
+
+        Returns:
+            快照中的分类数量，失败返回-1
+        """
+        try:
+            with self.db_service.get_session() as session:
+                await CategoryRepository().ensure_closure(session)
+                session.execute(text("DELETE FROM category_heatmap"))
+                result = session.execute(_REBUILD_SQL)
+                session.commit()
+                CategoryHeatmapRepository._snapshot_checked = True
+                logger.info(f"分类热力图快照已重建: {result.rowcount} 个分类")
+                return result.rowcount or 0
+        except Exception as e:
+            logger.error(f"重建分类热力图快照失败: {e}")
+            return -1
+
+    async def get_snapshot(self) -> List[CategoryHeatmapDB]:
+        """读取热力图快照（按加权涨跌幅降序）"""
+        rows = self._read_snapshot()
+        if not rows and not CategoryHeatmapRepository._snapshot_checked:
+            CategoryHeatmapRepository._snapshot_checked = True
+            if await self.rebuild_snapshot() > 0:
+                rows = self._read_snapshot()
+        return rows
+
+    def _read_snapshot(self) -> List[CategoryHeatmapDB]:
+        with self.db_service.get_session() as session:
+            rows = session.query(CategoryHeatmapDB).order_by(
+                CategoryHeatmapDB.weighted_change_percent.desc()
+            ).all()
+            return rows
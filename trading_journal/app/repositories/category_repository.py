@@ -0,0 +1,195 @@
+"""
+分类树仓库
+分类树一次查询加载并按版本号缓存在内存；子树关系由闭包表 category_closure 提供
+版本号存于 category_tree_version 表，写入方在同一事务内递增，多进程部署下各进程的缓存都能失效
+"""
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from loguru import logger
+
+from ..models import CategoryDB, CategoryClosureDB, CategoryStockRelationDB, CategoryTreeVersionDB
+from ..database import db_service
+
+
+# 由 path 推导闭包：子孙的 path 以祖先 path + '/' 开头（含自身）
+_REBUILD_CLOSURE_SQL = text("""
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    SELECT anc.category_id, d.category_id, d.level - anc.level
+    FROM categories anc
+    JOIN categories d
+      ON d.category_id = anc.category_id
+      OR LEFT(d.path, CHAR_LENGTH(anc.path) + 1) = CONCAT(anc.path, '/')
+""")
+
+# 重算指定分类所有祖先（含自身）的直接/总股票数
+_REFRESH_COUNTS_SQL = text("""
+    UPDATE categories c
+    JOIN category_closure target
+      ON target.ancestor_id = c.category_id AND target.descendant_id = :category_id
+    LEFT JOIN (
+        SELECT category_id, COUNT(*) AS n
+        FROM category_stock_relations
+        GROUP BY category_id
+    ) direct ON direct.category_id = c.category_id
+    LEFT JOIN (
+        SELECT cc.ancestor_id, COUNT(rel.id) AS n
+        FROM category_closure cc
+        JOIN category_closure target2
+          ON target2.ancestor_id = cc.ancestor_id AND target2.descendant_id = :category_id
+        JOIN category_stock_relations rel ON rel.category_id = cc.descendant_id
+        GROUP BY cc.ancestor_id
+    ) total ON total.ancestor_id = c.category_id
+    SET c.stock_count = COALESCE(direct.n, 0),
+        c.total_stock_count = COALESCE(total.n, 0)
+""")
+
+
+def category_to_dict(cat: CategoryDB) -> Dict[str, Any]:
+    """分类节点的API表示（不含children）"""
+    return {
+        "id": cat.id,
+        "category_id": cat.category_id,
+        "name": cat.name,
+        "parent_id": cat.parent_id,
+        "path": cat.path,
+        "level": cat.level,
+        "sort_order": cat.sort_order,
+        "icon": cat.icon,
+        "color": cat.color,
+        "description": cat.description,
+        "stock_count": cat.stock_count,
+        "total_stock_count": cat.total_stock_count,
+        "is_active": cat.is_active,
+        "is_custom": cat.is_custom
+    }
+
+
+class CategoryTreeSnapshot:
+    """某个版本的活跃分类树"""
+
+    def __init__(self, version: int, categories: List[CategoryDB]):
+        self.version = version
+        # 按 (level, sort_order) 排序的扁平列表
+        self.nodes: List[Dict[str, Any]] = [category_to_dict(cat) for cat in categories]
+        self.by_id: Dict[str, Dict[str, Any]] = {node["category_id"]: node for node in self.nodes}
+        self.children: Dict[Optional[str], List[str]] = {}
+        for node in sorted(self.nodes, key=lambda n: n["sort_order"] or 0):
+            self.children.setdefault(node["parent_id"], []).append(node["category_id"])
+
+    def build_tree(self, parent_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """从内存组装树形结构（parent_id为None时从根节点开始）"""
+        return [
+            {**self.by_id[child_id], "children": self.build_tree(child_id)}
+            for child_id in self.children.get(parent_id, [])
+        ]
+
+
+class CategoryRepository:
+    """分类树仓库实现"""
+
+    # 本进程缓存的快照，与数据库中的版本号不一致即失效
+    _snapshot: Optional[CategoryTreeSnapshot] = None
+    # 本进程是否已确认闭包表已建立
+    _closure_checked: bool = False
+
+    def __init__(self):
+        self.db_service = db_service
+
+    @staticmethod
+    def bump_version(session):
+        """
+        递增分类树版本号（不提交）
+
+        分类或分类-股票关联写入时在同一会话内、提交前调用，版本号与写入一起提交或回滚
+        """
+        stmt = mysql_insert(CategoryTreeVersionDB.__table__).values(id=1, version=1)
+        session.execute(stmt.on_duplicate_key_update(version=CategoryTreeVersionDB.__table__.c.version + 1))
+
+    @staticmethod
+    def current_version(session) -> int:
+        """数据库中的分类树版本号（尚无写入时为0）"""
+        version = session.query(CategoryTreeVersionDB.version).filter(CategoryTreeVersionDB.id == 1).scalar()
+        return version or 0
+
+    async def get_snapshot(self) -> CategoryTreeSnapshot:
+        """获取当前版本的分类树（版本号变化时一次查询重新加载）"""
+        with self.db_service.get_session() as session:
+            # 先读版本号再读分类：两次读取之间的写入只会让快照比标记的版本新，下次读取再重载
+            version = self.current_version(session)
+            snapshot = CategoryRepository._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+
+            categories = session.query(CategoryDB).filter(
+                CategoryDB.is_active == True
+            ).order_by(CategoryDB.level, CategoryDB.sort_order).all()
+            snapshot = CategoryTreeSnapshot(version, categories)
+
+        CategoryRepository._snapshot = snapshot
+        return snapshot
+
+    async def rebuild_closure(self) -> int:
+        """
+        按 path 重建闭包表（分类新增、移动、删除后调用）
+
+        Returns:
+            闭包表行数，失败返回-1
+        """
+        try:
+            with self.db_service.get_session() as session:
+                session.execute(text("DELETE FROM category_closure"))
+                result = session.execute(_REBUILD_CLOSURE_SQL)
+                self.bump_version(session)
+                session.commit()
+                CategoryRepository._closure_checked = True
+                logger.info(f"分类闭包表已重建: {result.rowcount} 行")
+                return result.rowcount or 0
+        except Exception as e:
+            logger.error(f"重建分类闭包表失败: {e}")
+            return -1
+
+    async def ensure_closure(self, session):
+        """闭包表为空而分类存在时补建一次（兼容升级前的数据）"""
+        if CategoryRepository._closure_checked:
+            return
+        CategoryRepository._closure_checked = True
+        if session.query(CategoryClosureDB.ancestor_id).first() is None \
+                and session.query(CategoryDB.id).first() is not None:
+            await self.rebuild_closure()
+
+    async def get_descendant_ids(self, category_id: str) -> Set[str]:
+        """分类自身及所有子孙分类ID"""
+        with self.db_service.get_session() as session:
+            await self.ensure_closure(session)
+            rows = session.query(CategoryClosureDB.descendant_id).filter(
+                CategoryClosureDB.ancestor_id == category_id
+            ).all()
+            return {row[0] for row in rows} or {category_id}
+
+    async def get_stock_codes(self, category_id: str, include_children: bool = False) -> Set[str]:
+        """分类（可含子树）下的股票代码集合，一次查询"""
+        with self.db_service.get_session() as session:
+            query = session.query(CategoryStockRelationDB.stock_code)
+            if include_children:
+                await self.ensure_closure(session)
+                query = query.join(
+                    CategoryClosureDB,
+                    CategoryClosureDB.descendant_id == CategoryStockRelationDB.category_id
+                ).filter(CategoryClosureDB.ancestor_id == category_id)
+            else:
+                query = query.filter(CategoryStockRelationDB.category_id == category_id)
+            return {row[0] for row in query.distinct().all()}
+
+    async def refresh_stock_counts(self, category_id: str) -> bool:
+        """重算分类及其所有祖先的股票数量（一条 UPDATE）"""
+        try:
+            with self.db_service.get_session() as session:
+                await self.ensure_closure(session)
+                session.execute(_REFRESH_COUNTS_SQL, {"category_id": category_id})
+                self.bump_version(session)
+                session.commit()
+                return True
+        except Exception as e:
+            logger.error(f"更新分类股票数量失败: {category_id}: {e}")
+            return False
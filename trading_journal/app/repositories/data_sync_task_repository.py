@@ -3,20 +3,47 @@
 负责数据同步任务的数据库操作
 """
 import json
+import time
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import desc, and_, or_
+from sqlalchemy import desc, and_, or_, func, update
 from loguru import logger
 
+from ..config import settings
 from ..database import get_db
 from ..models import DataSyncTaskDB
 
+# 按股票累加的进度计数列
+PROGRESS_COUNTERS = ("processed_stocks", "success_stocks", "failed_stocks", "daily_records", "hourly_records")
+
+# 结束状态（写入前先落盘内存中的进度）
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+@dataclass
+class _TaskProgress:
+    """运行中任务的内存进度：totals 为任务开始以来的累计值，pending 为尚未写入数据库的增量"""
+    total_stocks: int = 0
+    totals: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(PROGRESS_COUNTERS, 0))
+    pending: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(PROGRESS_COUNTERS, 0))
+    flushed_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def percent(self) -> Optional[float]:
+        if not self.total_stocks:
+            return None
+        return min(100.0, self.totals["processed_stocks"] / self.total_stocks * 100)
+
 
 class DataSyncTaskRepository:
     """数据同步任务数据访问层"""
     
+    # 运行中任务的内存进度，所有实例共享（进程内）
+    _progress: Dict[str, _TaskProgress] = {}
+    
     def __init__(self):
         self.db = next(get_db())
     
@@ -107,6 +134,9 @@ class DataSyncTaskRepository:
         Returns:
             是否更新成功
         """
+        if status in FINAL_STATUSES:
+            await self.flush_progress(task_id, final=True)
+        
         try:
             task = self.db.query(DataSyncTaskDB).filter(
                 DataSyncTaskDB.task_id == task_id
@@ -247,6 +277,7 @@ class DataSyncTaskRepository:
             task.updated_at = datetime.utcnow()
             
             self.db.commit()
+            self._progress.setdefault(task_id, _TaskProgress()).total_stocks = total_stocks
             return True
             
         except Exception as e:
@@ -261,41 +292,104 @@ class DataSyncTaskRepository:
         daily_count: int = 0,
         hourly_count: int = 0
     ) -> bool:
-        """增加已处理股票数量"""
+        """
+        增加已处理股票数量
+        
+        先在内存中累加，累计 sync_progress_flush_every 只股票或距上次写入超过
+        sync_progress_flush_interval 秒时才写入数据库（见 flush_progress）
+        """
+        progress = self._progress.setdefault(task_id, _TaskProgress())
+        delta = {
+            "processed_stocks": 1,
+            "success_stocks": 1 if success else 0,
+            "failed_stocks": 0 if success else 1,
+            "daily_records": daily_count,
+            "hourly_records": hourly_count,
+        }
+        for column, value in delta.items():
+            progress.totals[column] += value
+            progress.pending[column] += value
+        
+        if progress.pending["processed_stocks"] >= settings.sync_progress_flush_every \
+                or time.monotonic() - progress.flushed_at >= settings.sync_progress_flush_interval:
+            return await self.flush_progress(task_id)
+        return True
+    
+    async def flush_progress(self, task_id: str, final: bool = False) -> bool:
+        """
+        把内存中的进度增量写入数据库（一条 UPDATE ... SET x = x + :delta，不先读行）
+        
+        Args:
+            task_id: 任务ID
+            final: 任务结束时调用，写入后丢弃内存进度
+        """
+        progress = self._progress.get(task_id)
+        if progress is None:
+            return True
+        
+        pending = progress.pending
+        progress.pending = dict.fromkeys(PROGRESS_COUNTERS, 0)
+        progress.flushed_at = time.monotonic()
+        if final:
+            self._progress.pop(task_id, None)
+        if not pending["processed_stocks"]:
+            return True
+        
         try:
-            task = self.db.query(DataSyncTaskDB).filter(
-                DataSyncTaskDB.task_id == task_id
-            ).first()
-            
-            if not task:
-                return False
-            
-            task.processed_stocks = (task.processed_stocks or 0) + 1
-            
-            if success:
-                task.success_stocks = (task.success_stocks or 0) + 1
-            else:
-                task.failed_stocks = (task.failed_stocks or 0) + 1
-            
-            task.daily_records = (task.daily_records or 0) + daily_count
-            task.hourly_records = (task.hourly_records or 0) + hourly_count
-            
-            # 计算进度
-            if task.total_stocks and task.total_stocks > 0:
-                task.progress = (task.processed_stocks / task.total_stocks) * 100
-            
-            task.updated_at = datetime.utcnow()
-            
+            values = {
+                column: func.coalesce(getattr(DataSyncTaskDB, column), 0) + value
+                for column, value in pending.items() if value
+            }
+            if progress.percent is not None:
+                values["progress"] = progress.percent
+            values["updated_at"] = datetime.utcnow()
+            
+            self.db.execute(
+                update(DataSyncTaskDB)
+                .where(DataSyncTaskDB.task_id == task_id)
+                .values(**values)
+            )
             self.db.commit()
             return True
             
         except Exception as e:
-            logger.error(f"增加已处理股票数量失败: {e}")
+            logger.error(f"写入任务进度失败: {task_id}: {e}")
             self.db.rollback()
+            # 增量留到下次写入
+            for column, value in pending.items():
+                progress.pending[column] += value
+            if final:
+                self._progress.setdefault(task_id, progress)
             return False
     
+    def get_live_progress(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        运行中任务的实时进度（含尚未写入数据库的部分），不在本进程运行时返回None
+        
+        Returns:
+            {progress, processed_stocks, success_stocks, failed_stocks, daily_records, hourly_records}
+        """
+        progress = self._progress.get(task_id)
+        if progress is None:
+            return None
+        live: Dict[str, Any] = dict(progress.totals)
+        if progress.percent is not None:
+            live["progress"] = progress.percent
+        return live
+    
+    async def get_status(self, task_id: str) -> Optional[str]:
+        """只查询任务状态（用于同步过程中检查是否被取消）"""
+        try:
+            return self.db.query(DataSyncTaskDB.status).filter(
+                DataSyncTaskDB.task_id == task_id
+            ).scalar()
+        except Exception as e:
+            logger.error(f"查询任务状态失败: {task_id}: {e}")
+            return None
+    
     async def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
+        await self.flush_progress(task_id)
         try:
             task = self.db.query(DataSyncTaskDB).filter(
                 DataSyncTaskDB.task_id == task_id
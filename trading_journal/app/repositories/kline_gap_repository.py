@@ -0,0 +1,212 @@
+"""
+K线缺口索引仓库
+维护 kline_session_index 交易日位图：首次使用时按K线表批量建立，之后随K线写入增量更新
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from loguru import logger
+
+from ..core.kline_gap_index import SessionBitmap, missing_date_ranges
+from ..core.trading_calendar import trading_calendar
+from ..models import KLineSessionIndexDB, KLineTableManager
+from ..database import db_service
+
+# 建立缺口索引的时间周期
+GAP_INDEX_TIMEFRAMES = ('1d', '1h')
+
+# 每条SQL包含的股票数
+_CODES_PER_QUERY = 1000
+
+
+class KLineGapRepository:
+    """K线缺口索引仓库实现"""
+
+    def __init__(self):
+        self.db_service = db_service
+        self.calendar = trading_calendar
+
+    def _to_bitmap(self, row: KLineSessionIndexDB) -> SessionBitmap:
+        return SessionBitmap.from_bytes(
+            self.calendar.ordinal(row.start_date), row.session_count or 0, row.bitmap
+        )
+
+    def _row_values(self, code: str, timeframe: str, bitmap: SessionBitmap) -> dict:
+        return {
+            'code': code,
+            'timeframe': timeframe,
+            'start_date': self.calendar.session(bitmap.start),
+            'session_count': len(bitmap.bits),
+            'present_count': bitmap.present_count,
+            'bitmap': bitmap.to_bytes(),
+            'updated_at': datetime.utcnow(),
+        }
+
+    async def get_bitmaps(self, stock_codes: List[str], timeframe: str) -> Dict[str, SessionBitmap]:
+        """
+        批量获取位图，尚未建立索引的股票按K线表一次建立
+
+        Returns:
+            {股票代码: 位图}，失败返回空字典
+        """
+        if not stock_codes:
+            return {}
+        timeframe = KLineTableManager.normalize_period(timeframe)
+        try:
+            with self.db_service.get_session() as session:
+                bitmaps: Dict[str, SessionBitmap] = {}
+                for i in range(0, len(stock_codes), _CODES_PER_QUERY):
+                    for row in session.query(KLineSessionIndexDB).filter(
+                        KLineSessionIndexDB.code.in_(stock_codes[i:i + _CODES_PER_QUERY]),
+                        KLineSessionIndexDB.timeframe == timeframe
+                    ).all():
+                        bitmaps[row.code] = self._to_bitmap(row)
+
+                missing = [code for code in dict.fromkeys(stock_codes) if code not in bitmaps]
+                if missing:
+                    bitmaps.update(self._build(session, missing, timeframe))
+                return bitmaps
+
+        except Exception as e:
+            logger.error(f"获取K线缺口索引失败 {timeframe}: {e}")
+            return {}
+
+    def _build(self, session, stock_codes: List[str], timeframe: str) -> Dict[str, SessionBitmap]:
+        """按K线表中每只股票有数据的日期建立位图（每1000只股票一条 GROUP BY 查询）"""
+        model = KLineTableManager.get_model_by_period(timeframe)
+        trade_date = func.date(model.trade_time)
+        days: Dict[str, List[date]] = {code: [] for code in stock_codes}
+
+        for i in range(0, len(stock_codes), _CODES_PER_QUERY):
+            rows = session.query(model.code, trade_date).filter(
+                model.code.in_(stock_codes[i:i + _CODES_PER_QUERY])
+            ).group_by(model.code, trade_date).all()
+            for code, day in rows:
+                days[code].append(day)
+
+        bitmaps = {
+            code: SessionBitmap.from_ordinals(self.calendar.ordinals(code_days)) if code_days else SessionBitmap.empty()
+            for code, code_days in days.items()
+        }
+        values = [self._row_values(code, timeframe, bitmap) for code, bitmap in bitmaps.items()]
+        for i in range(0, len(values), _CODES_PER_QUERY):
+            stmt = mysql_insert(KLineSessionIndexDB.__table__).values(values[i:i + _CODES_PER_QUERY])
+            inserted = stmt.inserted
+            session.execute(stmt.on_duplicate_key_update(
+                start_date=inserted.start_date,
+                session_count=inserted.session_count,
+                present_count=inserted.present_count,
+                bitmap=inserted.bitmap,
+                updated_at=inserted.updated_at,
+            ))
+        session.commit()
+
+        logger.info(f"建立K线缺口索引: {timeframe} {len(bitmaps)} 只股票")
+        return bitmaps
+
+    async def mark_sessions(self, stock_code: str, timeframe: str, days: Iterable[date]) -> int:
+        """
+        K线写入后标记对应交易日（只更新已建立索引的股票）
+
+        Returns:
+            新标记的交易日数
+        """
+        timeframe = KLineTableManager.normalize_period(timeframe)
+        if timeframe not in GAP_INDEX_TIMEFRAMES:
+            return 0
+        ordinals = self.calendar.ordinals(sorted(set(days)))
+        return await asyncio.to_thread(self._update, stock_code, timeframe, ordinals)
+
+    async def mark_resolved(self, stock_code: str, timeframe: str, start: date, end: date) -> int:
+        """
+        数据源已返回 [start, end] 的数据后调用：区间内仍无K线的交易日（停牌、上市前等）也视为已确认，
+        避免每次分析都重复请求
+
+        Returns:
+            新标记的交易日数
+        """
+        timeframe = KLineTableManager.normalize_period(timeframe)
+        first, last = self.calendar.ordinal(start), self.calendar.ordinal_before(end)
+        if last < first:
+            return 0
+        return await asyncio.to_thread(self._update, stock_code, timeframe, range(first, last + 1))
+
+    async def mark_fetched(self, stock_code: str, timeframe: str, klines: List) -> int:
+        """
+        数据源返回的K线写入后调用：只确认返回数据实际覆盖的区间（首根到末根K线，当天除外）
+
+        数据源可能只返回请求范围的一部分（如小时线约730天的回溯上限），
+        覆盖区间以外的交易日仍保留为缺口；没有K线时不确认任何交易日
+
+        Returns:
+            新标记的交易日数
+        """
+        if not klines:
+            return 0
+        days = [kline.datetime.date() for kline in klines]
+        return await self.mark_resolved(
+            stock_code, timeframe, min(days), min(max(days), date.today() - timedelta(days=1))
+        )
+
+    def _update(self, stock_code: str, timeframe: str, ordinals) -> int:
+        try:
+            with self.db_service.get_session() as session:
+                # 行锁：并发写入同一股票（线程或其他worker进程）时位图的读-改-写不会互相覆盖
+                row = session.query(KLineSessionIndexDB).filter(
+                    KLineSessionIndexDB.code == stock_code,
+                    KLineSessionIndexDB.timeframe == timeframe
+                ).with_for_update().first()
+                if row is None:
+                    return 0
+
+                bitmap = self._to_bitmap(row)
+                marked = bitmap.mark(list(ordinals))
+                if marked:
+                    for key, value in self._row_values(stock_code, timeframe, bitmap).items():
+                        setattr(row, key, value)
+                    session.commit()
+                return marked
+
+        except Exception as e:
+            logger.error(f"更新K线缺口索引失败: {stock_code} {timeframe}: {e}")
+            return 0
+
+    async def get_gap_summary(
+        self,
+        stock_codes: List[str],
+        timeframe: str,
+        start: date,
+        end: Optional[date] = None,
+        max_gap: int = 0
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        每只股票 [start, end] 内的缺口统计
+
+        Returns:
+            {股票代码: {missing_sessions: 缺失交易日数, gap_ranges: 连续缺失区间数, requests: 合并后的请求数}}
+        """
+        end = end or date.today()
+        bitmaps = await self.get_bitmaps(stock_codes, timeframe)
+        summary = {}
+        for code, bitmap in bitmaps.items():
+            runs = bitmap.missing_runs(self.calendar.ordinal(start), self.calendar.ordinal_before(end))
+            summary[code] = {
+                'missing_sessions': sum(last - first + 1 for first, last in runs),
+                'gap_ranges': len(runs),
+                'requests': len(missing_date_ranges(bitmap, self.calendar, start, end, max_gap)),
+            }
+        return summary
+
+    async def clear(self) -> int:
+        """清空索引（K线被删除后调用，下次使用时重新建立）"""
+        try:
+            with self.db_service.get_session() as session:
+                deleted = session.query(KLineSessionIndexDB).delete()
+                session.commit()
+                return deleted
+        except Exception as e:
+            logger.error(f"清空K线缺口索引失败: {e}")
+            return 0
@@ -2,31 +2,159 @@
 K线数据仓库
 负责K线数据的持久化操作
 """
-from typing import List, Optional, Dict, Any, TYPE_CHECKING
+from typing import List, Optional, Dict, Any, Set, Tuple, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from ..core.interfaces import KLineData
+import asyncio
+import time
 from datetime import datetime
+import numpy as np
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import func
 from loguru import logger
 
 from ..core.interfaces import IKLineRepository
-from ..models import KLineDB
+from ..core.kline_cache import kline_cache
+from ..core.kline_manager import KLineManager
+from ..core.kline_rollup import KLineRollupEngine
+from .kline_gap_repository import KLineGapRepository, GAP_INDEX_TIMEFRAMES
+from ..models import KLineDB, KLineTableManager, LatestQuoteDB
 from ..database import db_service
+from ..config import settings
 
 
 class KLineRepository(IKLineRepository):
     """K线数据仓库实现"""
     
+    # 数据统计缓存: (生成时间, 统计结果)，所有实例共享
+    _statistics_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+    
     async def get_kline_data(self, symbol: str, timeframe: str, 
-                           start_date: datetime, end_date: datetime) -> List[KLineDB]:
-        """获取K线数据"""
+                           start_date: datetime, end_date: datetime) -> List['KLineData']:
+        """
+        获取 [start_date, end_date] 的K线数据（按时间正序）
+        
+        从 start_date 起的窗口缓存在进程内（kline_cache），写入新K线时追加到缓存尾部
+        """
         try:
-            return db_service.get_kline_data(symbol, timeframe, start_date, end_date)
+            from ..core.interfaces import KLineData
+            
+            period = KLineTableManager.normalize_period(timeframe)
+            since = KLineTableManager.to_epoch(start_date)
+            columns = kline_cache.get(symbol, period, since=since)
+            if columns is None:
+                columns = self._load_columns(period, [symbol], None, start_date, None).get(symbol)
+                if columns is None:
+                    return []
+                kline_cache.put(symbol, period, columns, covered_from=since)
+            elif kline_cache.needs_refresh(symbol, period):
+                # 其他进程（脚本等）写入的新K线
+                last_ts = kline_cache.last_ts(symbol, period)
+                tail = self._load_columns(
+                    period, [symbol], None, KLineTableManager.from_epoch(last_ts), None
+                ).get(symbol)
+                if tail is not None:
+                    kline_cache.merge(symbol, period, tail)
+                kline_cache.mark_checked(symbol, period)
+                columns = kline_cache.peek(symbol, period, since=since) or columns
+            
+            stop = int(np.searchsorted(columns["ts"], KLineTableManager.to_epoch(end_date), side="right"))
+            return [
+                KLineData(
+                    datetime=KLineTableManager.from_epoch(ts),
+                    open=open_, high=high, low=low, close=close,
+                    volume=volume, symbol=symbol
+                )
+                for ts, open_, high, low, close, volume in zip(
+                    columns["ts"][:stop].tolist(), columns["open"][:stop].tolist(),
+                    columns["high"][:stop].tolist(), columns["low"][:stop].tolist(),
+                    columns["close"][:stop].tolist(), columns["volume"][:stop].tolist()
+                )
+            ]
         except Exception as e:
             logger.error(f"获取K线数据失败: {e}")
             return []
+
+    def _load_columns(
+        self,
+        period: str,
+        symbols: List[str],
+        limit: Optional[int],
+        start: Optional[datetime],
+        end: Optional[datetime]
+    ) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        从周期表批量读取列数据（原始游标 + (code, ts) 索引，不构造ORM对象，每1000只股票一条SQL）
+        
+        Returns:
+            Dict[symbol, {ts, open, high, low, close, volume}]，各列为按时间正序的 NumPy 数组
+        """
+        model = KLineTableManager.get_model_by_period(period)
+        result: Dict[str, Dict[str, np.ndarray]] = {}
+        raw = db_service.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for i in range(0, len(symbols), 1000):
+                codes = symbols[i:i + 1000]
+                sql, params = self._columns_sql(model.__tablename__, codes, limit, start, end)
+                cursor.execute(sql, params)
+                result.update(self._split_columns(cursor.fetchall()))
+            cursor.close()
+        finally:
+            raw.close()
+        return result
+
+    @staticmethod
+    def _columns_sql(table: str, codes: List[str], limit: Optional[int],
+                     start: Optional[datetime], end: Optional[datetime]):
+        """构造列式读取SQL（pymysql 参数风格）"""
+        conditions = [f"code IN ({', '.join(['%s'] * len(codes))})"]
+        params: List[Any] = list(codes)
+        if start is not None:
+            conditions.append("ts >= %s")
+            params.append(KLineTableManager.to_epoch(start))
+        if end is not None:
+            conditions.append("ts <= %s")
+            params.append(KLineTableManager.to_epoch(end))
+        where = " AND ".join(conditions)
+        columns = "code, ts, open_price, high_price, low_price, close_price, COALESCE(volume, 0)"
+        
+        if limit is None:
+            return f"SELECT {columns} FROM {table} WHERE {where} ORDER BY code, ts", params
+        
+        params.append(int(limit))
+        return (
+            f"SELECT {columns} FROM ("
+            f" SELECT code, ts, open_price, high_price, low_price, close_price, volume,"
+            f" ROW_NUMBER() OVER (PARTITION BY code ORDER BY ts DESC) AS rn"
+            f" FROM {table} WHERE {where}"
+            f") AS recent WHERE rn <= %s ORDER BY code, ts",
+            params
+        )
+
+    @staticmethod
+    def _split_columns(rows) -> Dict[str, Dict[str, np.ndarray]]:
+        """把按 (code, ts) 排序的行拆成每只股票的列数组"""
+        if not rows:
+            return {}
+        n = len(rows)
+        codes, ts, opens, highs, lows, closes, volumes = zip(*rows)
+        columns = {
+            "ts": np.fromiter(ts, dtype=np.int64, count=n),
+            "open": np.fromiter(opens, dtype=np.float64, count=n),
+            "high": np.fromiter(highs, dtype=np.float64, count=n),
+            "low": np.fromiter(lows, dtype=np.float64, count=n),
+            "close": np.fromiter(closes, dtype=np.float64, count=n),
+            "volume": np.fromiter(volumes, dtype=np.int64, count=n),
+        }
+        
+        code_array = np.array(codes, dtype=object)
+        bounds = [0, *(np.flatnonzero(code_array[1:] != code_array[:-1]) + 1).tolist(), n]
+        return {
+            codes[lo]: {name: values[lo:hi] for name, values in columns.items()}
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        }
     
     async def save_kline_data(self, kline_data: Dict[str, Any]) -> bool:
         """保存K线数据"""
@@ -36,58 +164,136 @@ class KLineRepository(IKLineRepository):
             logger.error(f"保存K线数据失败: {e}")
             return False
     
+    async def save_kline_batch(self, symbol: str, timeframe: str, klines: List['KLineData']) -> Dict[str, Any]:
+        """
+        批量保存K线数据（分块 INSERT ... ON DUPLICATE KEY UPDATE 写入对应周期表）
+
+        Args:
+            symbol: 股票代码
+            timeframe: 时间周期，如 "1d", "1h"
+            klines: K线数据列表
+
+        Returns:
+            写入统计: rows_total/rows_inserted/rows_updated/rows_written/rows_unchanged/chunks/elapsed_ms，
+            触发汇总时附带 rollups {目标周期: 写入行数}
+        """
+        period = KLineTableManager.normalize_period(timeframe)
+        rows = [
+            {
+                "time_key": kline.datetime.strftime("%Y-%m-%d %H:%M:%S"),
+                "trade_time": kline.datetime,
+                "open_price": float(kline.open),
+                "close_price": float(kline.close),
+                "high_price": float(kline.high),
+                "low_price": float(kline.low),
+                "volume": int(kline.volume) if kline.volume is not None else None,
+            }
+            for kline in klines
+        ]
+        # 同步的 SQLAlchemy 写入放到线程中执行（各自的 Session），不阻塞事件循环上的拉取协程
+        stats = await asyncio.to_thread(self._write_kline_rows, symbol, period, rows)
+        
+        # 维护交易日缺口索引
+        if period in GAP_INDEX_TIMEFRAMES and rows:
+            await KLineGapRepository().mark_sessions(symbol, period, {row["trade_time"].date() for row in rows})
+        
+        return stats
+    
+    def _write_kline_rows(self, symbol: str, period: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """写入K线并重算汇总周期（同步执行，由 save_kline_batch 放到线程中调用）"""
+        with db_service.get_session() as session:
+            stats = KLineManager(session).upsert_klines(
+                symbol, period, rows, chunk_size=settings.kline_upsert_chunk_size
+            )
+            
+            # 有新数据写入时，只重算其时间范围涉及的汇总周期区间
+            if (settings.kline_rollup_enabled and stats["rows_written"]
+                    and period in KLineRollupEngine.ROLLUP_PLAN):
+                trade_times = [row["trade_time"] for row in rows]
+                try:
+                    engine = KLineRollupEngine(
+                        session,
+                        session_open=datetime.strptime(settings.market_session_open, "%H:%M").time(),
+                        chunk_size=settings.kline_upsert_chunk_size
+                    )
+                    stats["rollups"] = {
+                        target: result["rows_written"]
+                        for target, result in engine.rollup(
+                            symbol, period, min(trade_times), max(trade_times)
+                        ).items()
+                    }
+                except Exception as e:
+                    logger.error(f"K线汇总失败: {symbol} {period}: {e}")
+        
+        return stats
+    
+    @staticmethod
+    def _delete_klines_before(cutoff_date: datetime) -> int:
+        with db_service.get_session() as session:
+            return KLineManager(session).delete_klines_before(cutoff_date)
+    
     async def cleanup_old_data(self, cutoff_date: datetime) -> int:
         """清理过期数据"""
         try:
-            return db_service.cleanup_old_kline_data(cutoff_date)
+            # KLineManager 删除后使K线缓存失效
+            deleted = await asyncio.to_thread(self._delete_klines_before, cutoff_date)
+            await KLineGapRepository().clear()
+            return deleted
         except Exception as e:
             logger.error(f"清理过期数据失败: {e}")
             return 0
     
+    @classmethod
+    def invalidate_statistics_cache(cls) -> None:
+        """清除数据统计缓存（同步完成后调用）"""
+        cls._statistics_cache = None
+    
     async def get_data_statistics(self) -> Dict[str, Any]:
-        """获取数据统计信息"""
+        """
+        获取数据统计信息
+        
+        每个周期表一条 GROUP BY code 查询，结果缓存 kline_stats_cache_ttl 秒，同步完成时失效
+        """
+        cached = KLineRepository._statistics_cache
+        if cached is not None and time.monotonic() - cached[0] < settings.kline_stats_cache_ttl:
+            return cached[1]
+        
         try:
+            symbols = set()
+            total_records = 0
+            timeframe_counts = {}
+            latest_updates = {}
+            
             with db_service.get_session() as session:
-                # 获取基础统计信息
-                total_symbols = session.query(func.count(func.distinct(KLineDB.code))).scalar() or 0
-                total_records = session.query(func.count(KLineDB.id)).scalar() or 0
-                
-                # 获取所有时间周期
-                timeframes_result = session.query(func.distinct(KLineDB.period)).all()
-                timeframes = [row[0] for row in timeframes_result]
-                
-                # 获取所有股票代码
-                symbols_result = session.query(func.distinct(KLineDB.code)).all()
-                symbols = [row[0] for row in symbols_result]
-                
-                # 按时间周期统计数据量
-                timeframe_counts = {}
-                for period in timeframes:
-                    count = session.query(func.count(KLineDB.id)).filter(KLineDB.period == period).scalar() or 0
-                    timeframe_counts[period] = count
-                
-                # 获取最新更新时间
-                latest_updates = {}
-                for symbol in symbols:
-                    for period in timeframes:
-                        latest_time = session.query(func.max(KLineDB.created_at)).filter(
-                            KLineDB.code == symbol,
-                            KLineDB.period == period
-                        ).scalar()
+                for model in KLineTableManager.ALL_MODELS:
+                    period = KLineTableManager.get_period_by_model(model)
+                    rows = session.query(
+                        model.code, func.count(model.id), func.max(model.created_at)
+                    ).group_by(model.code).all()
+                    if not rows:
+                        continue
+                    
+                    period_count = 0
+                    for code, count, latest_time in rows:
+                        symbols.add(code)
+                        period_count += count
                         if latest_time:
-                            key = f"{symbol}_{period}"
-                            latest_updates[key] = latest_time.isoformat()
-                
-                stats = {
-                    "total_symbols": total_symbols,
-                    "total_records": total_records,
-                    "timeframes": timeframes,
-                    "symbols": symbols,
-                    "data_by_timeframe": timeframe_counts,
-                    "latest_updates": latest_updates
-                }
-                
-                return stats
+                            latest_updates[f"{code}_{period}"] = latest_time.isoformat()
+                    
+                    timeframe_counts[period] = period_count
+                    total_records += period_count
+            
+            stats = {
+                "total_symbols": len(symbols),
+                "total_records": total_records,
+                "timeframes": list(timeframe_counts.keys()),
+                "symbols": sorted(symbols),
+                "data_by_timeframe": timeframe_counts,
+                "latest_updates": latest_updates
+            }
+            
+            KLineRepository._statistics_cache = (time.monotonic(), stats)
+            return stats
                 
         except Exception as e:
             logger.error(f"获取K线数据统计失败: {e}")
@@ -102,31 +308,40 @@ class KLineRepository(IKLineRepository):
 
     async def get_last_datetime(self, symbol: str, timeframe: str) -> Optional[datetime]:
         """获取某股票某周期最新一条K线的时间（用于增量同步起点）"""
+        result = await self.get_last_datetimes([symbol], timeframe)
+        return result.get(symbol)
+
+    async def get_last_datetimes(self, symbols: List[str], timeframe: str) -> Dict[str, datetime]:
+        """
+        批量获取多只股票某周期最新一条K线的时间
+        
+        对应周期表上一条 GROUP BY 查询，走 (code, trade_time) 索引
+        
+        Returns:
+            {symbol: 最新K线时间}，没有数据的股票不在结果中
+        """
+        if not symbols:
+            return {}
         try:
-            period_map = {
-                "1d": "K_DAY",
-                "1h": "K_60M",
-                "15m": "K_15M",
-                "5m": "K_5M",
-                "1m": "K_1M",
-            }
-            period = period_map.get(timeframe, timeframe)
+            model = KLineTableManager.get_model_by_period(timeframe)
+            result: Dict[str, datetime] = {}
             with db_service.get_session() as session:
-                latest_time_key = session.query(func.max(KLineDB.time_key)).filter(
-                    KLineDB.code == symbol,
-                    KLineDB.period == period,
-                ).scalar()
-                if latest_time_key:
-                    # time_key 格式为 '%Y-%m-%d %H:%M:%S'
-                    return datetime.strptime(latest_time_key, "%Y-%m-%d %H:%M:%S")
-                return None
+                for i in range(0, len(symbols), 1000):
+                    rows = session.query(model.code, func.max(model.trade_time)).filter(
+                        model.code.in_(symbols[i:i + 1000])
+                    ).group_by(model.code).all()
+                    result.update({code: last_time for code, last_time in rows if last_time})
+            return result
         except Exception as e:
-            logger.error(f"获取最新K线时间失败: {symbol} {timeframe}: {e}")
-            return None
+            logger.error(f"批量获取最新K线时间失败: {timeframe}: {e}")
+            return {}
 
     async def get_latest_price_data(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
         """
-        获取多只股票的最新价格数据（从日线K线数据）
+        获取多只股票的最新价格数据（读取 latest_quotes 表，一次索引查询）
+        
+        latest_quotes 中没有的股票按日线表只读计算，不在读路径写入；
+        表建立前已入库的股票由启动时的 backfill_latest_quotes 补建
         
         Args:
             symbols: 股票代码列表
@@ -134,51 +349,58 @@ class KLineRepository(IKLineRepository):
         Returns:
             Dict[symbol, {price: float, change_percent: float, last_update: str}]
         """
+        if not symbols:
+            return {}
         try:
-            result = {}
             with db_service.get_session() as session:
-                for symbol in symbols:
-                    # 获取最近两个交易日的K线数据（去重）
-                    subquery = (session.query(KLineDB.time_key, 
-                                             func.max(KLineDB.close_price).label('close_price'))
-                              .filter(
-                                  KLineDB.code == symbol,
-                                  KLineDB.period == "K_DAY"
-                              )
-                              .group_by(KLineDB.time_key)
-                              .order_by(KLineDB.time_key.desc())
-                              .limit(2)
-                              .subquery())
-                    
-                    latest_klines = (session.query(subquery.c.time_key, subquery.c.close_price)
-                                   .order_by(subquery.c.time_key.desc())
-                                   .all())
-                    
-                    if latest_klines:
-                        current = latest_klines[0]
-                        current_price = current.close_price
-                        last_update = current.time_key
-                        
-                        # 计算涨跌幅
-                        change_percent = None
-                        if len(latest_klines) >= 2:
-                            previous = latest_klines[1]
-                            prev_price = previous.close_price
-                            if prev_price and prev_price > 0:
-                                change_percent = ((current_price - prev_price) / prev_price) * 100
-                        
-                        result[symbol] = {
-                            "price": current_price,
-                            "change_percent": change_percent,
-                            "last_update": str(last_update)
-                        }
+                quotes = {
+                    code: {
+                        "last_close": quote.last_close,
+                        "change_percent": quote.change_percent,
+                        "time_key": quote.time_key
+                    }
+                    for code, quote in self._read_latest_quotes(session, symbols).items()
+                }
+                
+                missing = [s for s in symbols if s not in quotes]
+                if missing:
+                    quotes.update(KLineManager(session).compute_latest_quotes(missing))
             
-            return result
+            return {
+                code: {
+                    "price": quote["last_close"],
+                    "change_percent": quote["change_percent"],
+                    "last_update": quote["time_key"]
+                }
+                for code, quote in quotes.items()
+            }
             
         except Exception as e:
             logger.error(f"获取最新价格数据失败: {e}")
             return {}
 
+    @staticmethod
+    def _read_latest_quotes(session, symbols: List[str]) -> Dict[str, LatestQuoteDB]:
+        """按主键批量读取 latest_quotes"""
+        quotes: Dict[str, LatestQuoteDB] = {}
+        for i in range(0, len(symbols), 1000):
+            for quote in session.query(LatestQuoteDB).filter(
+                LatestQuoteDB.code.in_(symbols[i:i + 1000])
+            ).all():
+                quotes[quote.code] = quote
+        return quotes
+
+    async def backfill_latest_quotes(self) -> int:
+        """补建 latest_quotes 中缺少的股票（启动时调用），返回影响的行数"""
+        def backfill() -> int:
+            with db_service.get_session() as session:
+                return KLineManager(session).backfill_latest_quotes()
+        try:
+            return await asyncio.to_thread(backfill)
+        except Exception as e:
+            logger.error(f"补建最新行情失败: {e}")
+            return 0
+
     async def get_single_latest_price_data(self, symbol: str) -> Optional[Dict[str, Any]]:
         """
         获取单只股票的最新价格数据（从日线K线数据）
@@ -208,30 +430,60 @@ class KLineRepository(IKLineRepository):
         Returns:
             bool: 是否有足够数据
         """
+        sufficient = await self.get_sufficient_symbols([symbol], min_daily_records, min_hourly_records)
+        return symbol in sufficient
+
+    async def get_sufficient_symbols(
+        self,
+        symbols: Optional[List[str]] = None,
+        min_daily_records: int = 100,
+        min_hourly_records: int = 100
+    ) -> Set[str]:
+        """
+        批量获取有足够K线数据的股票集合
+        
+        每个周期一条 GROUP BY code HAVING COUNT(*) >= N 查询（走 (code, trade_time) 索引），
+        小时线只在日线满足的股票中查询
+        
+        Args:
+            symbols: 股票代码列表，None表示全部股票
+            min_daily_records: 最少日线记录数
+            min_hourly_records: 最少小时线记录数
+            
+        Returns:
+            Set[str]: 日线和小时线都满足条件的股票代码
+        """
         try:
             with db_service.get_session() as session:
-                # 检查日线数据
-                daily_count = session.query(func.count(KLineDB.id)).filter(
-                    KLineDB.code == symbol,
-                    KLineDB.period == "K_DAY"
-                ).scalar() or 0
-                
-                # 检查小时线数据
-                hourly_count = session.query(func.count(KLineDB.id)).filter(
-                    KLineDB.code == symbol,
-                    KLineDB.period == "K_60M"
-                ).scalar() or 0
-                
-                has_enough = daily_count >= min_daily_records and hourly_count >= min_hourly_records
-                
-                if not has_enough:
-                    logger.debug(f"股票 {symbol} 数据不足: 日线 {daily_count}/{min_daily_records}, 小时线 {hourly_count}/{min_hourly_records}")
-                
-                return has_enough
+                daily = self._codes_with_min_records(session, "1d", min_daily_records, symbols)
+                if not daily:
+                    return set()
+                hourly = self._codes_with_min_records(session, "1h", min_hourly_records, list(daily))
+                return daily & hourly
                 
         except Exception as e:
-            logger.error(f"检查股票 {symbol} 数据充足性失败: {e}")
-            return False
+            logger.error(f"批量检查股票数据充足性失败: {e}")
+            return set()
+
+    @staticmethod
+    def _codes_with_min_records(session, period: str, min_records: int, symbols: Optional[List[str]]) -> Set[str]:
+        """返回指定周期表中记录数不少于 min_records 的股票代码"""
+        model = KLineTableManager.get_model_by_period(period)
+        
+        def query(codes: Optional[List[str]]) -> Set[str]:
+            q = session.query(model.code)
+            if codes is not None:
+                q = q.filter(model.code.in_(codes))
+            rows = q.group_by(model.code).having(func.count(model.id) >= min_records).all()
+            return {row[0] for row in rows}
+        
+        if symbols is None:
+            return query(None)
+        
+        result: Set[str] = set()
+        for i in range(0, len(symbols), 1000):
+            result |= query(symbols[i:i + 1000])
+        return result
 
     async def get_stocks_with_sufficient_data(self, symbols: List[str], min_daily_records: int = 100, min_hourly_records: int = 100) -> List[str]:
         """
@@ -243,35 +495,12 @@ class KLineRepository(IKLineRepository):
             min_hourly_records: 最少小时线记录数
             
         Returns:
-            List[str]: 有足够数据的股票代码列表
+            List[str]: 有足够数据的股票代码列表（保持输入顺序）
         """
-        try:
-            sufficient_symbols = []
-            with db_service.get_session() as session:
-                for symbol in symbols:
-                    # 检查日线数据
-                    daily_count = session.query(func.count(KLineDB.id)).filter(
-                        KLineDB.code == symbol,
-                        KLineDB.period == "K_DAY"
-                    ).scalar() or 0
-                    
-                    # 检查小时线数据
-                    hourly_count = session.query(func.count(KLineDB.id)).filter(
-                        KLineDB.code == symbol,
-                        KLineDB.period == "K_60M"
-                    ).scalar() or 0
-                    
-                    if daily_count >= min_daily_records and hourly_count >= min_hourly_records:
-                        sufficient_symbols.append(symbol)
-                    else:
-                        logger.debug(f"跳过数据不足的股票 {symbol}: 日线 {daily_count}/{min_daily_records}, 小时线 {hourly_count}/{min_hourly_records}")
-            
-            logger.info(f"在 {len(symbols)} 只股票中，{len(sufficient_symbols)} 只有足够数据用于策略分析")
-            return sufficient_symbols
-            
-        except Exception as e:
-            logger.error(f"批量检查股票数据充足性失败: {e}")
-            return []
+        sufficient = await self.get_sufficient_symbols(symbols, min_daily_records, min_hourly_records)
+        sufficient_symbols = [symbol for symbol in symbols if symbol in sufficient]
+        logger.info(f"在 {len(symbols)} 只股票中，{len(sufficient_symbols)} 只有足够数据用于策略分析")
+        return sufficient_symbols
 
     async def get_kline_data_from_db(self, symbol: str, period: str, limit: int = 1000) -> List['KLineData']:
         """
@@ -279,7 +508,7 @@ class KLineRepository(IKLineRepository):
         
         Args:
             symbol: 股票代码
-            period: 周期 ("K_DAY" 或 "K_60M")
+            period: 周期 ("K_DAY" 或 "K_60M"，也支持 "1d"/"1h")
             limit: 获取记录数限制
             
         Returns:
@@ -288,27 +517,29 @@ class KLineRepository(IKLineRepository):
         try:
             from ..core.interfaces import KLineData
             
+            model = KLineTableManager.get_model_by_period({"K_DAY": "1d", "K_60M": "1h"}.get(period, period))
             with db_service.get_session() as session:
-                klines = session.query(KLineDB).filter(
-                    KLineDB.code == symbol,
-                    KLineDB.period == period
-                ).order_by(KLineDB.time_key.desc()).limit(limit).all()
+                # 只取需要的列（不构造ORM对象），按 (code, ts) 索引倒序取最近 limit 条
+                rows = session.query(
+                    model.trade_time, model.open_price, model.high_price,
+                    model.low_price, model.close_price, model.volume
+                ).filter(
+                    model.code == symbol
+                ).order_by(model.ts.desc()).limit(limit).all()
                 
-                # 转换为策略所需的KLineData格式
-                result = []
-                for kline in reversed(klines):  # 转为正序（时间从早到晚）
-                    kline_data = KLineData(
-                        datetime=datetime.strptime(kline.time_key, "%Y-%m-%d %H:%M:%S"),
-                        open=kline.open_price,
-                        high=kline.high_price,
-                        low=kline.low_price,
-                        close=kline.close_price,
-                        volume=kline.volume or 0,
+                # 转换为策略所需的KLineData格式（转为正序，时间从早到晚）
+                return [
+                    KLineData(
+                        datetime=trade_time,
+                        open=open_price,
+                        high=high_price,
+                        low=low_price,
+                        close=close_price,
+                        volume=volume or 0,
                         symbol=symbol
                     )
-                    result.append(kline_data)
-                
-                return result
+                    for trade_time, open_price, high_price, low_price, close_price, volume in reversed(rows)
+                ]
                 
         except Exception as e:
             logger.error(f"从数据库获取K线数据失败 {symbol} {period}: {e}")
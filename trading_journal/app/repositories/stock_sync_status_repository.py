@@ -4,14 +4,21 @@
 """
 import json
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import func, and_, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from loguru import logger
 
-from ..models import StockSyncStatusDB, KLineDB
+from ..models import StockSyncStatusDB, KLineTableManager
 from ..database import db_service
 
+# 智能同步维护边界信息的时间周期
+SYNC_TIMEFRAMES = ('1d', '1h')
+
+# 每条SQL包含的股票数
+_CODES_PER_QUERY = 1000
+
 
 class StockSyncStatusRepository:
     """股票同步状态仓库实现"""
@@ -58,68 +65,93 @@ class StockSyncStatusRepository:
             raise
     
     async def update_boundary_info(self, stock_code: str, timeframe: str) -> bool:
-        """更新边界信息（从klines表查询最早和最新数据时间）"""
+        """更新边界信息（从对应周期K线表查询最早和最新数据时间）"""
+        return bool(await self.refresh_boundaries([stock_code], [timeframe]))
+    
+    async def refresh_boundaries(
+        self,
+        stock_codes: List[str],
+        timeframes: Iterable[str] = SYNC_TIMEFRAMES
+    ) -> Dict[Tuple[str, str], StockSyncStatusDB]:
+        """
+        批量刷新边界信息并返回同步状态
+        
+        每个周期表每1000只股票一条 GROUP BY code 查询（走 (code, trade_time) 索引），
+        结果用 INSERT ... ON DUPLICATE KEY UPDATE 一次写入（不存在的状态记录同时创建）
+        
+        Args:
+            stock_codes: 股票代码列表
+            timeframes: 时间周期列表
+            
+        Returns:
+            {(股票代码, 时间周期): 同步状态}，失败返回空字典
+        """
+        if not stock_codes:
+            return {}
+        stock_codes = list(dict.fromkeys(stock_codes))
+        timeframes = list(timeframes)
         try:
+            now = datetime.utcnow()
+            today = date.today()
             with self.db_service.get_session() as session:
-                # 获取时间周期映射
-                period_map = {
-                    "1d": "K_DAY",
-                    "1h": "K_60M",
-                    "15m": "K_15M",
-                    "5m": "K_5M",
-                    "1m": "K_1M"
-                }
-                period = period_map.get(timeframe, "K_DAY")
-                
-                # 查询边界信息
-                boundary_query = session.query(
-                    func.min(KLineDB.time_key).label('earliest'),
-                    func.max(KLineDB.time_key).label('latest'),
-                    func.count(KLineDB.id).label('total_count')
-                ).filter(
-                    and_(
-                        KLineDB.code == stock_code,
-                        KLineDB.period == period
-                    )
-                ).first()
-                
-                earliest_str = boundary_query.earliest
-                latest_str = boundary_query.latest
-                total_count = boundary_query.total_count or 0
-                
-                # 转换为日期
-                earliest_date = None
-                latest_date = None
-                
-                if earliest_str:
-                    earliest_date = datetime.strptime(earliest_str, "%Y-%m-%d %H:%M:%S").date()
-                if latest_str:
-                    latest_date = datetime.strptime(latest_str, "%Y-%m-%d %H:%M:%S").date()
-                
-                # 更新同步状态记录
-                status = await self.get_or_create_sync_status(stock_code, timeframe)
-                
-                session.query(StockSyncStatusDB).filter(
-                    and_(
-                        StockSyncStatusDB.stock_code == stock_code,
-                        StockSyncStatusDB.timeframe == timeframe
-                    )
-                ).update({
-                    'earliest_data_date': earliest_date,
-                    'latest_data_date': latest_date,
-                    'total_records': total_count,
-                    'updated_at': datetime.utcnow()
-                })
+                for timeframe in timeframes:
+                    model = KLineTableManager.get_model_by_period(timeframe)
+                    target_start = self._get_target_start_date(timeframe)
+                    
+                    for i in range(0, len(stock_codes), _CODES_PER_QUERY):
+                        codes = stock_codes[i:i + _CODES_PER_QUERY]
+                        boundaries = {
+                            code: (earliest, latest, count)
+                            for code, earliest, latest, count in session.query(
+                                model.code,
+                                func.min(model.trade_time),
+                                func.max(model.trade_time),
+                                func.count(model.id)
+                            ).filter(model.code.in_(codes)).group_by(model.code).all()
+                        }
+                        
+                        rows = []
+                        for code in codes:
+                            earliest, latest, count = boundaries.get(code, (None, None, 0))
+                            rows.append({
+                                'stock_code': code,
+                                'timeframe': timeframe,
+                                'earliest_data_date': earliest.date() if earliest else None,
+                                'latest_data_date': latest.date() if latest else None,
+                                'total_records': count,
+                                'target_start_date': target_start,
+                                'target_end_date': today,
+                                'sync_status': 'pending',
+                                'retry_count': 0,
+                                'created_at': now,
+                                'updated_at': now,
+                            })
+                        
+                        stmt = mysql_insert(StockSyncStatusDB.__table__).values(rows)
+                        inserted = stmt.inserted
+                        session.execute(stmt.on_duplicate_key_update(
+                            earliest_data_date=inserted.earliest_data_date,
+                            latest_data_date=inserted.latest_data_date,
+                            total_records=inserted.total_records,
+                            updated_at=inserted.updated_at,
+                        ))
                 
                 session.commit()
                 
-                logger.debug(f"更新边界信息: {stock_code} {timeframe} - "
-                           f"最早: {earliest_date}, 最新: {latest_date}, 总数: {total_count}")
-                return True
+                statuses: Dict[Tuple[str, str], StockSyncStatusDB] = {}
+                for i in range(0, len(stock_codes), _CODES_PER_QUERY):
+                    for status in session.query(StockSyncStatusDB).filter(
+                        StockSyncStatusDB.stock_code.in_(stock_codes[i:i + _CODES_PER_QUERY]),
+                        StockSyncStatusDB.timeframe.in_(timeframes)
+                    ).all():
+                        statuses[(status.stock_code, status.timeframe)] = status
+                
+                logger.debug(f"刷新边界信息: {len(stock_codes)} 只股票 × {len(timeframes)} 个周期")
+                return statuses
                 
         except Exception as e:
-            logger.error(f"更新边界信息失败: {stock_code} {timeframe}: {e}")
-            return False
+            logger.error(f"批量更新边界信息失败: {e}")
+            return {}
     
     async def get_sync_status(self, stock_code: str, timeframe: str) -> Optional[StockSyncStatusDB]:
         """获取同步状态"""
@@ -283,10 +315,8 @@ class StockSyncStatusRepository:
     async def initialize_all_stocks(self, stock_codes: List[str]) -> bool:
         """为所有股票初始化同步状态记录"""
         try:
-            for stock_code in stock_codes:
-                for timeframe in ['1d', '1h']:
-                    await self.get_or_create_sync_status(stock_code, timeframe)
-                    await self.update_boundary_info(stock_code, timeframe)
+            if stock_codes and not await self.refresh_boundaries(stock_codes):
+                return False
             
             logger.info(f"为 {len(stock_codes)} 只股票初始化同步状态完成")
             return True
@@ -0,0 +1,97 @@
+"""
+股票代码注册表仓库
+SymbolRegistry 的 MySQL 存储后端（symbol_registry 表），所有API进程和同步worker共享同一份缓存
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from loguru import logger
+
+from ..models import SymbolRegistryDB
+from ..database import db_service
+from ..utils.market_data_helper import SymbolStore
+
+# 每条SQL包含的代码数
+_SYMBOLS_PER_QUERY = 1000
+
+
+class SymbolRegistryRepository(SymbolStore):
+    """股票代码注册表仓库实现"""
+
+    def __init__(self):
+        self.db_service = db_service
+
+    def load_validity(self, symbols: List[str]) -> Dict[str, Tuple[bool, float]]:
+        result: Dict[str, Tuple[bool, float]] = {}
+        try:
+            with self.db_service.get_session() as session:
+                for i in range(0, len(symbols), _SYMBOLS_PER_QUERY):
+                    for symbol, is_valid, validated_at in session.query(
+                        SymbolRegistryDB.symbol, SymbolRegistryDB.is_valid, SymbolRegistryDB.validated_at
+                    ).filter(
+                        SymbolRegistryDB.symbol.in_(symbols[i:i + _SYMBOLS_PER_QUERY]),
+                        SymbolRegistryDB.is_valid.isnot(None)
+                    ).all():
+                        result[symbol] = (bool(is_valid), validated_at)
+        except Exception as e:
+            # 读取失败按未命中处理，由数据源重新验证
+            logger.error(f"读取股票代码注册表失败: {e}")
+        return result
+
+    def save_validity(self, validity: Dict[str, bool], validated_at: float):
+        rows = [
+            {'symbol': symbol, 'is_valid': is_valid, 'validated_at': validated_at}
+            for symbol, is_valid in validity.items()
+        ]
+        try:
+            with self.db_service.get_session() as session:
+                for i in range(0, len(rows), _SYMBOLS_PER_QUERY):
+                    stmt = mysql_insert(SymbolRegistryDB.__table__).values(rows[i:i + _SYMBOLS_PER_QUERY])
+                    session.execute(stmt.on_duplicate_key_update(
+                        is_valid=stmt.inserted.is_valid,
+                        validated_at=stmt.inserted.validated_at,
+                    ))
+                session.commit()
+        except Exception as e:
+            logger.error(f"写入股票代码有效性失败: {e}")
+
+    def load_info(self, symbol: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        try:
+            with self.db_service.get_session() as session:
+                row = session.query(SymbolRegistryDB.info, SymbolRegistryDB.info_at).filter(
+                    SymbolRegistryDB.symbol == symbol,
+                    SymbolRegistryDB.info.isnot(None)
+                ).first()
+            return (json.loads(row[0]), row[1]) if row else None
+        except Exception as e:
+            logger.error(f"读取股票 {symbol} 基本信息缓存失败: {e}")
+            return None
+
+    def save_info(self, symbol: str, info: Dict[str, Any], fetched_at: float):
+        try:
+            with self.db_service.get_session() as session:
+                stmt = mysql_insert(SymbolRegistryDB.__table__).values(
+                    symbol=symbol,
+                    is_valid=True,
+                    validated_at=fetched_at,
+                    info=json.dumps(info, ensure_ascii=False, default=str),
+                    info_at=fetched_at,
+                )
+                session.execute(stmt.on_duplicate_key_update(
+                    is_valid=stmt.inserted.is_valid,
+                    validated_at=stmt.inserted.validated_at,
+                    info=stmt.inserted.info,
+                    info_at=stmt.inserted.info_at,
+                ))
+                session.commit()
+        except Exception as e:
+            logger.error(f"写入股票 {symbol} 基本信息缓存失败: {e}")
+
+    def delete(self, symbol: str):
+        try:
+            with self.db_service.get_session() as session:
+                session.query(SymbolRegistryDB).filter(SymbolRegistryDB.symbol == symbol).delete()
+                session.commit()
+        except Exception as e:
+            logger.error(f"删除股票 {symbol} 注册表缓存失败: {e}")
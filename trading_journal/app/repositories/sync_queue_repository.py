@@ -0,0 +1,507 @@
+"""
+同步工作队列仓库
+sync_work_units 表上的租约队列：API 入队 (股票, 周期, 日期范围)，独立 worker 进程用
+SELECT ... FOR UPDATE SKIP LOCKED 认领，多个 worker 之间不会互相阻塞或重复认领
+
+计划范围已被其他任务的未结束单元覆盖时不重复入队，而是通过 sync_task_unit_links 关联到这些单元：
+任务的单元 = 自己入队的单元 + 关联的单元，全部结束后任务才结束
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, exists, func, select, update
+from loguru import logger
+
+from ..config import settings
+from ..models import DataSyncTaskDB, SyncWorkUnitDB, SyncTaskUnitLinkDB
+from ..database import db_service
+from .data_sync_task_repository import FINAL_STATUSES
+
+# 仍在队列中（未结束）的状态
+ACTIVE_STATUSES = ('pending', 'leased')
+
+# 每条SQL包含的工作单元数
+_UNITS_PER_QUERY = 1000
+
+
+@dataclass
+class WorkUnit:
+    """已认领的工作单元（脱离Session的快照）"""
+    id: int
+    task_id: Optional[str]
+    stock_code: str
+    timeframe: str
+    start_date: date
+    end_date: date
+    reason: Optional[str]
+    attempts: int
+    max_attempts: int
+
+
+def subtract_ranges(start: date, end: date, covered: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """[start, end] 中不被 covered 内任一闭区间覆盖的部分"""
+    remaining = []
+    for covered_start, covered_end in sorted(covered):
+        if covered_end < start or covered_start > end:
+            continue
+        if covered_start > start:
+            remaining.append((start, covered_start - timedelta(days=1)))
+        start = max(start, covered_end + timedelta(days=1))
+        if start > end:
+            return remaining
+    remaining.append((start, end))
+    return remaining
+
+
+def _task_units(task_id: str):
+    """任务的单元：自己入队的单元和关联的其他任务的单元"""
+    return or_(
+        SyncWorkUnitDB.task_id == task_id,
+        SyncWorkUnitDB.id.in_(
+            select(SyncTaskUnitLinkDB.unit_id).where(SyncTaskUnitLinkDB.task_id == task_id)
+        )
+    )
+
+
+class SyncQueueRepository:
+    """同步工作队列仓库实现"""
+
+    def __init__(self):
+        self.db_service = db_service
+
+    async def enqueue(self, task_id: Optional[str], units: Iterable[Dict[str, Any]]) -> Optional[int]:
+        """
+        批量入队
+
+        与同一 (股票, 周期) 未结束单元重叠的日期只入队未覆盖的部分，
+        避免重复触发时同一范围被多个worker同时拉取，又不丢弃新计划中超出已排队范围的日期；
+        重叠的其他任务的单元关联到本任务，本任务等待其完成
+
+        Args:
+            task_id: 所属任务ID
+            units: [{stock_code, timeframe, start_date, end_date, reason}]
+
+        Returns:
+            新入队的单元数（0表示全部已在队列中），失败返回None
+        """
+        units = list(units)
+        if not units:
+            return 0
+        try:
+            now = datetime.utcnow()
+            with self.db_service.get_session() as session:
+                codes = sorted({unit['stock_code'] for unit in units})
+                queued: Dict[Tuple[str, str], List[Tuple[date, date, int, Optional[str]]]] = {}
+                for i in range(0, len(codes), _UNITS_PER_QUERY):
+                    for unit_id, owner, code, timeframe, start, end in session.query(
+                        SyncWorkUnitDB.id, SyncWorkUnitDB.task_id, SyncWorkUnitDB.stock_code,
+                        SyncWorkUnitDB.timeframe, SyncWorkUnitDB.start_date, SyncWorkUnitDB.end_date
+                    ).filter(
+                        SyncWorkUnitDB.stock_code.in_(codes[i:i + _UNITS_PER_QUERY]),
+                        SyncWorkUnitDB.status.in_(ACTIVE_STATUSES)
+                    ).all():
+                        queued.setdefault((code, timeframe), []).append((start, end, unit_id, owner))
+
+                # 重叠的其他任务的单元（本任务自己的单元和已关联的除外）
+                linked = set()
+                if task_id:
+                    for unit in units:
+                        for start, end, unit_id, owner in queued.get((unit['stock_code'], unit['timeframe']), []):
+                            if owner != task_id and start <= unit['end_date'] and end >= unit['start_date']:
+                                linked.add(unit_id)
+                    if linked:
+                        linked -= {row[0] for row in session.query(SyncTaskUnitLinkDB.unit_id).filter(
+                            SyncTaskUnitLinkDB.task_id == task_id
+                        ).all()}
+
+                values = [
+                    {
+                        'task_id': task_id,
+                        'stock_code': unit['stock_code'],
+                        'timeframe': unit['timeframe'],
+                        'start_date': start,
+                        'end_date': end,
+                        'reason': unit.get('reason'),
+                        'status': 'pending',
+                        'available_at': now,
+                        'attempts': 0,
+                        'max_attempts': settings.sync_queue_max_attempts,
+                        'rows_written': 0,
+                        'created_at': now,
+                        'updated_at': now,
+                    }
+                    for unit in units
+                    for start, end in subtract_ranges(
+                        unit['start_date'], unit['end_date'],
+                        [(start, end) for start, end, _, _ in queued.get((unit['stock_code'], unit['timeframe']), [])]
+                    )
+                ]
+                for i in range(0, len(values), _UNITS_PER_QUERY):
+                    session.execute(SyncWorkUnitDB.__table__.insert(), values[i:i + _UNITS_PER_QUERY])
+                links = [{'task_id': task_id, 'unit_id': unit_id, 'created_at': now} for unit_id in sorted(linked)]
+                for i in range(0, len(links), _UNITS_PER_QUERY):
+                    session.execute(SyncTaskUnitLinkDB.__table__.insert(), links[i:i + _UNITS_PER_QUERY])
+                session.commit()
+
+                logger.info(f"同步队列入队: {len(values)} 个单元, 关联已排队单元 {len(links)} 个"
+                            f"（计划 {len(units)} 个范围）")
+                return len(values)
+
+        except Exception as e:
+            logger.error(f"同步队列入队失败: {e}")
+            return None
+
+    async def claim(self, worker_id: str, limit: int, lease_seconds: int) -> List[WorkUnit]:
+        """
+        认领最多 limit 个到期的单元并加租约
+
+        FOR UPDATE SKIP LOCKED 跳过其他worker正在认领的行（需要 MySQL 8.0+），
+        认领后立即提交，行锁只在本次查询期间持有
+
+        Returns:
+            认领到的单元，队列为空或失败返回空列表
+        """
+        try:
+            now = datetime.utcnow()
+            with self.db_service.get_session() as session:
+                ids = [row[0] for row in session.query(SyncWorkUnitDB.id).filter(
+                    SyncWorkUnitDB.status == 'pending',
+                    SyncWorkUnitDB.available_at <= now
+                ).order_by(
+                    SyncWorkUnitDB.available_at, SyncWorkUnitDB.id
+                ).limit(limit).with_for_update(skip_locked=True).all()]
+
+                if not ids:
+                    session.commit()
+                    return []
+
+                session.execute(update(SyncWorkUnitDB).where(SyncWorkUnitDB.id.in_(ids)).values(
+                    status='leased',
+                    lease_owner=worker_id,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds),
+                    attempts=SyncWorkUnitDB.attempts + 1,
+                    updated_at=now,
+                ))
+                units = [
+                    WorkUnit(
+                        id=row.id, task_id=row.task_id, stock_code=row.stock_code, timeframe=row.timeframe,
+                        start_date=row.start_date, end_date=row.end_date, reason=row.reason,
+                        attempts=row.attempts, max_attempts=row.max_attempts,
+                    )
+                    for row in session.query(SyncWorkUnitDB).filter(
+                        SyncWorkUnitDB.id.in_(ids)
+                    ).order_by(SyncWorkUnitDB.id).all()
+                ]
+                session.commit()
+                return units
+
+        except Exception as e:
+            logger.error(f"认领同步单元失败: {worker_id}: {e}")
+            return []
+
+    async def renew(self, unit_id: int, worker_id: str, lease_seconds: int) -> bool:
+        """续租（单元执行时间可能超过租约时调用），租约已不属于该worker时返回False"""
+        return self._update_leased(
+            unit_id, worker_id,
+            lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds)
+        )
+
+    async def complete(self, unit_id: int, worker_id: str, rows_written: int) -> bool:
+        """
+        标记完成
+
+        只更新仍由该worker持有租约的单元：租约过期被重新认领后，旧worker的结果不覆盖新状态
+
+        Returns:
+            是否更新成功
+        """
+        return self._update_leased(
+            unit_id, worker_id,
+            status='done', rows_written=rows_written, last_error=None,
+            lease_owner=None, lease_expires_at=None
+        )
+
+    async def fail(self, unit: WorkUnit, worker_id: str, error: str, retry_delay: float) -> bool:
+        """
+        标记失败：未达到最多认领次数时延后 retry_delay 秒重新入队，否则置为 failed
+
+        Returns:
+            是否更新成功
+        """
+        if unit.attempts >= unit.max_attempts:
+            return self._update_leased(
+                unit.id, worker_id,
+                status='failed', last_error=error[:2000], lease_owner=None, lease_expires_at=None
+            )
+        return self._update_leased(
+            unit.id, worker_id,
+            status='pending', last_error=error[:2000], lease_owner=None, lease_expires_at=None,
+            available_at=datetime.utcnow() + timedelta(seconds=retry_delay)
+        )
+
+    async def release(self, unit_id: int, worker_id: str) -> bool:
+        """放回已认领但未开始执行的单元（worker停止时），不计入认领次数"""
+        return self._update_leased(
+            unit_id, worker_id,
+            status='pending', available_at=datetime.utcnow(), attempts=SyncWorkUnitDB.attempts - 1,
+            lease_owner=None, lease_expires_at=None
+        )
+
+    def _update_leased(self, unit_id: int, worker_id: str, **values) -> bool:
+        try:
+            with self.db_service.get_session() as session:
+                result = session.execute(update(SyncWorkUnitDB).where(
+                    SyncWorkUnitDB.id == unit_id,
+                    SyncWorkUnitDB.status == 'leased',
+                    SyncWorkUnitDB.lease_owner == worker_id
+                ).values(updated_at=datetime.utcnow(), **values))
+                session.commit()
+                if not result.rowcount:
+                    logger.warning(f"同步单元 {unit_id} 的租约已不属于 {worker_id}，忽略本次更新")
+                return bool(result.rowcount)
+
+        except Exception as e:
+            logger.error(f"更新同步单元失败: {unit_id}: {e}")
+            return False
+
+    async def reclaim_expired(self) -> int:
+        """
+        租约过期的单元（worker崩溃或卡住）重新入队，已达最多认领次数的置为 failed
+
+        各worker定期调用，条件更新可重复执行
+
+        Returns:
+            处理的单元数
+        """
+        try:
+            now = datetime.utcnow()
+            expired = and_(SyncWorkUnitDB.status == 'leased', SyncWorkUnitDB.lease_expires_at < now)
+            with self.db_service.get_session() as session:
+                failed = session.execute(update(SyncWorkUnitDB).where(
+                    expired, SyncWorkUnitDB.attempts >= SyncWorkUnitDB.max_attempts
+                ).values(
+                    status='failed', last_error='租约过期', lease_owner=None, lease_expires_at=None, updated_at=now
+                )).rowcount or 0
+                requeued = session.execute(update(SyncWorkUnitDB).where(expired).values(
+                    status='pending', available_at=now, lease_owner=None, lease_expires_at=None, updated_at=now
+                )).rowcount or 0
+                session.commit()
+
+                if failed or requeued:
+                    logger.warning(f"回收过期租约: 重新入队 {requeued} 个, 失败 {failed} 个")
+                return failed + requeued
+
+        except Exception as e:
+            logger.error(f"回收过期租约失败: {e}")
+            return 0
+
+    async def get_task_progress(self, task_id: str) -> Dict[str, Any]:
+        """
+        任务下各单元（含关联的其他任务的单元）的进度
+
+        Returns:
+            {total, pending, leased, done, failed, rows_written,
+             timeframes: {周期: {状态: 数量, rows_written: 写入条数}}}
+        """
+        try:
+            with self.db_service.get_session() as session:
+                rows = session.query(
+                    SyncWorkUnitDB.timeframe, SyncWorkUnitDB.status,
+                    func.count(SyncWorkUnitDB.id), func.coalesce(func.sum(SyncWorkUnitDB.rows_written), 0)
+                ).filter(
+                    _task_units(task_id)
+                ).group_by(SyncWorkUnitDB.timeframe, SyncWorkUnitDB.status).all()
+
+            progress = {'total': 0, 'pending': 0, 'leased': 0, 'done': 0, 'failed': 0,
+                        'rows_written': 0, 'timeframes': {}}
+            for timeframe, status, count, rows_written in rows:
+                progress['total'] += count
+                progress[status] = progress.get(status, 0) + count
+                progress['rows_written'] += int(rows_written)
+                timeframe_progress = progress['timeframes'].setdefault(timeframe, {'rows_written': 0})
+                timeframe_progress[status] = count
+                timeframe_progress['rows_written'] += int(rows_written)
+            return progress
+
+        except Exception as e:
+            logger.error(f"获取同步队列任务进度失败: {task_id}: {e}")
+            return {}
+
+    async def finish_task_if_drained(self, task_id: str) -> bool:
+        """
+        任务下所有单元都已结束时，把汇总结果写入 data_sync_tasks 并置为结束状态
+
+        队列任务的计数按工作单元统计（processed/success/failed 为单元数）。
+        多个worker可能同时调用，条件更新保证只有一个生效。
+
+        Returns:
+            本次调用是否结束了任务
+        """
+        if not task_id:
+            return False
+        progress = await self.get_task_progress(task_id)
+        # total 为0：任务刚创建、单元尚未入队（或查询失败）
+        if not progress or not progress['total'] or progress['pending'] or progress['leased']:
+            return False
+
+        try:
+            now = datetime.utcnow()
+            with self.db_service.get_session() as session:
+                task = session.query(DataSyncTaskDB.start_time).filter(
+                    DataSyncTaskDB.task_id == task_id
+                ).first()
+                if task is None:
+                    return False
+
+                result = session.execute(update(DataSyncTaskDB).where(
+                    DataSyncTaskDB.task_id == task_id,
+                    DataSyncTaskDB.status.notin_(FINAL_STATUSES)
+                ).values(
+                    status='completed' if progress['done'] else 'failed',
+                    progress=100.0,
+                    total_stocks=progress['total'],
+                    processed_stocks=progress['total'],
+                    success_stocks=progress['done'],
+                    failed_stocks=progress['failed'],
+                    daily_records=progress['timeframes'].get('1d', {}).get('rows_written', 0),
+                    hourly_records=progress['timeframes'].get('1h', {}).get('rows_written', 0),
+                    end_time=now,
+                    duration_seconds=(now - task.start_time).total_seconds() if task.start_time else None,
+                ))
+                session.commit()
+
+                if result.rowcount:
+                    logger.info(f"同步队列任务完成: {task_id}, 成功 {progress['done']}/{progress['total']} 个单元, "
+                                f"写入 {progress['rows_written']} 条")
+                return bool(result.rowcount)
+
+        except Exception as e:
+            logger.error(f"结束同步队列任务失败: {task_id}: {e}")
+            return False
+
+    async def finish_drained_tasks(self) -> int:
+        """
+        结束所有单元都已结束、但仍处于运行中的队列任务
+
+        正常由执行最后一个单元的worker结束任务；该worker退出或崩溃时由其他worker定期补上
+
+        Returns:
+            本次结束的任务数
+        """
+        try:
+            with self.db_service.get_session() as session:
+                has_active_units = session.query(SyncWorkUnitDB.id).filter(
+                    SyncWorkUnitDB.task_id == DataSyncTaskDB.task_id,
+                    SyncWorkUnitDB.status.in_(ACTIVE_STATUSES)
+                ).exists()
+                has_active_links = session.query(SyncTaskUnitLinkDB.unit_id).join(
+                    SyncWorkUnitDB, SyncWorkUnitDB.id == SyncTaskUnitLinkDB.unit_id
+                ).filter(
+                    SyncTaskUnitLinkDB.task_id == DataSyncTaskDB.task_id,
+                    SyncWorkUnitDB.status.in_(ACTIVE_STATUSES)
+                ).exists()
+                task_ids = [row[0] for row in session.query(DataSyncTaskDB.task_id).filter(
+                    DataSyncTaskDB.task_type == 'queued',
+                    DataSyncTaskDB.status == 'running',
+                    ~has_active_units,
+                    ~has_active_links
+                ).all()]
+
+        except Exception as e:
+            logger.error(f"查询待结束的同步队列任务失败: {e}")
+            return 0
+
+        finished = 0
+        for task_id in task_ids:
+            if await self.finish_task_if_drained(task_id):
+                finished += 1
+        return finished
+
+    async def cancel_task(self, task_id: str) -> int:
+        """
+        取消任务下尚未认领的单元，返回取消的单元数（已认领的执行完为止）
+
+        仍被其他未结束任务拥有或关联的单元继续执行，不因本任务取消而失败
+        """
+        try:
+            other_active = and_(
+                DataSyncTaskDB.task_id != task_id,
+                DataSyncTaskDB.status.notin_(FINAL_STATUSES)
+            )
+            owned_by_other = exists().where(DataSyncTaskDB.task_id == SyncWorkUnitDB.task_id, other_active)
+            linked_by_other = SyncWorkUnitDB.id.in_(
+                select(SyncTaskUnitLinkDB.unit_id).join(
+                    DataSyncTaskDB, DataSyncTaskDB.task_id == SyncTaskUnitLinkDB.task_id
+                ).where(other_active)
+            )
+            with self.db_service.get_session() as session:
+                cancelled = session.query(SyncWorkUnitDB).filter(
+                    _task_units(task_id),
+                    SyncWorkUnitDB.status == 'pending',
+                    ~owned_by_other,
+                    ~linked_by_other
+                ).update(
+                    {'status': 'failed', 'last_error': '任务已取消', 'updated_at': datetime.utcnow()},
+                    synchronize_session=False
+                )
+                session.commit()
+                return cancelled or 0
+
+        except Exception as e:
+            logger.error(f"取消同步队列任务失败: {task_id}: {e}")
+            return 0
+
+    async def get_queue_stats(self) -> Dict[str, Any]:
+        """
+        队列整体状态
+
+        Returns:
+            {by_status: {状态: 数量}, ready: 可立即认领的单元数, workers: {worker: 持有租约数}, oldest_pending_at}
+        """
+        try:
+            now = datetime.utcnow()
+            with self.db_service.get_session() as session:
+                by_status = dict(session.query(
+                    SyncWorkUnitDB.status, func.count(SyncWorkUnitDB.id)
+                ).group_by(SyncWorkUnitDB.status).all())
+                ready = session.query(func.count(SyncWorkUnitDB.id)).filter(
+                    SyncWorkUnitDB.status == 'pending',
+                    SyncWorkUnitDB.available_at <= now
+                ).scalar() or 0
+                workers = dict(session.query(
+                    SyncWorkUnitDB.lease_owner, func.count(SyncWorkUnitDB.id)
+                ).filter(
+                    SyncWorkUnitDB.status == 'leased',
+                    SyncWorkUnitDB.lease_expires_at >= now
+                ).group_by(SyncWorkUnitDB.lease_owner).all())
+                oldest = session.query(func.min(SyncWorkUnitDB.available_at)).filter(
+                    SyncWorkUnitDB.status == 'pending'
+                ).scalar()
+
+            return {
+                'by_status': by_status,
+                'ready': ready,
+                'workers': workers,
+                'oldest_pending_at': oldest.isoformat() if oldest else None,
+            }
+
+        except Exception as e:
+            logger.error(f"获取同步队列状态失败: {e}")
+            return {}
+
+    async def cleanup_finished(self, days_to_keep: int = 7) -> int:
+        """删除早于 days_to_keep 天已结束的单元"""
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=days_to_keep)
+            with self.db_service.get_session() as session:
+                deleted = session.query(SyncWorkUnitDB).filter(
+                    SyncWorkUnitDB.status.in_(('done', 'failed')),
+                    SyncWorkUnitDB.updated_at < cutoff
+                ).delete(synchronize_session=False)
+                session.commit()
+                return deleted
+
+        except Exception as e:
+            logger.error(f"清理同步队列失败: {e}")
+            return 0
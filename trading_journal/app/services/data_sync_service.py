@@ -5,18 +5,28 @@
 import asyncio
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from loguru import logger
 
 from ..core.interfaces import (
     IMarketDataProvider, IStockRepository, IKLineRepository, KLineData
 )
+from ..core.rate_limiter import RequestQuota
 from ..repositories.data_sync_task_repository import DataSyncTaskRepository
+from ..repositories.category_heatmap_repository import CategoryHeatmapRepository
+from ..config import settings
 
 
 class DataSyncService:
     """数据同步服务"""
     
+    # 同步的时间周期
+    SYNC_TIMEFRAMES = ("1d", "1h")
+    # 全量同步的拉取范围（小时线约2年）
+    FULL_SYNC_PERIODS = {"1d": "max", "1h": "730d"}
+    # 首次同步（本地无数据）的拉取范围
+    INITIAL_SYNC_PERIODS = {"1d": "1y", "1h": "90d"}
+    
     def __init__(
         self,
         market_data_provider: IMarketDataProvider,
@@ -27,11 +37,15 @@ class DataSyncService:
         self.stock_repository = stock_repository
         self.kline_repository = kline_repository
         self.task_repository = DataSyncTaskRepository()
+        self.heatmap_repository = CategoryHeatmapRepository()
         self.is_syncing = False
         # 最近一次同步结果（内存保存，便于前端查看失败详情/重试）
         self._last_result: Optional[Dict[str, any]] = None
         self._last_sync_time: Optional[datetime] = None
         self._current_task_id: Optional[str] = None
+        self._cancel_event = asyncio.Event()
+        # 拉取请求配额，每次流水线启动时按数据源限速重建
+        self._fetch_quota = RequestQuota(0)
     
     async def sync_all_watchlist_data(
         self, 
@@ -54,6 +68,7 @@ class DataSyncService:
         
         self.is_syncing = True
         self._current_task_id = task_id
+        self._cancel_event = asyncio.Event()
         sync_start_time = datetime.now()
         
         # 如果有任务ID，更新任务状态为运行中
@@ -102,51 +117,62 @@ class DataSyncService:
                 "details": {}
             }
             
-            # 3. 逐个同步股票数据
-            for i, symbol in enumerate(symbols):
-                try:
-                    stock_result = await self._sync_single_stock(symbol, force_full_sync)
-                    sync_results["details"][symbol] = stock_result
-                    
-                    success = stock_result["success"]
-                    daily_count = stock_result.get("daily_count", 0)
-                    hourly_count = stock_result.get("hourly_count", 0)
-                    
-                    if success:
-                        sync_results["success_stocks"] += 1
-                        sync_results["daily_records"] += daily_count
-                        sync_results["hourly_records"] += hourly_count
-                    else:
-                        sync_results["failed_stocks"] += 1
-                    
-                    # 更新任务进度
-                    if task_id:
-                        await self.task_repository.increment_processed_stocks(
-                            task_id, 
-                            success=success,
-                            daily_count=daily_count,
-                            hourly_count=hourly_count
-                        )
-                    
-                    # 避免API限制，添加延迟
-                    await asyncio.sleep(1.0)
-                    
-                except Exception as e:
-                    logger.error(f"同步股票 {symbol} 失败: {e}")
+            # 3. 并发拉取 + 单独写库的流水线同步
+            processed = 0
+            
+            async def on_result(symbol: str, stock_result: Dict[str, any]):
+                nonlocal processed
+                sync_results["details"][symbol] = stock_result
+                
+                success = stock_result["success"]
+                daily_count = stock_result.get("daily_count", 0)
+                hourly_count = stock_result.get("hourly_count", 0)
+                
+                if success:
+                    sync_results["success_stocks"] += 1
+                    sync_results["daily_records"] += daily_count
+                    sync_results["hourly_records"] += hourly_count
+                else:
                     sync_results["failed_stocks"] += 1
-                    sync_results["details"][symbol] = {
-                        "success": False,
-                        "error": str(e),
-                        "daily_count": 0,
-                        "hourly_count": 0
-                    }
+                
+                # 更新任务进度
+                if task_id:
+                    await self.task_repository.increment_processed_stocks(
+                        task_id, 
+                        success=success,
+                        daily_count=daily_count,
+                        hourly_count=hourly_count
+                    )
                     
-                    # 更新任务进度（失败）
-                    if task_id:
-                        await self.task_repository.increment_processed_stocks(
-                            task_id, 
-                            success=False
-                        )
+                    # 定期检查任务是否已在数据库中被取消（如其他进程发起的取消）
+                    processed += 1
+                    if processed % 20 == 0:
+                        if await self.task_repository.get_status(task_id) == 'cancelled':
+                            self._cancel_event.set()
+            
+            cancelled = await self._run_sync_pipeline(symbols, force_full_sync, on_result)
+            
+            if cancelled:
+                sync_end_time = datetime.now()
+                sync_duration = (sync_end_time - sync_start_time).total_seconds()
+                sync_results.update({
+                    "status": "cancelled",
+                    "end_time": sync_end_time.isoformat(),
+                    "duration_seconds": round(sync_duration, 2),
+                })
+                if task_id:
+                    await self.task_repository.update_task(
+                        task_id,
+                        status='cancelled',
+                        end_time=sync_end_time,
+                        duration_seconds=sync_duration,
+                        result_summary=sync_results,
+                        sync_details=sync_results["details"]
+                    )
+                logger.info(f"⏹️ 数据同步已取消: 已处理 {len(sync_results['details'])}/{len(symbols)} 只股票")
+                self._last_result = sync_results
+                self._last_sync_time = sync_end_time
+                return sync_results
             
             # 4. 完成统计
             sync_end_time = datetime.now()
@@ -205,6 +231,8 @@ class DataSyncService:
         finally:
             self.is_syncing = False
             self._current_task_id = None
+            self.kline_repository.invalidate_statistics_cache()
+            await self.heatmap_repository.rebuild_snapshot()
 
     async def sync_specific_symbols(self, symbols: List[str], force_full_sync: bool = False) -> Dict[str, any]:
         """只同步指定股票清单（用于重试失败项）"""
@@ -212,6 +240,7 @@ class DataSyncService:
             return {"status": "skipped", "reason": "sync_in_progress"}
 
         self.is_syncing = True
+        self._cancel_event = asyncio.Event()
         sync_start_time = datetime.now()
         try:
             results = {
@@ -224,20 +253,16 @@ class DataSyncService:
                 "start_time": sync_start_time.isoformat(),
                 "details": {},
             }
-            for symbol in symbols:
-                try:
-                    stock_result = await self._sync_single_stock(symbol, force_full_sync)
-                    results["details"][symbol] = stock_result
-                    if stock_result.get("success"):
-                        results["success_stocks"] += 1
-                        results["daily_records"] += stock_result.get("daily_count", 0)
-                        results["hourly_records"] += stock_result.get("hourly_count", 0)
-                    else:
-                        results["failed_stocks"] += 1
-                    await asyncio.sleep(1.0)  # 增加延迟到1秒，避免API限流
-                except Exception as e:
+            async def on_result(symbol: str, stock_result: Dict[str, any]):
+                results["details"][symbol] = stock_result
+                if stock_result.get("success"):
+                    results["success_stocks"] += 1
+                    results["daily_records"] += stock_result.get("daily_count", 0)
+                    results["hourly_records"] += stock_result.get("hourly_count", 0)
+                else:
                     results["failed_stocks"] += 1
-                    results["details"][symbol] = {"success": False, "error": str(e), "daily_count": 0, "hourly_count": 0}
+            
+            await self._run_sync_pipeline(symbols, force_full_sync, on_result)
 
             sync_end_time = datetime.now()
             duration = (sync_end_time - sync_start_time).total_seconds()
@@ -257,6 +282,8 @@ class DataSyncService:
             return self._last_result
         finally:
             self.is_syncing = False
+            self.kline_repository.invalidate_statistics_cache()
+            await self.heatmap_repository.rebuild_snapshot()
 
     def get_last_result(self) -> Dict[str, any]:
         return self._last_result or {"status": "none"}
@@ -264,99 +291,215 @@ class DataSyncService:
     def get_last_sync_time(self) -> Optional[str]:
         return self._last_sync_time.isoformat() if self._last_sync_time else None
     
-    async def _sync_single_stock(self, symbol: str, force_full_sync: bool) -> Dict[str, any]:
-        """同步单只股票数据"""
+    def cancel_sync(self, task_id: Optional[str] = None) -> bool:
+        """
+        请求取消正在进行的同步（已拉取的数据写完后停止）
+        
+        Args:
+            task_id: 任务ID，提供时只取消该任务
+        
+        Returns:
+            是否发出了取消请求
+        """
+        if not self.is_syncing:
+            return False
+        if task_id and task_id != self._current_task_id:
+            return False
+        self._cancel_event.set()
+        logger.info(f"⏹️ 收到取消同步请求: {task_id or self._current_task_id}")
+        return True
+    
+    def _resolve_request_rate(self) -> float:
+        """
+        拉取的总请求速率（次/秒），0表示不限
+        
+        未配置时按数据源限速推算：组合数据源（MultiProvider 等）按各子数据源 1/rate_limit_delay 累加，
+        有子数据源未设置限速时不限。数据源自身的 rate_limit_delay 只在单个请求内等待（如雅虎在执行线程中sleep），
+        并发请求时并不限制总速率，因此由流水线的共享配额统一限速
+        """
+        if settings.sync_fetch_requests_per_second > 0:
+            return settings.sync_fetch_requests_per_second
+        
+        def leaf_providers(provider):
+            children = getattr(provider, 'providers', None)
+            if isinstance(children, dict):
+                children = list(children.values())
+            if not children:
+                yield provider
+                return
+            for child in children:
+                yield from leaf_providers(child)
+        
+        requests_per_second = 0.0
+        for provider in leaf_providers(self.market_data_provider):
+            delay = getattr(provider, 'rate_limit_delay', None)
+            if not delay:
+                return 0.0
+            requests_per_second += 1.0 / delay
+        
+        return requests_per_second
+    
+    async def _run_sync_pipeline(
+        self,
+        symbols: List[str],
+        force_full_sync: bool,
+        on_result: Callable[[str, Dict[str, any]], Awaitable[None]]
+    ) -> bool:
+        """
+        生产者/消费者同步流水线
+        
+        多个拉取协程并发获取行情（共用一个请求配额限制总速率），通过有界队列交给单个写库协程，
+        写库在线程中执行（见 KLineRepository.save_kline_batch），拉取与写库互相重叠；
+        写库完成后回调 on_result 处理统计和任务进度
+        
+        Returns:
+            是否被取消
+        """
+        workers = min(settings.sync_fetch_workers or settings.sync_max_fetch_workers, max(1, len(symbols)))
+        self._fetch_quota = RequestQuota(self._resolve_request_rate())
+        
+        # 增量同步起点：每个周期一次批量查询所有股票的最新K线时间
+        last_bars: Dict[str, Dict[str, datetime]] = {}
+        if not force_full_sync:
+            for timeframe in self.SYNC_TIMEFRAMES:
+                last_bars[timeframe] = await self.kline_repository.get_last_datetimes(symbols, timeframe)
+
+        pending: asyncio.Queue = asyncio.Queue()
+        for symbol in symbols:
+            pending.put_nowait(symbol)
+        # 有界队列：写库跟不上时拉取协程会被阻塞，避免内存堆积
+        fetched: asyncio.Queue = asyncio.Queue(maxsize=settings.sync_write_queue_size)
+        
+        logger.info(f"🚚 同步流水线启动: {len(symbols)} 只股票, {workers} 个拉取协程, "
+                    f"请求配额 {round(self._fetch_quota.rate, 2) or '不限'} 次/秒")
+        
+        async def fetch_worker():
+            while not self._cancel_event.is_set():
+                try:
+                    symbol = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    daily_data, hourly_data = await self._fetch_stock_data(symbol, force_full_sync, last_bars)
+                    await fetched.put((symbol, daily_data, hourly_data, None))
+                except Exception as e:
+                    logger.error(f"获取股票 {symbol} 数据失败: {e}")
+                    await fetched.put((symbol, [], [], str(e)))
+        
+        async def writer():
+            while True:
+                item = await fetched.get()
+                if item is None:
+                    return
+                symbol, daily_data, hourly_data, error = item
+                try:
+                    if error is None:
+                        stock_result = await self._store_stock_data(symbol, daily_data, hourly_data)
+                    else:
+                        stock_result = {
+                            "success": False,
+                            "daily_count": 0,
+                            "hourly_count": 0,
+                            "error": error
+                        }
+                    await on_result(symbol, stock_result)
+                except Exception as e:
+                    logger.error(f"写入股票 {symbol} 同步结果失败: {e}")
+        
+        writer_task = asyncio.create_task(writer())
+        fetchers = [asyncio.create_task(fetch_worker()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*fetchers)
+            await fetched.put(None)
+            await writer_task
+        except BaseException:
+            # 外部取消（如应用关闭）时一并停止流水线
+            for task in fetchers + [writer_task]:
+                task.cancel()
+            await asyncio.gather(*fetchers, writer_task, return_exceptions=True)
+            raise
+        
+        return self._cancel_event.is_set()
+    
+    async def _fetch_stock_data(
+        self,
+        symbol: str,
+        force_full_sync: bool,
+        last_bars: Dict[str, Dict[str, datetime]]
+    ) -> Tuple[List[KLineData], List[KLineData]]:
+        """并发获取单只股票的日线和小时线数据"""
+        logger.debug(f"📡 同步股票 {symbol} 数据...")
+        daily_data, hourly_data = await asyncio.gather(*(
+            self._fetch_timeframe(symbol, timeframe, force_full_sync, last_bars.get(timeframe, {}).get(symbol))
+            for timeframe in self.SYNC_TIMEFRAMES
+        ))
+        return daily_data or [], hourly_data or []
+    
+    async def _fetch_timeframe(
+        self,
+        symbol: str,
+        timeframe: str,
+        force_full_sync: bool,
+        last_bar: Optional[datetime]
+    ) -> List[KLineData]:
+        """获取单只股票单个周期的数据"""
+        await self._fetch_quota.acquire()
+        if force_full_sync:
+            # 全量同步：获取足够长的历史数据，确保技术分析有足够的数据
+            return await self.market_data_provider.get_stock_data(symbol, self.FULL_SYNC_PERIODS[timeframe], timeframe)
+        
+        if last_bar is None:
+            # 首次同步时获取足够的历史数据
+            return await self.market_data_provider.get_stock_data(symbol, self.INITIAL_SYNC_PERIODS[timeframe], timeframe)
+        
+        # 增量同步：只拉取最后一根已存K线及之后的数据（重新拉取最后一根以刷新未收盘的K线），
+        # 数据源不支持区间请求时由其自行选取最小的覆盖period
+        return await self.market_data_provider.get_stock_data_range(symbol, timeframe, last_bar)
+    
+    async def _store_stock_data(
+        self,
+        symbol: str,
+        daily_data: List[KLineData],
+        hourly_data: List[KLineData]
+    ) -> Dict[str, any]:
+        """写入单只股票的日线和小时线数据"""
+        result = {
+            "success": False,
+            "daily_count": 0,
+            "hourly_count": 0,
+            "write_stats": {},
+            "error": None
+        }
+        
         try:
-            logger.debug(f"📡 同步股票 {symbol} 数据...")
-            
-            result = {
-                "success": False,
-                "daily_count": 0,
-                "hourly_count": 0,
-                "error": None
-            }
-            
-            # 1. 同步日线数据
-            if force_full_sync:
-                # 全量同步：获取最大历史数据，确保有足够的历史数据用于技术分析
-                daily_data = await self.market_data_provider.get_stock_data(symbol, "max", "1d")
-            else:
-                # 增量同步：获取更多历史数据（兜底200天），确保策略有足够的数据进行分析
-                last_daily = await self.kline_repository.get_last_datetime(symbol, "1d")
-                if last_daily:
-                    # Yahoo provider按 period/interval 拉取，无法按时间过滤，这里取200天，保存时去重
-                    daily_data = await self.market_data_provider.get_stock_data(symbol, "200d", "1d")
-                else:
-                    # 首次同步时获取足够的历史数据
-                    daily_data = await self.market_data_provider.get_stock_data(symbol, "1y", "1d")
-            
             if daily_data:
-                daily_saved = await self._save_kline_data(symbol, daily_data, "1d")
-                result["daily_count"] = daily_saved
-                logger.debug(f"📊 {symbol} 日线数据: 获取 {len(daily_data)} 条, 保存 {daily_saved} 条")
-            
-            # 2. 同步小时线数据
-            if force_full_sync:
-                # 全量同步：获取更多小时线数据（约2年），确保技术分析有足够的数据
-                hourly_data = await self.market_data_provider.get_stock_data(symbol, "730d", "1h")
-            else:
-                # 增量同步：获取更多历史数据（兜底30天），确保策略有足够的小时线数据进行分析
-                last_hourly = await self.kline_repository.get_last_datetime(symbol, "1h")
-                if last_hourly:
-                    hourly_data = await self.market_data_provider.get_stock_data(symbol, "30d", "1h")
-                else:
-                    # 首次同步时获取足够的历史数据
-                    hourly_data = await self.market_data_provider.get_stock_data(symbol, "90d", "1h")
+                daily_stats = await self._save_kline_data(symbol, daily_data, "1d")
+                result["daily_count"] = daily_stats["rows_written"]
+                result["write_stats"]["1d"] = daily_stats
+                logger.debug(f"📊 {symbol} 日线数据: 获取 {len(daily_data)} 条, 写入 {daily_stats['rows_written']} 条, "
+                           f"未变化 {daily_stats['rows_unchanged']} 条, 耗时 {daily_stats['elapsed_ms']}ms")
             
             if hourly_data:
-                hourly_saved = await self._save_kline_data(symbol, hourly_data, "1h")
-                result["hourly_count"] = hourly_saved
-                logger.debug(f"📊 {symbol} 小时线数据: 获取 {len(hourly_data)} 条, 保存 {hourly_saved} 条")
-            
-            result["success"] = True
-            return result
-            
+                hourly_stats = await self._save_kline_data(symbol, hourly_data, "1h")
+                result["hourly_count"] = hourly_stats["rows_written"]
+                result["write_stats"]["1h"] = hourly_stats
+                logger.debug(f"📊 {symbol} 小时线数据: 获取 {len(hourly_data)} 条, 写入 {hourly_stats['rows_written']} 条, "
+                           f"未变化 {hourly_stats['rows_unchanged']} 条, 耗时 {hourly_stats['elapsed_ms']}ms")
         except Exception as e:
-            logger.error(f"同步股票 {symbol} 失败: {e}")
-            return {
-                "success": False,
-                "daily_count": 0,
-                "hourly_count": 0,
-                "error": str(e)
-            }
-    
-    async def _save_kline_data(self, symbol: str, kline_data: List[KLineData], timeframe: str) -> int:
-        """保存K线数据到数据库"""
-        saved_count = 0
-        
-        for kline in kline_data:
-            try:
-                # 检查是否已存在（简化实现，实际应该检查数据库）
-                # 这里假设数据库有去重机制
-                
-                data_dict = {
-                    'symbol': symbol,
-                    'timeframe': timeframe,
-                    'datetime': kline.datetime,
-                    'open': kline.open,
-                    'high': kline.high,
-                    'low': kline.low,
-                    'close': kline.close,
-                    'volume': kline.volume,
-                    'data_source': 'yahoo',
-                    'sync_time': datetime.now()
-                }
-                
-                # 保存到数据库
-                success = await self.kline_repository.save_kline_data(data_dict)
-                if success:
-                    saved_count += 1
-                
-            except Exception as e:
-                logger.error(f"保存K线数据失败: {e}")
-                continue
+            # 写库失败计为失败股票（已写入的周期保留在 write_stats 中）
+            result["error"] = f"写入K线失败: {e}"
+            return result
         
-        return saved_count
+        result["success"] = True
+        return result
+    
+    async def _save_kline_data(self, symbol: str, kline_data: List[KLineData], timeframe: str) -> Dict[str, any]:
+        """批量保存K线数据到数据库，返回写入统计；写入失败时抛出异常"""
+        try:
+            return await self.kline_repository.save_kline_batch(symbol, timeframe, kline_data)
+        except Exception as e:
+            logger.error(f"保存K线数据失败: {symbol} {timeframe}: {e}")
+            raise
     
     async def get_sync_status(self) -> Dict[str, any]:
         """获取同步状态"""
@@ -368,10 +511,9 @@ class DataSyncService:
         recent_tasks = await self.task_repository.get_recent_tasks(1)
         last_task = recent_tasks[0] if recent_tasks else None
         
-        return {
-            "is_syncing": self.is_syncing,
-            "current_task_id": self._current_task_id,
-            "current_task": {
+        current = None
+        if current_task:
+            current = {
                 "task_id": current_task.task_id,
                 "status": current_task.status,
                 "progress": current_task.progress,
@@ -380,7 +522,16 @@ class DataSyncService:
                 "success_stocks": current_task.success_stocks,
                 "failed_stocks": current_task.failed_stocks,
                 "start_time": current_task.start_time.isoformat() if current_task.start_time else None
-            } if current_task else None,
+            }
+            # 运行中的任务以内存中的实时进度为准（数据库按批写入）
+            live = self.task_repository.get_live_progress(current_task.task_id)
+            if live:
+                current.update({key: value for key, value in live.items() if key in current})
+        
+        return {
+            "is_syncing": self.is_syncing,
+            "current_task_id": self._current_task_id,
+            "current_task": current,
             "last_task": {
                 "task_id": last_task.task_id,
                 "status": last_task.status,
@@ -400,7 +551,7 @@ class DataSyncService:
         if not task:
             return None
         
-        return {
+        status = {
             "task_id": task.task_id,
             "status": task.status,
             "progress": task.progress,
@@ -420,6 +571,9 @@ class DataSyncService:
             "created_at": task.created_at.isoformat() if task.created_at else None,
             "updated_at": task.updated_at.isoformat() if task.updated_at else None
         }
+        # 运行中的任务以内存中的实时进度为准（数据库按批写入）
+        status.update(self.task_repository.get_live_progress(task_id) or {})
+        return status
     
     async def create_sync_task(
         self, 
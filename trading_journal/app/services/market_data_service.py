@@ -18,11 +18,14 @@ class MarketDataService:
         self,
         market_data_provider: IMarketDataProvider,
         stock_repository: IStockRepository,
-        kline_repository: IKLineRepository
+        kline_repository: IKLineRepository,
+        symbol_registry=None
     ):
         self.market_data_provider = market_data_provider
         self.stock_repository = stock_repository
         self.kline_repository = kline_repository
+        # 股票代码注册表缓存，为空时直接请求数据源
+        self.symbol_registry = symbol_registry
     
     async def update_watchlist_data(self) -> Dict[str, Dict[str, int]]:
         """更新自选股数据"""
@@ -78,34 +81,10 @@ class MarketDataService:
     
     async def _save_stock_data(self, symbol: str, kline_data: List[KLineData], 
                              timeframe: str) -> int:
-        """保存股票数据"""
+        """保存股票数据（批量写入，已存在的K线按新数据更新）"""
         try:
-            saved_count = 0
-            
-            for kline in kline_data:
-                # 检查是否已存在
-                existing = await self.kline_repository.get_kline_data(
-                    symbol, timeframe, kline.datetime, kline.datetime
-                )
-                
-                if not existing:
-                    data_dict = {
-                        'symbol': symbol,
-                        'timeframe': timeframe,
-                        'datetime': kline.datetime,
-                        'open': kline.open,
-                        'high': kline.high,
-                        'low': kline.low,
-                        'close': kline.close,
-                        'volume': kline.volume,
-                        'data_source': 'yahoo'
-                    }
-                    
-                    success = await self.kline_repository.save_kline_data(data_dict)
-                    if success:
-                        saved_count += 1
-            
-            return saved_count
+            stats = await self.kline_repository.save_kline_batch(symbol, timeframe, kline_data)
+            return stats["rows_written"]
             
         except Exception as e:
             logger.error(f"保存股票 {symbol} 数据失败: {e}")
@@ -124,22 +103,8 @@ class MarketDataService:
             )
             
             if db_data:
-                # 转换为KLineData格式
-                kline_data = []
-                for row in db_data:
-                    kline = KLineData(
-                        datetime=row.datetime if hasattr(row, 'datetime') else row.time_key,
-                        open=row.open if hasattr(row, 'open') else row.open_price,
-                        high=row.high if hasattr(row, 'high') else row.high_price,
-                        low=row.low if hasattr(row, 'low') else row.low_price,
-                        close=row.close if hasattr(row, 'close') else row.close_price,
-                        volume=row.volume,
-                        symbol=symbol
-                    )
-                    kline_data.append(kline)
-                
-                logger.debug(f"从数据库获取股票 {symbol} 的 {len(kline_data)} 条K线数据")
-                return kline_data
+                logger.debug(f"从数据库获取股票 {symbol} 的 {len(db_data)} 条K线数据")
+                return db_data
             else:
                 # 数据库没有数据，从API获取
                 logger.debug(f"数据库无数据，从API获取股票 {symbol} 数据")
@@ -153,14 +118,33 @@ class MarketDataService:
     async def validate_stock_symbol(self, symbol: str) -> bool:
         """验证股票代码"""
         try:
+            if self.symbol_registry is not None:
+                return bool(await self.symbol_registry.validate_symbol(self.market_data_provider, symbol))
             return await self.market_data_provider.validate_symbol(symbol)
         except Exception as e:
             logger.error(f"验证股票代码 {symbol} 失败: {e}")
             return False
     
+    async def validate_stock_symbols(self, symbols: List[str]) -> Dict[str, Optional[bool]]:
+        """
+        批量验证股票代码（先查缓存，未命中的批量请求数据源）
+        
+        Returns:
+            {symbol: True/False}，无法判断时为 None
+        """
+        try:
+            if self.symbol_registry is not None:
+                return await self.symbol_registry.validate_symbols(self.market_data_provider, symbols)
+            return await self.market_data_provider.validate_symbols(symbols)
+        except Exception as e:
+            logger.error(f"批量验证股票代码失败: {e}")
+            return {symbol: None for symbol in symbols}
+    
     async def get_stock_info(self, symbol: str) -> Optional[Dict]:
         """获取股票基本信息"""
         try:
+            if self.symbol_registry is not None:
+                return await self.symbol_registry.get_stock_info(self.market_data_provider, symbol)
             return await self.market_data_provider.get_stock_info(symbol)
         except Exception as e:
             logger.error(f"获取股票 {symbol} 基本信息失败: {e}")
@@ -3,13 +3,21 @@
 基于边界数据检测缺口，实现精确的增量同步
 """
 import json
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, time, timedelta
 from typing import Dict, List, Optional, Any, Tuple, NamedTuple
 from dataclasses import dataclass
 from loguru import logger
 
 from ..core.interfaces import IMarketDataProvider, IStockRepository, IKLineRepository
-from ..repositories.stock_sync_status_repository import StockSyncStatusRepository
+from ..models import StockSyncStatusDB
+from ..repositories.stock_sync_status_repository import StockSyncStatusRepository, SYNC_TIMEFRAMES
+from ..repositories.category_heatmap_repository import CategoryHeatmapRepository
+from ..repositories.kline_gap_repository import KLineGapRepository
+from ..repositories.sync_queue_repository import SyncQueueRepository
+from ..repositories.data_sync_task_repository import DataSyncTaskRepository
+from ..core.kline_gap_index import SessionBitmap, missing_date_ranges
+from ..core.trading_calendar import trading_calendar
+from ..config import settings
 
 
 @dataclass
@@ -46,28 +54,41 @@ class SmartSyncService:
         self.stock_repository = stock_repository
         self.kline_repository = kline_repository
         self.sync_status_repo = StockSyncStatusRepository()
+        self.heatmap_repository = CategoryHeatmapRepository()
+        self.gap_repository = KLineGapRepository()
+        self.sync_queue = SyncQueueRepository()
+        self.task_repository = DataSyncTaskRepository()
         self.is_syncing = False
     
     async def analyze_sync_needs(self, stock_codes: List[str] = None) -> Dict[str, Dict[str, StockSyncPlan]]:
-        """分析所有股票的同步需求"""
+        """
+        分析所有股票的同步需求
+        
+        边界信息按周期表批量刷新（见 StockSyncStatusRepository.refresh_boundaries），
+        缺失区间由交易日位图索引得出（见 KLineGapRepository），同步计划在内存中计算
+        """
         try:
             # 如果没有指定股票，则获取所有自选股
             if not stock_codes:
                 stocks = await self.stock_repository.get_all_stocks()
                 stock_codes = [stock.code if hasattr(stock, 'code') else stock.symbol for stock in stocks]
             
-            sync_plans = {}
+            statuses = await self.sync_status_repo.refresh_boundaries(stock_codes, SYNC_TIMEFRAMES)
+            bitmaps = {
+                timeframe: await self.gap_repository.get_bitmaps(stock_codes, timeframe)
+                for timeframe in SYNC_TIMEFRAMES
+            }
+            today = date.today()
             
+            sync_plans = {}
             for stock_code in stock_codes:
-                sync_plans[stock_code] = {}
-                
-                for timeframe in ['1d', '1h']:
-                    # 更新边界信息
-                    await self.sync_status_repo.update_boundary_info(stock_code, timeframe)
-                    
-                    # 计算同步计划
-                    plan = await self._calculate_stock_sync_plan(stock_code, timeframe)
-                    sync_plans[stock_code][timeframe] = plan
+                sync_plans[stock_code] = {
+                    timeframe: self._calculate_stock_sync_plan(
+                        stock_code, timeframe, statuses.get((stock_code, timeframe)), today,
+                        bitmaps[timeframe].get(stock_code)
+                    )
+                    for timeframe in SYNC_TIMEFRAMES
+                }
             
             return sync_plans
             
@@ -75,49 +96,62 @@ class SmartSyncService:
             logger.error(f"分析同步需求失败: {e}")
             return {}
     
-    async def _calculate_stock_sync_plan(self, stock_code: str, timeframe: str) -> StockSyncPlan:
-        """计算单个股票单个周期的同步计划"""
+    def _calculate_stock_sync_plan(
+        self,
+        stock_code: str,
+        timeframe: str,
+        status: Optional[StockSyncStatusDB],
+        today: date,
+        bitmap: Optional[SessionBitmap] = None
+    ) -> StockSyncPlan:
+        """根据同步状态和交易日位图计算单个股票单个周期的同步计划（不访问数据库）"""
         try:
-            # 获取同步状态
-            status = await self.sync_status_repo.get_sync_status(stock_code, timeframe)
-            if not status:
-                # 如果没有状态记录，创建一个
-                status = await self.sync_status_repo.get_or_create_sync_status(stock_code, timeframe)
-                await self.sync_status_repo.update_boundary_info(stock_code, timeframe)
-                status = await self.sync_status_repo.get_sync_status(stock_code, timeframe)
+            if status is None:
+                return StockSyncPlan(
+                    stock_code=stock_code,
+                    timeframe=timeframe,
+                    needs_sync=False,
+                    sync_ranges=[],
+                    reason='缺少同步状态记录'
+                )
             
             sync_ranges = []
             reasons = []
             
-            today = date.today()
             target_start = status.target_start_date
             target_end = today
             
-            # 1. 检查历史数据缺口（前向缺口）
-            if not status.earliest_data_date or status.earliest_data_date > target_start:
-                historical_end = status.earliest_data_date or target_end
-                if historical_end > target_start:
-                    sync_ranges.append(SyncRange(
-                        start_date=target_start,
-                        end_date=historical_end - timedelta(days=1),  # 避免重复
-                        reason='historical_gap'
-                    ))
-                    reasons.append('缺少历史数据')
-            
-            # 2. 检查最新数据缺口（后向缺口）
-            if not status.latest_data_date or status.latest_data_date < target_end:
-                latest_start = status.latest_data_date or target_start
-                if latest_start < target_end:
-                    # 如果有最新数据，从下一天开始同步
-                    if status.latest_data_date:
-                        latest_start = status.latest_data_date + timedelta(days=1)
+            if bitmap is not None:
+                # 1-2. 按交易日位图求缺失区间（含历史中间的缺口），相近的缺口合并为一次请求
+                gap_ranges, gap_reasons = self._gap_sync_ranges(status, bitmap, target_start, target_end)
+                sync_ranges.extend(gap_ranges)
+                reasons.extend(gap_reasons)
+            else:
+                # 1. 检查历史数据缺口（前向缺口）
+                if not status.earliest_data_date or status.earliest_data_date > target_start:
+                    historical_end = status.earliest_data_date or target_end
+                    if historical_end > target_start:
+                        sync_ranges.append(SyncRange(
+                            start_date=target_start,
+                            end_date=historical_end - timedelta(days=1),  # 避免重复
+                            reason='historical_gap'
+                        ))
+                        reasons.append('缺少历史数据')
+            
+                # 2. 检查最新数据缺口（后向缺口）
+                if not status.latest_data_date or status.latest_data_date < target_end:
+                    latest_start = status.latest_data_date or target_start
+                    if latest_start < target_end:
+                        # 如果有最新数据，从下一天开始同步
+                        if status.latest_data_date:
+                            latest_start = status.latest_data_date + timedelta(days=1)
                     
-                    sync_ranges.append(SyncRange(
-                        start_date=latest_start,
-                        end_date=target_end,
-                        reason='latest_gap'
-                    ))
-                    reasons.append('缺少最新数据')
+                        sync_ranges.append(SyncRange(
+                            start_date=latest_start,
+                            end_date=target_end,
+                            reason='latest_gap'
+                        ))
+                        reasons.append('缺少最新数据')
             
             # 3. 检查失败重试
             if status.failed_ranges:
@@ -159,6 +193,35 @@ class SmartSyncService:
                 reason=f'计算失败: {str(e)}'
             )
     
+    def _gap_sync_ranges(
+        self,
+        status: StockSyncStatusDB,
+        bitmap: SessionBitmap,
+        target_start: date,
+        target_end: date
+    ) -> Tuple[List[SyncRange], List[str]]:
+        """由交易日位图得到目标范围内的缺失区间（按 smart_sync_gap_merge_sessions 合并）"""
+        sync_ranges = []
+        labels = {}
+        interior_sessions = 0
+        
+        for first, last, missing in missing_date_ranges(
+            bitmap, trading_calendar, target_start, target_end, settings.smart_sync_gap_merge_sessions
+        ):
+            if not status.latest_data_date or last > status.latest_data_date:
+                reason = 'latest_gap'
+                labels[reason] = '缺少最新数据'
+            elif first < status.earliest_data_date:
+                reason = 'historical_gap'
+                labels[reason] = '缺少历史数据'
+            else:
+                reason = 'interior_gap'
+                interior_sessions += missing
+                labels[reason] = f'中间缺失{interior_sessions}个交易日'
+            sync_ranges.append(SyncRange(start_date=first, end_date=last, reason=reason))
+        
+        return sync_ranges, list(labels.values())
+    
     def _optimize_sync_ranges(self, ranges: List[SyncRange]) -> List[SyncRange]:
         """优化同步范围：合并相邻或重叠的范围"""
         if not ranges:
@@ -293,7 +356,62 @@ class SmartSyncService:
             }
         finally:
             self.is_syncing = False
+            self.kline_repository.invalidate_statistics_cache()
+            await self.heatmap_repository.rebuild_snapshot()
     
+    async def enqueue_sync(
+        self,
+        stock_codes: List[str] = None,
+        trigger_source: str = 'manual'
+    ) -> Dict[str, Any]:
+        """
+        分析同步需求并把每个同步范围作为工作单元放入同步队列，由独立的同步worker执行
+        （见 app/services/sync_worker.py）
+
+        Returns:
+            {task_id, total_units, enqueued_units, stocks}，无需同步时 task_id 为None；
+            enqueued_units 为0表示所有范围已在之前的任务中排队：任务关联这些单元，
+            保持运行中直到它们执行结束
+
+        Raises:
+            RuntimeError: 入队失败（任务置为 failed）
+        """
+        sync_plans = await self.analyze_sync_needs(stock_codes)
+        units = [
+            {
+                'stock_code': stock_code,
+                'timeframe': timeframe,
+                'start_date': sync_range.start_date,
+                'end_date': sync_range.end_date,
+                'reason': sync_range.reason,
+            }
+            for stock_code, timeframe_plans in sync_plans.items()
+            for timeframe, plan in timeframe_plans.items() if plan.needs_sync
+            for sync_range in plan.sync_ranges
+        ]
+        if not units:
+            logger.info("✅ 所有数据已是最新，无需入队")
+            return {"task_id": None, "total_units": 0, "enqueued_units": 0, "stocks": 0}
+
+        task_id = await self.task_repository.create_task(
+            task_type='queued',
+            target_symbols=stock_codes,
+            trigger_source=trigger_source
+        )
+        # 先置为运行中：worker 可能在入队返回前就执行完全部单元并结束任务
+        await self.task_repository.update_task(task_id, status='running')
+        enqueued = await self.sync_queue.enqueue(task_id, units)
+        if enqueued is None:
+            await self.task_repository.update_task(
+                task_id, status='failed', end_time=datetime.utcnow(),
+                error_details={"error": "同步单元入队失败"}
+            )
+            raise RuntimeError(f"同步单元入队失败: 任务 {task_id}")
+
+        stocks = len({unit['stock_code'] for unit in units})
+        logger.info(f"📥 智能同步入队: {stocks} 只股票, {enqueued}/{len(units)} 个单元, 任务 {task_id}")
+        return {"task_id": task_id, "total_units": len(units), "enqueued_units": enqueued, "stocks": stocks}
+
     async def _sync_stock_timeframe(
         self, 
         stock_code: str, 
@@ -309,6 +427,8 @@ class SmartSyncService:
                 "completed_ranges": 0,
                 "failed_ranges": [],
                 "total_records": 0,
+                "unchanged_records": 0,
+                "write_ms": 0.0,
                 "error": None
             }
             
@@ -316,15 +436,14 @@ class SmartSyncService:
             
             for sync_range in sync_ranges:
                 try:
-                    # 计算合适的Yahoo API参数
-                    period, interval = self._calculate_yahoo_params(sync_range, timeframe)
-                    
-                    logger.debug(f"📡 获取数据: {stock_code} {period} {interval} "
+                    logger.debug(f"📡 获取数据: {stock_code} {timeframe} "
                                f"({sync_range.start_date} to {sync_range.end_date})")
                     
-                    # 获取数据
-                    kline_data = await self.market_data_provider.get_stock_data(
-                        stock_code, period, interval
+                    # 按同步范围请求数据（数据源不支持区间请求时自动选取最小的覆盖period）
+                    kline_data = await self.market_data_provider.get_stock_data_range(
+                        stock_code, timeframe,
+                        datetime.combine(sync_range.start_date, time.min),
+                        datetime.combine(sync_range.end_date, time.max)
                     )
                     
                     if not kline_data:
@@ -340,16 +459,21 @@ class SmartSyncService:
                     filtered_data = self._filter_data_by_range(kline_data, sync_range)
                     
                     if not filtered_data:
+                        # 返回的数据都在范围外：不能确认范围内无K线，保留缺口
                         logger.warning(f"过滤后无数据: {stock_code} {timeframe} {sync_range}")
                         continue
                     
-                    # 保存数据
-                    saved_count = await self._save_kline_data(stock_code, filtered_data, timeframe)
+                    # 保存数据（写入失败抛出异常，该范围记入 failed_ranges）
+                    write_stats = await self._save_kline_data(stock_code, filtered_data, timeframe)
+                    await self.gap_repository.mark_fetched(stock_code, timeframe, filtered_data)
                     
-                    result["total_records"] += saved_count
+                    result["total_records"] += write_stats["rows_written"]
+                    result["unchanged_records"] += write_stats["rows_unchanged"]
+                    result["write_ms"] += write_stats["elapsed_ms"]
                     result["completed_ranges"] += 1
                     
-                    logger.debug(f"✅ 范围完成: {sync_range} - 保存 {saved_count} 条")
+                    logger.debug(f"✅ 范围完成: {sync_range} - 写入 {write_stats['rows_written']} 条, "
+                               f"未变化 {write_stats['rows_unchanged']} 条, 耗时 {write_stats['elapsed_ms']}ms")
                     
                 except Exception as e:
                     logger.error(f"同步范围失败: {sync_range}: {e}")
@@ -395,29 +519,6 @@ class SmartSyncService:
                 "error": str(e)
             }
     
-    def _calculate_yahoo_params(self, sync_range: SyncRange, timeframe: str) -> Tuple[str, str]:
-        """计算Yahoo API的period和interval参数"""
-        days_diff = (sync_range.end_date - sync_range.start_date).days
-        
-        interval = timeframe
-        
-        # 根据时间范围选择合适的period
-        if days_diff <= 7:
-            period = "7d"
-        elif days_diff <= 30:
-            period = "1mo"
-        elif days_diff <= 90:
-            period = "3mo"
-        elif days_diff <= 180:
-            period = "6mo"
-        elif days_diff <= 365:
-            period = "1y"
-        else:
-            # 超过1年的数据，分批获取
-            period = "1y"
-        
-        return period, interval
-    
     def _filter_data_by_range(self, kline_data: List, sync_range: SyncRange) -> List:
         """按时间范围过滤K线数据"""
         filtered = []
@@ -429,35 +530,13 @@ class SmartSyncService:
         
         return filtered
     
-    async def _save_kline_data(self, symbol: str, kline_data: List, timeframe: str) -> int:
-        """保存K线数据到数据库"""
-        saved_count = 0
-        
-        for kline in kline_data:
-            try:
-                data_dict = {
-                    'symbol': symbol,
-                    'timeframe': timeframe,
-                    'datetime': kline.datetime,
-                    'open': kline.open,
-                    'high': kline.high,
-                    'low': kline.low,
-                    'close': kline.close,
-                    'volume': kline.volume,
-                    'data_source': 'yahoo',
-                    'sync_time': datetime.now()
-                }
-                
-                # 保存到数据库（已有去重逻辑）
-                success = await self.kline_repository.save_kline_data(data_dict)
-                if success:
-                    saved_count += 1
-                
-            except Exception as e:
-                logger.error(f"保存K线数据失败: {e}")
-                continue
-        
-        return saved_count
+    async def _save_kline_data(self, symbol: str, kline_data: List, timeframe: str) -> Dict[str, Any]:
+        """批量保存K线数据到数据库，返回写入统计；写入失败时抛出异常"""
+        try:
+            return await self.kline_repository.save_kline_batch(symbol, timeframe, kline_data)
+        except Exception as e:
+            logger.error(f"保存K线数据失败: {symbol} {timeframe}: {e}")
+            raise
     
     async def _get_pending_sync_plans(self) -> Dict[str, Dict[str, StockSyncPlan]]:
         """从数据库获取待同步的计划"""
@@ -465,6 +544,33 @@ class SmartSyncService:
         # 暂时返回空，使用force_analysis=True
         return {}
     
+    async def get_gap_summary(self, stock_codes: List[str] = None) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """
+        每只股票各周期在目标范围内的缺口统计
+        
+        Returns:
+            {股票代码: {时间周期: {missing_sessions, gap_ranges, requests}}}
+        """
+        try:
+            if not stock_codes:
+                stocks = await self.stock_repository.get_all_stocks()
+                stock_codes = [stock.code if hasattr(stock, 'code') else stock.symbol for stock in stocks]
+            
+            summary: Dict[str, Dict[str, Dict[str, int]]] = {code: {} for code in stock_codes}
+            for timeframe in SYNC_TIMEFRAMES:
+                gaps = await self.gap_repository.get_gap_summary(
+                    stock_codes, timeframe,
+                    start=self.sync_status_repo._get_target_start_date(timeframe),
+                    max_gap=settings.smart_sync_gap_merge_sessions
+                )
+                for code, stats in gaps.items():
+                    summary.setdefault(code, {})[timeframe] = stats
+            return summary
+            
+        except Exception as e:
+            logger.error(f"获取缺口统计失败: {e}")
+            return {}
+    
     async def get_sync_overview(self) -> Dict[str, Any]:
         """获取同步状态概览"""
         try:
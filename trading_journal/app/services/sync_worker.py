@@ -0,0 +1,193 @@
+"""
+同步队列worker
+从 sync_work_units 认领工作单元（见 SyncQueueRepository），拉取数据源并写入K线表。
+每个worker进程独立运行，可在多台机器上水平扩展；入口见 scripts/run_sync_worker.py
+"""
+import asyncio
+import socket
+import os
+import time
+from datetime import datetime, time as dt_time
+from typing import Dict, Optional, Set
+
+from loguru import logger
+
+from ..core.interfaces import IMarketDataProvider, IKLineRepository
+from ..core.rate_limiter import RequestQuota
+from ..repositories.sync_queue_repository import SyncQueueRepository, WorkUnit
+from ..repositories.kline_gap_repository import KLineGapRepository
+from ..config import settings
+
+
+def default_worker_id() -> str:
+    """主机名:进程号"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SyncWorker:
+    """
+    同步队列worker
+
+    启动 concurrency 个执行循环，每个循环每次认领 batch_size 个单元并依次执行：
+        请求配额 -> 数据源区间请求 -> 写入K线 -> 标记缺口索引 -> 完成单元
+    执行期间按租约时长的1/3定时续租，续租失败（租约已被回收）时中止该单元；
+    失败的单元按次数延后重试；停止时已认领未开始的单元立即放回队列。
+
+    使用示例:
+        worker = SyncWorker(provider, KLineRepository(), concurrency=4)
+        await worker.run()   # 另一个协程中 worker.stop() 结束
+    """
+
+    def __init__(
+        self,
+        market_data_provider: IMarketDataProvider,
+        kline_repository: IKLineRepository,
+        worker_id: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+        poll_interval: Optional[float] = None
+    ):
+        self.market_data_provider = market_data_provider
+        self.kline_repository = kline_repository
+        self.queue = SyncQueueRepository()
+        self.gap_repository = KLineGapRepository()
+
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = concurrency or settings.sync_worker_concurrency
+        self.batch_size = batch_size or settings.sync_worker_batch_size
+        self.lease_seconds = lease_seconds or settings.sync_worker_lease_seconds
+        self.poll_interval = poll_interval if poll_interval is not None else settings.sync_worker_poll_interval
+        self.quota = RequestQuota(
+            requests_per_second if requests_per_second is not None else settings.sync_worker_requests_per_second
+        )
+
+        self._stop = asyncio.Event()
+        # 本worker执行过单元、可能尚未结束的任务
+        self._open_tasks: Set[str] = set()
+        self.stats: Dict[str, int] = {"claimed": 0, "done": 0, "errors": 0, "released": 0, "lost_leases": 0, "rows_written": 0}
+
+    def stop(self):
+        """请求停止：执行中的单元完成后退出"""
+        self._stop.set()
+
+    async def run(self):
+        """运行直到 stop() 被调用"""
+        logger.info(f"🚀 同步worker启动: {self.worker_id}, 并发 {self.concurrency}, 每次认领 {self.batch_size}, "
+                    f"租约 {self.lease_seconds}秒, 配额 {self.quota.rate or '不限'} 次/秒")
+        started = time.monotonic()
+        await asyncio.gather(
+            self._reclaim_loop(),
+            *(self._work_loop() for _ in range(self.concurrency))
+        )
+        elapsed = time.monotonic() - started
+        logger.info(f"同步worker退出: {self.worker_id}, 运行 {elapsed:.0f}秒, {self.stats}")
+
+    async def _wait(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _reclaim_loop(self):
+        """
+        定期回收过期租约，并结束单元已全部完成的任务（执行该任务的worker已退出时由此补上）
+
+        所有worker都执行，条件更新可重复
+        """
+        while not self._stop.is_set():
+            await self.queue.reclaim_expired()
+            await self.queue.finish_drained_tasks()
+            await self._wait(self.lease_seconds / 2)
+
+    async def _work_loop(self):
+        while not self._stop.is_set():
+            units = await self.queue.claim(self.worker_id, self.batch_size, self.lease_seconds)
+            if not units:
+                await self._finish_open_tasks()
+                await self._wait(self.poll_interval)
+                continue
+
+            self.stats["claimed"] += len(units)
+            claimed_at = time.monotonic()
+            for unit in units:
+                if self._stop.is_set():
+                    if await self.queue.release(unit.id, self.worker_id):
+                        self.stats["released"] += 1
+                    continue
+                # 批内靠后的单元开始前租约已过半时续租，续租失败说明已被回收
+                if time.monotonic() - claimed_at > self.lease_seconds / 2:
+                    if not await self.queue.renew(unit.id, self.worker_id, self.lease_seconds):
+                        continue
+                await self._execute(unit)
+
+    async def _execute(self, unit: WorkUnit):
+        """执行一个单元，执行期间定时续租"""
+        if unit.task_id:
+            self._open_tasks.add(unit.task_id)
+        work = asyncio.create_task(self._run_unit(unit))
+        heartbeat = asyncio.create_task(self._keep_lease(unit))
+        try:
+            await asyncio.wait({work, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if not work.done():
+                # 续租失败：单元已被回收并可能由其他worker执行，放弃本次结果
+                logger.warning(f"同步单元 {unit.id} 租约丢失，中止执行: {unit.stock_code} {unit.timeframe}")
+                self.stats["lost_leases"] += 1
+        finally:
+            for task in (work, heartbeat):
+                task.cancel()
+            await asyncio.gather(work, heartbeat, return_exceptions=True)
+
+    async def _keep_lease(self, unit: WorkUnit):
+        """每 lease_seconds/3 续租一次，续租失败时返回"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.queue.renew(unit.id, self.worker_id, self.lease_seconds):
+                return
+
+    async def _run_unit(self, unit: WorkUnit):
+        """拉取、写入并完成一个单元，失败时按次数延后重试"""
+        try:
+            await self.quota.acquire()
+            kline_data = await self.market_data_provider.get_stock_data_range(
+                unit.stock_code, unit.timeframe,
+                datetime.combine(unit.start_date, dt_time.min),
+                datetime.combine(unit.end_date, dt_time.max)
+            )
+            if not kline_data:
+                raise ValueError("未获取到数据")
+
+            filtered = [
+                kline for kline in kline_data
+                if unit.start_date <= kline.datetime.date() <= unit.end_date
+            ]
+            rows_written = 0
+            if filtered:
+                write_stats = await self.kline_repository.save_kline_batch(unit.stock_code, unit.timeframe, filtered)
+                rows_written = write_stats["rows_written"]
+                # 写入成功后才标记，且只标记返回数据实际覆盖的区间
+                await self.gap_repository.mark_fetched(unit.stock_code, unit.timeframe, filtered)
+
+            if await self.queue.complete(unit.id, self.worker_id, rows_written):
+                self.stats["done"] += 1
+                self.stats["rows_written"] += rows_written
+                logger.debug(f"✅ {unit.stock_code} {unit.timeframe} {unit.start_date}~{unit.end_date}: "
+                             f"写入 {rows_written} 条")
+
+        except Exception as e:
+            logger.warning(f"同步单元失败 (第{unit.attempts}次): {unit.stock_code} {unit.timeframe} "
+                           f"{unit.start_date}~{unit.end_date}: {e}")
+            self.stats["errors"] += 1
+            await self.queue.fail(
+                unit, self.worker_id, str(e),
+                retry_delay=settings.sync_queue_retry_delay * unit.attempts
+            )
+
+    async def _finish_open_tasks(self):
+        """队列暂无可认领单元时，检查本worker参与过的任务是否已全部结束"""
+        for task_id in list(self._open_tasks):
+            progress = await self.queue.get_task_progress(task_id)
+            if progress and not progress["pending"] and not progress["leased"]:
+                await self.queue.finish_task_if_drained(task_id)
+                self._open_tasks.discard(task_id)
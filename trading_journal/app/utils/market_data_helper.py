@@ -22,6 +22,9 @@ from market_data import (
     MultiAccountProvider,
     HybridProvider,
     ScenarioRouter,
+    SymbolRegistry,
+    SymbolStore,
+    KLineCache,
 )
 
 __all__ = [
@@ -34,4 +37,7 @@ __all__ = [
     'MultiAccountProvider',
     'HybridProvider',
     'ScenarioRouter',
+    'SymbolRegistry',
+    'SymbolStore',
+    'KLineCache',
 ]
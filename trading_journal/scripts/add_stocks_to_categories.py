@@ -9,6 +9,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import db_service
 from app.models import CategoryDB, CategoryStockRelationDB, StockDB
+from app.repositories.category_repository import CategoryRepository
 from loguru import logger
 
 
@@ -67,6 +68,8 @@ def add_stocks_to_categories():
                 category.stock_count = direct_count
                 category.total_stock_count = direct_count
                 
+                # 使运行中服务缓存的分类树失效
+                CategoryRepository.bump_version(session)
                 session.commit()
                 logger.info(f"分类 '{category.name}' 添加了股票，当前有 {direct_count} 只")
             
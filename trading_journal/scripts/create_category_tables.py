@@ -8,7 +8,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import db_service
-from app.models import CategoryDB, CategoryStockRelationDB, Base
+from app.models import CategoryDB, CategoryStockRelationDB, CategoryClosureDB, CategoryHeatmapDB, Base
 from loguru import logger
 
 
@@ -23,6 +23,8 @@ def create_tables():
         # 创建表
         CategoryDB.__table__.create(engine, checkfirst=True)
         CategoryStockRelationDB.__table__.create(engine, checkfirst=True)
+        CategoryClosureDB.__table__.create(engine, checkfirst=True)
+        CategoryHeatmapDB.__table__.create(engine, checkfirst=True)
         
         logger.info("✅ 分类树相关表创建成功")
         
@@ -240,6 +240,7 @@ def migrate_data(batch_size=1000, dry_run=False):
                             code=old.code,
                             time_key=old.time_key,
                             trade_time=trade_time,
+                            ts=KLineTableManager.to_epoch(trade_time),
                             open_price=old.open_price,
                             close_price=old.close_price,
                             high_price=old.high_price,
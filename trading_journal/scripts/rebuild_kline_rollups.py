@@ -0,0 +1,62 @@
+"""
+按已有K线重建汇总周期（周线/月线、4小时线等）
+用于启用汇总引擎前已入库的历史数据
+
+重建前先删除误写入1分钟表的月线：早期版本的汇总目标 "1M" 被规范化成 "1m"，
+月线（每月1日 00:00:00）写进了 klines_1min
+"""
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+from sqlalchemy import func, extract
+
+from app.config import settings
+from app.database import db_service
+from app.models import KLineTableManager
+from app.core.kline_rollup import KLineRollupEngine
+
+
+def purge_misrouted_monthly_bars(session) -> int:
+    """删除1分钟表中每月1日 00:00:00 的K线（美股1分钟线不会落在该时间，只可能是误写的月线）"""
+    model = KLineTableManager.get_model_by_period("1m")
+    deleted = session.query(model).filter(
+        extract("day", model.trade_time) == 1,
+        extract("hour", model.trade_time) == 0,
+        extract("minute", model.trade_time) == 0,
+        extract("second", model.trade_time) == 0
+    ).delete(synchronize_session=False)
+    session.commit()
+    return deleted
+
+
+def main():
+    session_open = datetime.strptime(settings.market_session_open, "%H:%M").time()
+
+    with db_service.get_session() as session:
+        purged = purge_misrouted_monthly_bars(session)
+        if purged:
+            logger.info(f"🧹 删除1分钟表中误写入的月线: {purged} 行")
+
+        engine = KLineRollupEngine(session, session_open=session_open,
+                                   chunk_size=settings.kline_upsert_chunk_size)
+
+        for source_period in KLineRollupEngine.ROLLUP_PLAN:
+            model = KLineTableManager.get_model_by_period(source_period)
+            ranges = session.query(
+                model.code, func.min(model.trade_time), func.max(model.trade_time)
+            ).group_by(model.code).all()
+
+            written = 0
+            for code, first, last in ranges:
+                for stats in engine.rollup(code, source_period, first, last).values():
+                    written += stats["rows_written"]
+
+            logger.info(f"✅ {source_period} 汇总完成: {len(ranges)} 只股票, 写入 {written} 行")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+创建并重建最新行情表 latest_quotes
+从 klines_daily 取每只股票最近两根日线，一条 INSERT ... SELECT 完成，随后重算分类热力图快照
+"""
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+from app.database import db_service
+from app.models import LatestQuoteDB
+from app.core.kline_manager import KLineManager
+from app.repositories.category_heatmap_repository import CategoryHeatmapRepository
+
+
+def main():
+    LatestQuoteDB.__table__.create(bind=db_service.engine, checkfirst=True)
+
+    with db_service.get_session() as session:
+        affected = KLineManager(session).rebuild_latest_quotes()
+        total = session.query(LatestQuoteDB).count()
+
+    logger.info(f"✅ 最新行情表重建完成: 影响 {affected} 行, 共 {total} 只股票")
+
+    categories = asyncio.run(CategoryHeatmapRepository().rebuild_snapshot())
+    logger.info(f"✅ 分类热力图快照重建完成: {categories} 个分类")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+同步队列worker进程
+
+从 sync_work_units 认领工作单元并执行，可在多台机器上同时运行多个进程水平扩展；
+单元通过 POST /api/v1/sync/queue/enqueue 入队。需要 MySQL 8.0+（SKIP LOCKED）。
+Ctrl+C / SIGTERM 后执行完手上的单元退出，已认领未开始的单元放回队列。
+
+用法:
+    python scripts/run_sync_worker.py
+    python scripts/run_sync_worker.py --concurrency 8 --requests-per-second 5
+    python scripts/run_sync_worker.py --worker-id sync-01 --lease-seconds 600
+"""
+import argparse
+import asyncio
+import signal
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+from app.database import db_service
+from app.repositories.kline_repository import KLineRepository
+from app.services.sync_worker import SyncWorker, default_worker_id
+from app.api.v1.endpoints.data_sync import get_market_data_provider
+
+
+async def run(args):
+    worker = SyncWorker(
+        get_market_data_provider(),
+        KLineRepository(),
+        worker_id=args.worker_id,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        lease_seconds=args.lease_seconds,
+        requests_per_second=args.requests_per_second,
+        poll_interval=args.poll_interval
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    await worker.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步队列worker")
+    parser.add_argument("--worker-id", default=default_worker_id(), help="worker标识（默认 主机名:进程号）")
+    parser.add_argument("--concurrency", type=int, default=settings.sync_worker_concurrency,
+                        help="并发执行的单元数")
+    parser.add_argument("--batch-size", type=int, default=settings.sync_worker_batch_size,
+                        help="每次认领的单元数")
+    parser.add_argument("--lease-seconds", type=int, default=settings.sync_worker_lease_seconds,
+                        help="租约时长（秒）")
+    parser.add_argument("--requests-per-second", type=float, default=settings.sync_worker_requests_per_second,
+                        help="本worker的数据源请求配额（次/秒），0表示不限")
+    parser.add_argument("--poll-interval", type=float, default=settings.sync_worker_poll_interval,
+                        help="队列为空时的轮询间隔（秒）")
+    args = parser.parse_args()
+
+    # 确保 sync_work_units 等表存在
+    db_service.create_tables()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+测试交易日历与K线缺口索引
+"""
+import pytest
+import sys
+import os
+from datetime import date, datetime
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.trading_calendar import TradingCalendar, us_market_holidays
+from app.core.kline_gap_index import SessionBitmap, coalesce_runs, missing_date_ranges
+from market_data.fakes import generate_bars
+
+
+@pytest.fixture(scope="module")
+def calendar():
+    return TradingCalendar(first_year=2020, last_year=2025)
+
+
+class TestTradingCalendar:
+    """测试交易日历"""
+
+    @pytest.mark.parametrize("year, expected", [
+        (2024, {
+            date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29),
+            date(2024, 5, 27), date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2),
+            date(2024, 11, 28), date(2024, 12, 25),
+        }),
+        # 元旦为周六不提前；独立日为周日顺延到周一；圣诞节为周六提前到周五
+        (2022, {
+            date(2022, 1, 17), date(2022, 2, 21), date(2022, 4, 15), date(2022, 5, 30),
+            date(2022, 6, 20), date(2022, 7, 4), date(2022, 9, 5), date(2022, 11, 24),
+            date(2022, 12, 26),
+        }),
+    ])
+    def test_holidays(self, year, expected):
+        assert us_market_holidays(year) == expected
+
+    def test_is_session(self, calendar):
+        assert calendar.is_session(date(2024, 7, 5))
+        assert not calendar.is_session(date(2024, 7, 4))  # 独立日
+        assert not calendar.is_session(date(2024, 7, 6))  # 周六
+        assert not calendar.is_session(date(2025, 1, 9))  # 临时休市
+
+    def test_ordinals(self, calendar):
+        """序号连续，非交易日向后/向前取最近的交易日"""
+        assert calendar.session(calendar.ordinal(date(2024, 7, 3))) == date(2024, 7, 3)
+        assert calendar.ordinal(date(2024, 7, 5)) == calendar.ordinal(date(2024, 7, 3)) + 1
+        assert calendar.ordinal(date(2024, 7, 6)) == calendar.ordinal(date(2024, 7, 8))
+        assert calendar.ordinal_before(date(2024, 7, 6)) == calendar.ordinal(date(2024, 7, 5))
+        assert list(calendar.ordinals([date(2024, 7, 5), date(2024, 7, 6)])) == [
+            calendar.ordinal(date(2024, 7, 5)), -1
+        ]
+
+    def test_sessions(self, calendar):
+        assert calendar.sessions(date(2024, 7, 1), date(2024, 7, 7)) == [
+            date(2024, 7, 1), date(2024, 7, 2), date(2024, 7, 3), date(2024, 7, 5)
+        ]
+        assert calendar.sessions(date(2024, 7, 6), date(2024, 7, 7)) == []
+
+
+class TestSessionBitmap:
+    """测试交易日位图"""
+
+    def test_mark_extends_both_ways(self):
+        bitmap = SessionBitmap.from_ordinals([10, 12])
+        assert (bitmap.start, bitmap.end) == (10, 13)
+
+        assert bitmap.mark([5, 12, 20]) == 2
+        assert (bitmap.start, bitmap.end) == (5, 21)
+        assert bitmap.present_count == 4
+        assert bitmap.mark([-1]) == 0
+
+    def test_bytes_round_trip(self):
+        bitmap = SessionBitmap.from_ordinals([3, 4, 9, 17])
+        restored = SessionBitmap.from_bytes(bitmap.start, len(bitmap.bits), bitmap.to_bytes())
+        assert restored.start == bitmap.start
+        assert np.array_equal(restored.bits, bitmap.bits)
+
+    def test_missing_runs(self):
+        """位图范围外的交易日视为缺失"""
+        bitmap = SessionBitmap.from_ordinals([10, 11, 14, 15])
+        assert bitmap.missing_runs(8, 18) == [(8, 9), (12, 13), (16, 18)]
+        assert bitmap.missing_runs(10, 11) == []
+        assert bitmap.missing_runs(12, 11) == []
+        assert SessionBitmap.empty().missing_runs(0, 4) == [(0, 4)]
+
+    def test_coalesce_runs(self):
+        runs = [(1, 2), (5, 5), (7, 9), (20, 21)]
+        assert coalesce_runs(runs, 0) == runs
+        assert coalesce_runs(runs, 2) == [(1, 9), (20, 21)]
+
+
+class TestMissingDateRanges:
+    """测试按交易日求缺失区间"""
+
+    def test_gaps_in_fake_bars(self, calendar):
+        """模拟上游日线中去掉部分交易日后，缺失区间只包含这些交易日"""
+        bars = generate_bars("AAPL", 60, end=datetime(2024, 7, 31))
+        present = [
+            bar["datetime"].date() for bar in bars
+            if calendar.is_session(bar["datetime"].date())
+            and not date(2024, 7, 1) <= bar["datetime"].date() <= date(2024, 7, 5)
+            and bar["datetime"].date() != date(2024, 7, 15)
+        ]
+        bitmap = SessionBitmap.from_ordinals(calendar.ordinals(present))
+
+        assert missing_date_ranges(bitmap, calendar, date(2024, 6, 15), date(2024, 7, 31)) == [
+            (date(2024, 7, 1), date(2024, 7, 5), 4),
+            (date(2024, 7, 15), date(2024, 7, 15), 1),
+        ]
+        # 相隔不超过6个已有交易日的区间合并为一次请求，缺失数仍按实际缺失计
+        assert missing_date_ranges(bitmap, calendar, date(2024, 6, 15), date(2024, 7, 31), max_gap=6) == [
+            (date(2024, 7, 1), date(2024, 7, 15), 5),
+        ]
+
+    def test_range_outside_bitmap(self, calendar):
+        bitmap = SessionBitmap.from_ordinals(calendar.ordinals([date(2024, 7, 1)]))
+        assert missing_date_ranges(bitmap, calendar, date(2024, 7, 6), date(2024, 7, 9)) == [
+            (date(2024, 7, 8), date(2024, 7, 9), 2),
+        ]
+        assert missing_date_ranges(bitmap, calendar, date(2024, 7, 6), date(2024, 7, 7)) == []
@@ -0,0 +1,128 @@
+"""
+测试K线周期汇总的区间划分与聚合
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, time
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.kline_rollup import KLineRollupEngine
+from app.models import KLineTableManager, KLine1MinDB, KLineMonthlyDB
+from market_data.fakes import generate_bars
+
+
+def _bars(bars, turnover: bool = True):
+    """模拟上游K线转换为与ORM行同名属性的对象"""
+    return [
+        SimpleNamespace(
+            trade_time=bar["datetime"], open_price=bar["open"], high_price=bar["high"],
+            low_price=bar["low"], close_price=bar["close"], volume=bar["volume"],
+            turnover=bar["close"] * bar["volume"] if turnover else None
+        )
+        for bar in bars
+    ]
+
+
+class TestRollupBuckets:
+    """测试区间划分"""
+
+    def setup_method(self):
+        # bucket_start/bucket_end/_aggregate 不访问数据库
+        self.engine = KLineRollupEngine(session=None, session_open=time(9, 30))
+
+    @pytest.mark.parametrize("period, moment, expected", [
+        ("5m", datetime(2024, 3, 4, 9, 30), datetime(2024, 3, 4, 9, 30)),
+        ("5m", datetime(2024, 3, 4, 9, 34), datetime(2024, 3, 4, 9, 30)),
+        ("5m", datetime(2024, 3, 4, 9, 35), datetime(2024, 3, 4, 9, 35)),
+        ("15m", datetime(2024, 3, 4, 15, 59), datetime(2024, 3, 4, 15, 45)),
+        ("30m", datetime(2024, 3, 4, 10, 29), datetime(2024, 3, 4, 10, 0)),
+        ("4h", datetime(2024, 3, 4, 13, 29), datetime(2024, 3, 4, 9, 30)),
+        ("4h", datetime(2024, 3, 4, 15, 0), datetime(2024, 3, 4, 13, 30)),
+        ("1w", datetime(2024, 3, 6, 0, 0), datetime(2024, 3, 4, 0, 0)),
+        ("1w", datetime(2024, 3, 10, 0, 0), datetime(2024, 3, 4, 0, 0)),
+        ("1month", datetime(2024, 2, 29, 0, 0), datetime(2024, 2, 1, 0, 0)),
+    ])
+    def test_bucket_start(self, period, moment, expected):
+        """日内周期按开盘时间对齐，周线从周一、月线从1日开始"""
+        assert self.engine.bucket_start(period, moment) == expected
+
+    @pytest.mark.parametrize("period, start, expected", [
+        ("30m", datetime(2024, 3, 4, 15, 30), datetime(2024, 3, 4, 16, 0)),
+        ("4h", datetime(2024, 3, 4, 9, 30), datetime(2024, 3, 4, 13, 30)),
+        ("1w", datetime(2024, 3, 4), datetime(2024, 3, 11)),
+        ("1month", datetime(2024, 1, 1), datetime(2024, 2, 1)),
+        ("1month", datetime(2024, 2, 1), datetime(2024, 3, 1)),
+        ("1month", datetime(2024, 12, 1), datetime(2025, 1, 1)),
+    ])
+    def test_bucket_end(self, period, start, expected):
+        """区间结束时间（不含）"""
+        assert self.engine.bucket_end(period, start) == expected
+
+    def test_pre_market_bar(self):
+        """开盘前的K线归入开盘时间之前的区间，不与首个区间合并"""
+        assert self.engine.bucket_start("30m", datetime(2024, 3, 4, 9, 15)) == datetime(2024, 3, 4, 9, 0)
+
+
+class TestRollupPlan:
+    """测试汇总计划与周期到表的映射"""
+
+    def test_targets_resolve_to_their_tables(self):
+        """汇总目标周期都映射到各自的表，月线不会落到1分钟线表"""
+        for targets in KLineRollupEngine.ROLLUP_PLAN.values():
+            for period in targets:
+                model = KLineTableManager.get_model_by_period(period)
+                assert KLineTableManager.normalize_period(period) == KLineTableManager.MODEL_TO_PERIOD[model]
+        assert KLineTableManager.get_model_by_period("1month") is KLineMonthlyDB
+        assert KLineTableManager.get_model_by_period("1M") is KLineMonthlyDB
+        assert KLineTableManager.get_model_by_period("1m") is KLine1MinDB
+
+    def test_provider_periods_are_not_targets(self):
+        """日线、小时线由数据源提供，不作为汇总目标"""
+        targets = {p for periods in KLineRollupEngine.ROLLUP_PLAN.values() for p in periods}
+        assert not targets & {"1d", "1h"}
+
+
+class TestRollupAggregate:
+    """测试聚合"""
+
+    def setup_method(self):
+        self.engine = KLineRollupEngine(session=None)
+
+    def test_weekly_from_daily(self):
+        """日线聚合为周线：开取首根、收取末根、高低取极值、成交量加总"""
+        source = generate_bars("AAPL", 28, end=datetime(2024, 3, 31))
+        bars = _bars(source)
+        first = self.engine.bucket_start("1w", bars[0].trade_time)
+        last = self.engine.bucket_start("1w", bars[-1].trade_time)
+
+        rows = self.engine._aggregate("1w", bars, first, last)
+        assert [row["trade_time"] for row in rows] == [
+            datetime(2024, 3, 4), datetime(2024, 3, 11), datetime(2024, 3, 18), datetime(2024, 3, 25),
+        ]
+        for row in rows:
+            week = [b for b in source if self.engine.bucket_start("1w", b["datetime"]) == row["trade_time"]]
+            assert row["open_price"] == week[0]["open"]
+            assert row["close_price"] == week[-1]["close"]
+            assert row["high_price"] == max(b["high"] for b in week)
+            assert row["low_price"] == min(b["low"] for b in week)
+            assert row["volume"] == sum(b["volume"] for b in week)
+            assert row["time_key"] == row["trade_time"].strftime("%Y-%m-%d %H:%M:%S")
+
+    def test_only_requested_buckets(self):
+        """只输出 [first, last] 内的区间"""
+        bars = _bars(generate_bars("AAPL", 60, end=datetime(2024, 3, 31)))
+        rows = self.engine._aggregate("1month", bars, datetime(2024, 3, 1), datetime(2024, 3, 1))
+        assert len(rows) == 1
+        assert rows[0]["trade_time"] == datetime(2024, 3, 1)
+
+    def test_turnover_requires_all_bars(self):
+        """任一源K线缺少成交额时汇总成交额为空"""
+        bars = _bars(generate_bars("AAPL", 5, end=datetime(2024, 3, 8)))
+        bars[2].turnover = None
+        first = self.engine.bucket_start("1w", bars[0].trade_time)
+        rows = self.engine._aggregate("1w", bars, first, self.engine.bucket_start("1w", bars[-1].trade_time))
+        assert rows[0]["turnover"] is None
@@ -0,0 +1,204 @@
+"""
+测试同步工作队列的入队去重与租约隔离
+
+需要可用的MySQL数据库（与其他测试相同，使用配置中的 database_url）
+"""
+import pytest
+import sys
+import os
+import uuid
+from datetime import date, datetime
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import DataSyncTaskDB, SyncWorkUnitDB, SyncTaskUnitLinkDB
+from app.repositories.sync_queue_repository import SyncQueueRepository, subtract_ranges
+
+
+class TestSubtractRanges:
+    """测试日期区间相减"""
+
+    def test_no_overlap(self):
+        assert subtract_ranges(date(2024, 1, 1), date(2024, 1, 31), []) == [(date(2024, 1, 1), date(2024, 1, 31))]
+        assert subtract_ranges(date(2024, 1, 1), date(2024, 1, 31), [(date(2024, 2, 1), date(2024, 2, 5))]) == [
+            (date(2024, 1, 1), date(2024, 1, 31))
+        ]
+
+    def test_fully_covered(self):
+        assert subtract_ranges(date(2024, 1, 5), date(2024, 1, 10), [(date(2024, 1, 1), date(2024, 1, 31))]) == []
+
+    def test_partial_and_interior(self):
+        covered = [(date(2024, 1, 20), date(2024, 2, 10)), (date(2024, 1, 5), date(2024, 1, 9))]
+        assert subtract_ranges(date(2024, 1, 1), date(2024, 1, 31), covered) == [
+            (date(2024, 1, 1), date(2024, 1, 4)),
+            (date(2024, 1, 10), date(2024, 1, 19)),
+        ]
+
+
+@pytest.mark.integration
+class TestSyncQueueLease:
+    """测试租约隔离：租约过期被回收后，原worker的续租和结果不再生效"""
+
+    def setup_method(self):
+        self.queue = SyncQueueRepository()
+        self.code = f"T{uuid.uuid4().hex[:8].upper()}"
+        self.task_id = f"test-{uuid.uuid4().hex[:12]}"
+
+    def teardown_method(self):
+        with self.queue.db_service.get_session() as session:
+            session.query(SyncWorkUnitDB).filter(SyncWorkUnitDB.stock_code == self.code).delete()
+            session.commit()
+
+    async def _enqueue(self, start: date, end: date):
+        return await self.queue.enqueue(self.task_id, [{
+            'stock_code': self.code, 'timeframe': '1d',
+            'start_date': start, 'end_date': end, 'reason': 'test'
+        }])
+
+    async def _claim_own(self, worker_id: str, lease_seconds: int):
+        """认领本测试入队的单元（队列中有其他待执行单元时跳过，避免占用）"""
+        stats = await self.queue.get_queue_stats()
+        if stats.get('ready', 0) > 1:
+            pytest.skip("队列中有其他待执行单元")
+        units = await self.queue.claim(worker_id, 1, lease_seconds)
+        assert len(units) == 1 and units[0].stock_code == self.code
+        return units[0]
+
+    @pytest.mark.asyncio
+    async def test_enqueue_skips_queued_ranges(self):
+        """与未结束单元重叠的日期只入队未覆盖的部分"""
+        assert await self._enqueue(date(2024, 1, 1), date(2024, 1, 31)) == 1
+        assert await self._enqueue(date(2024, 1, 10), date(2024, 1, 20)) == 0
+        assert await self._enqueue(date(2024, 1, 15), date(2024, 2, 15)) == 1
+
+        with self.queue.db_service.get_session() as session:
+            ranges = sorted(
+                (unit.start_date, unit.end_date)
+                for unit in session.query(SyncWorkUnitDB).filter(SyncWorkUnitDB.stock_code == self.code)
+            )
+        assert ranges == [(date(2024, 1, 1), date(2024, 1, 31)), (date(2024, 2, 1), date(2024, 2, 15))]
+
+    @pytest.mark.asyncio
+    async def test_claimed_unit_not_claimed_twice(self):
+        """租约有效期内其他worker认领不到"""
+        await self._enqueue(date(2024, 1, 1), date(2024, 1, 31))
+        await self._claim_own("worker-a", 300)
+
+        assert not [u for u in await self.queue.claim("worker-b", 10, 300) if u.stock_code == self.code]
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_fenced(self):
+        """租约过期被回收并由新worker认领后，旧worker的续租、完成都被拒绝"""
+        await self._enqueue(date(2024, 1, 1), date(2024, 1, 31))
+        stale = await self._claim_own("worker-a", -1)
+
+        assert await self.queue.reclaim_expired() >= 1
+        fresh = await self._claim_own("worker-b", 300)
+        assert fresh.id == stale.id
+        assert fresh.attempts == 2
+
+        assert not await self.queue.renew(stale.id, "worker-a", 300)
+        assert not await self.queue.complete(stale.id, "worker-a", 99)
+        assert await self.queue.complete(fresh.id, "worker-b", 21)
+
+        with self.queue.db_service.get_session() as session:
+            unit = session.query(SyncWorkUnitDB).filter(SyncWorkUnitDB.id == fresh.id).one()
+            assert (unit.status, unit.rows_written, unit.lease_owner) == ('done', 21, None)
+
+    @pytest.mark.asyncio
+    async def test_release_and_retry(self):
+        """放回的单元不计入认领次数；失败的单元延后重试，达到次数上限后置为失败"""
+        await self._enqueue(date(2024, 1, 1), date(2024, 1, 31))
+        unit = await self._claim_own("worker-a", 300)
+        assert await self.queue.release(unit.id, "worker-a")
+
+        for attempt in range(1, unit.max_attempts + 1):
+            unit = await self._claim_own("worker-a", 300)
+            assert unit.attempts == attempt
+            assert await self.queue.fail(unit, "worker-a", "boom", retry_delay=0)
+
+        progress = await self.queue.get_task_progress(self.task_id)
+        assert progress['failed'] == 1 and not progress['pending'] and not progress['leased']
+
+
+@pytest.mark.integration
+class TestSyncQueueSharedUnits:
+    """测试后入队的任务关联已排队的其他任务的单元"""
+
+    def setup_method(self):
+        self.queue = SyncQueueRepository()
+        self.code = f"T{uuid.uuid4().hex[:8].upper()}"
+        self.first = f"test-{uuid.uuid4().hex[:12]}"
+        self.second = f"test-{uuid.uuid4().hex[:12]}"
+        with self.queue.db_service.get_session() as session:
+            for task_id in (self.first, self.second):
+                session.add(DataSyncTaskDB(
+                    task_id=task_id, task_type='queued', status='running', start_time=datetime.utcnow()
+                ))
+            session.commit()
+
+    def teardown_method(self):
+        task_ids = [self.first, self.second]
+        with self.queue.db_service.get_session() as session:
+            session.query(SyncTaskUnitLinkDB).filter(SyncTaskUnitLinkDB.task_id.in_(task_ids)).delete()
+            session.query(SyncWorkUnitDB).filter(SyncWorkUnitDB.stock_code == self.code).delete()
+            session.query(DataSyncTaskDB).filter(DataSyncTaskDB.task_id.in_(task_ids)).delete()
+            session.commit()
+
+    async def _enqueue(self, task_id: str, start: date, end: date):
+        return await self.queue.enqueue(task_id, [{
+            'stock_code': self.code, 'timeframe': '1d',
+            'start_date': start, 'end_date': end, 'reason': 'test'
+        }])
+
+    def _units(self):
+        with self.queue.db_service.get_session() as session:
+            return sorted(
+                (unit.start_date, unit.end_date, unit.status)
+                for unit in session.query(SyncWorkUnitDB).filter(SyncWorkUnitDB.stock_code == self.code)
+            )
+
+    @pytest.mark.asyncio
+    async def test_covered_task_waits_for_linked_units(self):
+        """范围已全部排队的任务不入队新单元，进度计入关联单元，单元结束前不结束"""
+        assert await self._enqueue(self.first, date(2024, 1, 1), date(2024, 1, 31)) == 1
+        assert await self._enqueue(self.second, date(2024, 1, 10), date(2024, 1, 20)) == 0
+        # 重复入队不重复关联
+        assert await self._enqueue(self.second, date(2024, 1, 10), date(2024, 1, 20)) == 0
+
+        progress = await self.queue.get_task_progress(self.second)
+        assert progress['total'] == 1 and progress['pending'] == 1
+        assert not await self.queue.finish_task_if_drained(self.second)
+
+        with self.queue.db_service.get_session() as session:
+            session.query(SyncWorkUnitDB).filter(SyncWorkUnitDB.stock_code == self.code).update(
+                {'status': 'done', 'rows_written': 10}
+            )
+            session.commit()
+        progress = await self.queue.get_task_progress(self.second)
+        assert progress['done'] == 1 and progress['rows_written'] == 10
+        assert await self.queue.finish_task_if_drained(self.second)
+
+    @pytest.mark.asyncio
+    async def test_cancel_keeps_units_shared_with_running_task(self):
+        """取消先入队的任务时，仍被运行中任务关联的单元不取消"""
+        await self._enqueue(self.first, date(2024, 1, 1), date(2024, 1, 31))
+        await self._enqueue(self.first, date(2024, 3, 1), date(2024, 3, 31))
+        assert await self._enqueue(self.second, date(2024, 1, 15), date(2024, 2, 15)) == 1
+
+        assert await self.queue.cancel_task(self.first) == 1
+        assert self._units() == [
+            (date(2024, 1, 1), date(2024, 1, 31), 'pending'),
+            (date(2024, 2, 1), date(2024, 2, 15), 'pending'),
+            (date(2024, 3, 1), date(2024, 3, 31), 'failed'),
+        ]
+
+        # 后入队的任务也取消后，共享单元不再被保留
+        with self.queue.db_service.get_session() as session:
+            session.query(DataSyncTaskDB).filter(DataSyncTaskDB.task_id == self.first).update(
+                {'status': 'cancelled'}
+            )
+            session.commit()
+        assert await self.queue.cancel_task(self.second) == 2
+        assert all(status == 'failed' for _, _, status in self._units())